@@ -13,37 +13,55 @@ import asyncio
 import logging
 import time
 import re
+import threading
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List, Union
+from typing import TYPE_CHECKING, Dict, Any, Optional, List, Union
 
 import uvicorn
 from fastapi import FastAPI, HTTPException, Request, status, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
 
 # Import các module cần thiết từ MM A2A Ecommerce Chatbot
-from mm_a2a.agent.agent import root_agent
+# (agent, ADK và google.genai được nạp khi cần lần đầu, xem `_AgentRuntime`)
 from config import Config, active_config
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
-from mm_a2a.tools.memory import _get_session_data, _store_session_data
-
-# Thiết lập logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("backend_server.log", encoding='utf-8'),
-    ]
+from mm_a2a.tools.memory import _get_session_data, _store_session_data, _session_store
+from mm_a2a.tools.api_client.models import CartItem, Product
+from mm_a2a.tools.api_client.product import get_search_cache_stats
+from mm_a2a.tools.api_client.cart_pool import get_guest_cart_pool
+from mm_a2a.tools.api_client.cart_queue import get_cart_mutation_queue
+from mm_a2a.tools.api_client.cart_state import get_cart_state_cache
+from mm_a2a.tools.api_client.idempotency import get_mutation_ledger
+from mm_a2a.tools.api_client.customer_profile import get_customer_profiles, merge_profiles
+from mm_a2a.tools.api_client.request_context import SESSION_ID_KEY, get_session_contexts
+from mm_a2a.shared_state import generate_key, get_shared_store, session_db_url, shared_mapping, shared_state_stats
+from mm_a2a.admission import AdmissionRejected, AdmissionTicket, get_admission
+from mm_a2a.tracing import TracingMiddleware, run_turn_async, setup_tracing, shutdown_tracing
+from mm_a2a.timing import TurnTiming, instrument_agents
+from mm_a2a.logging_setup import LogSampler, capped, dropped_records, setup_logging
+from mm_a2a.metrics import (
+    ACTIVE_STREAMS, LLM_TOKENS, RUNNER_INFLIGHT, TURN_LATENCY, MetricsMiddleware, flatten_stats, registry,
+    render_metrics, worker_metrics
 )
+
+if TYPE_CHECKING:
+    from google.genai import types
+
+# Thiết lập logging: ghi console/file trên thread nền, mức theo LOG_LEVEL
+setup_logging("backend_server.log")
 logger = logging.getLogger(__name__)
 
-# Dictionary toàn cục để lưu trữ thông tin người dùng
+# Log từng chunk stream chỉ lấy mẫu 1 trên LOG_CHUNK_SAMPLE_EVERY
+_chunk_log_sampler = LogSampler(Config.LOG_CHUNK_SAMPLE_EVERY)
+
+# Kho toàn cục để lưu trữ thông tin người dùng (dùng chung giữa các worker khi SERVER_WORKERS > 1)
 # Key: "{user_id}:{session_id}", Value: Dict chứa thông tin user_profile
-user_profiles = {}
+user_profiles = shared_mapping("user_profiles")
 
 # Tạo app
 app = FastAPI(title="MM A2A Ecommerce Chatbot API")
@@ -57,16 +75,102 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Tạo session service để lưu trữ phiên chat
-session_service = InMemorySessionService()
+# Một span cho mỗi request HTTP (no-op khi TRACING_ENABLED tắt)
+app.add_middleware(TracingMiddleware)
+# Số request và độ trễ theo route cho /metrics
+app.add_middleware(MetricsMiddleware)
+
 APP_NAME = "mm_a2a_ecommerce"
 
-# Khởi tạo runner để chạy agent
-runner = Runner(
-    agent=root_agent,
-    app_name=APP_NAME,
-    session_service=session_service
-)
+class _AgentRuntime:
+    """
+    Cây agent, session service và runner của tiến trình.
+
+    Nạp google-adk/google.genai và dựng cây agent mất vài giây, nên được tạo khi cần lần đầu
+    (hoặc trên thread nền lúc khởi động, xem `warm_up`) để server nhận request ngay. Khi chạy
+    nhiều worker, session được lưu trong file SQLite dùng chung (`DatabaseSessionService`) để
+    lượt chat tiếp theo của phiên chạy được ở worker bất kỳ.
+    """
+
+    def __init__(self):
+        from google.adk.runners import Runner
+        from google.adk.sessions import InMemorySessionService
+        from mm_a2a.agent.agent import get_root_agent
+        from mm_a2a.models import get_model_name
+
+        root_agent = get_root_agent()
+        # Callback đo thời gian gọi LLM/công cụ cho `include_timing` (no-op khi không yêu cầu)
+        instrument_agents(root_agent)
+        # Session service để lưu trữ phiên chat
+        db_url = session_db_url()
+        self.session_service = _database_session_service(db_url) if db_url else InMemorySessionService()
+        if db_url:
+            self._init_app_state()
+        self.model_name = get_model_name(root_agent.model)
+        # Runner để chạy agent
+        self.runner = Runner(
+            agent=root_agent,
+            app_name=APP_NAME,
+            session_service=self.session_service
+        )
+
+    def create_session(self, user_id: str, session_id: str):
+        """Tạo phiên ADK; session_id được ghi vào state để tool đọc qua `tool_context.state`."""
+        return self.session_service.create_session(
+            app_name=APP_NAME, user_id=user_id, session_id=session_id, state={SESSION_ID_KEY: session_id}
+        )
+
+    def _init_app_state(self):
+        """
+        Tạo trước bản ghi trạng thái của app trong file session dùng chung.
+
+        Phiên đầu tiên của app tạo bản ghi này; hai worker cùng tạo phiên đầu tiên thì một
+        bên bị lỗi trùng khóa và request đó không có session. Tạo rồi xóa một phiên tạm lúc
+        khởi tạo runtime để bản ghi có sẵn trước khi nhận lượt chat.
+        """
+        session_id = f"_startup-{os.getpid()}"
+        try:
+            self.session_service.create_session(app_name=APP_NAME, user_id="_runtime", session_id=session_id)
+            self.session_service.delete_session(app_name=APP_NAME, user_id="_runtime", session_id=session_id)
+        except Exception as e:
+            # Worker khác vừa tạo bản ghi
+            logger.debug("Bỏ qua lỗi khi tạo trạng thái app: %s", e)
+
+def _database_session_service(db_url: str):
+    """Session service trên file SQLite dùng chung; thử lại một lần nếu worker khác đang tạo bảng cùng lúc."""
+    from google.adk.sessions import DatabaseSessionService
+    from sqlalchemy.exc import OperationalError
+
+    try:
+        return DatabaseSessionService(db_url)
+    except OperationalError as e:
+        logger.debug("Tạo lại session service sau lỗi tạo bảng: %s", e)
+        return DatabaseSessionService(db_url)
+
+_runtime: Optional[_AgentRuntime] = None
+_runtime_lock = threading.Lock()
+
+def _get_runtime() -> _AgentRuntime:
+    """Trả về runtime của agent, tạo nếu chưa có (chặn thread gọi trong lúc tạo)."""
+    global _runtime
+    if _runtime is None:
+        with _runtime_lock:
+            if _runtime is None:
+                started = time.perf_counter()
+                _runtime = _AgentRuntime()
+                logger.info("Đã khởi tạo agent runtime trong %.2f giây", time.perf_counter() - started)
+    return _runtime
+
+async def agent_runtime() -> _AgentRuntime:
+    """Runtime của agent cho các endpoint; lần tạo đầu tiên chạy trên thread pool để không chặn event loop."""
+    if _runtime is not None:
+        return _runtime
+    return await asyncio.get_running_loop().run_in_executor(None, _get_runtime)
+
+def _text_content(role: str, text: str) -> "types.Content":
+    """Nội dung một phần văn bản cho runner."""
+    from google.genai import types
+    return types.Content(role=role, parts=[types.Part(text=text)])
 
 # Models cho API
 class ChatRequest(BaseModel):
@@ -82,6 +186,7 @@ class ChatRequest(BaseModel):
     include_timestamps: bool = False
     max_tokens: Optional[int] = None
     include_thinking: bool = False
+    include_timing: bool = False  # Trả về phân rã độ trễ của lượt chat (`timing`)
     max_context_messages: int = 20  # Giới hạn số lượng tin nhắn trong context
     user_profile: Optional[Dict[str, Any]] = None  # Thông tin người dùng từ frontend
 
@@ -102,6 +207,64 @@ class SessionData(BaseModel):
     memory: Dict[str, Any] = {}
     user_profile: Optional[Dict[str, Any]] = None
 
+def _lift_products(json_data: Dict[str, Any]):
+    """Đảm bảo luôn có trường "products" ở root của JSON (chuyển từ `data` lên nếu cần)."""
+    data = json_data.get('data')
+    if isinstance(data, dict) and 'products' in data and 'products' not in json_data:
+        # Chuyển trường products từ data lên level root
+        json_data['products'] = data['products']
+        # Chuyển các trường khác từ data nếu cần
+        if 'total_results' in data:
+            json_data['total_results'] = data['total_results']
+        if 'page' in data:
+            json_data['page'] = data['page']
+
+def _ensure_response_fields(json_data: Dict[str, Any]):
+    """Bổ sung các trường success/message/action cho phản hồi chứa sản phẩm."""
+    if 'products' not in json_data:
+        return
+    # Đảm bảo có trường success = true nếu chưa có
+    json_data.setdefault('success', True)
+    # Đảm bảo có trường message nếu chưa có
+    if 'message' not in json_data:
+        if 'total_results' in json_data:
+            json_data['message'] = f"Đã tìm thấy {json_data['total_results']} sản phẩm"
+        else:
+            json_data['message'] = f"Đã tìm thấy {len(json_data['products'])} sản phẩm"
+    # Đảm bảo có trường action nếu chưa có
+    json_data.setdefault('action', "search_products")
+
+def _normalize_products(products: List[Any]):
+    """
+    Đảm bảo các trường cần thiết trong mỗi sản phẩm.
+
+    Sản phẩm còn ở dạng GraphQL (giá là dict lồng nhau) được giải mã một lần
+    bằng `Product` để lấy giá cuối, giá gốc và phần trăm giảm giá đã tính sẵn.
+    """
+    for product in products:
+        if not isinstance(product, dict):
+            continue
+        # Đảm bảo product_id
+        if 'id' in product and 'product_id' not in product:
+            product['product_id'] = product['id']
+        # Đảm bảo có giá gốc và phần trăm giảm giá. Chỉ giải mã khi giá còn ở dạng GraphQL;
+        # giá đã là số phẳng thì giữ nguyên (price_range lúc đó có thể chỉ chứa giảm giá)
+        if isinstance(product.get('price'), dict) or ('price' not in product and 'price_range' in product):
+            summary = Product.from_graphql(product).to_summary()
+            product['price'] = summary['price']
+            for key in ('original_price', 'discount_percentage', 'image_url', 'unit'):
+                if summary[key] or key not in ('image_url', 'unit'):
+                    product.setdefault(key, summary[key])
+        elif 'price' in product and 'original_price' not in product:
+            product['original_price'] = product['price']
+            product['discount_percentage'] = 0
+        # Đảm bảo có thương hiệu
+        if 'brand' not in product:
+            product['brand'] = "No brand"
+
+def _has_product_list(json_data: Any) -> bool:
+    return isinstance(json_data, dict) and isinstance(json_data.get('products'), list)
+
 def process_model_response(text: str) -> str:
     """
     Xử lý phản hồi từ mô hình để định dạng đúng cách cho frontend.
@@ -113,7 +276,7 @@ def process_model_response(text: str) -> str:
     if not text:
         return ""
     
-    logger.info(f"Xử lý phản hồi từ mô hình: {text[:200]}...")
+    logger.debug("Xử lý phản hồi từ mô hình: %s", capped(text, 200))
         
     # Kiểm tra phản hồi có phải là JSON trong code block không
     json_code_block_pattern = r'```(?:json)?\s*(.*?)\s*```'
@@ -127,50 +290,16 @@ def process_model_response(text: str) -> str:
             json_data = json.loads(json_content)
             
             # Ghi log JSON đã xử lý
-            logger.info(f"JSON đã xử lý: {json.dumps(json_data, ensure_ascii=False)[:200]}...")
+            logger.debug("JSON đã xử lý: %s", capped(json_data, 200))
             
-            # Chuẩn hóa định dạng dữ liệu sản phẩm
-            # Đảm bảo luôn có trường "products" ở root của JSON
-            if 'data' in json_data and 'products' in json_data['data'] and not 'products' in json_data:
-                # Chuyển trường products từ data lên level root
-                json_data['products'] = json_data['data']['products']
-                # Chuyển các trường khác từ data nếu cần
-                if 'total_results' in json_data['data']:
-                    json_data['total_results'] = json_data['data']['total_results']
-                if 'page' in json_data['data']:
-                    json_data['page'] = json_data['data']['page']
-            
-            # Đảm bảo có trường success = true nếu chưa có
-            if not 'success' in json_data and 'products' in json_data:
-                json_data['success'] = True
-                
-            # Đảm bảo có trường message nếu chưa có
-            if not 'message' in json_data and 'products' in json_data:
-                if 'total_results' in json_data:
-                    json_data['message'] = f"Đã tìm thấy {json_data['total_results']} sản phẩm"
-                else:
-                    json_data['message'] = f"Đã tìm thấy {len(json_data['products'])} sản phẩm"
-                    
-            # Đảm bảo có trường action nếu chưa có
-            if not 'action' in json_data and 'products' in json_data:
-                json_data['action'] = "search_products"
+            if isinstance(json_data, dict):
+                _lift_products(json_data)
+                _ensure_response_fields(json_data)
             
             # Nếu có một đối tượng products trong JSON, đây có thể là kết quả tìm kiếm sản phẩm
-            if 'products' in json_data and isinstance(json_data.get('products'), list):
-                logger.info(f"Phát hiện dữ liệu JSON chứa sản phẩm: {len(json_data['products'])} sản phẩm")
-                
-                # Đảm bảo các trường cần thiết trong mỗi sản phẩm
-                for product in json_data['products']:
-                    # Đảm bảo product_id
-                    if 'id' in product and not 'product_id' in product:
-                        product['product_id'] = product['id']
-                    # Đảm bảo có giá gốc và phần trăm giảm giá
-                    if 'price' in product and not 'original_price' in product:
-                        product['original_price'] = product['price']
-                        product['discount_percentage'] = 0
-                    # Đảm bảo có thương hiệu
-                    if not 'brand' in product:
-                        product['brand'] = "No brand"
+            if _has_product_list(json_data):
+                logger.debug("Phát hiện dữ liệu JSON chứa sản phẩm: %d sản phẩm", len(json_data['products']))
+                _normalize_products(json_data['products'])
             
             # Trả về chuỗi JSON đã làm sạch để frontend có thể phân tích trực tiếp
             return json.dumps(json_data, ensure_ascii=False)
@@ -183,50 +312,15 @@ def process_model_response(text: str) -> str:
     try:
         # Kiểm tra xem toàn bộ văn bản có phải là JSON hợp lệ không
         json_data = json.loads(text)
-        logger.info("Phát hiện JSON trực tiếp không có code block")
+        logger.debug("Phát hiện JSON trực tiếp không có code block")
         
-        # Chuẩn hóa định dạng dữ liệu sản phẩm
-        # Đảm bảo luôn có trường "products" ở root của JSON
-        if 'data' in json_data and 'products' in json_data['data'] and not 'products' in json_data:
-            # Chuyển trường products từ data lên level root
-            json_data['products'] = json_data['data']['products']
-            # Chuyển các trường khác từ data nếu cần
-            if 'total_results' in json_data['data']:
-                json_data['total_results'] = json_data['data']['total_results']
-            if 'page' in json_data['data']:
-                json_data['page'] = json_data['data']['page']
-                
-        # Đảm bảo có trường success = true nếu chưa có
-        if not 'success' in json_data and 'products' in json_data:
-            json_data['success'] = True
+        if isinstance(json_data, dict):
+            _lift_products(json_data)
+            _ensure_response_fields(json_data)
         
-        # Đảm bảo có trường message nếu chưa có
-        if not 'message' in json_data and 'products' in json_data:
-            if 'total_results' in json_data:
-                json_data['message'] = f"Đã tìm thấy {json_data['total_results']} sản phẩm"
-            else:
-                json_data['message'] = f"Đã tìm thấy {len(json_data['products'])} sản phẩm"
-                
-        # Đảm bảo có trường action nếu chưa có
-        if not 'action' in json_data and 'products' in json_data:
-            json_data['action'] = "search_products"
-        
-        # Nếu có, trả về chuỗi JSON ban đầu
-        if 'products' in json_data and isinstance(json_data.get('products'), list):
-            logger.info(f"Phát hiện dữ liệu JSON trực tiếp chứa sản phẩm: {len(json_data['products'])} sản phẩm")
-            
-            # Đảm bảo các trường cần thiết trong mỗi sản phẩm
-            for product in json_data['products']:
-                # Đảm bảo product_id
-                if 'id' in product and not 'product_id' in product:
-                    product['product_id'] = product['id']
-                # Đảm bảo có giá gốc và phần trăm giảm giá
-                if 'price' in product and not 'original_price' in product:
-                    product['original_price'] = product['price']
-                    product['discount_percentage'] = 0
-                # Đảm bảo có thương hiệu
-                if not 'brand' in product:
-                    product['brand'] = "No brand"
+        if _has_product_list(json_data):
+            logger.debug("Phát hiện dữ liệu JSON trực tiếp chứa sản phẩm: %d sản phẩm", len(json_data['products']))
+            _normalize_products(json_data['products'])
         
         # Trả về chuỗi JSON gốc để frontend có thể phân tích
         return json.dumps(json_data, ensure_ascii=False)
@@ -243,42 +337,23 @@ def process_model_response(text: str) -> str:
         if len(potential_json) > 50:  # Chỉ xét các chuỗi đủ dài là JSON tiềm năng
             try:
                 json_data = json.loads(potential_json)
-                logger.info(f"Phát hiện JSON tiềm năng trong văn bản: {potential_json[:100]}...")
+                logger.debug("Phát hiện JSON tiềm năng trong văn bản: %s", capped(potential_json, 100))
+                if not isinstance(json_data, dict):
+                    continue
                 
-                # Chuẩn hóa định dạng dữ liệu sản phẩm
-                # Đảm bảo luôn có trường "products" ở root của JSON
-                if 'data' in json_data and 'products' in json_data['data'] and not 'products' in json_data:
-                    # Chuyển trường products từ data lên level root
-                    json_data['products'] = json_data['data']['products']
-                    # Chuyển các trường khác từ data nếu cần
-                    if 'total_results' in json_data['data']:
-                        json_data['total_results'] = json_data['data']['total_results']
-                    if 'page' in json_data['data']:
-                        json_data['page'] = json_data['data']['page']
+                _lift_products(json_data)
                 
                 # Nếu có đối tượng products, đây có thể là kết quả tìm kiếm
-                if 'products' in json_data and isinstance(json_data.get('products'), list):
-                    logger.info(f"Phát hiện dữ liệu JSON nhúng chứa sản phẩm: {len(json_data['products'])} sản phẩm")
-                    
-                    # Đảm bảo các trường cần thiết trong mỗi sản phẩm
-                    for product in json_data['products']:
-                        # Đảm bảo product_id
-                        if 'id' in product and not 'product_id' in product:
-                            product['product_id'] = product['id']
-                        # Đảm bảo có giá gốc và phần trăm giảm giá
-                        if 'price' in product and not 'original_price' in product:
-                            product['original_price'] = product['price']
-                            product['discount_percentage'] = 0
-                        # Đảm bảo có thương hiệu
-                        if not 'brand' in product:
-                            product['brand'] = "No brand"
+                if _has_product_list(json_data):
+                    logger.debug("Phát hiện dữ liệu JSON nhúng chứa sản phẩm: %d sản phẩm", len(json_data['products']))
+                    _normalize_products(json_data['products'])
                     
                     # Trả về đối tượng JSON đã trích xuất
                     return json.dumps(json_data, ensure_ascii=False)
                 
                 # Nếu JSON chứa thông tin quan trọng khác như cart
                 if 'cart' in json_data or 'cart_items' in json_data:
-                    logger.info("Phát hiện dữ liệu JSON chứa thông tin giỏ hàng")
+                    logger.debug("Phát hiện dữ liệu JSON chứa thông tin giỏ hàng")
                     return json.dumps(json_data, ensure_ascii=False)
             except json.JSONDecodeError:
                 # Không phải JSON hợp lệ, bỏ qua
@@ -314,10 +389,10 @@ def ensure_event_loop():
 def prepare_model_context(user_profile: Optional[Dict[str, Any]]) -> str:
     """Chuẩn bị context cho model dựa trên thông tin đã biết về người dùng."""
     if not user_profile:
-        logger.info("Không có user_profile để chuẩn bị context")
+        logger.debug("Không có user_profile để chuẩn bị context")
         return ""
         
-    logger.info(f"Chuẩn bị context từ user_profile: {user_profile}")
+    logger.debug("Chuẩn bị context từ user_profile: %s", capped(user_profile))
     
     context_parts = []
     
@@ -378,17 +453,17 @@ def prepare_model_context(user_profile: Optional[Dict[str, Any]]) -> str:
                 total_price = 0
                 for item in cart_items:
                     if isinstance(item, dict):
-                        product_name = item.get('name', 'Sản phẩm không tên')
-                        quantity = item.get('quantity', 1)
-                        price = item.get('price', 0)
-                        item_total = quantity * price
-                        total_price += item_total
-                        cart_info.append(f"{product_name} - {quantity} cái x {price:,}đ = {item_total:,}đ")
+                        line = CartItem.from_dict(item)
+                        total_price += line.row_total
+                        cart_info.append(
+                            f"{line.name or 'Sản phẩm không tên'} - {line.quantity:g} cái x "
+                            f"{line.price:,.0f}đ = {line.row_total:,.0f}đ"
+                        )
                     else:
                         logger.warning(f"cart_item không phải là dict: {item}")
                 
                 if cart_info:
-                    context_parts.append(f"Giỏ hàng hiện tại (tổng: {total_price:,}đ):\n" + "\n".join(cart_info))
+                    context_parts.append(f"Giỏ hàng hiện tại (tổng: {total_price:,.0f}đ):\n" + "\n".join(cart_info))
             else:
                 logger.warning(f"cart_items không phải là list: {cart_items}")
                 
@@ -427,22 +502,25 @@ def prepare_model_context(user_profile: Optional[Dict[str, Any]]) -> str:
     # Tạo system message với context
     if context_parts:
         system_info = "Hãy sử dụng thông tin sau về khách hàng để phục vụ tốt hơn:\n\n" + "\n\n".join(context_parts)
-        logger.info(f"Đã tạo context cho model với {len(context_parts)} phần")
+        logger.debug("Đã tạo context cho model với %d phần", len(context_parts))
     else:
         system_info = "Chưa có thông tin cụ thể về khách hàng này."
-        logger.info("Không có thông tin chi tiết về khách hàng")
+        logger.debug("Không có thông tin chi tiết về khách hàng")
     
     return system_info
 
 def get_user_profile(user_id: str, session_id: str) -> Dict[str, Any]:
-    """Helper function để lấy user_profile từ dictionary toàn cục."""
+    """Helper function để lấy user_profile từ dictionary toàn cục, gộp với hồ sơ tài khoản đã cache nếu khách đã đăng nhập."""
     profile_key = f"{user_id}:{session_id}"
     profile = user_profiles.get(profile_key, {})
+    customer = get_customer_profiles().for_session(session_id)
+    if customer:
+        profile = merge_profiles(profile, customer)
     
     if not profile:
-        logger.info(f"Không tìm thấy profile cho {profile_key}")
+        logger.debug("Không tìm thấy profile cho %s", profile_key)
     else:
-        logger.info(f"Đã tìm thấy profile cho {profile_key}: {profile}")
+        logger.debug("Đã tìm thấy profile cho %s: %s", profile_key, capped(profile))
         
     return profile
 
@@ -455,18 +533,253 @@ def manage_context_size(session, max_messages: int = 20):
         if len(session.history) > max_history_items:
             # Giữ lại tin nhắn đầu tiên (lời chào) và các tin nhắn mới nhất
             session.history = [session.history[0]] + session.history[-(max_history_items-1):]
-            logger.info(f"Đã cắt bớt context, giữ lại {len(session.history)} tin nhắn")
+            logger.debug("Đã cắt bớt context, giữ lại %d tin nhắn", len(session.history))
+
+def _warm_agent_runtime():
+    """Tạo agent runtime trên thread nền; lỗi chỉ được ghi log, request đầu tiên sẽ thử lại."""
+    try:
+        _get_runtime()
+    except Exception as e:
+        logger.error(f"Lỗi khi khởi tạo agent runtime: {str(e)}")
+
+@app.on_event("startup")
+async def warm_up():
+    """Bật tracing, dọn trạng thái dùng chung cũ, bắt đầu đăng chỉ số của worker, làm nóng pool giỏ hàng khách cho cửa hàng mặc định và dựng agent runtime trên thread nền."""
+    setup_tracing()
+    store = get_shared_store()
+    if store is not None:
+        pruned = store.prune(Config.SHARED_STATE_TTL)
+        if pruned:
+            logger.info("Đã xóa %d bản ghi trạng thái dùng chung quá hạn", pruned)
+    if worker_metrics is not None and registry.enabled:
+        worker_metrics.start()
+    get_guest_cart_pool().refill(Config.API_BASE_URL.rstrip("/"), Config.STORE_CODE)
+    if Config.SERVER_WORKERS > 1:
+        # Chờ dựng xong: worker mới (kể cả khi thay worker cũ) chỉ nhận request khi đã sẵn sàng,
+        # các worker khác vẫn phục vụ trong lúc đó
+        await asyncio.get_running_loop().run_in_executor(None, _warm_agent_runtime)
+    elif Config.AGENT_WARMUP:
+        # Không chờ: server nhận request (kể cả /health) ngay, lượt chat đến sớm sẽ chờ runtime
+        asyncio.get_running_loop().run_in_executor(None, _warm_agent_runtime)
+
+@app.on_event("shutdown")
+async def flush_traces():
+    """Xuất nốt các span còn trong hàng đợi và xóa chỉ số của worker khỏi kho dùng chung."""
+    shutdown_tracing()
+    if worker_metrics is not None:
+        worker_metrics.retire()
+
+async def _run_agent(user_id: str, session_id: str, user_content: "types.Content", timing: Optional[TurnTiming] = None):
+    """
+    Chạy một lượt của runner trong span `chat_turn` (kèm mã cửa hàng của phiên).
+    
+    Ghi số lượt đang chạy, thời gian lượt và số token (`tokens_used` của event cuối có
+    giá trị) vào chỉ số Prometheus; `timing` (nếu có) nhận thời gian các lần gọi LLM,
+    công cụ và GraphQL.
+    """
+    runtime = _get_runtime()
+    contexts = get_session_contexts()
+    # Nạp lại ngữ cảnh nếu lượt trước của phiên chạy ở worker khác
+    context = contexts.sync(session_id)
+    RUNNER_INFLIGHT.inc()
+    started = time.perf_counter()
+    tokens_used = 0
+    try:
+        async for event in run_turn_async(
+            runtime.runner,
+            user_id=user_id,
+            session_id=session_id,
+            new_message=user_content,
+            store_code=context.store_code if context else None,
+            timing=timing
+        ):
+            tokens_used = getattr(event, "tokens_used", 0) or tokens_used
+            yield event
+    finally:
+        contexts.save(session_id)
+        RUNNER_INFLIGHT.dec()
+        TURN_LATENCY.observe(time.perf_counter() - started)
+        if tokens_used:
+            LLM_TOKENS.inc(tokens_used, model=runtime.model_name)
+
+# Thread chạy lượt chat (một thread cho mỗi lượt): bằng số lượt được nhận đồng thời (ADMISSION_MAX_INFLIGHT), mặc định của Python khi tắt kiểm soát tải
+_turn_executor = ThreadPoolExecutor(
+    max_workers=max(Config.ADMISSION_MAX_INFLIGHT, 1) if Config.ADMISSION_ENABLED else None,
+    thread_name_prefix="chat-turn"
+)
+
+async def _turn_events(
+    ticket: AdmissionTicket,
+    user_id: str,
+    session_id: str,
+    user_content: "types.Content",
+    timing: Optional[TurnTiming] = None
+):
+    """
+    Chạy `_run_agent` trên event loop riêng của một thread `_turn_executor` và trả các event
+    qua hàng đợi asyncio.
+    
+    Công cụ của agent gọi API đồng bộ và chặn event loop đang chạy lượt chat; chạy thẳng trên
+    event loop của worker thì worker không nhận được request nào khác (kể cả để xếp hàng hay
+    trả 503). Thread của executor tự chạy Runner (`asyncio.run`) và đẩy event thẳng vào hàng
+    đợi, nên mỗi lượt chỉ chiếm một thread. Slot của `ticket` được trả khi lượt thực sự kết
+    thúc, kể cả khi client đã ngắt kết nối giữa chừng.
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue = asyncio.Queue()
+    release = ticket.detach()
+    
+    async def pump():
+        async with contextlib.aclosing(_run_agent(user_id, session_id, user_content, timing)) as turn:
+            async for event in turn:
+                loop.call_soon_threadsafe(events.put_nowait, event)
+    
+    def produce():
+        try:
+            asyncio.run(pump())
+            loop.call_soon_threadsafe(events.put_nowait, None)
+        except Exception as e:
+            loop.call_soon_threadsafe(events.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(release)
+    
+    # Bản sao contextvars: span của request và `timing` đi theo sang thread chạy lượt
+    loop.run_in_executor(_turn_executor, contextvars.copy_context().run, produce)
+    while True:
+        event = await events.get()
+        if event is None:
+            return
+        if isinstance(event, Exception):
+            raise event
+        yield event
+
+def _overloaded_response(rejected: AdmissionRejected) -> JSONResponse:
+    """Phản hồi 503 kèm `Retry-After` khi lượt chat bị từ chối vì quá tải."""
+    logger.warning("Từ chối lượt chat vì quá tải: %s", rejected.reason)
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={"Retry-After": str(rejected.retry_after)},
+        content={
+            "success": False,
+            "message": "Server đang quá tải, vui lòng thử lại sau",
+            "error_code": "SERVER_OVERLOADED",
+            "error_details": {
+                "reason": rejected.reason,
+                "retry_after": rejected.retry_after,
+                "timestamp": datetime.now().isoformat()
+            }
+        }
+    )
+
+def component_stats() -> Dict[str, Any]:
+    """Thống kê cache, prefetch, pool, hàng đợi, trạng thái giỏ hàng, ledger mutation, hồ sơ khách hàng, ngữ cảnh phiên và kiểm soát tải."""
+    return dict(
+        get_search_cache_stats(),
+        cart_pool=get_guest_cart_pool().stats(),
+        cart_queue=get_cart_mutation_queue().stats(),
+        cart_state=get_cart_state_cache().stats(),
+        mutation_ledger=get_mutation_ledger().stats(),
+        customer_profiles=get_customer_profiles().stats(),
+        session_contexts=get_session_contexts().stats(),
+        admission=get_admission().stats()
+    )
+
+def _session_store_stats() -> Dict[str, Dict[str, int]]:
+    """Số phiên, số event và số byte (JSON của state/dữ liệu phiên) của các kho phiên."""
+    sessions = events = state_bytes = 0
+    # Không tạo runtime chỉ để đọc chỉ số: chưa có runtime thì kho phiên ADK rỗng.
+    # DatabaseSessionService (nhiều worker) không giữ phiên trong bộ nhớ nên không được đếm
+    adk_sessions = getattr(_runtime.session_service, "sessions", {}) if _runtime is not None else {}
+    for users in list(adk_sessions.values()):
+        for user_sessions in list(users.values()):
+            for session in list(user_sessions.values()):
+                sessions += 1
+                events += len(session.events)
+                state_bytes += len(json.dumps(session.state, ensure_ascii=False, default=str).encode("utf-8"))
+    data_bytes = sum(
+        len(json.dumps(data, ensure_ascii=False, default=str).encode("utf-8"))
+        for data in list(_session_store.values())
+    )
+    return {
+        "adk": {"sessions": sessions, "events": events, "bytes": state_bytes},
+        "session_data": {"sessions": len(_session_store), "events": 0, "bytes": data_bytes}
+    }
+
+def _collect_metrics():
+    """Chỉ số đọc lúc scrape: thống kê thành phần và kích thước kho phiên."""
+    stats = flatten_stats(component_stats())
+    stores = _session_store_stats()
+    yield ("mm_component_stat", "gauge", "Thống kê của cache, pool, hàng đợi và ngữ cảnh phiên (xem /api/cache-stats)",
+           [("mm_component_stat", {"component": name.split(".", 1)[0], "stat": name.split(".", 1)[-1]}, value)
+            for name, value in stats.items()])
+    yield ("mm_sessions", "gauge", "Số phiên trong kho phiên",
+           [("mm_sessions", {"store": store}, values["sessions"]) for store, values in stores.items()])
+    yield ("mm_session_events", "gauge", "Số event trong kho phiên",
+           [("mm_session_events", {"store": store}, values["events"]) for store, values in stores.items()])
+    yield ("mm_session_store_bytes", "gauge", "Số byte JSON của state/dữ liệu phiên",
+           [("mm_session_store_bytes", {"store": store}, values["bytes"]) for store, values in stores.items()])
+    yield ("mm_log_records_dropped_total", "counter", "Số bản ghi log bị bỏ do hàng đợi log đầy",
+           [("mm_log_records_dropped_total", {}, dropped_records())])
+
+registry.register_collector(_collect_metrics)
 
 @app.get("/")
 async def root():
     return {"message": "MM A2A Ecommerce Chatbot API đang hoạt động"}
 
 @app.get("/health")
+@app.get("/api/health")
 async def health_check():
     """
-    Endpoint kiểm tra sức khỏe cho Render
+    Endpoint kiểm tra sức khỏe cho Render (`healthCheckPath` trong render.yaml)
+
+    Không chờ agent runtime; `agent_ready` cho biết cây agent đã được dựng hay chưa.
+    """
+    return {"status": "healthy", "agent_ready": _runtime is not None, "timestamp": datetime.now().isoformat()}
+
+@app.get("/ready")
+@app.get("/api/ready")
+async def readiness_check():
+    """
+    Endpoint sẵn sàng của worker: 200 khi agent runtime đã dựng xong và đọc được trạng thái dùng chung, 503 nếu chưa
+
+    Khác `/health` (chỉ cần tiến trình sống), dùng để bộ cân bằng tải chỉ gửi lượt chat tới
+    worker đã sẵn sàng (sau khi khởi động hoặc khi worker được thay mới).
+    """
+    shared_state = shared_state_stats()
+    ready = _runtime is not None and shared_state.get("ok", True)
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={
+            "status": "ready" if ready else "starting",
+            "agent_ready": _runtime is not None,
+            "shared_state": shared_state,
+            "pid": os.getpid(),
+            "timestamp": datetime.now().isoformat()
+        }
+    )
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    """
+    Endpoint thống kê cache, prefetch, pool, hàng đợi, trạng thái giỏ hàng, ledger mutation, hồ sơ khách hàng và ngữ cảnh phiên (tỷ lệ hit, số lần tải lãng phí, số thao tác được gộp, số mutation trùng được bỏ qua)
     """
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return {
+        "success": True,
+        "data": component_stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Endpoint chỉ số Prometheus: request/độ trễ theo route, luồng stream và lượt runner đang chạy,
+    độ trễ/lỗi/thử lại GraphQL theo operation, cache hit/miss, kho phiên và token LLM
+    (khi chạy nhiều worker: của mọi worker, nhãn `pid`)
+    """
+    if not registry.enabled:
+        raise HTTPException(status_code=404, detail="Metrics bị tắt (METRICS_ENABLED=false)")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 @app.post("/api/auth-llm")
 @app.get("/api/auth-llm")
@@ -477,7 +790,7 @@ async def auth_llm(request: Request):
         token = str(int(time.time() * 1000))  # Unix timestamp milliseconds
         
         # Log request
-        logger.info(f"Nhận yêu cầu xác thực LLM từ method: {request.method}")
+        logger.info("Nhận yêu cầu xác thực LLM từ method: %s", request.method)
         
         # Trả về token giả
         return {
@@ -506,36 +819,46 @@ async def auth_llm(request: Request):
 
 @app.post("/api/chat")
 async def chat(request: ChatRequest):
+    ticket = None
     try:
         # Kiểm tra nếu yêu cầu stream thì chuyển hướng đến endpoint stream
         if request.stream:
             return await stream_chat(request)
+        
+        # Kiểm soát tải: chờ slot hoặc trả 503 ngay khi quá tải
+        try:
+            ticket = await get_admission().acquire(request.user_id)
+        except AdmissionRejected as e:
+            return _overloaded_response(e)
             
+        runtime = await agent_runtime()
+        
         # Tạo hoặc lấy user_id và session_id
         user_id = request.user_id or str(uuid.uuid4())
         session_id = request.session_id or str(uuid.uuid4())
+        timing = TurnTiming()
         
         # Tạo key cho dictionary toàn cục
         profile_key = f"{user_id}:{session_id}"
         
         # Tạo session nếu chưa có
         try:
-            session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
-            logger.info(f"Đã tạo session mới cho {profile_key}")
+            runtime.create_session(user_id, session_id)
+            logger.debug("Đã tạo session mới cho %s", profile_key)
         except Exception as e:
             # Session có thể đã tồn tại, bỏ qua lỗi
             logger.warning(f"Không thể tạo session mới (có thể đã tồn tại): {e}")
             pass
         
         # Lấy session hiện tại
-        session = session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        session = runtime.session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
         
         # Load memory from previous session
         try:
             saved_memory = _get_session_data(session_id)
             if saved_memory:
                 session.state.update(saved_memory)
-                logger.info(f"Loaded {len(saved_memory)} memory entries for {profile_key}")
+                logger.debug("Loaded %d memory entries for %s", len(saved_memory), profile_key)
         except Exception as e:
             logger.warning(f"Error loading session memory for {profile_key}: {e}")
         
@@ -544,7 +867,7 @@ async def chat(request: ChatRequest):
         if user_profile:
             # Cập nhật thông tin từ request vào dictionary toàn cục
             user_profiles[profile_key] = user_profile
-            logger.info(f"Đã cập nhật profile từ request cho {profile_key}")
+            logger.debug("Đã cập nhật profile từ request cho %s", profile_key)
         
         # Quản lý kích thước context
         manage_context_size(session, request.max_context_messages)
@@ -564,18 +887,20 @@ async def chat(request: ChatRequest):
             model_context = mem_text + "\n\n" + model_context
         
         # Tạo nội dung người dùng
-        user_content = types.Content(role='user', parts=[types.Part(text=request.message)])
+        user_content = _text_content('user', request.message)
         
         # Thêm system message với context nếu có
         if model_context:
             try:
                 # Thử thêm system prompt với context
-                system_content = types.Content(role='system', parts=[types.Part(text=model_context)])
-                runner.update_system_instruction(user_id=user_id, session_id=session_id, content=system_content)
-                logger.info("Đã cập nhật system prompt với context")
+                system_content = _text_content('system', model_context)
+                runtime.runner.update_system_instruction(user_id=user_id, session_id=session_id, content=system_content)
+                logger.debug("Đã cập nhật system prompt với context")
             except Exception as e:
                 logger.warning(f"Không thể cập nhật system prompt: {e}")
         
+        timing.mark("context_prep")
+        
         # Biến để lưu phản hồi cuối cùng
         final_response = None
         raw_response = None
@@ -588,7 +913,7 @@ async def chat(request: ChatRequest):
         ensure_event_loop()
         
         # Chạy agent thông qua runner để xử lý tin nhắn
-        for event in runner.run(user_id=user_id, session_id=session_id, new_message=user_content):
+        async for event in _turn_events(ticket, user_id, session_id, user_content, timing if request.include_timing else None):
             if event.is_final_response() and event.content and event.content.parts:
                 part_text = None
                 if len(event.content.parts) > 0 and hasattr(event.content.parts[0], 'text'):
@@ -603,14 +928,14 @@ async def chat(request: ChatRequest):
                             raw_response = {
                                 "model_output": event.content.to_dict(),
                                 "tokens_used": getattr(event, "tokens_used", 0),
-                                "model_name": "gemini-2.0-flash-001"
+                                "model_name": runtime.model_name
                             }
                         else:
                             # Nếu không có phương thức to_dict, tạo một đối tượng thay thế
                             raw_response = {
                                 "model_output": {"text": final_response},
                                 "tokens_used": getattr(event, "tokens_used", 0),
-                                "model_name": "gemini-2.0-flash-001"
+                                "model_name": runtime.model_name
                             }
                     except Exception as e:
                         logger.error(f"Lỗi khi tạo raw_response: {str(e)}")
@@ -620,12 +945,13 @@ async def chat(request: ChatRequest):
                             "error": str(e),
                             "model_output": {"text": final_response},
                             "tokens_used": getattr(event, "tokens_used", 0),
-                            "model_name": "gemini-2.0-flash-001"
+                            "model_name": runtime.model_name
                         }
             
             # Nếu bật include_thinking, thu thập các suy nghĩ trung gian
             if request.include_thinking and hasattr(event, 'thinking'):
                 thinking_process = getattr(event, 'thinking', None)
+        timing.mark("agent")
         
         # Kiểm tra phản hồi
         if final_response is None:
@@ -651,7 +977,7 @@ async def chat(request: ChatRequest):
                 # Nếu có trường thinking_process trong JSON, trích xuất
                 if 'thinking_process' in response_json:
                     thinking_process = response_json.get('thinking_process')
-                    logger.info(f"Đã trích xuất thinking_process từ phản hồi JSON")
+                    logger.debug("Đã trích xuất thinking_process từ phản hồi JSON")
                     
                     # Nếu include_thinking là False, không hiển thị thinking_process trong phản hồi
                     if not request.include_thinking:
@@ -659,7 +985,7 @@ async def chat(request: ChatRequest):
                         response_json.pop('thinking_process', None)
                         # Cập nhật phản hồi
                         processed_response = json.dumps(response_json, ensure_ascii=False)
-                        logger.info("Đã loại bỏ thinking_process khỏi phản hồi cuối cùng")
+                        logger.debug("Đã loại bỏ thinking_process khỏi phản hồi cuối cùng")
             except json.JSONDecodeError:
                 # Không phải JSON, kiểm tra xem có chứa thinking_process không
                 # Tìm kiếm mẫu trong text
@@ -685,7 +1011,7 @@ async def chat(request: ChatRequest):
                     # Loại bỏ phần thinking khỏi phản hồi nếu không cần hiển thị
                     if not request.include_thinking:
                         processed_response = final_response[:thinking_index].strip() + final_response[end_index:].strip()
-                        logger.info("Đã loại bỏ thinking_process khỏi phản hồi văn bản")
+                        logger.debug("Đã loại bỏ thinking_process khỏi phản hồi văn bản")
             
         # Nếu người dùng yêu cầu include_thinking, đảm bảo thinking_process được thêm vào
         if request.include_thinking and thinking_process:
@@ -698,15 +1024,18 @@ async def chat(request: ChatRequest):
                 # Nếu processed_response không phải JSON, thêm thinking_process vào đầu
                 processed_response = f"Quá trình tư duy:\n{thinking_process}\n\n{processed_response}"
         
+        timing.mark("post_processing")
+        
         # Save memory after conversation
         try:
             mem_to_save = {k: v for k, v in session.state.items() if not str(k).startswith("_")}
             _store_session_data(session_id, mem_to_save)
-            logger.info(f"Saved {len(mem_to_save)} memory entries for {profile_key}")
+            logger.debug("Saved %d memory entries for %s", len(mem_to_save), profile_key)
         except Exception as e:
             logger.error(f"Error saving session memory for {profile_key}: {e}")
+        timing.mark("session_save")
         
-        logger.info(f"Trả về LLM response trực tiếp: {processed_response[:100]}...")
+        logger.debug("Trả về LLM response trực tiếp: %s", capped(processed_response, 100))
             
         # Chuẩn bị dữ liệu phản hồi
         response_data = {
@@ -725,6 +1054,9 @@ async def chat(request: ChatRequest):
         if request.include_thinking and thinking_process:
             response_data["thinking"] = thinking_process
             
+        if request.include_timing:
+            response_data["timing"] = timing.to_dict()
+            
         if request.include_session_data:
             # Tạo lịch sử hội thoại
             conversation_history = []
@@ -767,16 +1099,27 @@ async def chat(request: ChatRequest):
                 }
             }
         )
+    finally:
+        if ticket is not None:
+            ticket.release()
 
 @app.post("/api/chat/stream")
 async def stream_chat(request: ChatRequest):
     """Endpoint để stream phản hồi từ chatbot - trả về trực tiếp phản hồi từ LLM"""
     
+    # Kiểm soát tải trước khi mở luồng SSE để còn trả được 503
+    try:
+        ticket = await get_admission().acquire(request.user_id)
+    except AdmissionRejected as e:
+        return _overloaded_response(e)
+    
     async def event_generator():
+        ACTIVE_STREAMS.inc()
         try:
             # Tạo hoặc lấy user_id và session_id
             user_id = request.user_id or str(uuid.uuid4())
             session_id = request.session_id or str(uuid.uuid4())
+            timing = TurnTiming()
             
             # Gửi sự kiện bắt đầu
             start_data = {
@@ -786,17 +1129,20 @@ async def stream_chat(request: ChatRequest):
             }
             yield f"data: {json.dumps(start_data)}\n\n"
             
+            # Sự kiện bắt đầu đã gửi trước khi chờ agent runtime (lần đầu sau cold start)
+            runtime = await agent_runtime()
+            
             # Xử lý tất cả yêu cầu thông qua LLM
             try:
                 # Tạo session nếu chưa có
                 try:
-                    session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+                    runtime.create_session(user_id, session_id)
                 except Exception:
                     # Session có thể đã tồn tại, bỏ qua lỗi
                     pass
                 
                 # Lấy session hiện tại
-                session = session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+                session = runtime.session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
                 
                 # Lấy user_profile hiện tại từ dictionary toàn cục
                 profile_key = f"{user_id}:{session_id}"
@@ -820,23 +1166,25 @@ async def stream_chat(request: ChatRequest):
                     user_profiles[profile_key] = user_profile
                 
                 # Tạo nội dung người dùng
-                user_content = types.Content(role='user', parts=[types.Part(text=request.message)])
+                user_content = _text_content('user', request.message)
                 
                 # Thêm system message với context nếu có
                 if model_context:
                     try:
                         # Thử thêm system prompt với context
-                        system_content = types.Content(role='system', parts=[types.Part(text=model_context)])
-                        runner.update_system_instruction(user_id=user_id, session_id=session_id, content=system_content)
+                        system_content = _text_content('system', model_context)
+                        runtime.runner.update_system_instruction(user_id=user_id, session_id=session_id, content=system_content)
                     except Exception:
                         # Bỏ qua lỗi nếu không thể thêm system prompt
                         pass
                 
+                timing.mark("context_prep")
+                
                 # Chạy agent
                 accumulated_response = ""
                 tokens_used = 0
                 
-                for event in runner.run(user_id=user_id, session_id=session_id, new_message=user_content):
+                async for event in _turn_events(ticket, user_id, session_id, user_content, timing if request.include_timing else None):
                     # Kiểm tra event có valid không
                     if (not event or not hasattr(event, 'content') or not event.content or 
                         not hasattr(event.content, 'parts') or not event.content.parts):
@@ -874,14 +1222,18 @@ async def stream_chat(request: ChatRequest):
                     if event.is_final_response():
                         data["metadata"] = {
                             "tokens_used": tokens_used,
-                            "model_name": "gemini-2.0-flash-001",
+                            "model_name": runtime.model_name,
                             "user_id": user_id,
                             "session_id": session_id,
                             "timestamp": datetime.now().isoformat()
                         }
+                        if request.include_timing:
+                            timing.mark("agent")
+                            data["metadata"]["timing"] = timing.to_dict()
                     
                     # Gửi dữ liệu
-                    logger.info(f"Stream: Trả về LLM response trực tiếp: {new_text[:50]}...")
+                    if logger.isEnabledFor(logging.DEBUG) and _chunk_log_sampler.should_log():
+                        logger.debug("Stream: chunk %s", capped(new_text, 50))
                     yield f"data: {json.dumps(data)}\n\n"
                     
                     # Nếu đã hoàn thành, kết thúc
@@ -901,7 +1253,7 @@ async def stream_chat(request: ChatRequest):
                     "done": True,
                     "metadata": {
                         "tokens_used": 0,
-                        "model_name": "gemini-2.0-flash-001",
+                        "model_name": runtime.model_name,
                         "user_id": user_id,
                         "session_id": session_id,
                         "timestamp": datetime.now().isoformat()
@@ -918,6 +1270,9 @@ async def stream_chat(request: ChatRequest):
                 "stack_trace": str(e)
             }
             yield f"data: {json.dumps(error_data)}\n\n"
+        finally:
+            ticket.release()
+            ACTIVE_STREAMS.dec()
     
     return StreamingResponse(
         event_generator(),
@@ -926,7 +1281,9 @@ async def stream_chat(request: ChatRequest):
             "Cache-Control": "no-cache",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no"
-        }
+        },
+        # Trả slot cả khi luồng không được chạy (client ngắt kết nối trước khi nhận dữ liệu)
+        background=BackgroundTask(ticket.release)
     )
 
 @app.get("/api/chat/stream")
@@ -937,6 +1294,7 @@ async def stream_chat_get(
     response_format: str = Query("text", description="Định dạng phản hồi"),
     include_raw_response: bool = Query(False, description="Bao gồm phản hồi gốc"),
     max_context_messages: int = Query(20, description="Giới hạn số lượng tin nhắn trong context"),
+    include_timing: bool = Query(False, description="Trả về phân rã độ trễ trong metadata cuối"),
     user_profile_json: Optional[str] = Query(None, description="Thông tin người dùng dạng JSON"),
     auth_token: Optional[str] = Query(None, description="Token xác thực (không sử dụng)"),
     _t: Optional[str] = Query(None, description="Timestamp cho cache busting (không sử dụng)"),
@@ -957,6 +1315,7 @@ async def stream_chat_get(
         response_format=response_format,
         include_raw_response=include_raw_response,
         max_context_messages=max_context_messages,
+        include_timing=include_timing,
         stream=True,
         user_profile=user_profile
     )
@@ -968,11 +1327,13 @@ async def stream_chat_get(
 async def reset_session(user_id: str, keep_profile: bool = True, user_profile_json: Optional[str] = None):
     """Reset phiên chat và tạo phiên mới, có thể giữ lại thông tin profile từ frontend."""
     try:
+        runtime = await agent_runtime()
+        
         # Tạo session_id mới
         new_session_id = str(uuid.uuid4())
         
         # Tạo phiên mới
-        session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=new_session_id)
+        runtime.create_session(user_id, new_session_id)
         
         # Tạo key cho dictionary toàn cục
         profile_key = f"{user_id}:{new_session_id}"
@@ -984,7 +1345,7 @@ async def reset_session(user_id: str, keep_profile: bool = True, user_profile_js
                 user_profile = json.loads(user_profile_json)
                 # Lưu profile vào dictionary toàn cục
                 user_profiles[profile_key] = user_profile
-                logger.info(f"Đã cập nhật profile từ frontend cho {profile_key}")
+                logger.debug("Đã cập nhật profile từ frontend cho %s", profile_key)
             except Exception as e:
                 logger.warning(f"Lỗi khi cập nhật profile từ frontend: {e}")
                 logger.exception(e)  # Log full traceback
@@ -1022,20 +1383,22 @@ async def update_user_profile(
 ):
     """API endpoint để cập nhật thông tin profile người dùng từ frontend."""
     try:
+        runtime = await agent_runtime()
+        
         # Tạo key cho dictionary toàn cục
         profile_key = f"{user_id}:{session_id}"
         
         # Kiểm tra xem session có tồn tại không
         try:
-            session = session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
-            logger.info(f"Đã tìm thấy session cho {profile_key}")
+            session = runtime.session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+            logger.debug("Đã tìm thấy session cho %s", profile_key)
         except Exception as e:
             logger.warning(f"Session không tồn tại, tạo session mới: {e}")
             try:
                 # Tạo session mới trước khi sử dụng
-                session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
-                session = session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
-                logger.info(f"Đã tạo session mới cho {profile_key}")
+                runtime.create_session(user_id, session_id)
+                session = runtime.session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+                logger.debug("Đã tạo session mới cho %s", profile_key)
             except Exception as e:
                 logger.error(f"Không thể tạo session mới: {e}")
                 logger.exception(e)  # Log full traceback
@@ -1055,7 +1418,7 @@ async def update_user_profile(
         # Cập nhật user_profile vào dictionary toàn cục
         if user_profile:
             user_profiles[profile_key] = user_profile
-            logger.info(f"Đã cập nhật profile cho {profile_key}: {user_profile}")
+            logger.debug("Đã cập nhật profile cho %s: %s", profile_key, capped(user_profile))
             
             return {
                 "success": True,
@@ -1099,20 +1462,22 @@ async def get_user_profile_get(
 ):
     """API endpoint GET để lấy thông tin profile người dùng."""
     try:
+        runtime = await agent_runtime()
+        
         # Tạo key cho dictionary toàn cục
         profile_key = f"{user_id}:{session_id}"
         
         # Kiểm tra xem session có tồn tại không
         try:
-            session = session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
-            logger.info(f"Đã tìm thấy session cho {profile_key}")
+            session = runtime.session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+            logger.debug("Đã tìm thấy session cho %s", profile_key)
         except Exception as e:
             logger.warning(f"Session không tồn tại, tạo session mới: {e}")
             try:
                 # Tạo session mới trước khi sử dụng
-                session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
-                session = session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
-                logger.info(f"Đã tạo session mới cho {profile_key}")
+                runtime.create_session(user_id, session_id)
+                session = runtime.session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+                logger.debug("Đã tạo session mới cho %s", profile_key)
             except Exception as e:
                 logger.error(f"Không thể tạo session mới: {e}")
                 logger.exception(e)  # Log full traceback
@@ -1129,9 +1494,8 @@ async def get_user_profile_get(
                     }
                 )
         
-        # Lấy profile từ dictionary toàn cục
-        user_profile = user_profiles.get(profile_key, {})
-        logger.info(f"Lấy profile cho {profile_key}: {user_profile}")
+        # Lấy profile từ dictionary toàn cục (gộp với hồ sơ tài khoản nếu đã đăng nhập)
+        user_profile = get_user_profile(user_id, session_id)
         
         return {
             "success": True,
@@ -1177,18 +1541,18 @@ async def get_session_memory(
     try:
         # Tạo session_key từ user_id và session_id
         session_key = f"{user_id}:{session_id}"
-        logger.info(f"Nhận yêu cầu lấy session memory cho {session_key}")
+        logger.info("Nhận yêu cầu lấy session memory cho %s", session_key)
         
         # Lấy thông tin user profile từ dictionary toàn cục
         user_profile = get_user_profile(user_id, session_id)
-        logger.info(f"Đã lấy user profile: {user_profile}")
+        logger.debug("Đã lấy user profile: %s", capped(user_profile))
         
         # Lấy lịch sử hội thoại từ các nguồn khác nhau
         conversation_data = {"messages": [], "message_count": 0}
         try:
             # 1. Thử lấy từ session_data - không dùng await vì _get_session_data là hàm đồng bộ
             session_data = _get_session_data(session_id)
-            logger.info(f"Đã lấy session_data: {session_data}")
+            logger.debug("Đã lấy session_data: %s", capped(session_data))
             
             # Nếu session_data có messages, sử dụng nó
             if session_data and 'messages' in session_data and isinstance(session_data['messages'], list):
@@ -1196,7 +1560,7 @@ async def get_session_memory(
                     "messages": session_data['messages'],
                     "message_count": len(session_data['messages'])
                 }
-                logger.info(f"Đã lấy {len(session_data['messages'])} tin nhắn từ session_data")
+                logger.debug("Đã lấy %d tin nhắn từ session_data", len(session_data['messages']))
             # Nếu không có messages, tạo dữ liệu giả
             else:
                 # Mô phỏng một số tin nhắn gần đây từ user_profiles
@@ -1236,7 +1600,7 @@ async def get_session_memory(
                     "note": "Không có lịch sử hội thoại chính xác, đây là dữ liệu mô phỏng"
                 }
                 
-                logger.info(f"Đã tạo {len(messages)} tin nhắn mô phỏng")
+                logger.debug("Đã tạo %d tin nhắn mô phỏng", len(messages))
         except Exception as e:
             logger.error(f"Lỗi khi lấy thông tin hội thoại: {str(e)}")
             logger.exception(e)
@@ -1252,7 +1616,7 @@ async def get_session_memory(
             "timestamp": datetime.now().isoformat()
         }
         
-        logger.info(f"Trả về kết quả session memory thành công")
+        logger.debug("Trả về kết quả session memory thành công")
         return JSONResponse(content=result)
     except Exception as e:
         logger.error(f"Lỗi khi lấy dữ liệu in-memory: {str(e)}")
@@ -1346,7 +1710,7 @@ def start_server():
     
     if available_port:
         current_port = available_port
-        logger.info(f"Sử dụng cổng khả dụng: {current_port}")
+        logger.info("Sử dụng cổng khả dụng: %s", current_port)
     else:
         current_port = active_config.PORT_RANGE[-1]  # Sử dụng cổng cuối cùng trong dải
         logger.warning(f"Không tìm thấy cổng khả dụng trong dải, sử dụng cổng cuối cùng: {current_port}")
@@ -1355,15 +1719,43 @@ def start_server():
     # Lưu cổng hiện tại để các phần khác có thể truy cập
     app.state.port = current_port
     
+    # Thay worker sau WORKER_MAX_REQUESTS request (0: không giới hạn); uvicorn tự khởi động worker mới
+    recycling = dict(
+        limit_max_requests=Config.WORKER_MAX_REQUESTS or None,
+        limit_max_requests_jitter=Config.WORKER_MAX_REQUESTS_JITTER,
+        timeout_graceful_shutdown=Config.WORKER_GRACEFUL_TIMEOUT
+    )
+    
     # Bắt đầu Uvicorn
-    logger.info(f"Khởi động server trên {host}:{current_port}...")
+    if Config.SERVER_WORKERS > 1:
+        if not Config.SHARED_STATE_KEY:
+            # Khóa mã hóa token trong file trạng thái chỉ nằm trong môi trường của các worker
+            os.environ["SHARED_STATE_KEY"] = Config.SHARED_STATE_KEY = generate_key()
+        # Nhiều worker cần chuỗi import để mỗi tiến trình con tự tạo app
+        logger.info("Khởi động %d worker trên %s:%s (trạng thái dùng chung: %s)...",
+                    Config.SERVER_WORKERS, host, current_port, Config.SHARED_STATE_PATH)
+        uvicorn.run(
+            "backend_server:app",
+            host=host,
+            port=current_port,
+            workers=Config.SERVER_WORKERS,
+            reload=False,
+            log_level="info",
+            access_log=True,
+            **recycling
+        )
+        return
+    logger.info("Khởi động server trên %s:%s...", host, current_port)
+    # Truyền thẳng app: chuỗi "backend_server:app" khiến module bị import lần thứ hai
+    # (khi chạy `python backend_server.py`, module hiện tại là __main__)
     uvicorn.run(
-        "backend_server:app",
+        app,
         host=host,
         port=current_port,
         reload=False,
         log_level="info",
-        access_log=True
+        access_log=True,
+        **recycling
     )
 
 if __name__ == "__main__":
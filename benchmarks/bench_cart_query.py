@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark thời gian phản hồi của server cho truy vấn giỏ hàng tóm tắt và đầy đủ.
+
+Tạo một giỏ hàng khách (tùy chọn thêm sản phẩm bằng --sku), rồi gửi xen kẽ
+`CART_SUMMARY_QUERY` và `CART_CHECKOUT_QUERY` trực tiếp tới API (không qua cache
+trạng thái giỏ hàng) để so sánh thời gian phản hồi và kích thước dữ liệu trả về.
+Truy vấn đầy đủ phải tính thuế, giảm giá, phương thức thanh toán và vận chuyển
+nên chậm hơn; chênh lệch này là phần tiết kiệm được khi chỉ xem giỏ hàng.
+
+Cần truy cập mạng tới API_BASE_URL.
+
+Chạy: python benchmarks/bench_cart_query.py [--sku 123456] [--repeat 20]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+# Thêm thư mục gốc vào sys.path để import các module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mm_a2a.tools.api_client.cart import CART_QUERY_MODES, CartAPI
+from config import Config
+
+
+async def run(args):
+    api = CartAPI(args.base_url, Config.API_TIMEOUT)
+    api.mutation_queue_enabled = False
+    api.set_store_code(args.store)
+    try:
+        created = await api.create_cart(is_guest=True)
+        if not created.get("success", False):
+            print(f"Không tạo được giỏ hàng: {created.get('message')}")
+            return
+        cart_id = created.get("cart_id")
+        if args.sku:
+            added = await api.add_items_to_cart(cart_id, [(args.sku, 1)])
+            print(f"Thêm {args.sku}: {added.get('message')}")
+
+        samples = {mode: [] for mode in CART_QUERY_MODES}
+        sizes = {}
+        for _ in range(args.repeat):
+            # Xen kẽ hai chế độ để biến động mạng ảnh hưởng như nhau
+            for mode, query in CART_QUERY_MODES.items():
+                started = time.perf_counter()
+                result = await api.execute_graphql(query, {"cartId": cart_id})
+                samples[mode].append((time.perf_counter() - started) * 1000)
+                if not result.get("success", False):
+                    print(f"{mode}: lỗi {result.get('message')}")
+                    return
+                sizes[mode] = len(json.dumps(result.get("data", {}), ensure_ascii=False).encode("utf-8"))
+
+        for mode, values in samples.items():
+            values.sort()
+            print(
+                f"{mode:9} p50={values[len(values) // 2]:7.1f} ms  "
+                f"p95={values[min(int(len(values) * 0.95), len(values) - 1)]:7.1f} ms  "
+                f"mean={sum(values) / len(values):7.1f} ms  payload={sizes[mode]} bytes"
+            )
+    finally:
+        await api.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--base-url", default=Config.API_BASE_URL)
+    parser.add_argument("--store", default=Config.STORE_CODE)
+    parser.add_argument("--sku", default=None, help="Art no/SKU thêm vào giỏ hàng trước khi đo")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark tìm kiếm trên catalog sản phẩm cục bộ.
+
+Dựng một snapshot giả lập rồi đo độ trễ của `LocalCatalog.search` cho các truy
+vấn có dấu, không dấu và tiền tố. Catalog giả lập chỉ có ít loại tên nên mỗi term
+khớp rất nhiều sản phẩm (trường hợp xấu cho lần truy vấn lạnh).
+
+Chạy: python benchmarks/bench_catalog_search.py [--products 20000] [--repeat 2000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Thêm thư mục gốc vào sys.path để import các module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mm_a2a.tools.api_client.catalog import LocalCatalog
+
+BRANDS = ["Vinamilk", "TH True Milk", "Tiger", "Heineken", "Omo", "Lifebuoy", "Acecook", "Nestlé", "Kinh Đô", "Chinsu"]
+KINDS = ["Sữa tươi", "Sữa chua", "Bia lon", "Nước giặt", "Sữa tắm", "Mì gói", "Bánh quy", "Cà phê", "Nước mắm", "Dầu ăn"]
+SIZES = ["180ml", "1L", "330ml", "2kg", "500g", "75g", "200g", "thùng 24", "lốc 4", "gói 10"]
+QUERIES = ["sữa tươi", "sua tuoi", "bia tiger", "nuoc mam chinsu", "banh qu", "mì", "ca phe nestle", "sữa"]
+
+
+def make_items(products: int, seed: int = 42):
+    """Tạo danh sách item sản phẩm giả lập."""
+    rng = random.Random(seed)
+    return [
+        {
+            "id": i,
+            "sku": f"SKU{i:06d}",
+            "name": f"{rng.choice(KINDS)} {rng.choice(BRANDS)} {rng.choice(SIZES)}",
+            "price": {"regularPrice": {"amount": {"currency": "VND", "value": rng.randint(5, 500) * 1000}}},
+        }
+        for i in range(products)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        catalog = LocalCatalog(os.path.join(directory, "catalog.bin"), "bench", max_age=3600)
+        started = time.perf_counter()
+        catalog.update(make_items(args.products), complete=True)
+        print(f"Dựng snapshot {args.products} sản phẩm: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        started = time.perf_counter()
+        catalog.load()
+        print(f"Nạp lại từ file: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        for query in QUERIES:
+            # Lạnh: chưa có điểm BM25 tính sẵn cho term; nóng: truy vấn đã được xếp hạng
+            cold = []
+            for _ in range(max(args.repeat // 20, 5)):
+                catalog._invalidate_scores()
+                started = time.perf_counter()
+                catalog.search(query, args.page_size)
+                cold.append((time.perf_counter() - started) * 1000)
+            samples = []
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                result = catalog.search(query, args.page_size)
+                samples.append((time.perf_counter() - started) * 1000)
+            cold.sort()
+            samples.sort()
+            total = result["data"]["products"]["total_count"] if result else 0
+            print(
+                f"{query!r:20} kết quả={total:6d}  lạnh p50={cold[len(cold) // 2]:.3f} ms  "
+                f"nóng p50={samples[len(samples) // 2]:.3f} ms  p99={samples[int(len(samples) * 0.99)]:.3f} ms"
+            )
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark gộp kết quả của search_multiple_products.
+
+So sánh cách gộp cũ (gom toàn bộ item, sắp xếp toàn bộ rồi mới cắt trang)
+với `merge_product_pages` (một lượt duyệt id + chọn top-k bằng heap trên các
+`Product` đã giải mã). Chi phí giải mã các trang thành `Product` (làm một lần
+cho mỗi response GraphQL) được in riêng.
+
+Chạy: python benchmarks/bench_search_merge.py [--keywords 50] [--items 100]
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+# Thêm thư mục gốc vào sys.path để import các module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mm_a2a.tools.api_client.models import Product
+from mm_a2a.tools.api_client.product import merge_product_pages
+# Dữ liệu giả lập và cách gộp cũ dùng chung với kiểm thử (kết quả được đối chiếu ở cả hai nơi)
+from mm_a2a.tools.api_client.test_product import legacy_merge, make_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark gộp kết quả tìm kiếm nhiều từ khóa")
+    parser.add_argument("--keywords", type=int, default=50)
+    parser.add_argument("--items", type=int, default=100)
+    parser.add_argument("--catalog", type=int, default=3000, help="Số sản phẩm khác nhau trong catalog giả lập")
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    pages = make_pages(args.keywords, args.items, args.catalog)
+    decode = timeit.timeit(lambda: [Product.decode_many(items) for items in pages], number=args.repeat)
+    decoded = [Product.decode_many(items) for items in pages]
+    scenarios = [
+        ("union, không sắp xếp", None, "union"),
+        ("union, giá tăng dần", {"price": "ASC"}, "union"),
+        ("union, giá giảm dần", {"price": "DESC"}, "union"),
+        ("intersection", None, "intersection"),
+    ]
+
+    print(f"{args.keywords} từ khóa x {args.items} item, page_size={args.page_size}, lặp {args.repeat} lần")
+    print(f"Giải mã các trang thành Product: {decode * 1000 / args.repeat:.3f} ms")
+    print(f"{'Kịch bản':<24}{'cũ (ms)':>12}{'mới (ms)':>12}{'tăng tốc':>10}")
+    for label, sort, mode in scenarios:
+        expected = legacy_merge(pages, sort, mode, args.page_size, 1)
+        actual = merge_product_pages(decoded, sort, mode, args.page_size, 1)
+        if [i["id"] for i in expected[0]] != [p.id for p in actual[0]] or expected[1] != actual[1]:
+            raise SystemExit(f"Kết quả không khớp cho kịch bản: {label}")
+
+        legacy = timeit.timeit(lambda: legacy_merge(pages, sort, mode, args.page_size, 1), number=args.repeat)
+        current = timeit.timeit(lambda: merge_product_pages(decoded, sort, mode, args.page_size, 1), number=args.repeat)
+        legacy_ms = legacy * 1000 / args.repeat
+        current_ms = current * 1000 / args.repeat
+        print(f"{label:<24}{legacy_ms:>12.3f}{current_ms:>12.3f}{legacy_ms / current_ms:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Đo cold start của backend_server: thời gian tới khi `/health` trả 200 và tới byte/nội dung
+đầu tiên của lượt chat đầu tiên (điều quan trọng trên gói free của Render, nơi server bị tắt
+khi rảnh và khởi động lại ở request kế tiếp).
+
+Mỗi lần chạy khởi động một tiến trình Python mới (`-X importtime`) chạy backend_server bằng
+uvicorn (không dùng lại module đã import của tiến trình đo), với server GraphQL giả lập và
+mô hình cục bộ có kịch bản như `load_chat.py`, nên không cần mạng. Sau khi server khỏe, gửi ngay một request
+`/api/chat/stream` để đo thời gian tới sự kiện bắt đầu và tới nội dung đầu tiên (gồm cả thời
+gian dựng cây agent nếu chưa xong). Báo cáo kèm các module tốn thời gian import nhất (theo
+`-X importtime` của tiến trình đầu tiên).
+
+Chạy: python benchmarks/cold_start.py [--runs 3] [--no-chat] [--no-warmup] [--top 15]
+      [--json report.json]
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.mock_graphql_server import add_server_arguments, server_from_args
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+def parse_importtime(path: str) -> List[Dict[str, Any]]:
+    """
+    Đọc kết quả `-X importtime` (stderr của tiến trình con).
+
+    Returns:
+        List[Dict[str, Any]]: Mỗi module một dòng: tên, độ sâu, thời gian riêng và tích lũy (ms).
+    """
+    modules = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            parts = line[len("import time:"):].split("|")
+            if len(parts) != 3:
+                continue
+            raw_name = parts[2].rstrip("\n")
+            stripped = raw_name.lstrip(" ")
+            modules.append({
+                "module": stripped,
+                "depth": (len(raw_name) - len(stripped) - 1) // 2,
+                "self_ms": round(int(parts[0]) / 1000, 1),
+                "cumulative_ms": round(int(parts[1]) / 1000, 1)
+            })
+    return modules
+
+
+def top_imports(modules: List[Dict[str, Any]], top: int) -> List[Dict[str, Any]]:
+    """
+    Các import tốn thời gian tích lũy nhất: module con trực tiếp của backend_server và các
+    module gốc được import sau đó (import lười, ví dụ ADK khi dựng agent runtime).
+    """
+    roots = []
+    children = []
+    # importtime in module con trước module cha
+    for module in modules:
+        if module["depth"] == 1:
+            children.append(module)
+        elif module["depth"] == 0:
+            roots.extend(children if module["module"] == "backend_server" else [module])
+            children = []
+    return sorted(roots, key=lambda module: module["cumulative_ms"], reverse=True)[:top]
+
+
+def _wait_healthy(url: str, process: subprocess.Popen, timeout: float) -> Dict[str, Any]:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"backend_server thoát với mã {process.returncode}")
+        try:
+            with urllib.request.urlopen(url + "/health", timeout=1) as response:
+                if response.status == 200:
+                    return json.loads(response.read())
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"backend_server không khỏe sau {timeout} giây")
+
+
+def _first_chat(url: str, message: str, spawned: float, timeout: float) -> Dict[str, Optional[float]]:
+    payload = json.dumps({"user_id": "cold-start", "message": message}).encode("utf-8")
+    request = urllib.request.Request(
+        url + "/api/chat/stream", data=payload, headers={"Content-Type": "application/json"}
+    )
+    result = {"first_byte_ms": None, "first_content_ms": None, "done_ms": None, "ok": False}
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        for raw in response:
+            line = raw.decode("utf-8").strip()
+            if not line.startswith("data: "):
+                continue
+            elapsed = _ms(time.perf_counter() - spawned)
+            if result["first_byte_ms"] is None:
+                result["first_byte_ms"] = elapsed
+            event = json.loads(line[len("data: "):])
+            if event.get("error"):
+                break
+            if event.get("content") and result["first_content_ms"] is None:
+                result["first_content_ms"] = elapsed
+            if event.get("done"):
+                result["done_ms"] = elapsed
+                result["ok"] = True
+                break
+    return result
+
+
+def run_once(graphql_url: str, args, workdir: str, index: int) -> Dict[str, Any]:
+    """Khởi động một tiến trình backend mới và đo thời gian tới khỏe và tới lượt chat đầu tiên."""
+    port = _free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = dict(
+        os.environ,
+        MM_ECOMMERCE_API_URL=graphql_url,
+        MODEL_PROVIDER="scripted",
+        AGENT_WARMUP="false" if args.no_warmup else "true",
+        PYTHONWARNINGS="ignore"
+    )
+    importtime_path = os.path.join(workdir, f"importtime-{index}.txt")
+    # Import bằng câu lệnh import (importlib.import_module của uvicorn không được importtime ghi lại)
+    command = [
+        sys.executable, "-X", "importtime", "-c",
+        f"import sys; sys.path.insert(0, {ROOT!r}); import backend_server, uvicorn; "
+        f"uvicorn.run(backend_server.app, host='127.0.0.1', port={port}, log_level='warning')"
+    ]
+    with open(importtime_path, "w", encoding="utf-8") as stderr:
+        spawned = time.perf_counter()
+        # cwd là thư mục tạm để backend_server.log của lần đo không ghi vào repo
+        process = subprocess.Popen(command, cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=stderr)
+        try:
+            health = _wait_healthy(url, process, args.timeout)
+            result: Dict[str, Any] = {
+                "healthy_ms": _ms(time.perf_counter() - spawned),
+                "agent_ready_at_healthy": health.get("agent_ready")
+            }
+            if not args.no_chat:
+                result.update(_first_chat(url, args.message, spawned, args.timeout))
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                process.wait()
+
+    modules = parse_importtime(importtime_path)
+    backend = next((module for module in modules if module["module"] == "backend_server"), None)
+    result["import_backend_ms"] = backend["cumulative_ms"] if backend else None
+    result["modules"] = modules
+    return result
+
+
+def summarize(runs: List[Dict[str, Any]], top: int) -> Dict[str, Any]:
+    """Trung vị các chỉ số qua các lần chạy và danh sách import nặng nhất của lần đầu."""
+    summary = {}
+    for key in ("healthy_ms", "import_backend_ms", "first_byte_ms", "first_content_ms", "done_ms"):
+        values = [run[key] for run in runs if run.get(key) is not None]
+        if values:
+            summary[key] = {"median": round(statistics.median(values), 1), "min": min(values), "max": max(values)}
+    return {
+        "runs": [{key: value for key, value in run.items() if key != "modules"} for run in runs],
+        "summary": summary,
+        "top_imports": top_imports(runs[0]["modules"], top) if runs else []
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    labels = {
+        "healthy_ms": "tới /health 200",
+        "import_backend_ms": "import backend_server",
+        "first_byte_ms": "tới byte chat đầu tiên",
+        "first_content_ms": "tới nội dung đầu tiên",
+        "done_ms": "tới hết lượt chat đầu"
+    }
+    print(f"\nCold start ({len(report['runs'])} lần, tính từ lúc tạo tiến trình)")
+    for key, label in labels.items():
+        values = report["summary"].get(key)
+        if values:
+            print(f"  {label:<24} median={values['median']:8.1f} ms  min={values['min']:8.1f} ms  "
+                  f"max={values['max']:8.1f} ms")
+    print("\nImport nặng nhất (tích lũy, lần chạy đầu)")
+    for module in report["top_imports"]:
+        print(f"  {module['cumulative_ms']:8.1f} ms  {module['module']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo cold start của backend_server")
+    parser.add_argument("--runs", type=int, default=3, help="Số lần khởi động")
+    parser.add_argument("--no-chat", action="store_true", help="Chỉ đo tới khi /health trả 200")
+    parser.add_argument("--no-warmup", action="store_true", help="Tắt dựng agent nền lúc khởi động (AGENT_WARMUP=false)")
+    parser.add_argument("--message", default="Tìm sữa tươi Vinamilk", help="Tin nhắn của lượt chat đầu tiên")
+    parser.add_argument("--top", type=int, default=15, help="Số module import nặng nhất hiển thị")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Thời gian chờ tối đa mỗi bước (giây)")
+    parser.add_argument("--json", help="Ghi báo cáo ra file JSON")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+
+    mock = server_from_args(args)
+    graphql_url = mock.start_in_thread()
+    try:
+        with tempfile.TemporaryDirectory(prefix="mm-cold-start-") as workdir:
+            runs = [run_once(graphql_url, args, workdir, index) for index in range(args.runs)]
+    finally:
+        mock.stop_thread()
+
+    report = summarize(runs, args.top)
+    report["config"] = {"runs": args.runs, "chat": not args.no_chat, "warmup": not args.no_warmup}
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nĐã ghi báo cáo: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Load test đầu-cuối cho `/api/chat` và `/api/chat/stream` của backend_server.
+
+Mặc định chạy toàn bộ trong tiến trình, không cần mạng: khởi động server GraphQL giả
+lập (`mock_graphql_server.py`) thay cho `online.mmvietnam.com`, trỏ
+`MM_ECOMMERCE_API_URL` tới nó, dùng mô hình cục bộ có kịch bản cho các agent
+(`MODEL_PROVIDER=scripted`, xem `mm_a2a/models/scripted.py`: tìm kiếm -> xem chi tiết,
+hoặc tạo giỏ hàng -> thêm sản phẩm) và chạy backend_server bằng uvicorn trên một cổng trống.
+Với --url, tải được gửi tới một backend đang chạy sẵn (LLM và API do backend đó quyết định).
+
+Mỗi worker giữ một phiên chat riêng và gửi tuần tự các tin nhắn; báo cáo số request
+mỗi giây, độ trễ p50/p95/p99, thời gian tới nội dung đầu tiên (stream) và tỷ lệ lỗi.
+Request bị từ chối vì quá tải (503) được tính là lỗi; worker chờ theo `Retry-After` trước
+khi gửi tiếp như một client đúng chuẩn (tắt bằng --no-retry-after).
+Đây là mốc so sánh cho mọi thay đổi hiệu năng.
+
+Chạy: python benchmarks/load_chat.py [--endpoint chat|stream|both] [--concurrency 8]
+      [--requests 200 | --duration 30] [--latency-ms 80] [--first-token-ms 300 --token-ms 20]
+      [--error-rate 0.01] [--json report.json] [--url http://localhost:8000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+# Thêm thư mục gốc vào sys.path để import các module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.mock_graphql_server import add_server_arguments, server_from_args
+
+DEFAULT_MESSAGES = [
+    "Tìm sữa tươi Vinamilk",
+    "Cho tôi xem dầu ăn",
+    "Có bán gạo ST25 không?",
+    "Thêm sữa vào giỏ hàng",
+]
+
+ENDPOINTS = {
+    "chat": "/api/chat",
+    "stream": "/api/chat/stream",
+}
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_backend(args):
+    """
+    Khởi động server GraphQL giả lập và backend_server (mô hình có kịch bản) trong tiến trình.
+
+    Returns:
+        Tuple: (URL backend, server giả lập, server uvicorn, thread uvicorn).
+    """
+    mock = server_from_args(args)
+    graphql_url = mock.start_in_thread()
+    # Phải đặt trước khi import config
+    os.environ["MM_ECOMMERCE_API_URL"] = graphql_url
+    os.environ["MODEL_PROVIDER"] = "scripted"
+    os.environ["SCRIPTED_MODEL_FIRST_TOKEN_MS"] = str(args.first_token_ms)
+    os.environ["SCRIPTED_MODEL_TOKEN_MS"] = str(args.token_ms)
+    if args.script:
+        os.environ["SCRIPTED_MODEL_SCRIPT"] = args.script
+
+    import uvicorn
+    import backend_server
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(backend_server.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, name="backend", daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError("backend_server không khởi động được")
+        time.sleep(0.05)
+    print(f"Mock GraphQL: {graphql_url}")
+    print(f"Backend:      http://127.0.0.1:{port}")
+    return f"http://127.0.0.1:{port}", mock, server, thread
+
+
+async def _send_chat(http, url, payload):
+    async with http.post(url + ENDPOINTS["chat"], json=payload) as response:
+        body = await response.json(content_type=None)
+        ok = response.status == 200 and body.get("success", False)
+        return response.status, ok, None, _retry_after(response)
+
+
+async def _send_stream(http, url, payload):
+    started = time.perf_counter()
+    first_content = None
+    done = False
+    failed = False
+    async with http.post(url + ENDPOINTS["stream"], json=payload) as response:
+        if response.status != 200:
+            await response.read()
+            return response.status, False, None, _retry_after(response)
+        async for line in response.content:
+            line = line.decode("utf-8").strip()
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[len("data: "):])
+            if event.get("error"):
+                failed = True
+            if event.get("content") and first_content is None:
+                first_content = time.perf_counter() - started
+            if event.get("done"):
+                done = True
+        return response.status, done and not failed, first_content, None
+
+
+def _retry_after(response) -> Optional[float]:
+    """Số giây trong header `Retry-After` của phản hồi 503, hoặc None."""
+    if response.status != 503:
+        return None
+    try:
+        return float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+class EndpointStats:
+    """Kết quả đo của một endpoint."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.latencies: List[float] = []
+        self.first_content: List[float] = []
+        self.errors = 0
+        self.statuses: Counter = Counter()
+        self.elapsed = 0.0
+
+    def record(self, latency: float, status: Any, ok: bool, first_content: Optional[float]):
+        self.latencies.append(latency)
+        self.statuses[str(status)] += 1
+        if not ok:
+            self.errors += 1
+        if first_content is not None:
+            self.first_content.append(first_content)
+
+    def summary(self) -> Dict[str, Any]:
+        count = len(self.latencies)
+        summary = {
+            "requests": count,
+            "errors": self.errors,
+            "error_rate": round(self.errors / count, 4) if count else 0.0,
+            "rps": round(count / self.elapsed, 2) if self.elapsed else 0.0,
+            "latency_ms": _percentiles(self.latencies),
+            "statuses": dict(self.statuses)
+        }
+        if self.first_content:
+            summary["first_content_ms"] = _percentiles(self.first_content)
+        return summary
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def at(q):
+        return round(values[min(int(len(values) * q), len(values) - 1)] * 1000, 1)
+
+    return {"p50": at(0.50), "p95": at(0.95), "p99": at(0.99), "max": round(values[-1] * 1000, 1)}
+
+
+async def drive(url: str, endpoint: str, args) -> EndpointStats:
+    """Chạy tải lên một endpoint với `args.concurrency` worker."""
+    stats = EndpointStats(endpoint)
+    send = _send_stream if endpoint == "stream" else _send_chat
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    remaining = [args.requests]
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+
+    async def worker(index: int):
+        user_id = f"load-{index}"
+        session_id = str(uuid.uuid4())
+        turn = 0
+        async with aiohttp.ClientSession(timeout=timeout) as http:
+            while True:
+                if deadline is not None:
+                    if time.perf_counter() >= deadline:
+                        return
+                elif remaining[0] <= 0:
+                    return
+                else:
+                    remaining[0] -= 1
+                if args.new_session:
+                    session_id = str(uuid.uuid4())
+                payload = {
+                    "user_id": user_id,
+                    "session_id": session_id,
+                    "message": args.messages[(index + turn) % len(args.messages)]
+                }
+                turn += 1
+                started = time.perf_counter()
+                retry_after = None
+                try:
+                    status, ok, first_content, retry_after = await send(http, url, payload)
+                except asyncio.TimeoutError:
+                    status, ok, first_content = "timeout", False, None
+                except aiohttp.ClientError as e:
+                    status, ok, first_content = type(e).__name__, False, None
+                stats.record(time.perf_counter() - started, status, ok, first_content)
+                if retry_after and not args.no_retry_after:
+                    await asyncio.sleep(retry_after)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(args.concurrency)))
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def print_report(report: Dict[str, Any]):
+    for name, summary in report["endpoints"].items():
+        latency = summary["latency_ms"]
+        print(f"\n{ENDPOINTS[name]}")
+        print(f"  requests={summary['requests']}  rps={summary['rps']:.2f}  "
+              f"errors={summary['errors']} ({summary['error_rate']:.2%})  statuses={summary['statuses']}")
+        if latency:
+            print(f"  latency      p50={latency['p50']:8.1f} ms  p95={latency['p95']:8.1f} ms  "
+                  f"p99={latency['p99']:8.1f} ms  max={latency['max']:8.1f} ms")
+        first = summary.get("first_content_ms")
+        if first:
+            print(f"  first chunk  p50={first['p50']:8.1f} ms  p95={first['p95']:8.1f} ms  "
+                  f"p99={first['p99']:8.1f} ms  max={first['max']:8.1f} ms")
+    if "mock_graphql" in report:
+        print(f"\nMock GraphQL: {report['mock_graphql']}")
+
+
+async def run(url: str, args) -> Dict[str, Any]:
+    endpoints = list(ENDPOINTS) if args.endpoint == "both" else [args.endpoint]
+    report = {"config": {
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "duration": args.duration,
+        "latency_ms": args.latency_ms,
+        "first_token_ms": args.first_token_ms,
+        "token_ms": args.token_ms,
+        "error_rate": args.error_rate,
+        "external": bool(args.url)
+    }, "endpoints": {}}
+    for endpoint in endpoints:
+        stats = await drive(url, endpoint, args)
+        report["endpoints"][endpoint] = stats.summary()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test /api/chat và /api/chat/stream")
+    parser.add_argument("--url", help="Backend đang chạy sẵn (mặc định khởi động trong tiến trình)")
+    parser.add_argument("--endpoint", choices=["chat", "stream", "both"], default="both")
+    parser.add_argument("--concurrency", type=int, default=8, help="Số phiên gửi đồng thời")
+    parser.add_argument("--requests", type=int, default=100, help="Tổng số request mỗi endpoint")
+    parser.add_argument("--duration", type=float, default=None, help="Chạy theo thời gian (giây) thay cho --requests")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Thời gian chờ mỗi request (giây)")
+    parser.add_argument("--new-session", action="store_true", help="Mỗi request một phiên mới")
+    parser.add_argument("--no-retry-after", action="store_true", help="Gửi lại ngay sau phản hồi 503 thay vì chờ Retry-After")
+    parser.add_argument("--message", dest="messages", action="append", help="Tin nhắn gửi đi (lặp lại được)")
+    parser.add_argument("--script", help="Kịch bản JSON của mô hình cục bộ (mặc định kịch bản có sẵn)")
+    parser.add_argument("--first-token-ms", type=float, default=0.0, help="Độ trễ tới token đầu của mô hình cục bộ (ms)")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="Độ trễ mỗi token tiếp theo (ms)")
+    parser.add_argument("--json", help="Ghi báo cáo ra file JSON")
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    args.messages = args.messages or DEFAULT_MESSAGES
+
+    mock = server = thread = None
+    url = args.url.rstrip("/") if args.url else None
+    if url is None:
+        url, mock, server, thread = start_backend(args)
+    try:
+        report = asyncio.run(run(url, args))
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join()
+        if mock is not None:
+            mock.stop_thread()
+    if mock is not None:
+        report["mock_graphql"] = mock.stats()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nĐã ghi báo cáo: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Microbenchmark cho các hàm Python thuần chạy ở mỗi lượt chat.
+
+Đo `process_model_response`, `prepare_model_context`, `manage_context_size`, phần lọc
+của `_save_session_data`, gộp kết quả `search_multiple_products` (`merge_product_pages`)
+và các lượt duyệt đơn hàng trong `transit.py`, với dữ liệu sát thực tế: trang sản phẩm
+lớn, lịch sử hội thoại dài, khách hàng có nhiều đơn hàng.
+
+Cách đo giống pyperf: mỗi benchmark tự hiệu chỉnh số vòng lặp để một mẫu kéo dài ít nhất
+--min-time giây, chạy một mẫu làm nóng rồi lấy --samples mẫu (tắt GC như timeit); kết quả
+là thời gian mỗi lần gọi (trung vị, trung bình, độ lệch chuẩn, nhỏ nhất). Log của các hàm
+vẫn được tạo và định dạng như khi chạy thật nhưng không ghi ra file/console.
+
+Kết quả lưu dạng JSON làm baseline (`benchmarks/baselines/microbench.json`); lệnh
+`compare` báo các benchmark chậm hơn baseline quá ngưỡng và trả mã thoát 1 (dùng trong CI).
+Mặc định so sánh thời gian nhỏ nhất: trên máy dùng chung, nhiễu chỉ làm chậm đi nên giá trị
+này ổn định hơn trung vị. Chỉ so sánh kết quả đo trên cùng một máy.
+
+Chạy: python benchmarks/microbench.py run [-k process_model] [-o current.json]
+      [--compare benchmarks/baselines/microbench.json --threshold 0.1]
+      python benchmarks/microbench.py compare baseline.json current.json [--threshold 0.1]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import timeit
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List
+
+# Thêm thư mục gốc vào sys.path để import các module
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baselines", "microbench.json")
+
+# Tên benchmark -> hàm chuẩn bị dữ liệu, trả về hàm không tham số cần đo
+BENCHMARKS: Dict[str, Callable[[], Callable[[], Any]]] = {}
+
+
+def benchmark(name: str):
+    """Đăng ký một benchmark."""
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+# ---------------------------------------------------------------------------
+# Dữ liệu giả lập
+# ---------------------------------------------------------------------------
+
+def make_graphql_products(count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Sản phẩm dạng GraphQL như kết quả `products` của API."""
+    rng = random.Random(seed)
+    products = []
+    for i in range(count):
+        regular = rng.randint(5, 500) * 1000
+        final = regular - rng.choice([0, 0, 1000, 5000])
+        products.append({
+            "id": 10000 + i,
+            "sku": f"{180000 + i}",
+            "name": f"Sản phẩm thử nghiệm số {i} loại đóng hộp 1kg",
+            "url_key": f"san-pham-thu-nghiem-{i}",
+            "price": {"regularPrice": {"amount": {"currency": "VND", "value": regular}}},
+            "price_range": {"maximum_price": {
+                "final_price": {"currency": "VND", "value": final},
+                "discount": {"amount_off": regular - final, "percent_off": round((regular - final) * 100 / regular, 2)}
+            }},
+            "small_image": {"url": f"https://online.mmvietnam.com/media/catalog/product/{i}.jpg"},
+            "unit_ecom": "Hộp",
+            "description": {"html": "<p>" + "Mô tả sản phẩm chi tiết. " * 10 + "</p>"}
+        })
+    return products
+
+
+def make_profile(orders: int, seed: int = 42) -> Dict[str, Any]:
+    """user_profile của khách hàng mua nhiều, xem nhiều sản phẩm và theo dõi nhiều đơn hàng."""
+    rng = random.Random(seed)
+    return {
+        "name": "Nguyễn Văn An",
+        "phone": "0901234567",
+        "address": "12 Nguyễn Văn Linh, Quận 7, Hồ Chí Minh",
+        "shopping_preferences": ["sữa", "rau củ", "thịt", "đồ uống", "gia vị"],
+        "purchase_history": [
+            {"product_name": f"Sản phẩm {i}", "date": f"2025-0{1 + i % 9}-1{i % 10}"} for i in range(orders)
+        ],
+        "viewed_products": [{"name": f"Sản phẩm {i}", "price": rng.randint(5, 500) * 1000} for i in range(100)],
+        "cart_items": [
+            {"name": f"Sản phẩm {i}", "sku": f"{180000 + i}", "quantity": rng.randint(1, 5),
+             "price": rng.randint(5, 500) * 1000}
+            for i in range(30)
+        ],
+        "recent_interactions": [{"query": f"Tìm sản phẩm {i}", "time": "2025-05-01 10:00"} for i in range(50)],
+        "tracked_orders": [
+            {"order_id": f"{100000 + i}", "status": "Đang giao", "date": "2025-05-01"} for i in range(orders)
+        ]
+    }
+
+
+def make_order_history(orders: int) -> Dict[str, Any]:
+    """Lịch sử đơn hàng nhiều đơn, mỗi đơn ba sự kiện; sự kiện tương lai nằm ở cuối."""
+    today = datetime(2025, 6, 1)
+    history = []
+    for i in range(orders):
+        day = (today - timedelta(days=orders - i)).strftime("%Y-%m-%d")
+        history.append({
+            "order_id": f"{100000 + i}",
+            "order_date": day,
+            "status": "Đã giao",
+            "payment_status": "Đã thanh toán",
+            "delivery_status": "Đã giao",
+            "events": [
+                {"event_type": "order", "order_id": f"{100000 + i}", "store_name": "MM An Phú", "delivery_time": "09:00"},
+                {"event_type": "payment", "order_id": f"{100000 + i}", "payment_time": "09:05"},
+                {"event_type": "delivery", "address": "12 Nguyễn Văn Linh", "estimated_arrival": "11:00"}
+            ]
+        })
+    history[-1]["order_date"] = today.strftime("%Y-%m-%d")
+    return {"orders": history}
+
+
+def _history(messages: int):
+    return [
+        SimpleNamespace(role="user" if i % 2 == 0 else "model",
+                        parts=[SimpleNamespace(text=f"Tin nhắn số {i}: " + "nội dung hội thoại " * 8)])
+        for i in range(messages)
+    ]
+
+
+def _run_coroutine(coro):
+    """Chạy coroutine không chờ I/O đến hết mà không cần event loop."""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    raise RuntimeError("Coroutine bị treo chờ I/O")
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+@benchmark("process_model_response/json_block_50_products")
+def _process_json_block():
+    from backend_server import process_model_response
+    text = "```json\n" + json.dumps({"data": {"products": make_graphql_products(50), "total_results": 50}},
+                                    ensure_ascii=False) + "\n```"
+    return lambda: process_model_response(text)
+
+
+@benchmark("process_model_response/embedded_json_50_products")
+def _process_embedded_json():
+    from backend_server import process_model_response
+    text = ("Mình tìm được các sản phẩm sau cho bạn:\n"
+            + json.dumps({"products": make_graphql_products(50)}, ensure_ascii=False)
+            + "\nBạn muốn thêm sản phẩm nào vào giỏ hàng?")
+    return lambda: process_model_response(text)
+
+
+@benchmark("process_model_response/plain_text_4kb")
+def _process_plain_text():
+    from backend_server import process_model_response
+    text = "Dạ, cửa hàng hiện có nhiều loại sữa tươi, bạn có thể chọn theo dung tích {1L} hoặc {180ml}. " * 40
+    return lambda: process_model_response(text)
+
+
+@benchmark("prepare_model_context/heavy_profile")
+def _prepare_context():
+    from backend_server import prepare_model_context
+    profile = make_profile(orders=200)
+    return lambda: prepare_model_context(profile)
+
+
+@benchmark("manage_context_size/2000_messages")
+def _manage_context():
+    from backend_server import manage_context_size
+    history = _history(2000)
+    session = SimpleNamespace(history=history)
+
+    def run():
+        session.history = history
+        manage_context_size(session, 20)
+    return run
+
+
+@benchmark("save_session_data/200_keys_200_messages")
+def _save_session():
+    from mm_a2a.tools.memory import _save_session_data
+    state = {f"key_{i}": f"giá trị {i}" for i in range(150)}
+    state.update({f"_internal_{i}": i for i in range(20)})
+    state.update({f"search_{i}": {"products": make_graphql_products(10, seed=i)} for i in range(25)})
+    state.update({f"large_{i}": "x" * 20000 for i in range(3)})
+    state.update({f"object_{i}": object() for i in range(2)})
+    ctx = SimpleNamespace(session=SimpleNamespace(session_id="bench-session", state=state, history=_history(200)))
+    return lambda: _run_coroutine(_save_session_data(callback_context=ctx))
+
+
+@benchmark("merge_product_pages/union_sorted_20x100")
+def _merge_union():
+    from benchmarks.bench_search_merge import make_pages
+    from mm_a2a.tools.api_client.models import Product
+    from mm_a2a.tools.api_client.product import merge_product_pages
+    pages = [Product.decode_many(items) for items in make_pages(20, 100, 1000)]
+    return lambda: merge_product_pages(pages, {"price": "ASC"}, "union", 10, 1)
+
+
+@benchmark("merge_product_pages/intersection_20x100")
+def _merge_intersection():
+    from benchmarks.bench_search_merge import make_pages
+    from mm_a2a.tools.api_client.models import Product
+    from mm_a2a.tools.api_client.product import merge_product_pages
+    pages = [Product.decode_many(items) for items in make_pages(20, 100, 300)]
+    return lambda: merge_product_pages(pages, None, "intersection", 10, 1)
+
+
+@benchmark("transit/find_next_event_500_orders")
+def _find_next_event():
+    from mm_a2a.tools.transit import find_next_event
+    history = make_order_history(500)
+    profile = {"home": {"event_type": "home", "address": "12 Nguyễn Văn Linh"}}
+    return lambda: find_next_event(profile, history, "2025-06-01T10:00:00")
+
+
+@benchmark("transit/order_status_check_1000_orders")
+def _order_status_check():
+    from mm_a2a.tools import constants
+    from mm_a2a.tools.transit import delivery_status_check, order_status_check, payment_status_check
+    context = SimpleNamespace(state={constants.ORDER_HISTORY_KEY: make_order_history(1000)})
+    last = f"{100000 + 999}"
+
+    def run():
+        order_status_check(last, context)
+        payment_status_check(last, context)
+        delivery_status_check(last, context)
+    return run
+
+
+@benchmark("transit/order_coordination_500_orders")
+def _order_coordination():
+    from mm_a2a.tools import constants
+    from mm_a2a.tools.transit import order_coordination
+    context = SimpleNamespace(state={
+        constants.ORDER_HISTORY_KEY: make_order_history(500),
+        constants.CUSTOMER_PROFILE_KEY: {"home": {"event_type": "home", "address": "12 Nguyễn Văn Linh"}},
+        constants.SYSTEM_TIME: "2025-06-01T10:00:00"
+    })
+    return lambda: order_coordination(context)
+
+
+# ---------------------------------------------------------------------------
+# Đo và so sánh
+# ---------------------------------------------------------------------------
+
+class _DiscardHandler(logging.Handler):
+    """Định dạng bản ghi log như handler thật nhưng không ghi ra đâu."""
+
+    def emit(self, record):
+        self.format(record)
+
+
+def _quiet_logging():
+    """Thay các handler của root logger (console, backend_server.log) bằng handler bỏ đi."""
+    import backend_server  # noqa: F401 - setup_logging của backend chạy khi import
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+    root.addHandler(_DiscardHandler())
+
+
+def measure(func: Callable[[], Any], samples: int, min_time: float) -> Dict[str, Any]:
+    """
+    Đo thời gian mỗi lần gọi `func`.
+
+    Args:
+        func: Hàm cần đo.
+        samples: Số mẫu.
+        min_time: Thời gian tối thiểu của một mẫu (giây), dùng để chọn số vòng lặp.
+
+    Returns:
+        Dict[str, Any]: Thống kê theo micro giây và số vòng lặp mỗi mẫu.
+    """
+    timer = timeit.Timer(func)
+    loops = 1
+    while True:
+        elapsed = timer.timeit(loops)
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9) * 1.2))
+    timer.timeit(loops)  # làm nóng
+    values = [timer.timeit(loops) / loops * 1e6 for _ in range(samples)]
+    return {
+        "median_us": round(statistics.median(values), 3),
+        "mean_us": round(statistics.mean(values), 3),
+        "stdev_us": round(statistics.stdev(values), 3) if len(values) > 1 else 0.0,
+        "min_us": round(min(values), 3),
+        "loops": loops,
+        "samples": samples
+    }
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run_suite(pattern: str = None, samples: int = 15, min_time: float = 0.02) -> Dict[str, Any]:
+    """Chạy các benchmark có tên khớp `pattern` và trả về kết quả dạng baseline."""
+    _quiet_logging()
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if pattern and not re.search(pattern, name):
+            continue
+        stats = measure(setup(), samples, min_time)
+        results[name] = stats
+        print(f"{name:<52}{stats['median_us']:>12.1f} us  ±{stats['stdev_us']:.1f}")
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine()
+        },
+        "benchmarks": results
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float, metric: str = "min_us") -> List[str]:
+    """
+    So sánh với baseline theo `metric` và in bảng kết quả.
+
+    Args:
+        baseline: Kết quả baseline.
+        current: Kết quả mới.
+        threshold: Tỷ lệ chậm đi tối đa chấp nhận được (0.1 = 10%).
+        metric: Thống kê dùng để so sánh (`min_us` hoặc `median_us`).
+
+    Returns:
+        List[str]: Tên các benchmark bị chậm đi quá ngưỡng.
+    """
+    regressions = []
+    print(f"\n{'Benchmark (' + metric + ')':<52}{'baseline':>12}{'hiện tại':>12}{'thay đổi':>10}")
+    for name, stats in current["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if base is None:
+            print(f"{name:<52}{'-':>12}{stats[metric]:>12.1f}{'mới':>10}")
+            continue
+        change = stats[metric] / base[metric] - 1 if base[metric] else 0.0
+        mark = ""
+        if change > threshold:
+            mark = "  CHẬM HƠN"
+            regressions.append(name)
+        elif change < -threshold:
+            mark = "  nhanh hơn"
+        print(f"{name:<52}{base[metric]:>12.1f}{stats[metric]:>12.1f}{change:>+9.1%}{mark}")
+    if regressions:
+        print(f"\n{len(regressions)} benchmark chậm hơn baseline quá {threshold:.0%}")
+    return regressions
+
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark các hàm chạy ở mỗi lượt chat")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Chạy benchmark")
+    run.add_argument("-k", dest="pattern", help="Chỉ chạy benchmark có tên khớp regex")
+    run.add_argument("-o", "--output", help="Ghi kết quả JSON (ví dụ để cập nhật baseline)")
+    run.add_argument("--samples", type=int, default=15)
+    run.add_argument("--min-time", type=float, default=0.02, help="Thời gian tối thiểu mỗi mẫu (giây)")
+    run.add_argument("--compare", nargs="?", const=DEFAULT_BASELINE, help="So sánh với baseline sau khi chạy")
+    run.add_argument("--threshold", type=float, default=0.1, help="Ngưỡng chậm đi (0.1 = 10%%)")
+    run.add_argument("--metric", choices=["min_us", "median_us"], default="min_us", help="Thống kê dùng để so sánh")
+
+    diff = commands.add_parser("compare", help="So sánh hai file kết quả")
+    diff.add_argument("baseline")
+    diff.add_argument("current")
+    diff.add_argument("--threshold", type=float, default=0.1, help="Ngưỡng chậm đi (0.1 = 10%%)")
+    diff.add_argument("--metric", choices=["min_us", "median_us"], default="min_us", help="Thống kê dùng để so sánh")
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        regressions = compare(_load(args.baseline), _load(args.current), args.threshold, args.metric)
+    else:
+        results = run_suite(args.pattern, args.samples, args.min_time)
+        if args.output:
+            os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, ensure_ascii=False, indent=2)
+            print(f"\nĐã ghi kết quả: {args.output}")
+        regressions = compare(_load(args.compare), results, args.threshold, args.metric) if args.compare else []
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Server GraphQL giả lập thay cho `online.mmvietnam.com` khi đo hiệu năng.
+
+Phát lại các phản hồi đã ghi (`benchmarks/fixtures/graphql_responses.json`) cho các
+thao tác sản phẩm, giỏ hàng và xác thực mà client sử dụng, chọn theo trường gốc của
+truy vấn (`products`, `cart`, `addProductsToCart`, `generateCustomerToken`...). Trong
+phản hồi ghi sẵn, chuỗi `$uuid` được thay bằng một ID mới (cart ID, token) và
+`$var:<tên>` bằng biến của request (ví dụ cart ID của truy vấn giỏ hàng).
+
+Có thể thêm độ trễ (cố định, dao động, theo từng thao tác) và tiêm lỗi: lỗi GraphQL
+(HTTP 200 kèm `errors`), lỗi HTTP 503 và request treo quá thời gian chờ của client.
+
+Chạy: python benchmarks/mock_graphql_server.py [--port 8765] [--latency-ms 80]
+      [--jitter-ms 20] [--op-latency products=150] [--error-rate 0.01]
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import re
+import threading
+import uuid
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+from aiohttp import web
+
+DEFAULT_FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "graphql_responses.json")
+
+# Trường gốc (có thể kèm alias) ngay sau dấu `{` đầu tiên ngoài phần khai báo biến
+_ROOT_FIELD = re.compile(r"\s*(?:(\w+)\s*:\s*)?(\w+)")
+
+
+def root_field(query: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Tìm trường gốc của truy vấn GraphQL.
+
+    Args:
+        query: Truy vấn GraphQL.
+
+    Returns:
+        Tuple[Optional[str], Optional[str]]: (tên trường, khóa trong `data` - alias nếu có).
+    """
+    depth = 0
+    for index, char in enumerate(query or ""):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "{" and depth == 0:
+            match = _ROOT_FIELD.match(query, index + 1)
+            if match:
+                alias, field = match.groups()
+                return field, alias or field
+            break
+    return None, None
+
+
+def _render(value: Any, variables: Dict[str, Any]) -> Any:
+    """Thay `$uuid` và `$var:<tên>` trong phản hồi ghi sẵn."""
+    if isinstance(value, dict):
+        return {key: _render(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_render(item, variables) for item in value]
+    if value == "$uuid":
+        return uuid.uuid4().hex
+    if isinstance(value, str) and value.startswith("$var:"):
+        return variables.get(value[len("$var:"):])
+    return value
+
+
+class MockGraphQLServer:
+    """
+    Server GraphQL phát lại phản hồi đã ghi, có độ trễ và tiêm lỗi cấu hình được.
+
+    Args:
+        responses: Phản hồi ghi sẵn theo tên trường gốc.
+        latency_ms: Độ trễ cố định mỗi request (ms).
+        jitter_ms: Dao động ngẫu nhiên cộng thêm, trong khoảng [0, jitter_ms] (ms).
+        op_latency_ms: Độ trễ riêng theo trường gốc, thay cho `latency_ms`.
+        error_rate: Tỷ lệ request trả lỗi GraphQL (HTTP 200 kèm `errors`).
+        http_error_rate: Tỷ lệ request trả HTTP 503.
+        timeout_rate: Tỷ lệ request treo `hang_seconds` giây (vượt thời gian chờ của client).
+        hang_seconds: Thời gian treo của request bị tiêm timeout.
+        seed: Seed cho bộ sinh ngẫu nhiên (tái lập được kết quả).
+    """
+
+    def __init__(
+        self,
+        responses: Dict[str, Any],
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        op_latency_ms: Optional[Dict[str, float]] = None,
+        error_rate: float = 0.0,
+        http_error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        hang_seconds: float = 60.0,
+        seed: Optional[int] = None
+    ):
+        self.responses = responses
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.op_latency_ms = dict(op_latency_ms or {})
+        self.error_rate = error_rate
+        self.http_error_rate = http_error_rate
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self._random = random.Random(seed)
+        self.requests: Counter = Counter()
+        self.injected: Counter = Counter()
+        self._runner: Optional[web.AppRunner] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_fixture(cls, path: str = DEFAULT_FIXTURE, **kwargs) -> "MockGraphQLServer":
+        """Tạo server từ file JSON phản hồi ghi sẵn."""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f), **kwargs)
+
+    def app(self) -> web.Application:
+        """Ứng dụng aiohttp phục vụ `/graphql` (POST và GET)."""
+        app = web.Application()
+        app.router.add_route("POST", "/graphql", self.handle)
+        app.router.add_route("GET", "/graphql", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if request.method == "POST":
+            payload = await request.json()
+        else:
+            payload = {"query": request.query.get("query", ""), "variables": request.query.get("variables")}
+        variables = payload.get("variables") or {}
+        if isinstance(variables, str):
+            variables = json.loads(variables)
+        field, key = root_field(payload.get("query", ""))
+        self.requests[field or "unknown"] += 1
+
+        delay = self.op_latency_ms.get(field, self.latency_ms) + self._random.uniform(0, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+        roll = self._random.random()
+        if roll < self.timeout_rate:
+            self.injected["timeout"] += 1
+            await asyncio.sleep(self.hang_seconds)
+        elif roll < self.timeout_rate + self.http_error_rate:
+            self.injected["http_503"] += 1
+            return web.json_response({"message": "Service Unavailable"}, status=503)
+        elif roll < self.timeout_rate + self.http_error_rate + self.error_rate:
+            self.injected["graphql_error"] += 1
+            return web.json_response({
+                "errors": [{"message": "Injected error", "extensions": {"category": "internal"}}]
+            })
+
+        recorded = self.responses.get(field)
+        if recorded is None:
+            return web.json_response({
+                "errors": [{"message": f"No recorded response for '{field}'",
+                            "extensions": {"category": "graphql-no-such-entity"}}]
+            })
+        body = _render(copy.deepcopy(recorded), variables)
+        if key != field and field in body.get("data", {}):
+            body["data"][key] = body["data"].pop(field)
+        return web.json_response(body)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """
+        Khởi động server trên event loop hiện tại.
+
+        Returns:
+            str: URL GraphQL (dùng làm `API_BASE_URL`).
+        """
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}/graphql"
+
+    async def stop(self):
+        """Dừng server."""
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_thread(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Khởi động server trên một thread riêng (dùng trong tiến trình của backend)."""
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="mock-graphql", daemon=True)
+        self._thread.start()
+        return asyncio.run_coroutine_threadsafe(self.start(host, port), self._loop).result()
+
+    def stop_thread(self):
+        """Dừng server đã khởi động bằng `start_in_thread`."""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+        self._loop = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Số request theo trường gốc và số lỗi đã tiêm theo loại."""
+        return {"requests": dict(self.requests), "injected": dict(self.injected)}
+
+
+def parse_op_latency(values) -> Dict[str, float]:
+    """Chuyển các tham số `field=ms` thành dict độ trễ theo thao tác."""
+    latency = {}
+    for value in values or []:
+        field, _, ms = value.partition("=")
+        latency[field.strip()] = float(ms)
+    return latency
+
+
+def add_server_arguments(parser: argparse.ArgumentParser):
+    """Thêm các tham số độ trễ/tiêm lỗi của server giả lập vào parser."""
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE, help="File JSON phản hồi ghi sẵn")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Độ trễ cố định mỗi request (ms)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Dao động độ trễ ngẫu nhiên (ms)")
+    parser.add_argument("--op-latency", action="append", metavar="FIELD=MS",
+                        help="Độ trễ riêng theo trường gốc, ví dụ products=150 (lặp lại được)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Tỷ lệ lỗi GraphQL")
+    parser.add_argument("--http-error-rate", type=float, default=0.0, help="Tỷ lệ HTTP 503")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="Tỷ lệ request treo")
+    parser.add_argument("--hang-seconds", type=float, default=60.0, help="Thời gian treo của request bị tiêm timeout")
+    parser.add_argument("--seed", type=int, default=None, help="Seed ngẫu nhiên")
+
+
+def server_from_args(args) -> MockGraphQLServer:
+    """Tạo server giả lập từ tham số dòng lệnh."""
+    return MockGraphQLServer.from_fixture(
+        args.fixture,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        op_latency_ms=parse_op_latency(args.op_latency),
+        error_rate=args.error_rate,
+        http_error_rate=args.http_error_rate,
+        timeout_rate=args.timeout_rate,
+        hang_seconds=args.hang_seconds,
+        seed=args.seed
+    )
+
+
+async def serve(args):
+    server = server_from_args(args)
+    url = await server.start(args.host, args.port)
+    print(f"Mock GraphQL: {url} (đặt API_BASE_URL={url})")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        print(json.dumps(server.stats(), ensure_ascii=False))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server GraphQL giả lập phát lại phản hồi đã ghi")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_server_arguments(parser)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
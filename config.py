@@ -16,7 +16,7 @@ class Config:
     """Cấu hình chung cho ứng dụng."""
     
     # Cấu hình API
-    API_BASE_URL = "https://online.mmvietnam.com/graphql"
+    API_BASE_URL = os.getenv("MM_ECOMMERCE_API_URL", "https://online.mmvietnam.com/graphql")
     API_TIMEOUT = 30  # Timeout mặc định 30 giây
     
     # Store code
@@ -35,8 +35,30 @@ class Config:
     MAX_RETRY_ATTEMPTS = 3
     
     # Cấu hình logging
-    LOG_LEVEL = "INFO"
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
     LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))  # Hàng đợi đầy thì bỏ bản ghi thay vì chặn
+    LOG_MAX_MESSAGE = int(os.getenv("LOG_MAX_MESSAGE", 4000))  # Số ký tự tối đa của một bản ghi
+    LOG_MAX_PAYLOAD = int(os.getenv("LOG_MAX_PAYLOAD", 500))  # Số ký tự tối đa của payload (`capped`)
+    LOG_CHUNK_SAMPLE_EVERY = int(os.getenv("LOG_CHUNK_SAMPLE_EVERY", 20))  # Ghi 1 trên N chunk stream (0: tắt)
+    
+    # Cấu hình chạy nhiều worker (uvicorn); khi đó trạng thái theo phiên nằm trong SQLite dùng chung
+    SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", os.getenv("WEB_CONCURRENCY", 1)))
+    SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "mm_a2a_state.db" if SERVER_WORKERS > 1 else "")  # Trống: dict trong tiến trình
+    SHARED_STATE_TIMEOUT = float(os.getenv("SHARED_STATE_TIMEOUT", 5))  # Thời gian chờ khóa ghi SQLite (giây)
+    SHARED_STATE_TTL = int(os.getenv("SHARED_STATE_TTL", 24 * 3600))  # Bản ghi cũ hơn bị xóa khi worker khởi động (giây)
+    SHARED_STATE_KEY = os.getenv("SHARED_STATE_KEY", "")  # Khóa Fernet mã hóa token trong file (trống: sinh khi khởi động)
+    WORKER_MAX_REQUESTS = int(os.getenv("WORKER_MAX_REQUESTS", 0))  # Khởi động lại worker sau N request (0: không)
+    WORKER_MAX_REQUESTS_JITTER = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", 0))  # Để các worker không khởi động lại cùng lúc
+    WORKER_GRACEFUL_TIMEOUT = int(os.getenv("WORKER_GRACEFUL_TIMEOUT", 30))  # Chờ request đang chạy khi dừng worker (giây)
+
+    # Cấu hình kiểm soát tải cho /api/chat và /api/chat/stream (theo từng worker)
+    ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", 8))  # Số lượt chat chạy đồng thời tối đa
+    ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 16))  # Số request chờ tối đa, vượt quá thì trả 503
+    ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))  # Thời gian chờ tối đa trong hàng đợi (giây)
+    ADMISSION_MAX_PER_USER = int(os.getenv("ADMISSION_MAX_PER_USER", 2))  # Lượt đang chạy + đang chờ của một user_id (0: không giới hạn)
+    ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 2))  # Retry-After tối thiểu của phản hồi 503 (giây)
     
     # Các mã lỗi cần retry
     RETRY_ERROR_CODES = [
@@ -46,6 +68,87 @@ class Config:
         "NETWORK_ERROR"
     ]
     
+    # Cấu hình cache tìm kiếm sản phẩm
+    SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 300))  # Thời gian sống (giây)
+    SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", 1000))
+    
+    # Cấu hình cache facet/aggregation của suggest_products
+    AGGREGATION_CACHE_TTL = int(os.getenv("AGGREGATION_CACHE_TTL", 3600))  # Thời gian sống (giây)
+    AGGREGATION_CACHE_MAX_ENTRIES = int(os.getenv("AGGREGATION_CACHE_MAX_ENTRIES", 500))
+    
+    # Cấu hình prefetch trang kết quả tiếp theo
+    PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+    PREFETCH_MAX_INFLIGHT = int(os.getenv("PREFETCH_MAX_INFLIGHT", 4))  # Ngân sách prefetch đồng thời
+    
+    # Cấu hình catalog sản phẩm cục bộ (snapshot + chỉ mục ngược)
+    CATALOG_ENABLED = os.getenv("CATALOG_ENABLED", "false").lower() == "true"
+    CATALOG_DIR = os.getenv("CATALOG_DIR", os.path.join("data", "catalog"))
+    CATALOG_MAX_AGE = int(os.getenv("CATALOG_MAX_AGE", 6 * 3600))  # Quá hạn thì tìm kiếm qua API (giây)
+    CATALOG_COMPACT_RATIO = 0.3  # Tỷ lệ dòng đã xóa để nén lại snapshot
+    CATALOG_RELOAD_INTERVAL = int(os.getenv("CATALOG_RELOAD_INTERVAL", 30))  # Chu kỳ kiểm tra file snapshot bị thay (giây)
+    
+    # Cấu hình chuẩn hóa truy vấn tìm kiếm (đồng nghĩa, sửa lỗi chính tả, khôi phục dấu)
+    QUERY_NORMALIZATION_ENABLED = os.getenv("QUERY_NORMALIZATION_ENABLED", "true").lower() == "true"
+    QUERY_VOCAB_FILE = os.getenv("QUERY_VOCAB_FILE", "")  # File từ vựng sản phẩm (mỗi dòng một từ/cụm từ)
+    QUERY_MAX_EDIT_DISTANCE = 2
+    
+    # Cấu hình pool giỏ hàng khách vãng lai tạo sẵn
+    CART_POOL_ENABLED = os.getenv("CART_POOL_ENABLED", "true").lower() == "true"
+    CART_POOL_SIZE = int(os.getenv("CART_POOL_SIZE", 3))  # Số giỏ hàng giữ sẵn cho mỗi cửa hàng
+    CART_POOL_MAX_AGE = int(os.getenv("CART_POOL_MAX_AGE", 6 * 3600))  # Tuổi tối đa của cart ID trong pool (giây)
+    
+    # Cấu hình hàng đợi ghi giỏ hàng (tuần tự hóa và gộp thao tác theo giỏ hàng)
+    CART_QUEUE_ENABLED = os.getenv("CART_QUEUE_ENABLED", "true").lower() == "true"
+    CART_QUEUE_WINDOW = float(os.getenv("CART_QUEUE_WINDOW", 0.05))  # Cửa sổ gộp thao tác (giây)
+    
+    # Cấu hình cache trạng thái giỏ hàng (cập nhật từ kết quả mutation)
+    # Mặc định tắt khi chạy nhiều worker: trạng thái cache ở worker khác có thể đã cũ
+    CART_STATE_ENABLED = os.getenv("CART_STATE_ENABLED", "true" if SERVER_WORKERS <= 1 else "false").lower() == "true"
+    CART_STATE_TTL = int(os.getenv("CART_STATE_TTL", 120))  # Thời gian phục vụ giỏ hàng tại chỗ (giây)
+    CART_STATE_MAX_ENTRIES = 1024
+    
+    # Cấu hình chống gửi trùng mutation (khóa idempotency phía client)
+    IDEMPOTENCY_ENABLED = os.getenv("IDEMPOTENCY_ENABLED", "true").lower() == "true"
+    IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 300))  # Thời gian giữ kết quả mutation theo khóa (giây)
+    IDEMPOTENCY_MAX_ENTRIES = 4096
+    
+    # Cấu hình vòng đời token xác thực khách hàng
+    AUTH_TOKEN_LIFETIME = int(os.getenv("AUTH_TOKEN_LIFETIME", 3600))  # Thời gian sống khi chưa biết cấu hình cửa hàng (giây)
+    AUTH_REFRESH_MARGIN = int(os.getenv("AUTH_REFRESH_MARGIN", 300))  # Đăng nhập lại khi token còn ít hơn (giây)
+    AUTH_RELOGIN_ENABLED = os.getenv("AUTH_RELOGIN_ENABLED", "true").lower() == "true"
+    AUTH_LIFETIME_CACHE_TTL = 3600  # Thời gian cache customer_access_token_lifetime theo cửa hàng (giây)
+    
+    # Cấu hình cache hồ sơ khách hàng (nạp khi đăng nhập, làm mới nền)
+    CUSTOMER_PROFILE_ENABLED = os.getenv("CUSTOMER_PROFILE_ENABLED", "true").lower() == "true"
+    CUSTOMER_PROFILE_TTL = int(os.getenv("CUSTOMER_PROFILE_TTL", 600))  # Quá tuổi này thì làm mới nền (giây)
+    CUSTOMER_PROFILE_MAX_AGE = int(os.getenv("CUSTOMER_PROFILE_MAX_AGE", 24 * 3600))  # Tuổi tối đa được phục vụ (giây)
+    CUSTOMER_PROFILE_MAX_ENTRIES = 1024
+    
+    # Cấu hình ngữ cảnh request theo phiên chat (cửa hàng, token, giỏ hàng)
+    SESSION_CONTEXT_TTL = int(os.getenv("SESSION_CONTEXT_TTL", 24 * 3600))  # Giữ ngữ cảnh kể từ lần dùng cuối (giây)
+    SESSION_CONTEXT_MAX_ENTRIES = 10000
+    
+    # Cấu hình mô hình của các agent: "gemini" (MODEL_NAME qua ADK) hoặc "scripted"
+    # (mô hình cục bộ phát lại kịch bản gọi công cụ, dùng để đo hiệu năng không cần mạng)
+    MODEL_PROVIDER = os.getenv("MODEL_PROVIDER", "gemini").lower()
+    MODEL_NAME = os.getenv("MODEL_NAME", "gemini-2.0-flash-001")
+    SCRIPTED_MODEL_SCRIPT = os.getenv("SCRIPTED_MODEL_SCRIPT", "")  # File JSON kịch bản (trống: kịch bản mặc định)
+    SCRIPTED_MODEL_FIRST_TOKEN_MS = float(os.getenv("SCRIPTED_MODEL_FIRST_TOKEN_MS", 0))  # Độ trễ tới token đầu (ms)
+    SCRIPTED_MODEL_TOKEN_MS = float(os.getenv("SCRIPTED_MODEL_TOKEN_MS", 0))  # Độ trễ mỗi token tiếp theo (ms)
+    # Dựng cây agent (nạp ADK) trên thread nền ngay khi server khởi động thay vì ở request đầu tiên
+    AGENT_WARMUP = os.getenv("AGENT_WARMUP", "true").lower() == "true"
+    
+    # Tracing OpenTelemetry (exporter offline: file JSON lines hoặc console)
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "file").lower()  # file | console
+    TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+    TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "mm-a2a-backend")
+    
+    # Chỉ số Prometheus (`/metrics`); số chuỗi nhãn tối đa mỗi chỉ số
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    METRICS_MAX_SERIES = int(os.getenv("METRICS_MAX_SERIES", 500))
+    METRICS_PUBLISH_INTERVAL = float(os.getenv("METRICS_PUBLISH_INTERVAL", 15))  # Chu kỳ đăng chỉ số của worker vào kho dùng chung (giây)
+    
     # URL dự phòng
     FALLBACK_API_URL = "https://online.mmvietnam.com/graphql"
     
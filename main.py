@@ -26,7 +26,7 @@ import uuid
 import time
 import asyncio
 import signal
-from mm_a2a.agent.agent import root_agent
+from mm_a2a.agent.agent import get_root_agent
 from mm_a2a.tools.api_client import EcommerceAPIClient
 from config import Config
 
@@ -132,7 +132,7 @@ def start_cli():
     
     # Tạo runner
     runner = Runner(
-        agent=root_agent,
+        agent=get_root_agent(),
         app_name=APP_NAME,
         session_service=session_service
     )
@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm soát tải (admission control) cho lượt chat.
+
+Mỗi lượt chat gọi LLM nhiều lần, nên nhận mọi request khi tải tăng đột biến làm độ trễ của
+tất cả cùng tăng. `AdmissionController` giới hạn số lượt chạy đồng thời của một worker
+(`ADMISSION_MAX_INFLIGHT`); request vượt quá chờ trong hàng đợi có giới hạn
+(`ADMISSION_MAX_QUEUE`) tối đa `ADMISSION_QUEUE_TIMEOUT` giây. Request bị từ chối ngay (để
+trả 503 kèm `Retry-After`) khi:
+- hàng đợi đã đầy (`queue_full`)
+- thời gian chờ ước tính (theo thời gian lượt trung bình) vượt hạn chờ (`deadline`)
+- người dùng đã có `ADMISSION_MAX_PER_USER` lượt đang chạy hoặc đang chờ (`user_limit`)
+và bị từ chối khi chờ quá hạn (`timeout`).
+
+Controller chạy trên event loop của worker (không an toàn đa luồng): slot được trả bằng
+`AdmissionTicket.release` trên event loop; từ thread khác dùng `loop.call_soon_threadsafe`.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from config import Config
+from mm_a2a.metrics import ADMISSION_QUEUE_WAIT, ADMISSION_SHED
+
+# Hệ số làm mượt thời gian lượt trung bình (EWMA)
+_TURN_TIME_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    """
+    Request bị từ chối vì quá tải.
+
+    Args:
+        reason: Lý do (`queue_full`, `deadline`, `timeout`, `user_limit`).
+        retry_after: Số giây nên chờ trước khi gửi lại (header `Retry-After`).
+    """
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Server quá tải ({reason}), thử lại sau {retry_after} giây")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionTicket:
+    """Slot của một lượt chat đã được nhận; trả slot bằng `release` (gọi nhiều lần không sao)."""
+
+    __slots__ = ("_controller", "user_key", "admitted_at", "_released", "_detached")
+
+    def __init__(self, controller: "AdmissionController", user_key: Optional[str]):
+        self._controller = controller
+        self.user_key = user_key
+        self.admitted_at = time.monotonic()
+        self._released = False
+        self._detached = False
+
+    def detach(self) -> Callable[[], None]:
+        """
+        Chuyển việc trả slot cho tác vụ chạy lượt chat (trả khi lượt thực sự kết thúc, kể cả
+        khi client đã ngắt kết nối); sau đó `release` của request không còn tác dụng.
+
+        Returns:
+            Callable[[], None]: Hàm trả slot (gọi trên event loop).
+        """
+        self._detached = True
+        return self._release
+
+    def release(self):
+        """Trả slot, trừ khi đã chuyển cho tác vụ chạy lượt chat (`detach`)."""
+        if not self._detached:
+            self._release()
+
+    def _release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release(self)
+
+
+class AdmissionController:
+    """
+    Giới hạn số lượt chat đồng thời, hàng đợi có hạn chờ và giới hạn theo người dùng.
+
+    Args:
+        max_inflight: Số lượt chạy đồng thời tối đa.
+        max_queue: Số request chờ tối đa.
+        queue_timeout: Thời gian chờ tối đa trong hàng đợi (giây).
+        max_per_user: Số lượt đang chạy + đang chờ tối đa của một người dùng (0: không giới hạn).
+        retry_after: `Retry-After` tối thiểu (giây).
+        enabled: Tắt thì mọi request được nhận ngay (vẫn đếm số lượt đang chạy).
+    """
+
+    def __init__(
+        self,
+        max_inflight: int = 8,
+        max_queue: int = 16,
+        queue_timeout: float = 10.0,
+        max_per_user: int = 2,
+        retry_after: int = 2,
+        enabled: bool = True
+    ):
+        self.max_inflight = max(max_inflight, 1)
+        self.max_queue = max(max_queue, 0)
+        self.queue_timeout = queue_timeout
+        self.max_per_user = max_per_user
+        self.retry_after = retry_after
+        self.enabled = enabled
+        self._inflight = 0
+        self._waiters: Deque[Tuple[asyncio.Future, Optional[str]]] = deque()
+        self._per_user: Dict[str, int] = {}
+        self._turn_time: Optional[float] = None
+        self.admitted = 0
+        self.queued_total = 0
+        self.shed: Dict[str, int] = {"queue_full": 0, "deadline": 0, "timeout": 0, "user_limit": 0}
+
+    def estimated_wait(self, position: int) -> Optional[float]:
+        """
+        Thời gian chờ ước tính (giây) của request ở vị trí `position` trong hàng đợi.
+
+        Returns:
+            Optional[float]: None khi chưa có lượt nào hoàn thành để ước tính.
+        """
+        if self._turn_time is None:
+            return None
+        return math.ceil(position / self.max_inflight) * self._turn_time
+
+    async def acquire(self, user_key: Optional[str] = None) -> AdmissionTicket:
+        """
+        Nhận một lượt chat, chờ trong hàng đợi nếu đã đủ số lượt đồng thời.
+
+        Args:
+            user_key: Khóa người dùng cho giới hạn theo người dùng (None: không giới hạn).
+
+        Returns:
+            AdmissionTicket: Slot của lượt chat.
+
+        Raises:
+            AdmissionRejected: Khi quá tải.
+        """
+        if not self.enabled:
+            self._admit(user_key)
+            return AdmissionTicket(self, user_key)
+        if user_key and self.max_per_user and self._per_user.get(user_key, 0) >= self.max_per_user:
+            self._reject("user_limit", self.retry_after)
+        if self._inflight < self.max_inflight and not self._waiters:
+            self._admit(user_key)
+            return AdmissionTicket(self, user_key)
+
+        position = len(self._waiters) + 1
+        estimated = self.estimated_wait(position)
+        if position > self.max_queue:
+            self._reject("queue_full", self._retry_after(estimated))
+        if estimated is not None and estimated > self.queue_timeout:
+            self._reject("deadline", self._retry_after(estimated))
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, user_key)
+        self._waiters.append(waiter)
+        self._count_user(user_key, 1)
+        self.queued_total += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # Được nhận đúng lúc bị hủy: trả lại slot
+                self._free(user_key)
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+                self._count_user(user_key, -1)
+            if isinstance(e, asyncio.TimeoutError):
+                self._reject("timeout", self._retry_after(self.estimated_wait(len(self._waiters) + 1)))
+            raise
+        ADMISSION_QUEUE_WAIT.observe(time.monotonic() - started)
+        return AdmissionTicket(self, user_key)
+
+    def _admit(self, user_key: Optional[str]):
+        self._inflight += 1
+        self.admitted += 1
+        self._count_user(user_key, 1)
+
+    def _release(self, ticket: AdmissionTicket):
+        duration = time.monotonic() - ticket.admitted_at
+        self._turn_time = duration if self._turn_time is None else (
+            _TURN_TIME_ALPHA * duration + (1 - _TURN_TIME_ALPHA) * self._turn_time
+        )
+        self._free(ticket.user_key)
+
+    def _free(self, user_key: Optional[str]):
+        self._inflight -= 1
+        self._count_user(user_key, -1)
+        # Nhận request chờ lâu nhất (bỏ qua request đã hết hạn chờ)
+        while self._waiters and self._inflight < self.max_inflight:
+            future, _ = self._waiters.popleft()
+            if future.done():
+                continue
+            self._inflight += 1
+            self.admitted += 1
+            future.set_result(None)
+
+    def _count_user(self, user_key: Optional[str], delta: int):
+        if not user_key:
+            return
+        count = self._per_user.get(user_key, 0) + delta
+        if count > 0:
+            self._per_user[user_key] = count
+        else:
+            self._per_user.pop(user_key, None)
+
+    def _retry_after(self, estimated: Optional[float]) -> int:
+        return max(self.retry_after, math.ceil(estimated or 0))
+
+    def _reject(self, reason: str, retry_after: int):
+        self.shed[reason] += 1
+        ADMISSION_SHED.inc(reason=reason)
+        raise AdmissionRejected(reason, retry_after)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê kiểm soát tải.
+
+        Returns:
+            Dict[str, Any]: Số lượt đang chạy, độ sâu hàng đợi, số request đã nhận/đã phải chờ,
+            số request bị từ chối theo lý do và thời gian lượt trung bình (giây).
+        """
+        return {
+            "enabled": self.enabled,
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+            "in_flight": self._inflight,
+            "queued": len(self._waiters),
+            "users": len(self._per_user),
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "shed": dict(self.shed),
+            "shed_total": sum(self.shed.values()),
+            "avg_turn_s": round(self._turn_time, 3) if self._turn_time is not None else 0.0
+        }
+
+
+_admission = AdmissionController(
+    max_inflight=Config.ADMISSION_MAX_INFLIGHT,
+    max_queue=Config.ADMISSION_MAX_QUEUE,
+    queue_timeout=Config.ADMISSION_QUEUE_TIMEOUT,
+    max_per_user=Config.ADMISSION_MAX_PER_USER,
+    retry_after=Config.ADMISSION_RETRY_AFTER,
+    enabled=Config.ADMISSION_ENABLED
+)
+
+
+def get_admission() -> AdmissionController:
+    """Trả về bộ kiểm soát tải của worker."""
+    return _admission
@@ -2,5 +2,11 @@
 MM A2A Ecommerce Chatbot - Root Agent
 """
 
-# Export root_agent để có thể import từ module khác
-from .agent import root_agent
+# Export root_agent để có thể import từ module khác; cây agent chỉ được tạo khi truy cập
+from .agent import get_root_agent
+
+
+def __getattr__(name: str):
+    if name == "root_agent":
+        return get_root_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -7,9 +7,11 @@ Root Agent cho MM A2A Ecommerce Chatbot sử dụng Google Gemini
 
 import asyncio
 import logging
+import threading
 from google.adk.agents import Agent
 from mm_a2a import prompt
-from mm_a2a.sub_agents.cng.agent import cng_agent
+from mm_a2a.models import get_model
+from mm_a2a.sub_agents.cng.agent import build_cng_agent
 from mm_a2a.tools.memory import _load_precreated_session, _save_session_data, memorize, get_memory, memorize_list
 from config import Config
 
@@ -51,7 +53,7 @@ async def cleanup_resources(context=None, callback_context=None):
             }
             # Lưu thông tin quan trọng vào memory
             await memorize(key="session_info", value=str(session_data))
-            logger.info("Đã lưu thông tin phiên làm việc")
+            logger.debug("Đã lưu thông tin phiên làm việc")
     except Exception as e:
         logger.error(f"Lỗi khi dọn dẹp tài nguyên: {str(e)}")
 
@@ -61,21 +63,46 @@ class RootAgent(Agent):
     name: str = "root_agent"
     description: str = "Root Agent cho MM A2A Ecommerce Chatbot"
 
-# Đảm bảo event loop được thiết lập trước khi khởi tạo agent
-try:
-    asyncio.get_running_loop()
-except RuntimeError:
-    # Không có event loop đang chạy
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+_root_agent = None
+_root_agent_lock = threading.Lock()
 
-root_agent = Agent(
-    model="gemini-2.0-flash-001",  # Sử dụng model Gemini-2.0-flash-001
-    name="root_agent",
-    description="Root Agent cho MM A2A Ecommerce Chatbot",
-    instruction=prompt.ROOT_AGENT_INSTR,
-    sub_agents=[
-        cng_agent,
-        # Thêm các sub-agent khác khi cần thiết
-    ],
-)
+
+def build_root_agent() -> Agent:
+    """
+    Tạo cây agent mới: root agent và các sub-agent.
+
+    Returns:
+        Agent: Root agent.
+    """
+    return Agent(
+        model=get_model(),  # Mô hình theo MODEL_PROVIDER (mặc định Gemini MODEL_NAME)
+        name="root_agent",
+        description="Root Agent cho MM A2A Ecommerce Chatbot",
+        instruction=prompt.ROOT_AGENT_INSTR,
+        sub_agents=[
+            build_cng_agent(),
+            # Thêm các sub-agent khác khi cần thiết
+        ],
+    )
+
+
+def get_root_agent() -> Agent:
+    """
+    Root agent dùng chung của tiến trình, tạo ở lần gọi đầu tiên.
+
+    Returns:
+        Agent: Root agent.
+    """
+    global _root_agent
+    if _root_agent is None:
+        with _root_agent_lock:
+            if _root_agent is None:
+                _root_agent = build_root_agent()
+    return _root_agent
+
+
+def __getattr__(name: str):
+    # `root_agent` được tạo khi truy cập lần đầu (ADK CLI và main.py đọc thuộc tính này)
+    if name == "root_agent":
+        return get_root_agent()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
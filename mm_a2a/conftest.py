@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Fixture dùng chung cho kiểm thử của mm_a2a
+"""
+
+import json as jsonlib
+
+import pytest
+
+
+class FakeResponse:
+    """Response aiohttp giả trả về một nội dung JSON."""
+
+    status = 200
+
+    def __init__(self, body):
+        self.body = body
+        self.content_length = len(jsonlib.dumps(body).encode("utf-8"))
+
+    async def json(self):
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """
+    Session aiohttp giả: ghi lại truy vấn và header của từng request.
+
+    Args:
+        respond: Hàm `(query, headers) -> body` tạo nội dung trả lời; mặc định trả về `body`.
+        body: Nội dung trả lời cố định khi không có `respond`.
+    """
+
+    closed = False
+
+    def __init__(self, respond=None, body=None):
+        self.respond = respond or (lambda query, headers: body)
+        self.requests = []
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        query = json["query"]
+        headers = headers or {}
+        self.requests.append((query, headers))
+        return FakeResponse(self.respond(query, headers))
+
+
+@pytest.fixture
+def fake_session():
+    """Lớp `FakeSession`, gán vào `_session` của API client thay cho session aiohttp."""
+    return FakeSession
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Logging không chặn cho đường xử lý request.
+
+- `setup_logging`: handler gốc là `QueueHandler` với hàng đợi có giới hạn; một thread nền
+  (`QueueListener`) ghi ra console/file, nên event loop không chờ I/O. Hàng đợi đầy thì bỏ
+  bản ghi và đếm (`dropped_records`) thay vì chặn.
+- `capped(value)`: bọc payload (hồ sơ, dữ liệu phiên, phản hồi mô hình) để chỉ chuyển thành
+  chuỗi khi bản ghi thực sự được ghi, và cắt còn `LOG_MAX_PAYLOAD` ký tự. Dùng với kiểu
+  định dạng lười của logging: `logger.debug("Profile: %s", capped(profile))`.
+- `LogSampler`: chỉ ghi 1 trên N lần cho log theo từng chunk/tin nhắn.
+
+Mọi bản ghi cũng bị cắt còn `LOG_MAX_MESSAGE` ký tự trước khi vào hàng đợi.
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+from typing import Any, List, Optional
+
+from config import Config
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["_DroppingQueueHandler"] = None
+
+
+def _truncate(text: str, limit: int) -> str:
+    if limit and len(text) > limit:
+        return f"{text[:limit]}... (+{len(text) - limit} ký tự)"
+    return text
+
+
+class _Capped:
+    """Payload chỉ được định dạng khi ghi log (xem `capped`)."""
+
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: int):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self) -> str:
+        value = self.value
+        if isinstance(value, (dict, list)):
+            try:
+                value = json.dumps(value, ensure_ascii=False, default=str)
+            except (TypeError, ValueError):
+                pass
+        return _truncate(str(value), self.limit)
+
+
+def capped(value: Any, limit: Optional[int] = None) -> _Capped:
+    """
+    Bọc payload để ghi log lười, cắt còn `limit` ký tự.
+
+    Args:
+        value: Giá trị cần ghi (dict/list được ghi dạng JSON).
+        limit: Số ký tự tối đa (mặc định `LOG_MAX_PAYLOAD`).
+
+    Returns:
+        _Capped: Đối tượng chỉ chuyển thành chuỗi khi bản ghi được ghi.
+    """
+    return _Capped(value, Config.LOG_MAX_PAYLOAD if limit is None else limit)
+
+
+class LogSampler:
+    """
+    Lấy mẫu 1 trên `every` lần gọi (an toàn giữa các thread).
+
+    Args:
+        every: Chu kỳ lấy mẫu; 1 là ghi mọi lần, 0 là không ghi.
+    """
+
+    def __init__(self, every: int):
+        self.every = every
+        self._counter = itertools.count()
+
+    def should_log(self) -> bool:
+        if self.every <= 0:
+            return False
+        return next(self._counter) % self.every == 0
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler không chặn: cắt message dài và bỏ bản ghi khi hàng đợi đầy."""
+
+    def __init__(self, log_queue: queue.Queue, max_message: int):
+        super().__init__(log_queue)
+        self.max_message = max_message
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Ghép message (và traceback) ở thread gọi để đối số không đổi khi thread nền ghi
+        message = _truncate(record.getMessage(), self.max_message)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+def setup_logging(log_file: Optional[str] = None, level: Optional[str] = None) -> logging.Logger:
+    """
+    Cài pipeline logging cho tiến trình (gọi một lần, thay cho `logging.basicConfig`).
+
+    Args:
+        log_file: File log (ghi bởi thread nền); None nếu chỉ ghi console.
+        level: Mức log gốc (mặc định `LOG_LEVEL`).
+
+    Returns:
+        logging.Logger: Logger gốc.
+    """
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    root.setLevel((level or Config.LOG_LEVEL).upper())
+    if _listener is not None:
+        return root
+
+    formatter = logging.Formatter(Config.LOG_FORMAT)
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=Config.LOG_QUEUE_SIZE)
+    _queue_handler = _DroppingQueueHandler(log_queue, Config.LOG_MAX_MESSAGE)
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+    # Giữ handler sẵn có (vd. handler bắt log của pytest), chỉ thêm handler hàng đợi
+    root.addHandler(_queue_handler)
+    return root
+
+
+def stop_logging():
+    """Ghi nốt các bản ghi trong hàng đợi và dừng thread nền."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def dropped_records() -> int:
+    """Số bản ghi bị bỏ do hàng đợi log đầy."""
+    return _queue_handler.dropped if _queue_handler is not None else 0
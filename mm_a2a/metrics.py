@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Chỉ số Prometheus cho backend (endpoint `/metrics`, định dạng text 0.0.4).
+
+Các chỉ số được giữ trong bộ nhớ tiến trình, mỗi lần ghi chỉ là một phép cộng dưới khóa
+nên có thể bật thường trực trong production. Mỗi chỉ số giới hạn số chuỗi nhãn
+(`METRICS_MAX_SERIES`): tổ hợp nhãn mới vượt giới hạn được gộp vào chuỗi có mọi nhãn
+bằng `__overflow__` và được đếm trong `mm_metrics_series_dropped_total`, nên nhãn lấy từ
+dữ liệu ngoài (đường dẫn lạ, mã lỗi, tên operation) không làm phình bộ nhớ. Nhãn route
+dùng mẫu đường dẫn của FastAPI (`/api/chat`), không dùng đường dẫn thô.
+
+Số liệu đã có sẵn trong các thành phần (cache, pool, hàng đợi, phiên) được đọc lúc
+scrape qua `register_collector`, không tính thêm gì trên đường xử lý request.
+
+Khi chạy nhiều worker, mỗi lần scrape chỉ tới một worker; `WorkerMetrics` vì vậy đăng chỉ số
+của từng worker vào kho dùng chung (`METRICS_PUBLISH_INTERVAL`) và `/metrics` của worker nào
+cũng xuất chỉ số của mọi worker, mỗi mẫu có thêm nhãn `pid`.
+"""
+
+import bisect
+import logging
+import math
+import os
+import threading
+import time
+from collections.abc import MutableMapping
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import Config
+from mm_a2a.shared_state import SharedMapping, get_shared_store
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW = "__overflow__"
+
+# Mốc histogram độ trễ (giây): từ thao tác cache tới lượt chat nhiều bước gọi LLM
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+Family = Tuple[str, str, str, List[Sample]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Chỉ số có nhãn, giới hạn số chuỗi nhãn."""
+
+    type = "untyped"
+
+    def __init__(self, registry: "MetricsRegistry", name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        """Khóa chuỗi nhãn; gọi khi đang giữ khóa."""
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        if key not in self._values and len(self._values) >= self.registry.max_series:
+            self.registry.dropped += 1
+            key = (OVERFLOW,) * len(self.labelnames)
+        return key
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            return [(self.name, self._labels(key), value) for key, value in self._values.items()]
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng."""
+
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            key = self._key(labels)
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Giá trị tức thời (tăng/giảm được)."""
+
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            key = self._key(labels)
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Histogram theo mốc cố định (đếm theo từng mốc, cộng dồn khi xuất)."""
+
+    type = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            key = self._key(labels)
+            state = self._values.get(key)
+            if state is None:
+                # [đếm theo từng mốc..., đếm > mốc cuối, tổng]
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            values = [(key, list(state)) for key, state in self._values.items()]
+        samples = []
+        for key, state in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((f"{self.name}_count", labels, cumulative))
+            samples.append((f"{self.name}_sum", labels, state[-1]))
+        return samples
+
+
+class MetricsRegistry:
+    """
+    Tập chỉ số của tiến trình và các collector đọc lúc scrape.
+
+    Args:
+        max_series: Số chuỗi nhãn tối đa mỗi chỉ số.
+        enabled: Tắt thì mọi thao tác ghi là no-op.
+    """
+
+    def __init__(self, max_series: int = 500, enabled: bool = True):
+        self.max_series = max_series
+        self.enabled = enabled
+        self.dropped = 0
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+
+    def _add(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Chỉ số đã được khai báo: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(self, name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> Histogram:
+        return self._add(Histogram(self, name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        """
+        Đăng ký hàm trả về các chỉ số tính lúc scrape.
+
+        Args:
+            collector: Hàm trả về danh sách (tên, loại, mô tả, mẫu); mẫu là (tên, nhãn, giá trị).
+        """
+        self._collectors.append(collector)
+
+    def families(self) -> List[Family]:
+        """Toàn bộ chỉ số dạng (tên, loại, mô tả, mẫu)."""
+        families = [(metric.name, metric.type, metric.documentation, metric.samples())
+                    for metric in self._metrics.values()]
+        for collector in self._collectors:
+            # Mẫu của collector cũng chịu giới hạn số chuỗi
+            families.extend((name, metric_type, documentation, samples[:self.max_series])
+                            for name, metric_type, documentation, samples in collector())
+        families.append(("mm_metrics_series_dropped_total", "counter",
+                         "Số lần ghi bị gộp vào chuỗi __overflow__ do vượt giới hạn nhãn",
+                         [("mm_metrics_series_dropped_total", {}, self.dropped)]))
+        return families
+
+    def render(self) -> str:
+        """Xuất toàn bộ chỉ số theo định dạng text của Prometheus."""
+        return render_families(self.families())
+
+
+def render_families(families: Iterable[Family]) -> str:
+    """
+    Xuất các chỉ số theo định dạng text của Prometheus.
+
+    Các họ chỉ số trùng tên (của các worker khác nhau) được gộp dưới một dòng HELP/TYPE.
+    """
+    merged: Dict[str, Tuple[str, str, List[Sample]]] = {}
+    for name, metric_type, documentation, samples in families:
+        family = merged.setdefault(name, (metric_type, documentation, []))
+        family[2].extend(samples)
+    lines = []
+    for name, (metric_type, documentation, samples) in merged.items():
+        lines.append(f"# HELP {name} {_escape(documentation)}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for sample_name, labels, value in samples:
+            lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class WorkerMetrics:
+    """
+    Chỉ số của mọi worker qua kho dùng chung (mỗi worker một khóa theo pid).
+
+    Args:
+        registry: Chỉ số của worker này.
+        shared: Kho dùng chung giữa các worker.
+        interval: Chu kỳ đăng chỉ số của worker (giây); bản đăng cũ hơn 3 chu kỳ (worker đã
+            dừng) bị bỏ.
+        pid: Nhãn của worker (mặc định pid của tiến trình).
+    """
+
+    def __init__(self, registry: "MetricsRegistry", shared: MutableMapping, interval: float = 15.0, pid: Optional[int] = None):
+        self.registry = registry
+        self.shared = shared
+        self.interval = interval
+        self.pid = str(pid or os.getpid())
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self):
+        """Đăng chỉ số hiện tại của worker."""
+        self.shared[self.pid] = {"pid": self.pid, "published_at": time.time(), "families": self.registry.families()}
+
+    def retire(self):
+        """Dừng đăng và xóa chỉ số của worker (khi worker dừng)."""
+        self._stop.set()
+        self.shared.pop(self.pid, None)
+
+    def start(self):
+        """Đăng chỉ số định kỳ trên thread nền."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="metrics-publisher", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.publish()
+            except Exception as e:
+                logger.warning(f"Không đăng được chỉ số của worker: {str(e)}")
+
+    def render(self) -> str:
+        """Xuất chỉ số của mọi worker còn chạy, mỗi mẫu có nhãn `pid`."""
+        self.publish()
+        cutoff = time.time() - 3 * self.interval
+        families: List[Family] = []
+        for entry in self.shared.values():
+            if entry["published_at"] < cutoff:
+                self.shared.pop(entry["pid"], None)
+                continue
+            pid = entry["pid"]
+            for name, metric_type, documentation, samples in entry["families"]:
+                families.append((name, metric_type, documentation, [
+                    (sample_name, dict(labels, pid=pid), value) for sample_name, labels, value in samples
+                ]))
+        return render_families(families)
+
+
+def flatten_stats(stats: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    """Làm phẳng dict thống kê thành {tên.có.chấm: số}, bỏ các giá trị không phải số."""
+    flat = {}
+    for key, value in stats.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, bool):
+            flat[name] = float(value)
+        elif isinstance(value, (int, float)):
+            flat[name] = float(value)
+        elif isinstance(value, dict):
+            flat.update(flatten_stats(value, f"{name}."))
+    return flat
+
+
+registry = MetricsRegistry(max_series=Config.METRICS_MAX_SERIES, enabled=Config.METRICS_ENABLED)
+_shared_store = get_shared_store()
+# Chỉ số của mọi worker (None khi chạy một worker)
+worker_metrics = (
+    WorkerMetrics(registry, SharedMapping(_shared_store, "metrics"), Config.METRICS_PUBLISH_INTERVAL)
+    if _shared_store is not None else None
+)
+
+
+def render_metrics() -> str:
+    """Nội dung `/metrics`: chỉ số của mọi worker khi chạy nhiều worker, của tiến trình khi chạy một worker."""
+    return worker_metrics.render() if worker_metrics is not None else registry.render()
+
+HTTP_REQUESTS = registry.counter(
+    "mm_http_requests_total", "Số request HTTP theo route, phương thức và mã trạng thái",
+    ("route", "method", "status"))
+HTTP_LATENCY = registry.histogram(
+    "mm_http_request_duration_seconds", "Thời gian xử lý request HTTP (tới khi gửi xong body)",
+    ("route", "method"))
+ACTIVE_STREAMS = registry.gauge("mm_active_streams", "Số luồng SSE đang mở")
+RUNNER_INFLIGHT = registry.gauge("mm_runner_inflight", "Số lượt Runner đang chạy đồng thời")
+TURN_LATENCY = registry.histogram("mm_chat_turn_duration_seconds", "Thời gian một lượt chạy Runner")
+LLM_TOKENS = registry.counter("mm_llm_tokens_total", "Số token LLM đã dùng", ("model",))
+ADMISSION_SHED = registry.counter(
+    "mm_admission_shed_total", "Số lượt chat bị từ chối vì quá tải (503) theo lý do", ("reason",))
+ADMISSION_QUEUE_WAIT = registry.histogram(
+    "mm_admission_queue_wait_seconds", "Thời gian chờ trong hàng đợi của lượt chat được nhận")
+GRAPHQL_LATENCY = registry.histogram(
+    "mm_graphql_request_duration_seconds", "Thời gian truy vấn GraphQL theo operation",
+    ("operation", "outcome"))
+GRAPHQL_ERRORS = registry.counter(
+    "mm_graphql_errors_total", "Số truy vấn GraphQL lỗi theo operation và mã lỗi", ("operation", "code"))
+GRAPHQL_RETRIES = registry.counter(
+    "mm_graphql_retries_total", "Số lần thử lại truy vấn GraphQL", ("operation",))
+CACHE_LOOKUPS = registry.counter(
+    "mm_cache_lookups_total", "Số lần tra cache theo cache và kết quả (hit/miss)", ("cache", "result"))
+
+
+class MetricsMiddleware:
+    """Middleware ASGI ghi số request và độ trễ theo mẫu route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not registry.enabled:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+
+        async def recording_send(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, recording_send)
+        finally:
+            route = scope.get("route")
+            route = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "GET")
+            HTTP_REQUESTS.inc(route=route, method=method, status=str(status[0]))
+            HTTP_LATENCY.observe(time.perf_counter() - started, route=route, method=method)
@@ -0,0 +1,5 @@
+"""
+MM A2A Ecommerce Chatbot - Mô hình của các agent
+"""
+
+from .provider import get_model, get_model_name
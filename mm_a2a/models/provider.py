@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Chọn mô hình cho các agent theo cấu hình (`MODEL_PROVIDER`).
+
+- `gemini` (mặc định): tên mô hình `MODEL_NAME`, ADK tự tạo client Gemini
+- `scripted`: `ScriptedLlm` cục bộ (kịch bản `SCRIPTED_MODEL_SCRIPT`), dùng để đo chi phí
+  điều phối agent không cần mạng
+"""
+
+from typing import Optional, Union
+
+from google.adk.models.base_llm import BaseLlm
+
+from config import Config
+
+_scripted_model = None
+
+
+def get_model() -> Union[str, BaseLlm]:
+    """
+    Mô hình dùng cho `LlmAgent(model=...)`.
+
+    Returns:
+        Union[str, BaseLlm]: Tên mô hình Gemini hoặc instance `ScriptedLlm` dùng chung.
+
+    Raises:
+        ValueError: Nếu `MODEL_PROVIDER` không được hỗ trợ.
+    """
+    global _scripted_model
+    if Config.MODEL_PROVIDER == "gemini":
+        return Config.MODEL_NAME
+    if Config.MODEL_PROVIDER == "scripted":
+        if _scripted_model is None:
+            from .scripted import DEFAULT_SCRIPT, ScriptedLlm, load_script
+
+            script = load_script(Config.SCRIPTED_MODEL_SCRIPT) if Config.SCRIPTED_MODEL_SCRIPT else DEFAULT_SCRIPT
+            _scripted_model = ScriptedLlm(
+                script=script,
+                first_token_ms=Config.SCRIPTED_MODEL_FIRST_TOKEN_MS,
+                token_ms=Config.SCRIPTED_MODEL_TOKEN_MS
+            )
+        return _scripted_model
+    raise ValueError(f"MODEL_PROVIDER không được hỗ trợ: {Config.MODEL_PROVIDER}")
+
+
+def get_model_name(model: Optional[Union[str, BaseLlm]] = None) -> str:
+    """Tên mô hình đang dùng (ghi vào metadata phản hồi)."""
+    model = model if model is not None else get_model()
+    return model if isinstance(model, str) else model.model
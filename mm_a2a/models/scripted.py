@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mô hình cục bộ có kịch bản (không gọi mạng, kết quả xác định).
+
+`ScriptedLlm` phát lại các chuỗi gọi công cụ đã ghi cho từng agent, ví dụ
+tìm kiếm -> xem chi tiết -> thêm vào giỏ hàng, để đo chi phí của Runner, session,
+callback, công cụ và xử lý hậu kỳ mà không phụ thuộc độ trễ và biến động của Gemini.
+
+Kịch bản (dict hoặc file JSON) gồm:
+- `agents`: theo tên agent, danh sách kịch bản thay thế `{"match": regex, "steps": [...]}`;
+  kịch bản đầu tiên có `match` khớp tin nhắn người dùng (hoặc không có `match`) được dùng
+- mỗi bước là `{"call": tên công cụ, "args": {...}}`, `{"transfer": tên agent}` hoặc
+  `{"text": "..."}`; trong `args`, `"$message"` là tin nhắn người dùng và
+  `"$result.<đường dẫn>"` lấy từ kết quả công cụ gần nhất (ví dụ
+  `$result.data.products.items.0.sku`)
+- `default_text`: câu trả lời khi agent không có kịch bản hoặc đã hết bước
+
+Bước hiện tại được suy ra từ nội dung request (số kết quả công cụ của agent kể từ tin
+nhắn người dùng gần nhất), nên một instance dùng chung được cho mọi agent và mọi phiên.
+"""
+
+import asyncio
+import json
+import logging
+import re
+from typing import Any, AsyncGenerator, Dict, List, Optional
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+# Kịch bản mặc định: root_agent -> cng_agent -> product_agent (tìm kiếm, xem chi tiết)
+# hoặc cart_retry_agent (tạo giỏ hàng, thêm sản phẩm) tùy tin nhắn
+DEFAULT_SCRIPT: Dict[str, Any] = {
+    "agents": {
+        "root_agent": [
+            {"steps": [{"transfer": "cng_agent"}]}
+        ],
+        "cng_agent": [
+            {"match": "giỏ|thêm|mua", "steps": [{"transfer": "cart_retry_agent"}]},
+            {"steps": [{"transfer": "product_agent"}]}
+        ],
+        "product_agent": [
+            {"steps": [
+                {"call": "search_products", "args": {"query": "$message"}},
+                {"call": "get_product_detail", "args": {"product_id": "$result.data.products.items.0.sku"}},
+                {"text": "Mình đã tìm thấy sản phẩm phù hợp với \"$message\"."}
+            ]}
+        ],
+        "cart_manager_agent": [
+            {"steps": [
+                {"call": "create_cart", "args": {}},
+                {"call": "add_to_cart", "args": {"cart_id": "$result.cart_id", "product_id": "184523", "quantity": 1}},
+                {"text": "Mình đã thêm sản phẩm vào giỏ hàng."}
+            ]}
+        ]
+    },
+    "default_text": "Mình có thể giúp gì thêm cho bạn?"
+}
+
+_AGENT_NAME = re.compile(r'Your internal name is "([^"]+)"')
+_TRANSFER_TOOL = "transfer_to_agent"
+
+
+def load_script(path: str) -> Dict[str, Any]:
+    """Đọc kịch bản từ file JSON."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _agent_name(llm_request: LlmRequest) -> Optional[str]:
+    """Tên agent đang gọi mô hình (ADK ghi trong system instruction)."""
+    instruction = (llm_request.config.system_instruction if llm_request.config else None) or ""
+    match = _AGENT_NAME.search(str(instruction))
+    return match.group(1) if match else None
+
+
+def _user_turn(contents: List[types.Content]) -> int:
+    """Vị trí tin nhắn người dùng gần nhất (bỏ qua phần "For context:" ADK thêm khi chuyển agent)."""
+    for index in range(len(contents) - 1, -1, -1):
+        content = contents[index]
+        if content.role == "user" and content.parts and content.parts[0].text not in (None, "For context:"):
+            return index
+    return -1
+
+
+def _lookup(value: Any, path: List[str]) -> Any:
+    for key in path:
+        if isinstance(value, list) and key.isdigit() and int(key) < len(value):
+            value = value[int(key)]
+        elif isinstance(value, dict):
+            value = value.get(key)
+        else:
+            return None
+    return value
+
+
+class ScriptedLlm(BaseLlm):
+    """
+    Mô hình phát lại kịch bản gọi công cụ, có độ trễ theo token cấu hình được.
+
+    Args:
+        model: Tên mô hình (ghi vào metadata phản hồi).
+        script: Kịch bản (xem docstring của module).
+        first_token_ms: Độ trễ tới token đầu tiên của mỗi lần gọi (ms).
+        token_ms: Độ trễ mỗi token tiếp theo (ms); số token ước lượng theo số từ.
+    """
+
+    model: str = "scripted"
+    script: Dict[str, Any] = DEFAULT_SCRIPT
+    first_token_ms: float = 0.0
+    token_ms: float = 0.0
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        part = self.next_part(llm_request)
+        tokens = self._tokens(part)
+        if self.first_token_ms:
+            await asyncio.sleep(self.first_token_ms / 1000)
+        if stream and part.text:
+            # Trả từng token như mô hình streaming, rồi phản hồi đầy đủ
+            for token in tokens[:-1]:
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=token)]), partial=True)
+                if self.token_ms:
+                    await asyncio.sleep(self.token_ms / 1000)
+        elif self.token_ms and len(tokens) > 1:
+            await asyncio.sleep(self.token_ms * (len(tokens) - 1) / 1000)
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[part]),
+            custom_metadata={"usage": {"prompt_tokens": self._prompt_tokens(llm_request), "output_tokens": len(tokens)}}
+        )
+
+    def next_part(self, llm_request: LlmRequest) -> types.Part:
+        """
+        Bước tiếp theo của kịch bản cho request này.
+
+        Args:
+            llm_request: Request ADK gửi tới mô hình.
+
+        Returns:
+            types.Part: Lời gọi công cụ/chuyển agent hoặc câu trả lời văn bản.
+        """
+        contents = llm_request.contents or []
+        start = _user_turn(contents)
+        message = contents[start].parts[0].text if start >= 0 else ""
+        responses = [
+            part.function_response
+            for content in contents[start + 1:]
+            for part in (content.parts or [])
+            if part.function_response
+        ]
+        default_text = self.script.get("default_text", "")
+
+        steps = self._steps(_agent_name(llm_request), message)
+        if len(responses) >= len(steps):
+            return types.Part(text=default_text)
+        step = steps[len(responses)]
+        if "text" in step:
+            return types.Part(text=step["text"].replace("$message", message))
+
+        if "transfer" in step:
+            name, args = _TRANSFER_TOOL, {"agent_name": step["transfer"]}
+        else:
+            last = responses[-1].response if responses else None
+            name, args = step["call"], self._render(step.get("args", {}), message, last)
+        if name not in llm_request.tools_dict:
+            logger.warning(f"Kịch bản gọi công cụ không có trong agent: {name}")
+            return types.Part(text=default_text)
+        return types.Part(function_call=types.FunctionCall(name=name, args=args))
+
+    def _steps(self, agent_name: Optional[str], message: str) -> List[Dict[str, Any]]:
+        for scenario in self.script.get("agents", {}).get(agent_name, []):
+            pattern = scenario.get("match")
+            if not pattern or re.search(pattern, message or "", re.IGNORECASE):
+                return scenario.get("steps", [])
+        return []
+
+    def _render(self, value: Any, message: str, last: Optional[Dict[str, Any]]) -> Any:
+        if isinstance(value, dict):
+            return {key: self._render(item, message, last) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._render(item, message, last) for item in value]
+        if value == "$message":
+            return message
+        if isinstance(value, str) and value.startswith("$result."):
+            return _lookup(last, value[len("$result."):].split("."))
+        return value
+
+    @staticmethod
+    def _prompt_tokens(llm_request: LlmRequest) -> int:
+        """Số token (theo khoảng trắng) của lời nhắc hệ thống và hội thoại gửi tới mô hình."""
+        texts = [llm_request.config.system_instruction or ""] if llm_request.config else []
+        for content in llm_request.contents:
+            for part in content.parts or []:
+                texts.append(part.text or "")
+        return sum(len(text.split()) for text in texts if isinstance(text, str))
+
+    @staticmethod
+    def _tokens(part: types.Part) -> List[str]:
+        if part.text:
+            return re.findall(r"\S+\s*", part.text) or [part.text]
+        return json.dumps(part.function_call.args or {}, ensure_ascii=False).split() + [part.function_call.name]
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho mô hình cục bộ có kịch bản (chuyển agent, chuỗi gọi công cụ, tham số từ kết quả trước)
+"""
+
+import asyncio
+
+from google.adk.agents import Agent
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from mm_a2a.models.scripted import ScriptedLlm
+
+SCRIPT = {
+    "agents": {
+        "router": [
+            {"match": "giỏ", "steps": [{"transfer": "cart"}]},
+            {"steps": [{"transfer": "shop"}]}
+        ],
+        "shop": [
+            {"steps": [
+                {"call": "search", "args": {"query": "$message"}},
+                {"call": "detail", "args": {"sku": "$result.items.0.sku"}},
+                {"text": "Xong: $message"}
+            ]}
+        ]
+    },
+    "default_text": "Mặc định"
+}
+
+
+def _run(message, calls):
+    def search(query: str):
+        calls.append(("search", query))
+        return {"items": [{"sku": "184523"}]}
+
+    def detail(sku: str):
+        calls.append(("detail", sku))
+        return {"sku": sku}
+
+    model = ScriptedLlm(script=SCRIPT)
+    shop = Agent(name="shop", model=model, instruction="shop", tools=[search, detail])
+    cart = Agent(name="cart", model=model, instruction="cart")
+    router = Agent(name="router", model=model, instruction="router", sub_agents=[shop, cart])
+
+    async def run():
+        sessions = InMemorySessionService()
+        sessions.create_session(app_name="test", user_id="u", session_id="s")
+        runner = Runner(agent=router, app_name="test", session_service=sessions)
+        content = types.Content(role="user", parts=[types.Part(text=message)])
+        events = [event async for event in runner.run_async(user_id="u", session_id="s", new_message=content)]
+        return [event for event in events if event.is_final_response()][-1]
+
+    return asyncio.run(run())
+
+
+def test_replays_tool_calls_with_previous_results():
+    calls = []
+    final = _run("sữa tươi", calls)
+    assert calls == [("search", "sữa tươi"), ("detail", "184523")]
+    assert final.author == "shop"
+    assert final.content.parts[0].text == "Xong: sữa tươi"
+
+
+def test_scenario_is_chosen_by_message():
+    calls = []
+    final = _run("xem giỏ hàng", calls)
+    assert calls == []
+    assert final.author == "cart"
+    assert final.content.parts[0].text == "Mặc định"
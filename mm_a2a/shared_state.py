@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Trạng thái theo phiên dùng chung giữa các worker.
+
+Khi chạy nhiều worker (`SERVER_WORKERS > 1`), request của cùng một phiên chat có thể rơi
+vào bất kỳ worker nào, và worker có thể được khởi động lại (`WORKER_MAX_REQUESTS`). Các kho
+trạng thái theo phiên (dữ liệu phiên, bộ nhớ của agent, hồ sơ từ frontend, ngữ cảnh request)
+vì vậy được lưu trong một file SQLite (`SHARED_STATE_PATH`, chế độ WAL) thay vì dict của tiến
+trình. Session của ADK dùng `DatabaseSessionService` trên cùng file (`session_db_url`).
+
+`shared_mapping(namespace)` trả về một `SharedMapping` (giao diện dict, giá trị lưu dạng JSON)
+khi có `SHARED_STATE_PATH`, và dict thường khi chạy một worker. Giá trị lấy ra là bản sao:
+sửa tại chỗ không được lưu, phải gán lại khóa.
+
+File chứa dữ liệu khách hàng nên được tạo với quyền 0600 (chỉ tiến trình server đọc được) và
+không được đưa vào repo hay bản sao lưu; token của khách hàng được mã hóa (`seal`/`unseal`,
+Fernet) bằng khóa `SHARED_STATE_KEY`. `start_server` sinh khóa ngẫu nhiên cho các worker nếu
+chưa cấu hình, nên token trong file không dùng được sau khi toàn bộ server dừng (khách hàng
+đăng nhập lại).
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS shared_state (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+) WITHOUT ROWID
+"""
+
+
+class SharedStore:
+    """
+    File SQLite chứa trạng thái dùng chung (một kết nối cho mỗi thread).
+
+    Args:
+        path: Đường dẫn file SQLite.
+        timeout: Thời gian chờ khóa ghi của worker khác (giây).
+    """
+
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Chỉ tiến trình server đọc được; SQLite tạo file -wal/-shm cùng quyền với file chính
+        os.close(os.open(path, os.O_CREAT | os.O_RDWR, 0o600))
+        os.chmod(path, 0o600)
+        with self.connection() as conn:
+            conn.execute(_SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def prune(self, max_age: float) -> int:
+        """
+        Xóa các bản ghi không được cập nhật trong `max_age` giây.
+
+        Returns:
+            int: Số bản ghi đã xóa.
+        """
+        cursor = self.connection().execute(
+            "DELETE FROM shared_state WHERE updated_at < ?", (time.time() - max_age,)
+        )
+        return cursor.rowcount
+
+    def check(self) -> bool:
+        """Đọc được file SQLite hay không (dùng cho `/ready`)."""
+        try:
+            self.connection().execute("SELECT 1 FROM shared_state LIMIT 1").fetchall()
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"Không đọc được trạng thái dùng chung: {str(e)}")
+            return False
+
+
+class SharedMapping(MutableMapping):
+    """
+    Dict có giá trị JSON trong một namespace của `SharedStore`.
+
+    Args:
+        store: File SQLite dùng chung.
+        namespace: Tên kho (vd. "session_data").
+    """
+
+    def __init__(self, store: SharedStore, namespace: str):
+        self.store = store
+        self.namespace = namespace
+
+    def __getitem__(self, key: str) -> Any:
+        row = self.store.connection().execute(
+            "SELECT value FROM shared_state WHERE namespace = ? AND key = ?", (self.namespace, key)
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __setitem__(self, key: str, value: Any):
+        self.store.connection().execute(
+            "INSERT INTO shared_state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            (self.namespace, key, json.dumps(value, ensure_ascii=False, default=str), time.time())
+        )
+
+    def __delitem__(self, key: str):
+        cursor = self.store.connection().execute(
+            "DELETE FROM shared_state WHERE namespace = ? AND key = ?", (self.namespace, key)
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return self.store.connection().execute(
+            "SELECT 1 FROM shared_state WHERE namespace = ? AND key = ?", (self.namespace, key)
+        ).fetchone() is not None
+
+    def __iter__(self) -> Iterator[str]:
+        rows = self.store.connection().execute(
+            "SELECT key FROM shared_state WHERE namespace = ?", (self.namespace,)
+        ).fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self) -> int:
+        return self.store.connection().execute(
+            "SELECT COUNT(*) FROM shared_state WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+
+    def values(self) -> List[Any]:
+        # Một truy vấn thay vì đọc từng khóa
+        rows = self.store.connection().execute(
+            "SELECT value FROM shared_state WHERE namespace = ?", (self.namespace,)
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+_store: Optional[SharedStore] = None
+_store_lock = threading.Lock()
+_fernet: Optional[Fernet] = None
+
+
+def generate_key() -> str:
+    """Sinh khóa mới cho `SHARED_STATE_KEY`."""
+    return Fernet.generate_key().decode("ascii")
+
+
+def _cipher() -> Fernet:
+    global _fernet
+    if _fernet is None:
+        if not Config.SHARED_STATE_KEY:
+            # Không có khóa chung: chỉ tiến trình này giải mã được (worker khác coi như chưa đăng nhập)
+            logger.warning("Chưa cấu hình SHARED_STATE_KEY, dùng khóa riêng của tiến trình")
+            Config.SHARED_STATE_KEY = generate_key()
+        _fernet = Fernet(Config.SHARED_STATE_KEY.encode("ascii"))
+    return _fernet
+
+
+def seal(secret: Optional[str]) -> Optional[str]:
+    """Mã hóa một giá trị bí mật (token) trước khi ghi vào kho dùng chung."""
+    if not secret:
+        return None
+    return _cipher().encrypt(secret.encode("utf-8")).decode("ascii")
+
+
+def unseal(sealed: Optional[str]) -> Optional[str]:
+    """
+    Giải mã giá trị do `seal` tạo ra.
+
+    Returns:
+        Optional[str]: Giá trị gốc, hoặc None nếu không giải mã được (khóa đã đổi).
+    """
+    if not sealed:
+        return None
+    try:
+        return _cipher().decrypt(sealed.encode("ascii")).decode("utf-8")
+    except (InvalidToken, ValueError):
+        return None
+
+
+def get_shared_store() -> Optional[SharedStore]:
+    """File trạng thái dùng chung của tiến trình, hoặc None khi không cấu hình `SHARED_STATE_PATH`."""
+    global _store
+    if not Config.SHARED_STATE_PATH:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SharedStore(Config.SHARED_STATE_PATH, timeout=Config.SHARED_STATE_TIMEOUT)
+    return _store
+
+
+def shared_mapping(namespace: str) -> MutableMapping:
+    """
+    Kho theo phiên: `SharedMapping` khi chạy nhiều worker, dict của tiến trình khi chạy một worker.
+
+    Args:
+        namespace: Tên kho.
+
+    Returns:
+        MutableMapping: Kho có giao diện dict.
+    """
+    store = get_shared_store()
+    return SharedMapping(store, namespace) if store is not None else {}
+
+
+def session_db_url() -> Optional[str]:
+    """URL SQLAlchemy cho `DatabaseSessionService` của ADK, hoặc None khi chạy một worker."""
+    if not Config.SHARED_STATE_PATH:
+        return None
+    return f"sqlite:///{os.path.abspath(Config.SHARED_STATE_PATH)}"
+
+
+def shared_state_stats() -> Dict[str, Any]:
+    """Chế độ trạng thái (trong tiến trình hay SQLite dùng chung) cho `/ready`."""
+    store = get_shared_store()
+    if store is None:
+        return {"mode": "process"}
+    return {"mode": "sqlite", "path": store.path, "ok": store.check()}
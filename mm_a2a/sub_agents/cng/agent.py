@@ -6,31 +6,40 @@ Sub Agents cho nghiệp vụ C&G (Click and Get) của MM A2A Ecommerce Chatbot
 """
 
 import asyncio
+import functools
+import itertools
 import json
 import logging
-from typing import List, Dict, Any, AsyncGenerator, Optional
+from typing import List, Dict, Any, AsyncGenerator, Optional, Tuple
 
 from google.adk.agents import Agent, ParallelAgent, SequentialAgent, LoopAgent
 from google.adk.agents.invocation_context import InvocationContext
 from google.adk.events import Event, EventActions
 from google.adk.tools.agent_tool import AgentTool
+from google.adk.tools.tool_context import ToolContext
 
 from mm_a2a import prompt
+from mm_a2a.models import get_model
 from mm_a2a.tools.memory import memorize, get_memory, memorize_list
 from mm_a2a.tools.api_client import EcommerceAPIClient
+from mm_a2a.tools.api_client.customer_profile import get_customer_profiles
+from mm_a2a.tools.api_client.idempotency import make_idempotency_key
+from mm_a2a.tools.api_client.request_context import SESSION_ID_KEY, RequestContext, get_session_contexts, use_context
+from mm_a2a.tracing import set_attributes
 from mm_a2a.tools.transit import order_status_check, payment_status_check, delivery_status_check, order_coordination
 from config import Config
 
 logger = logging.getLogger(__name__)
 
-# Khởi tạo API client
+# API client dùng chung cho mọi phiên; cửa hàng, token và giỏ hàng của từng phiên
+# được truyền qua ngữ cảnh request (xem `_in_session_context`)
 api_client = None
 
-# Khai báo biến toàn cục để theo dõi sự reset API client
-_last_search_id = 0
-
-# Thêm biến ID cho product detail
-_last_product_id = 0
+# Truy vấn mới nhất của từng phiên theo loại ("search", "product"): kết quả của truy vấn cũ
+# hơn trong cùng phiên bị bỏ qua. Mục được xóa khi truy vấn mới nhất kết thúc, nên chỉ còn
+# các phiên đang có truy vấn dở; các phiên chạy đồng thời không ảnh hưởng lẫn nhau
+_latest_queries: Dict[Tuple[str, str], int] = {}
+_query_ids = itertools.count(1)
 
 def get_api_client():
     """Trả về instance API client hiện tại hoặc tạo mới nếu chưa có."""
@@ -45,17 +54,98 @@ def get_api_client():
         )
     return api_client
 
+async def _call_client(method_name: str, *args, **kwargs):
+    """
+    Gọi một phương thức của API client, khởi tạo lại client và thử lại một lần khi gặp lỗi event loop.
+    
+    Args:
+        method_name: Tên phương thức của `EcommerceAPIClient`.
+        
+    Returns:
+        Kết quả của phương thức.
+    """
+    global api_client
+    try:
+        ensure_event_loop()
+        return await getattr(get_api_client(), method_name)(*args, **kwargs)
+    except Exception as e:
+        if "event loop" not in str(e).lower():
+            raise
+        logger.warning(f"Lỗi event loop khi gọi {method_name}, khởi tạo lại API client: {str(e)}")
+        api_client = None
+        ensure_event_loop()
+        return await getattr(get_api_client(), method_name)(*args, **kwargs)
+
 # Các công cụ API cho sản phẩm và giỏ hàng
-async def search_products(query: str, page_size: int = 10, current_page: int = 1):
-    """Tìm kiếm sản phẩm thông qua API."""
-    global api_client, _last_search_id
+def _session_scope(tool_context: Optional[ToolContext]) -> Optional[str]:
+    """Lấy session_id của lượt chat hiện tại (backend ghi vào state khi tạo phiên) làm phạm vi cho prefetch."""
+    if tool_context is None:
+        return None
+    return tool_context.state.get(SESSION_ID_KEY)
+
+def _begin_query(kind: str, scope: Optional[str]) -> int:
+    """Đánh dấu truy vấn mới nhất của phiên và trả về ID của nó."""
+    query_id = next(_query_ids)
+    if scope:
+        _latest_queries[(kind, scope)] = query_id
+    return query_id
+
+def _finish_query(kind: str, scope: Optional[str], query_id: int) -> bool:
+    """
+    Kiểm tra truy vấn có còn là truy vấn mới nhất của phiên không (không có phiên: luôn đúng).
+    
+    Returns:
+        bool: False nếu phiên đã gửi truy vấn cùng loại mới hơn.
+    """
+    if not scope:
+        return True
+    key = (kind, scope)
+    if _latest_queries.get(key) != query_id:
+        return False
+    _latest_queries.pop(key, None)
+    return True
+
+def _request_context(tool_context: Optional[ToolContext]) -> Optional[RequestContext]:
+    """Ngữ cảnh request (cửa hàng, token, giỏ hàng) của phiên chat hiện tại."""
+    return get_session_contexts().get(_session_scope(tool_context))
+
+def _in_session_context(tool):
+    """
+    Chạy tool trong ngữ cảnh request của phiên chat gọi tool.
     
-    # Tăng ID tìm kiếm để theo dõi các lần tìm kiếm khác nhau
-    _last_search_id += 1
-    current_search_id = _last_search_id
+    Client API được dùng chung giữa các phiên, nên cửa hàng (sau `login_with_mcard`),
+    token và cart ID không được đặt lên client mà gắn cho từng lần gọi. Mã cửa hàng
+    được ghi lên span `tool_call` của ADK.
+    """
+    @functools.wraps(tool)
+    async def wrapper(*args, **kwargs):
+        context = _request_context(kwargs.get("tool_context"))
+        set_attributes({"mm.store_code": context.store_code if context else Config.STORE_CODE})
+        with use_context(context):
+            return await tool(*args, **kwargs)
+    return wrapper
+
+def _mutation_key(tool_context: Optional[ToolContext], *parts) -> Optional[str]:
+    """
+    Khóa idempotency cho thao tác ghi của một lượt chat.
+    
+    Cùng lượt chat (invocation) và cùng tham số cho cùng khóa, nên lần gọi lại của
+    `cart_retry_agent` hoặc của mô hình không thêm sản phẩm hai lần.
+    """
+    try:
+        invocation_id = tool_context.invocation_id
+    except AttributeError:
+        return None
+    return make_idempotency_key(invocation_id, *parts) if invocation_id else None
+
+@_in_session_context
+async def search_products(query: str, page_size: int = 10, current_page: int = 1, tool_context: ToolContext = None):
+    """Tìm kiếm sản phẩm thông qua API."""
+    global api_client
+    scope = _session_scope(tool_context)
     
-    # Reset API client sau mỗi lần tìm kiếm để tránh lỗi event loop
-    api_client = None
+    # ID tìm kiếm để bỏ qua kết quả đã bị tìm kiếm mới hơn của cùng phiên ghi đè
+    current_search_id = _begin_query("search", scope)
     
     try:
         # Tạo mới event loop cho mỗi lần tìm kiếm
@@ -68,12 +158,12 @@ async def search_products(query: str, page_size: int = 10, current_page: int = 1
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
         
-        # Lấy client mới với event loop mới
+        # Client dùng chung tạo session HTTP riêng cho event loop này
         client = get_api_client()
-        result = await client.search_products(query, page_size, current_page)
+        result = await client.search_products(query, page_size, current_page, scope)
         
         # Nếu tìm kiếm này vẫn là tìm kiếm mới nhất (không bị ghi đè bởi tìm kiếm khác)
-        if current_search_id == _last_search_id:
+        if _finish_query("search", scope, current_search_id):
             return result
         else:
             # Nếu đã có tìm kiếm mới hơn, bỏ qua kết quả này
@@ -96,10 +186,10 @@ async def search_products(query: str, page_size: int = 10, current_page: int = 1
                 client = get_api_client()
                 
                 # Thử lại với API client mới
-                result = await client.search_products(query, page_size, current_page)
+                result = await client.search_products(query, page_size, current_page, scope)
                 
                 # Nếu tìm kiếm này vẫn là tìm kiếm mới nhất
-                if current_search_id == _last_search_id:
+                if _finish_query("search", scope, current_search_id):
                     return result
                 else:
                     # Nếu đã có tìm kiếm mới hơn, bỏ qua kết quả này
@@ -121,17 +211,18 @@ async def search_products(query: str, page_size: int = 10, current_page: int = 1
             "message": f"Lỗi khi tìm kiếm sản phẩm: {str(e)}",
             "code": "SEARCH_ERROR"
         }
+    finally:
+        # Truy vấn lỗi cũng không còn được theo dõi
+        _finish_query("search", scope, current_search_id)
 
-async def get_product_detail(product_id: str):
+@_in_session_context
+async def get_product_detail(product_id: str, tool_context: ToolContext = None):
     """Lấy thông tin chi tiết sản phẩm."""
-    global api_client, _last_product_id
-    
-    # Tăng ID truy vấn để theo dõi các lần truy vấn khác nhau
-    _last_product_id += 1
-    current_product_query_id = _last_product_id
+    global api_client
+    scope = _session_scope(tool_context)
     
-    # Reset API client sau mỗi lần truy vấn để tránh lỗi event loop
-    api_client = None
+    # ID truy vấn để bỏ qua kết quả đã bị truy vấn mới hơn của cùng phiên ghi đè
+    current_product_query_id = _begin_query("product", scope)
     
     try:
         # Tạo mới event loop cho mỗi lần truy vấn
@@ -144,7 +235,7 @@ async def get_product_detail(product_id: str):
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
         
-        # Lấy client mới với event loop mới
+        # Client dùng chung tạo session HTTP riêng cho event loop này
         client = get_api_client()
         
         # Xác định loại ID và thực hiện truy vấn
@@ -156,7 +247,7 @@ async def get_product_detail(product_id: str):
             result = await client.get_product_by_art_no(product_id)
         
         # Nếu truy vấn này vẫn là truy vấn mới nhất (không bị ghi đè bởi truy vấn khác)
-        if current_product_query_id == _last_product_id:
+        if _finish_query("product", scope, current_product_query_id):
             return result
         else:
             # Nếu đã có truy vấn mới hơn, bỏ qua kết quả này
@@ -185,7 +276,7 @@ async def get_product_detail(product_id: str):
                     result = await client.get_product_by_art_no(product_id)
                 
                 # Nếu truy vấn này vẫn là truy vấn mới nhất
-                if current_product_query_id == _last_product_id:
+                if _finish_query("product", scope, current_product_query_id):
                     return result
                 else:
                     # Nếu đã có truy vấn mới hơn, bỏ qua kết quả này
@@ -207,15 +298,20 @@ async def get_product_detail(product_id: str):
             "message": f"Lỗi khi lấy thông tin sản phẩm: {str(e)}",
             "code": "PRODUCT_DETAIL_ERROR"
         }
+    finally:
+        # Truy vấn lỗi cũng không còn được theo dõi
+        _finish_query("product", scope, current_product_query_id)
 
-async def add_to_cart(cart_id: str, product_id: str, quantity: int = 1):
+@_in_session_context
+async def add_to_cart(cart_id: str, product_id: str, quantity: int = 1, tool_context: ToolContext = None):
     """Thêm sản phẩm vào giỏ hàng."""
     global api_client
+    idempotency_key = _mutation_key(tool_context, "add_to_cart", cart_id, product_id, quantity)
     try:
         # Đảm bảo event loop hợp lệ
         ensure_event_loop()
         client = get_api_client()
-        return await client.add_to_cart(cart_id, product_id, quantity)
+        return await client.add_to_cart(cart_id, product_id, quantity, idempotency_key=idempotency_key)
     except Exception as e:
         logger.error(f"Lỗi khi thêm sản phẩm vào giỏ hàng: {str(e)}")
         if "event loop" in str(e).lower():
@@ -232,15 +328,62 @@ async def add_to_cart(cart_id: str, product_id: str, quantity: int = 1):
                 asyncio.set_event_loop(loop)
                 
             client = get_api_client()
-            # Thử lại với API client mới
-            return await client.add_to_cart(cart_id, product_id, quantity)
+            # Thử lại với API client mới (cùng khóa idempotency)
+            return await client.add_to_cart(cart_id, product_id, quantity, idempotency_key=idempotency_key)
         return {
             "success": False,
             "message": f"Lỗi khi thêm sản phẩm vào giỏ hàng: {str(e)}",
             "code": "ADD_TO_CART_ERROR"
         }
 
-async def create_cart(is_guest: bool = False):
+@_in_session_context
+async def add_items_to_cart(cart_id: str, items: List[Dict[str, Any]], tool_context: ToolContext = None):
+    """
+    Thêm nhiều sản phẩm vào giỏ hàng trong một lần gọi.
+    
+    Args:
+        cart_id: ID giỏ hàng (để trống nếu chưa có, hệ thống sẽ tự lấy giỏ hàng mới).
+        items: Danh sách sản phẩm, mỗi phần tử gồm "sku" (mã sản phẩm) và "quantity" (số lượng).
+    """
+    idempotency_key = _mutation_key(tool_context, "add_items_to_cart", cart_id, json.dumps(items, sort_keys=True, default=str))
+    try:
+        result = await _call_client("add_items_to_cart", cart_id or None, items, idempotency_key=idempotency_key)
+        cart_id = result.get("data", {}).get("cart", {}).get("id")
+        if result.get("success", False) and cart_id:
+            # Lưu cart_id vào bộ nhớ phiên để các agent khác có thể sử dụng
+            await memorize(key="cart_id", value=cart_id)
+        return result
+    except Exception as e:
+        logger.error(f"Lỗi khi thêm nhiều sản phẩm vào giỏ hàng: {str(e)}")
+        return {
+            "success": False,
+            "message": f"Lỗi khi thêm nhiều sản phẩm vào giỏ hàng: {str(e)}",
+            "code": "ADD_TO_CART_ERROR"
+        }
+
+@_in_session_context
+async def view_cart(cart_id: str, for_checkout: bool = False, tool_context: ToolContext = None):
+    """
+    Xem giỏ hàng.
+    
+    Args:
+        cart_id: ID giỏ hàng (để trống để dùng giỏ hàng hiện tại).
+        for_checkout: True khi khách chuẩn bị thanh toán/đặt hàng (lấy thêm thuế, giảm giá,
+            phương thức thanh toán và vận chuyển); False khi chỉ xem giỏ hàng.
+    """
+    mode = "checkout" if for_checkout else "summary"
+    try:
+        return await _call_client("get_cart_info", cart_id or None, mode=mode)
+    except Exception as e:
+        logger.error(f"Lỗi khi xem giỏ hàng: {str(e)}")
+        return {
+            "success": False,
+            "message": f"Lỗi khi xem giỏ hàng: {str(e)}",
+            "code": "VIEW_CART_ERROR"
+        }
+
+@_in_session_context
+async def create_cart(is_guest: bool = False, tool_context: ToolContext = None):
     """Tạo giỏ hàng mới."""
     global api_client
     try:
@@ -299,38 +442,50 @@ def ensure_event_loop():
         asyncio.set_event_loop(loop)
         return loop
 
-async def login(email: str, password: str):
+def _bind_customer(result: Dict[str, Any], tool_context: Optional[ToolContext]) -> Dict[str, Any]:
+    """Gắn phiên chat với khách hàng vừa đăng nhập để backend dùng hồ sơ tài khoản đã cache."""
+    if result.get("success", False):
+        customer = result.get("customer") or {}
+        context = _request_context(tool_context)
+        get_customer_profiles().bind_session(
+            _session_scope(tool_context), context.store_code if context else None, customer.get("email")
+        )
+    return result
+
+@_in_session_context
+async def login(email: str, password: str, tool_context: ToolContext = None):
     """Đăng nhập vào hệ thống."""
     try:
         ensure_event_loop()
         client = get_api_client()
-        return await client.login(email, password)
+        return _bind_customer(await client.login(email, password), tool_context)
     except Exception as e:
         logger.error(f"Lỗi khi đăng nhập: {str(e)}")
         if "event loop" in str(e).lower():
             global api_client
             api_client = None
             client = get_api_client()
-            return await client.login(email, password)
+            return _bind_customer(await client.login(email, password), tool_context)
         return {
             "success": False, 
             "message": f"Lỗi khi đăng nhập: {str(e)}",
             "code": "LOGIN_ERROR"
         }
 
-async def login_with_mcard(hash_value: str, store: str, cust_no: str, phone: str, cust_no_mm: str, cust_name: str):
+@_in_session_context
+async def login_with_mcard(hash_value: str, store: str, cust_no: str, phone: str, cust_no_mm: str, cust_name: str, tool_context: ToolContext = None):
     """Đăng nhập bằng thông tin MCard."""
     try:
         ensure_event_loop()
         client = get_api_client()
-        return await client.login_with_mcard(hash_value, store, cust_no, phone, cust_no_mm, cust_name)
+        return _bind_customer(await client.login_with_mcard(hash_value, store, cust_no, phone, cust_no_mm, cust_name), tool_context)
     except Exception as e:
         logger.error(f"Lỗi khi đăng nhập bằng MCard: {str(e)}")
         if "event loop" in str(e).lower():
             global api_client
             api_client = None
             client = get_api_client()
-            return await client.login_with_mcard(hash_value, store, cust_no, phone, cust_no_mm, cust_name)
+            return _bind_customer(await client.login_with_mcard(hash_value, store, cust_no, phone, cust_no_mm, cust_name), tool_context)
         return {
             "success": False,
             "message": f"Lỗi khi đăng nhập bằng MCard: {str(e)}",
@@ -362,196 +517,189 @@ class CartResultChecker(Agent):
             actions=EventActions(escalate=success)  # Dừng vòng lặp nếu thành công
         )
 
-cart_result_checker = CartResultChecker()
-
 # Khởi tạo Sub-agents cho sản phẩm và giỏ hàng
 class CartManagerAgent(Agent):
     name: str = "cart_manager_agent"
     description: str = "Quản lý giỏ hàng và quy trình thanh toán"
-    
-cart_manager_agent = Agent(
-    model="gemini-2.0-flash-001",
-    name="cart_manager_agent",
-    description="Quản lý giỏ hàng và quy trình thanh toán",
-    instruction=prompt.CART_MANAGER_INSTR,
-    tools=[
-        add_to_cart,
-        create_cart,
-        memorize,
-        get_memory
-    ],
-)
 
 # Tạo LoopAgent để thử lại thao tác giỏ hàng nếu thất bại
 class CartRetryAgent(LoopAgent):
     name: str = "cart_retry_agent"
     description: str = "Thử lại thao tác giỏ hàng nếu thất bại"
-    
-cart_retry_agent = LoopAgent(
-    name="cart_retry_agent",
-    description="Thử lại thao tác giỏ hàng nếu thất bại",
-    max_iterations=3,  # Thử tối đa 3 lần
-    sub_agents=[
-        cart_manager_agent,
-        cart_result_checker
-    ]
-)
 
 class ProductAgent(Agent):
     name: str = "product_agent"
     description: str = "Tìm kiếm và hiển thị thông tin sản phẩm"
 
-product_agent = Agent(
-    model="gemini-2.0-flash-001",
-    name="product_agent",
-    description="Tìm kiếm và hiển thị thông tin sản phẩm",
-    instruction=prompt.PRODUCT_AGENT_INSTR,
-    tools=[
-        search_products,
-        get_product_detail,
-        memorize_list,
-        get_memory
-    ],
-)
-
 # Tạo các Agent con xử lý đơn hàng
 class OrderDetailsAgent(Agent):
     name: str = "order_details_agent"
     description: str = "Kiểm tra thông tin chi tiết đơn hàng"
     output_key: str = "order_details"
 
-order_details_agent = Agent(
-    model="gemini-2.0-flash-001",
-    name="order_details_agent",
-    description="Kiểm tra thông tin chi tiết đơn hàng",
-    instruction=prompt.ORDER_AGENT_INSTR,
-    tools=[order_status_check, get_memory],
-    output_key="order_details"
-)
-
 class PaymentDetailsAgent(Agent):
     name: str = "payment_details_agent"
     description: str = "Kiểm tra thông tin thanh toán đơn hàng"
     output_key: str = "payment_details"
 
-payment_details_agent = Agent(
-    model="gemini-2.0-flash-001",
-    name="payment_details_agent",
-    description="Kiểm tra thông tin thanh toán đơn hàng",
-    instruction=prompt.ORDER_AGENT_INSTR,
-    tools=[payment_status_check, get_memory],
-    output_key="payment_details"
-)
-
 class DeliveryDetailsAgent(Agent):
     name: str = "delivery_details_agent"
     description: str = "Kiểm tra thông tin giao hàng"
     output_key: str = "delivery_details"
 
-delivery_details_agent = Agent(
-    model="gemini-2.0-flash-001",
-    name="delivery_details_agent",
-    description="Kiểm tra thông tin giao hàng",
-    instruction=prompt.ORDER_AGENT_INSTR,
-    tools=[delivery_status_check, get_memory],
-    output_key="delivery_details"
-)
-
 # Sử dụng ParallelAgent để chạy song song các agent kiểm tra
 class ParallelCheckAgent(ParallelAgent):
     name: str = "parallel_check_agent"
     description: str = "Chạy song song các agent kiểm tra thông tin đơn hàng"
 
-parallel_check_agent = ParallelAgent(
-    name="parallel_check_agent",
-    description="Chạy song song các agent kiểm tra thông tin đơn hàng",
-    sub_agents=[
-        order_details_agent,
-        payment_details_agent,
-        delivery_details_agent
-    ]
-)
-
 # Tạo agent tổng hợp kết quả
 class SummaryAgent(Agent):
     name: str = "summary_agent"
     description: str = "Tổng hợp thông tin đơn hàng từ các agent kiểm tra"
 
-summary_agent = Agent(
-    model="gemini-2.0-flash-001",
-    name="summary_agent",
-    description="Tổng hợp thông tin đơn hàng từ các agent kiểm tra",
-    instruction="""
-    Bạn là một trợ lý tổng hợp thông tin đơn hàng. Nhiệm vụ của bạn là kết hợp thông tin từ ba nguồn:
-    1. Thông tin chi tiết đơn hàng (order_details)
-    2. Thông tin thanh toán (payment_details) 
-    3. Thông tin giao hàng (delivery_details)
-    
-    Hãy tạo một bản tóm tắt đầy đủ về đơn hàng của khách hàng bao gồm tất cả các thông tin quan trọng.
-    Định dạng thông tin theo mẫu ORDER_STATUS_FORMAT, đảm bảo nó dễ đọc và đầy đủ thông tin.
-    
-    Nhớ lưu trữ thông tin tổng hợp vào bộ nhớ phiên để có thể sử dụng trong tương lai.
-    """,
-    tools=[memorize, get_memory],
-)
-
 # Tạo SequentialAgent để điều phối luồng xử lý đơn hàng
 class OrderFlowAgent(SequentialAgent):
     name: str = "order_flow_agent"
     description: str = "Điều phối quá trình kiểm tra và tổng hợp thông tin đơn hàng"
 
-order_flow_agent = SequentialAgent(
-    name="order_flow_agent",
-    description="Điều phối quá trình kiểm tra và tổng hợp thông tin đơn hàng",
-    sub_agents=[
-        parallel_check_agent,  # Chạy song song các agent kiểm tra
-        summary_agent          # Tổng hợp kết quả
-    ]
-)
-
 # Khởi tạo CnG Agent chính
 class CngAgent(Agent):
     name: str = "cng_agent"
     description: str = "CnG (Click and Get) Agent cho MM A2A Ecommerce Chatbot"
 
-# Đảm bảo event loop được thiết lập trước khi khởi tạo agent
-# Tạo đoạn code khởi tạo event loop mạnh mẽ hơn
-loop = None
-try:
-    loop = asyncio.get_running_loop()
-    # Nếu loop đã đóng, tạo mới
-    if loop.is_closed():
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-except RuntimeError:
-    # Không có event loop đang chạy
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-except Exception as e:
-    logger.error(f"Lỗi khi thiết lập event loop: {str(e)}")
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
-
-# Lưu loop tạm thời để sử dụng khi cần
-_temp_loop = loop
-
-cng_agent = Agent(
-    model="gemini-2.0-flash-001",
-    name="cng_agent",
-    description="CnG (Click and Get) Agent cho MM A2A Ecommerce Chatbot",
-    instruction=prompt.CNG_AGENT_INSTR,
-    sub_agents=[
-        cart_retry_agent,   # Sử dụng agent retry thay vì cart_manager trực tiếp
-        product_agent,
-        order_flow_agent
-    ],
-    tools=[
-        login,
-        login_with_mcard,
-        memorize,
-        get_memory,
-        AgentTool(agent=order_details_agent),  # Cho phép gọi trực tiếp các agent con nếu cần
-        AgentTool(agent=payment_details_agent),
-        AgentTool(agent=delivery_details_agent)
-    ],
-)
\ No newline at end of file
+# Hướng dẫn của agent tổng hợp kết quả đơn hàng
+SUMMARY_AGENT_INSTR = """
+    Bạn là một trợ lý tổng hợp thông tin đơn hàng. Nhiệm vụ của bạn là kết hợp thông tin từ ba nguồn:
+    1. Thông tin chi tiết đơn hàng (order_details)
+    2. Thông tin thanh toán (payment_details) 
+    3. Thông tin giao hàng (delivery_details)
+    
+    Hãy tạo một bản tóm tắt đầy đủ về đơn hàng của khách hàng bao gồm tất cả các thông tin quan trọng.
+    Định dạng thông tin theo mẫu ORDER_STATUS_FORMAT, đảm bảo nó dễ đọc và đầy đủ thông tin.
+    
+    Nhớ lưu trữ thông tin tổng hợp vào bộ nhớ phiên để có thể sử dụng trong tương lai.
+    """
+
+def build_cng_agent() -> Agent:
+    """
+    Tạo CnG Agent cùng các sub-agent (giỏ hàng, sản phẩm, đơn hàng).
+
+    Mỗi lần gọi tạo một cây agent mới vì mỗi agent chỉ gắn được với một agent cha.
+
+    Returns:
+        Agent: CnG Agent.
+    """
+    cart_result_checker = CartResultChecker()
+
+    cart_manager_agent = Agent(
+        model=get_model(),
+        name="cart_manager_agent",
+        description="Quản lý giỏ hàng và quy trình thanh toán",
+        instruction=prompt.CART_MANAGER_INSTR,
+        tools=[
+            add_to_cart,
+            add_items_to_cart,
+            view_cart,
+            create_cart,
+            memorize,
+            get_memory
+        ],
+    )
+
+    cart_retry_agent = LoopAgent(
+        name="cart_retry_agent",
+        description="Thử lại thao tác giỏ hàng nếu thất bại",
+        max_iterations=3,  # Thử tối đa 3 lần
+        sub_agents=[
+            cart_manager_agent,
+            cart_result_checker
+        ]
+    )
+
+    product_agent = Agent(
+        model=get_model(),
+        name="product_agent",
+        description="Tìm kiếm và hiển thị thông tin sản phẩm",
+        instruction=prompt.PRODUCT_AGENT_INSTR,
+        tools=[
+            search_products,
+            get_product_detail,
+            memorize_list,
+            get_memory
+        ],
+    )
+
+    order_details_agent = Agent(
+        model=get_model(),
+        name="order_details_agent",
+        description="Kiểm tra thông tin chi tiết đơn hàng",
+        instruction=prompt.ORDER_AGENT_INSTR,
+        tools=[order_status_check, get_memory],
+        output_key="order_details"
+    )
+
+    payment_details_agent = Agent(
+        model=get_model(),
+        name="payment_details_agent",
+        description="Kiểm tra thông tin thanh toán đơn hàng",
+        instruction=prompt.ORDER_AGENT_INSTR,
+        tools=[payment_status_check, get_memory],
+        output_key="payment_details"
+    )
+
+    delivery_details_agent = Agent(
+        model=get_model(),
+        name="delivery_details_agent",
+        description="Kiểm tra thông tin giao hàng",
+        instruction=prompt.ORDER_AGENT_INSTR,
+        tools=[delivery_status_check, get_memory],
+        output_key="delivery_details"
+    )
+
+    parallel_check_agent = ParallelAgent(
+        name="parallel_check_agent",
+        description="Chạy song song các agent kiểm tra thông tin đơn hàng",
+        sub_agents=[
+            order_details_agent,
+            payment_details_agent,
+            delivery_details_agent
+        ]
+    )
+
+    summary_agent = Agent(
+        model=get_model(),
+        name="summary_agent",
+        description="Tổng hợp thông tin đơn hàng từ các agent kiểm tra",
+        instruction=SUMMARY_AGENT_INSTR,
+        tools=[memorize, get_memory],
+    )
+
+    order_flow_agent = SequentialAgent(
+        name="order_flow_agent",
+        description="Điều phối quá trình kiểm tra và tổng hợp thông tin đơn hàng",
+        sub_agents=[
+            parallel_check_agent,  # Chạy song song các agent kiểm tra
+            summary_agent          # Tổng hợp kết quả
+        ]
+    )
+
+    return Agent(
+        model=get_model(),
+        name="cng_agent",
+        description="CnG (Click and Get) Agent cho MM A2A Ecommerce Chatbot",
+        instruction=prompt.CNG_AGENT_INSTR,
+        sub_agents=[
+            cart_retry_agent,   # Sử dụng agent retry thay vì cart_manager trực tiếp
+            product_agent,
+            order_flow_agent
+        ],
+        tools=[
+            login,
+            login_with_mcard,
+            memorize,
+            get_memory,
+            AgentTool(agent=order_details_agent),  # Cho phép gọi trực tiếp các agent con nếu cần
+            AgentTool(agent=payment_details_agent),
+            AgentTool(agent=delivery_details_agent)
+        ],
+    )
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho việc bỏ qua kết quả tìm kiếm đã bị tìm kiếm mới hơn ghi đè (theo từng phiên)
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from mm_a2a.sub_agents.cng import agent
+from mm_a2a.tools.api_client.request_context import SESSION_ID_KEY
+
+
+class _SlowClient:
+    """Client giả: mỗi truy vấn chờ đến khi được giải phóng."""
+
+    def __init__(self):
+        self.pending = {}
+
+    async def search_products(self, query, page_size, current_page, scope):
+        self.pending[query] = asyncio.get_running_loop().create_future()
+        await self.pending[query]
+        return {"success": True, "query": query}
+
+
+def _tool_context(session_id):
+    return SimpleNamespace(state={SESSION_ID_KEY: session_id})
+
+
+def test_search_is_superseded_only_within_its_session(monkeypatch):
+    client = _SlowClient()
+    monkeypatch.setattr(agent, "api_client", client)
+
+    async def scenario():
+        old = asyncio.ensure_future(agent.search_products("sua", tool_context=_tool_context("a")))
+        other = asyncio.ensure_future(agent.search_products("banh", tool_context=_tool_context("b")))
+        await asyncio.sleep(0)
+        newer = asyncio.ensure_future(agent.search_products("sua tuoi", tool_context=_tool_context("a")))
+        await asyncio.sleep(0)
+        for future in client.pending.values():
+            future.set_result(None)
+        return await old, await other, await newer
+
+    old, other, newer = asyncio.run(scenario())
+    assert old["code"] == "SEARCH_SUPERSEDED"
+    assert other == {"success": True, "query": "banh"}
+    assert newer == {"success": True, "query": "sua tuoi"}
+    assert agent._latest_queries == {}
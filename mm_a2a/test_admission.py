@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho kiểm soát tải lượt chat (giới hạn đồng thời, hàng đợi có hạn chờ, giới hạn theo người dùng)
+"""
+
+import asyncio
+
+import pytest
+
+from mm_a2a.admission import AdmissionController, AdmissionRejected
+
+
+def test_queue_admits_in_order_and_sheds_when_full():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue=1, queue_timeout=5, max_per_user=0)
+        first = await controller.acquire("a")
+        waiting = asyncio.ensure_future(controller.acquire("b"))
+        await asyncio.sleep(0)
+        assert controller.stats()["queued"] == 1
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("c")
+        assert rejected.value.reason == "queue_full"
+        assert rejected.value.retry_after >= controller.retry_after
+
+        first.release()
+        first.release()
+        second = await waiting
+        stats = controller.stats()
+        assert (stats["in_flight"], stats["queued"], stats["admitted"]) == (1, 0, 2)
+        second.release()
+        assert controller.stats()["in_flight"] == 0
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["shed"]["queue_full"] == 1 and stats["shed_total"] == 1
+
+
+def test_per_user_limit_counts_running_and_queued():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue=4, queue_timeout=5, max_per_user=2)
+        first = await controller.acquire("u")
+        waiting = asyncio.ensure_future(controller.acquire("u"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("u")
+        assert rejected.value.reason == "user_limit"
+        # Người dùng khác và request không có user_id không bị ảnh hưởng
+        other = asyncio.ensure_future(controller.acquire("v"))
+        anonymous = asyncio.ensure_future(controller.acquire(None))
+        await asyncio.sleep(0)
+        first.release()
+        (await waiting).release()
+        (await other).release()
+        (await anonymous).release()
+        assert controller.stats()["users"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_timeout_and_deadline_rejection():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue=4, queue_timeout=0.05, max_per_user=0)
+        first = await controller.acquire("a")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("b")
+        assert rejected.value.reason == "timeout"
+        assert controller.stats()["queued"] == 0
+
+        # Sau một lượt 0.1 giây, thời gian chờ ước tính vượt hạn chờ: từ chối ngay
+        await asyncio.sleep(0.1)
+        first.release()
+        busy = await controller.acquire("a")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("b")
+        assert rejected.value.reason == "deadline"
+        busy.release()
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["shed"]["timeout"] == 1 and stats["shed"]["deadline"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_detached_ticket_is_released_by_turn():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue=0)
+        ticket = await controller.acquire("a")
+        release = ticket.detach()
+        ticket.release()
+        assert controller.stats()["in_flight"] == 1
+        release()
+        assert controller.stats()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_disabled_never_rejects():
+    async def scenario():
+        controller = AdmissionController(max_inflight=1, max_queue=0, max_per_user=1, enabled=False)
+        tickets = [await controller.acquire("a") for _ in range(3)]
+        assert controller.stats()["in_flight"] == 3
+        for ticket in tickets:
+            ticket.release()
+
+    asyncio.run(scenario())
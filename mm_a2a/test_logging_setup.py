@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho pipeline logging (định dạng lười, cắt payload, lấy mẫu, hàng đợi không chặn)
+"""
+
+import logging
+import queue
+
+from mm_a2a.logging_setup import LogSampler, _DroppingQueueHandler, capped
+
+
+class _Payload:
+    """Payload đếm số lần bị chuyển thành chuỗi."""
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return "x" * 1000
+
+
+def _logger(handler, level=logging.INFO):
+    logger = logging.getLogger(f"test_logging_setup.{id(handler)}")
+    logger.propagate = False
+    logger.setLevel(level)
+    logger.addHandler(handler)
+    return logger
+
+
+def test_capped_is_lazy_and_truncated():
+    log_queue = queue.Queue()
+    logger = _logger(_DroppingQueueHandler(log_queue, max_message=4000))
+    payload = _Payload()
+
+    logger.debug("Profile: %s", capped(payload, 10))
+    assert payload.formatted == 0
+    assert log_queue.empty()
+
+    logger.info("Profile: %s", capped(payload, 10))
+    record = log_queue.get_nowait()
+    assert payload.formatted == 1
+    assert record.getMessage() == "Profile: xxxxxxxxxx... (+990 ký tự)"
+    assert str(capped({"name": "Nguyễn"})) == '{"name": "Nguyễn"}'
+
+
+def test_queue_handler_caps_messages_and_drops_when_full():
+    log_queue = queue.Queue(maxsize=2)
+    handler = _DroppingQueueHandler(log_queue, max_message=20)
+    logger = _logger(handler)
+    for index in range(5):
+        logger.info("%d %s", index, "y" * 100)
+
+    assert handler.dropped == 3
+    first = log_queue.get_nowait()
+    assert first.args is None
+    assert first.getMessage().startswith("0 " + "y" * 18 + "...")
+
+
+def test_sampler():
+    sampler = LogSampler(3)
+    assert [sampler.should_log() for _ in range(7)] == [True, False, False, True, False, False, True]
+    assert not any(LogSampler(0).should_log() for _ in range(3))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho chỉ số Prometheus (định dạng xuất, histogram, giới hạn số chuỗi nhãn)
+"""
+
+from mm_a2a.metrics import OVERFLOW, MetricsRegistry, WorkerMetrics, flatten_stats
+from mm_a2a.shared_state import SharedMapping, SharedStore
+
+
+def test_render_counter_and_histogram():
+    registry = MetricsRegistry()
+    requests = registry.counter("mm_test_requests_total", "Số request", ("route", "status"))
+    latency = registry.histogram("mm_test_seconds", "Độ trễ", ("route",), buckets=(0.1, 1.0))
+    requests.inc(route="/api/chat", status="200")
+    requests.inc(2, route="/api/chat", status="200")
+    latency.observe(0.05, route="/api/chat")
+    latency.observe(0.5, route="/api/chat")
+    latency.observe(3.0, route="/api/chat")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE mm_test_requests_total counter" in lines
+    assert 'mm_test_requests_total{route="/api/chat",status="200"} 3' in lines
+    assert 'mm_test_seconds_bucket{route="/api/chat",le="0.1"} 1' in lines
+    assert 'mm_test_seconds_bucket{route="/api/chat",le="1"} 2' in lines
+    assert 'mm_test_seconds_bucket{route="/api/chat",le="+Inf"} 3' in lines
+    assert 'mm_test_seconds_count{route="/api/chat"} 3' in lines
+    assert 'mm_test_seconds_sum{route="/api/chat"} 3.55' in lines
+
+
+def test_label_cardinality_is_capped():
+    registry = MetricsRegistry(max_series=3)
+    errors = registry.counter("mm_test_errors_total", "Lỗi", ("code",))
+    for code in ("A", "B", "C", "D", "E", "A"):
+        errors.inc(code=code)
+
+    samples = {labels["code"]: value for _, labels, value in errors.samples()}
+    assert samples == {"A": 2, "B": 1, "C": 1, OVERFLOW: 2}
+    assert registry.dropped == 2
+    assert "mm_metrics_series_dropped_total 2" in registry.render().splitlines()
+
+
+def test_collectors_and_disabled_registry():
+    registry = MetricsRegistry(max_series=2, enabled=False)
+    gauge = registry.gauge("mm_test_streams", "Luồng")
+    gauge.inc()
+    registry.register_collector(lambda: [("mm_test_stat", "gauge", "Thống kê", [
+        ("mm_test_stat", {"stat": name}, value)
+        for name, value in flatten_stats({"cache": {"hits": 4, "enabled": True, "name": "x"}, "size": 2}).items()
+    ])])
+
+    lines = registry.render().splitlines()
+    assert not any(line.startswith("mm_test_streams ") for line in lines)
+    assert 'mm_test_stat{stat="cache.hits"} 4' in lines
+    assert 'mm_test_stat{stat="cache.enabled"} 1' in lines
+    assert not any('stat="size"' in line for line in lines)
+
+
+def test_every_worker_is_exported_with_pid(tmp_path):
+    path = str(tmp_path / "state.db")
+    workers = []
+    for pid, count in ((101, 2), (102, 5)):
+        registry = MetricsRegistry()
+        registry.counter("mm_test_turns_total", "Lượt chat").inc(count)
+        workers.append(WorkerMetrics(registry, SharedMapping(SharedStore(path), "metrics"), pid=pid))
+    workers[1].publish()
+
+    lines = workers[0].render().splitlines()
+    assert lines.count("# TYPE mm_test_turns_total counter") == 1
+    assert 'mm_test_turns_total{pid="101"} 2' in lines
+    assert 'mm_test_turns_total{pid="102"} 5' in lines
+
+    # Worker đã dừng không còn được xuất
+    workers[1].retire()
+    assert not any('pid="102"' in line for line in workers[0].render().splitlines())
@@ -0,0 +1,123 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho trạng thái dùng chung giữa các worker (hai `SharedStore` trên cùng file SQLite
+đóng vai hai worker)
+"""
+
+import os
+import stat
+
+from mm_a2a import shared_state
+from mm_a2a.shared_state import SharedMapping, SharedStore
+from mm_a2a.tools.api_client.customer_profile import CustomerProfileCache
+from mm_a2a.tools.api_client.request_context import SessionContexts
+from mm_a2a.tools.api_client.token_manager import AuthTokenManager
+
+
+def _workers(tmp_path, namespace):
+    path = str(tmp_path / "state.db")
+    return SharedMapping(SharedStore(path), namespace), SharedMapping(SharedStore(path), namespace)
+
+
+def test_shared_mapping_round_trip(tmp_path):
+    first, second = _workers(tmp_path, "session_data")
+    first["s1"] = {"cart_id": "c1", "tên": "Sữa"}
+    first["s2"] = {"cart_id": "c2"}
+
+    assert second["s1"] == {"cart_id": "c1", "tên": "Sữa"}
+    assert "s2" in second and "s3" not in second
+    assert len(second) == 2 and sorted(second) == ["s1", "s2"]
+    assert second.get("s3", {}) == {}
+
+    second["s1"] = {"cart_id": "c9"}
+    del second["s2"]
+    assert first["s1"] == {"cart_id": "c9"}
+    assert first.values() == [{"cart_id": "c9"}]
+    # Namespace khác không thấy dữ liệu
+    assert len(SharedMapping(first.store, "memory")) == 0
+
+
+def test_prune_removes_stale_entries(tmp_path):
+    first, _ = _workers(tmp_path, "memory")
+    first["k"] = "v"
+    assert first.store.prune(3600) == 0
+    assert first.store.prune(-1) == 1
+    assert "k" not in first
+    assert first.store.check()
+
+
+def test_token_snapshot_restore():
+    tokens = AuthTokenManager()
+    tokens.set("tok", lifetime=3600)
+    tokens.customer_key = ("default", "a@b.c")
+
+    restored = AuthTokenManager()
+    restored.restore(tokens.snapshot())
+    assert restored.token == "tok"
+    assert restored.customer_key == ("default", "a@b.c")
+    assert 3590 < restored.remaining() <= 3600
+
+    restored.restore(AuthTokenManager().snapshot())
+    assert restored.token is None and restored.customer_key is None
+
+
+def test_session_context_follows_session_across_workers(tmp_path):
+    first_shared, second_shared = _workers(tmp_path, "session_contexts")
+    first = SessionContexts(shared=first_shared)
+    second = SessionContexts(shared=second_shared)
+
+    # Lượt 1 ở worker 1: đăng nhập tại cửa hàng khác và tạo giỏ hàng
+    context = first.sync("s1")
+    context.store_code = "b2c_10010"
+    context.cart_id = "cart-1"
+    context.tokens.set("tok", lifetime=3600)
+    first.save("s1")
+
+    # Lượt 2 ở worker 2
+    other = second.sync("s1")
+    assert (other.store_code, other.cart_id, other.tokens.token) == ("b2c_10010", "cart-1", "tok")
+    other.cart_id = "cart-2"
+    second.save("s1")
+
+    # Lượt 3 quay lại worker 1: nạp bản mới hơn, không nạp lại khi không đổi
+    assert first.sync("s1").cart_id == "cart-2"
+    assert first.sync("s1").cart_id == "cart-2"
+    assert first.stats()["restored"] == 1
+    assert second.stats()["restored"] == 1
+
+
+def test_state_file_is_private_and_tokens_are_encrypted(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_state.Config, "SHARED_STATE_KEY", shared_state.generate_key())
+    monkeypatch.setattr(shared_state, "_fernet", None)
+    first_shared, second_shared = _workers(tmp_path, "session_contexts")
+    assert stat.S_IMODE(os.stat(tmp_path / "state.db").st_mode) == 0o600
+
+    first = SessionContexts(shared=first_shared)
+    first.sync("s1").tokens.set("secret-token", lifetime=3600)
+    first.save("s1")
+    assert "secret-token" not in first_shared["s1"]["tokens"]["token"]
+    assert SessionContexts(shared=second_shared).sync("s1").tokens.token == "secret-token"
+
+    # Khóa đổi (toàn bộ server khởi động lại): token cũ không dùng được, phải đăng nhập lại
+    monkeypatch.setattr(shared_state.Config, "SHARED_STATE_KEY", shared_state.generate_key())
+    monkeypatch.setattr(shared_state, "_fernet", None)
+    restarted = SessionContexts(shared=second_shared).sync("s1")
+    assert restarted.tokens.token is None and not restarted.tokens.is_authenticated()
+
+
+def test_customer_profile_shared_by_session(tmp_path):
+    async def fetcher(base_url, store_code, token):
+        return None
+
+    first_shared, second_shared = _workers(tmp_path, "customer_sessions")
+    first = CustomerProfileCache(fetcher, shared=first_shared)
+    second = CustomerProfileCache(fetcher, shared=second_shared)
+    customer = {"email": "a@b.c", "firstname": "An"}
+    first.store(customer, "http://api", "default", AuthTokenManager())
+    first.bind_session("s1", "default", "a@b.c")
+
+    assert second.for_session("s1") == customer
+    assert second.for_session("s2") is None
+    assert second.stats()["shared_hits"] == 1
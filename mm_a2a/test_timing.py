@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho phân rã độ trễ của lượt chat (giai đoạn, gọi LLM, công cụ kèm GraphQL)
+"""
+
+import time
+
+from google.adk.agents import Agent
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from mm_a2a.models.scripted import ScriptedLlm
+from mm_a2a.timing import TurnTiming, instrument_agents, record_graphql
+from mm_a2a.tracing import run_turn
+
+SCRIPT = {"agents": {
+    "router": [{"steps": [{"transfer": "shop"}]}],
+    "shop": [{"steps": [{"call": "search", "args": {"query": "$message"}}, {"text": "Xong"}]}]
+}}
+
+
+def _runner():
+    def search(query: str):
+        record_graphql("ProductSearch", time.perf_counter(), True)
+        return {"success": True, "items": []}
+
+    model = ScriptedLlm(script=SCRIPT)
+    shop = Agent(name="shop", model=model, instruction="shop", tools=[search])
+    router = Agent(name="router", model=model, instruction="router", sub_agents=[shop])
+    assert instrument_agents(router) == 2
+    sessions = InMemorySessionService()
+    sessions.create_session(app_name="test", user_id="u", session_id="s")
+    return Runner(agent=router, app_name="test", session_service=sessions)
+
+
+def test_turn_breakdown():
+    runner = _runner()
+    timing = TurnTiming()
+    timing.mark("context_prep")
+    content = types.Content(role="user", parts=[types.Part(text="sữa tươi")])
+    events = list(run_turn(runner, user_id="u", session_id="s", new_message=content, timing=timing))
+    timing.mark("agent")
+    assert events[-1].content.parts[0].text == "Xong"
+
+    result = timing.to_dict()
+    assert list(result["phases"]) == ["context_prep", "agent"]
+    assert [call["agent"] for call in result["llm_calls"]] == ["router", "shop", "shop"]
+    assert all(call["output_tokens"] > 0 and call["prompt_tokens"] > 0 for call in result["llm_calls"])
+    assert result["tokens"]["output"] == sum(call["output_tokens"] for call in result["llm_calls"])
+    search = [tool for tool in result["tool_calls"] if tool["name"] == "search"][0]
+    assert search["agent"] == "shop"
+    assert search["success"] is True
+    assert [query["operation"] for query in search["graphql"]] == ["ProductSearch"]
+    assert result["graphql"] == []
+
+
+def test_no_timing_when_not_requested():
+    runner = _runner()
+    content = types.Content(role="user", parts=[types.Part(text="sữa")])
+    events = list(run_turn(runner, user_id="u", session_id="s", new_message=content))
+    assert events[-1].content.parts[0].text == "Xong"
+    # Ghi GraphQL ngoài lượt chat có timing là no-op
+    record_graphql("ProductSearch", time.perf_counter(), True)
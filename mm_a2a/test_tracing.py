@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho tracing (span GraphQL theo operation, cây span của một lượt chat, exporter file)
+"""
+
+import asyncio
+import json
+
+from google.adk.agents import Agent
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+from mm_a2a.models.scripted import ScriptedLlm
+from mm_a2a.tools.api_client.base import APIClientBase, graphql_operation
+from mm_a2a.tracing import JsonLinesSpanExporter, TracingMiddleware, record_cache, run_turn, tracer
+
+# Provider toàn cục chỉ đặt được một lần mỗi tiến trình; xuất đồng bộ để đọc span ngay
+_exporter = InMemorySpanExporter()
+_provider = TracerProvider()
+_provider.add_span_processor(SimpleSpanProcessor(_exporter))
+trace.set_tracer_provider(_provider)
+
+
+def _finished():
+    return {span.name: span for span in _exporter.get_finished_spans()}
+
+
+def test_graphql_operation_names():
+    assert graphql_operation("query SearchProducts($q: String) { products { total_count } }") == \
+        ("SearchProducts", "query")
+    assert graphql_operation("mutation { addProductsToCart(cartId: $c) { cart { id } } }") == \
+        ("addProductsToCart", "mutation")
+    assert graphql_operation("{ cart: customerCart { id } }") == ("customerCart", "query")
+
+
+def test_graphql_span_named_by_operation(fake_session):
+    _exporter.clear()
+
+    async def run(body):
+        api = APIClientBase("http://mock", 5)
+        api.set_store_code("b2c_10010_vi")
+        api._session = fake_session(body=body)
+        return await api.execute_graphql("query StoreConfig { storeConfig { store_code } }")
+
+    body = {"data": {"storeConfig": {}}}
+    assert asyncio.run(run(body))["success"]
+    asyncio.run(run({"errors": [{"message": "x", "extensions": {"category": "graphql-input"}}]}))
+
+    ok, failed = _exporter.get_finished_spans()
+    assert ok.name == failed.name == "graphql StoreConfig"
+    assert ok.attributes["graphql.operation.type"] == "query"
+    assert ok.attributes["mm.store_code"] == "b2c_10010_vi"
+    assert ok.attributes["http.request.body.size"] > 0
+    assert ok.attributes["http.response.body.size"] == len(json.dumps(body))
+    assert ok.attributes["mm.success"] is True
+    assert failed.attributes["mm.error_code"] == "graphql-input"
+    assert not failed.status.is_ok
+
+
+def test_turn_spans_nest_agent_and_tool_spans():
+    _exporter.clear()
+
+    def search(query: str):
+        record_cache("product_search", False)
+        return {"items": []}
+
+    script = {"agents": {
+        "router": [{"steps": [{"transfer": "shop"}]}],
+        "shop": [{"steps": [{"call": "search", "args": {"query": "$message"}}, {"text": "Xong"}]}]
+    }}
+    model = ScriptedLlm(script=script)
+    shop = Agent(name="shop", model=model, instruction="shop", tools=[search])
+    router = Agent(name="router", model=model, instruction="router", sub_agents=[shop])
+    sessions = InMemorySessionService()
+    sessions.create_session(app_name="test", user_id="u", session_id="s")
+    runner = Runner(agent=router, app_name="test", session_service=sessions)
+    content = types.Content(role="user", parts=[types.Part(text="sữa")])
+
+    with tracer.start_as_current_span("request"):
+        events = list(run_turn(runner, user_id="u", session_id="s", new_message=content, store_code="b2c_1"))
+    assert events[-1].content.parts[0].text == "Xong"
+
+    spans = _finished()
+    turn = spans["chat_turn"]
+    assert turn.parent.span_id == spans["request"].context.span_id
+    assert turn.attributes["mm.store_code"] == "b2c_1"
+    assert turn.attributes["mm.events"] == len(events)
+    for name in ("agent_run [router]", "agent_run [shop]", "tool_call [search]"):
+        assert spans[name].context.trace_id == turn.context.trace_id
+    assert spans["tool_call [search]"].attributes["mm.cache.product_search"] == "miss"
+
+
+def test_http_span_named_by_route():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    app = FastAPI()
+
+    @app.get("/api/session/{session_id}")
+    async def get_session(session_id: str):
+        return {"id": session_id}
+
+    app.add_middleware(TracingMiddleware)
+    _exporter.clear()
+    assert TestClient(app).get("/api/session/abc-123").status_code == 200
+
+    span = _finished()["HTTP GET /api/session/{session_id}"]
+    assert span.attributes["http.route"] == "/api/session/{session_id}"
+    assert span.attributes["url.path"] == "/api/session/abc-123"
+    assert span.attributes["http.response.status_code"] == 200
+
+
+def test_json_lines_exporter(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    provider = TracerProvider()
+    exporter = JsonLinesSpanExporter(str(path))
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    with provider.get_tracer("test").start_as_current_span("graphql products", attributes={"mm.store_code": "b2c"}):
+        pass
+    provider.shutdown()
+
+    (line,) = path.read_text(encoding="utf-8").splitlines()
+    span = json.loads(line)
+    assert span["name"] == "graphql products"
+    assert span["attributes"]["mm.store_code"] == "b2c"
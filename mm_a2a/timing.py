@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Phân rã độ trễ của một lượt chat (`ChatRequest.include_timing`).
+
+`TurnTiming` ghi các giai đoạn của endpoint theo mốc (`mark`): chuẩn bị ngữ cảnh, chạy agent,
+xử lý hậu kỳ, lưu phiên. Trong lúc chạy agent, timing được gắn vào ngữ cảnh của lượt
+(`use_timing` trong `run_turn_async`) và được ghi bởi:
+- callback model của từng agent (`instrument_agents`): mỗi lần gọi LLM, kèm số token
+- callback công cụ: mỗi lần gọi công cụ, kèm các truy vấn GraphQL bên trong
+- `APIClientBase.execute_graphql` (`record_graphql`): thời gian từng operation
+
+Khi lượt chat không yêu cầu timing, các callback chỉ đọc một contextvar rồi trả về.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+_current_timing: contextvars.ContextVar[Optional["TurnTiming"]] = contextvars.ContextVar(
+    "mm_turn_timing", default=None
+)
+_current_tool: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "mm_turn_tool", default=None
+)
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+def _usage(llm_response) -> Dict[str, Optional[int]]:
+    """Số token của một phản hồi LLM (usage_metadata nếu ADK cung cấp, nếu không thì custom_metadata["usage"])."""
+    usage = getattr(llm_response, "usage_metadata", None)
+    if usage is not None:
+        return {
+            "prompt_tokens": getattr(usage, "prompt_token_count", None),
+            "output_tokens": getattr(usage, "candidates_token_count", None)
+        }
+    usage = (getattr(llm_response, "custom_metadata", None) or {}).get("usage") or {}
+    return {"prompt_tokens": usage.get("prompt_tokens"), "output_tokens": usage.get("output_tokens")}
+
+
+class TurnTiming:
+    """
+    Thời gian các bước của một lượt chat.
+
+    Các mốc thời gian (`start_ms`) tính từ lúc tạo đối tượng, nên các lần gọi LLM, công cụ và
+    GraphQL xếp được thành biểu đồ thác nước.
+    """
+
+    def __init__(self):
+        self._started = time.perf_counter()
+        self._last_mark = self._started
+        self.phases: Dict[str, float] = {}
+        self.llm_calls: List[Dict[str, Any]] = []
+        self.tool_calls: List[Dict[str, Any]] = []
+        self.graphql: List[Dict[str, Any]] = []
+        self._pending_llm: Dict[Any, Dict[str, Any]] = {}
+
+    def _offset(self, moment: float) -> float:
+        return _ms(moment - self._started)
+
+    def mark(self, phase: str):
+        """Kết thúc giai đoạn `phase` (tính từ mốc trước đó)."""
+        now = time.perf_counter()
+        self.phases[phase] = round(self.phases.get(phase, 0.0) + _ms(now - self._last_mark), 2)
+        self._last_mark = now
+
+    def llm_started(self, key: Any, agent: str):
+        self._pending_llm[key] = {"agent": agent, "started": time.perf_counter()}
+
+    def llm_finished(self, key: Any, llm_response, partial: bool = False):
+        pending = self._pending_llm.get(key)
+        if pending is None:
+            return
+        now = time.perf_counter()
+        if partial:
+            pending.setdefault("first_chunk", now)
+            return
+        del self._pending_llm[key]
+        entry = {
+            "agent": pending["agent"],
+            "start_ms": self._offset(pending["started"]),
+            "duration_ms": _ms(now - pending["started"])
+        }
+        if "first_chunk" in pending:
+            entry["first_chunk_ms"] = _ms(pending["first_chunk"] - pending["started"])
+        entry.update(_usage(llm_response))
+        self.llm_calls.append(entry)
+
+    def tool_started(self, name: str, agent: str, parent: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        entry = {"name": name, "agent": agent, "started": time.perf_counter(), "graphql": [], "_parent": parent}
+        self.tool_calls.append(entry)
+        return entry
+
+    def tool_finished(self, entry: Dict[str, Any], response: Any):
+        entry["duration_ms"] = _ms(time.perf_counter() - entry["started"])
+        if isinstance(response, dict) and "success" in response:
+            entry["success"] = response["success"]
+
+    def add_graphql(self, operation: str, started: float, success: bool, code: Optional[str]):
+        entry = {
+            "operation": operation,
+            "start_ms": self._offset(started),
+            "duration_ms": _ms(time.perf_counter() - started),
+            "success": success
+        }
+        if code:
+            entry["code"] = code
+        tool = _current_tool.get()
+        (tool["graphql"] if tool is not None else self.graphql).append(entry)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Phân rã dạng JSON: giai đoạn, các lần gọi LLM, công cụ (kèm GraphQL) và GraphQL ngoài công cụ."""
+        tool_calls = []
+        for entry in list(self.tool_calls):
+            tool = {key: value for key, value in entry.items() if key not in ("started", "_parent")}
+            tool["start_ms"] = self._offset(entry["started"])
+            tool_calls.append(tool)
+        llm_calls = list(self.llm_calls)
+        return {
+            "total_ms": _ms(self._last_mark - self._started),
+            "phases": dict(self.phases),
+            "llm_calls": llm_calls,
+            "llm_ms": round(sum(call["duration_ms"] for call in llm_calls), 2),
+            "tokens": {
+                "prompt": sum(call.get("prompt_tokens") or 0 for call in llm_calls),
+                "output": sum(call.get("output_tokens") or 0 for call in llm_calls)
+            },
+            "tool_calls": tool_calls,
+            "tool_ms": round(sum(tool.get("duration_ms", 0.0) for tool in tool_calls), 2),
+            "graphql": list(self.graphql)
+        }
+
+
+def current_timing() -> Optional[TurnTiming]:
+    """Timing của lượt chat đang chạy (None nếu không được yêu cầu)."""
+    return _current_timing.get()
+
+
+@contextmanager
+def use_timing(timing: Optional[TurnTiming]) -> Iterator[Optional[TurnTiming]]:
+    """Gắn timing cho lượt chat trong khối `with`."""
+    token = _current_timing.set(timing)
+    try:
+        yield timing
+    finally:
+        _current_timing.reset(token)
+
+
+def record_graphql(operation: str, started: float, success: bool, code: Optional[str] = None):
+    """Ghi một truy vấn GraphQL (bắt đầu lúc `started`, theo `time.perf_counter`) vào timing hiện tại."""
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.add_graphql(operation, started, success, code)
+
+
+def _before_model(callback_context, llm_request):
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.llm_started((callback_context.invocation_id, callback_context.agent_name), callback_context.agent_name)
+    return None
+
+
+def _after_model(callback_context, llm_response):
+    timing = _current_timing.get()
+    if timing is not None:
+        timing.llm_finished(
+            (callback_context.invocation_id, callback_context.agent_name),
+            llm_response,
+            partial=bool(llm_response.partial)
+        )
+    return None
+
+
+def _before_tool(tool, args, tool_context):
+    timing = _current_timing.get()
+    if timing is not None:
+        _current_tool.set(timing.tool_started(tool.name, tool_context.agent_name, _current_tool.get()))
+    return None
+
+
+def _after_tool(tool, args, tool_context, tool_response):
+    timing = _current_timing.get()
+    entry = _current_tool.get()
+    if timing is not None and entry is not None:
+        timing.tool_finished(entry, tool_response)
+        # Công cụ lồng nhau (AgentTool): trả lại công cụ bao ngoài
+        _current_tool.set(entry["_parent"])
+    return None
+
+
+def _chain(first, second):
+    """Gọi callback đo thời gian rồi callback sẵn có của agent."""
+    if second is None:
+        return first
+
+    def callback(**kwargs):
+        first(**kwargs)
+        return second(**kwargs)
+    return callback
+
+
+def instrument_agents(agent) -> int:
+    """
+    Gắn callback đo thời gian vào mọi LlmAgent trong cây agent (kể cả agent dùng làm công cụ).
+
+    Args:
+        agent: Agent gốc.
+
+    Returns:
+        int: Số agent đã gắn callback.
+    """
+    from google.adk.agents import LlmAgent
+    from google.adk.tools.agent_tool import AgentTool
+
+    seen = set()
+    instrumented = 0
+    stack = [agent]
+    while stack:
+        node = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        stack.extend(node.sub_agents)
+        if isinstance(node, LlmAgent):
+            stack.extend(tool.agent for tool in node.tools if isinstance(tool, AgentTool))
+            node.before_model_callback = _chain(_before_model, node.before_model_callback)
+            node.after_model_callback = _chain(_after_model, node.after_model_callback)
+            node.before_tool_callback = _chain(_before_tool, node.before_tool_callback)
+            node.after_tool_callback = _chain(_after_tool, node.after_tool_callback)
+            instrumented += 1
+    return instrumented
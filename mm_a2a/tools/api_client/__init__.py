@@ -10,11 +10,16 @@ from .base import APIClientBase
 from .product import ProductAPI
 from .cart import CartAPI
 from .auth import AuthAPI
+from .models import PriceInfo, Product, CartItem, Cart
 
 __all__ = [
     'EcommerceAPIClient',
     'APIClientBase',
     'ProductAPI',
     'CartAPI',
-    'AuthAPI'
+    'AuthAPI',
+    'PriceInfo',
+    'Product',
+    'CartItem',
+    'Cart'
 ] 
\ No newline at end of file
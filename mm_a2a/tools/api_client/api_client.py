@@ -43,10 +43,10 @@ class EcommerceAPIClient(APIClientBase):
         from .cart import CartAPI
         from .auth import AuthAPI
         
-        # Tạo các instance của các module API
-        self._product_api = ProductAPI(base_url, timeout, loop)
-        self._cart_api = CartAPI(base_url, timeout, loop)
-        self._auth_api = AuthAPI(base_url, timeout, loop)
+        # Tạo các instance của các module API, dùng chung ngữ cảnh mặc định (cửa hàng, token, giỏ hàng)
+        self._product_api = ProductAPI(base_url, timeout, loop, context=self._default_context)
+        self._cart_api = CartAPI(base_url, timeout, loop, context=self._default_context)
+        self._auth_api = AuthAPI(base_url, timeout, loop, context=self._default_context)
     
     async def ensure_session(self):
         """Đảm bảo session được khởi tạo và đồng bộ giữa các API module."""
@@ -62,24 +62,10 @@ class EcommerceAPIClient(APIClientBase):
         await self._cart_api.close()
         await self._auth_api.close()
     
-    def set_auth_token(self, token: str):
-        """Đồng bộ token xác thực cho tất cả các API module."""
-        super().set_auth_token(token)
-        self._product_api.set_auth_token(token)
-        self._cart_api.set_auth_token(token)
-        self._auth_api.set_auth_token(token)
-    
-    def set_store_code(self, store_code: str):
-        """Đồng bộ mã cửa hàng cho tất cả các API module."""
-        super().set_store_code(store_code)
-        self._product_api.set_store_code(store_code)
-        self._cart_api.set_store_code(store_code)
-        self._auth_api.set_store_code(store_code)
-    
     # Định nghĩa lại các phương thức của các API module
     # Các phương thức Product API
-    async def search_products(self, query: str, page_size: int = 10, current_page: int = 1):
-        return await self._product_api.search_products(query, page_size, current_page)
+    async def search_products(self, query: str, page_size: int = 10, current_page: int = 1, scope: Optional[str] = None):
+        return await self._product_api.search_products(query, page_size, current_page, scope)
     
     async def get_product_by_sku(self, sku: str):
         return await self._product_api.get_product_by_sku(sku)
@@ -100,11 +86,14 @@ class EcommerceAPIClient(APIClientBase):
             self._cart_id = cart_result.get("cart_id")
         return cart_result
     
-    async def add_to_cart(self, cart_id=None, product_id=None, quantity=1, retry_count=3):
-        return await self._cart_api.add_to_cart(cart_id or self._cart_id, product_id, quantity, retry_count)
+    async def add_to_cart(self, cart_id=None, product_id=None, quantity=1, retry_count=3, idempotency_key=None):
+        return await self._cart_api.add_to_cart(cart_id or self._cart_id, product_id, quantity, retry_count, idempotency_key)
+    
+    async def add_items_to_cart(self, cart_id=None, items=None, idempotency_key=None):
+        return await self._cart_api.add_items_to_cart(cart_id or self._cart_id, items or [], idempotency_key)
     
-    async def get_cart_info(self, cart_id=None):
-        return await self._cart_api.get_cart_info(cart_id or self._cart_id)
+    async def get_cart_info(self, cart_id=None, mode="checkout"):
+        return await self._cart_api.get_cart_info(cart_id or self._cart_id, mode)
     
     async def update_cart_item(self, cart_id=None, cart_item_id=None, quantity=1):
         return await self._cart_api.update_cart_item(cart_id or self._cart_id, cart_item_id, quantity)
@@ -114,23 +103,12 @@ class EcommerceAPIClient(APIClientBase):
     
     # Các phương thức Auth API
     async def login(self, email, password):
-        login_result = await self._auth_api.login(email, password)
-        if login_result.get("success", False):
-            token = login_result.get("token")
-            if token:
-                self.set_auth_token(token)
-        return login_result
+        # Token được lưu vào ngữ cảnh request dùng chung bởi AuthAPI
+        return await self._auth_api.login(email, password)
     
     async def login_with_mcard(self, hash_value, store, cust_no, phone, cust_no_mm, cust_name):
-        login_result = await self._auth_api.login_with_mcard(hash_value, store, cust_no, phone, cust_no_mm, cust_name)
-        if login_result.get("success", False):
-            token = login_result.get("token")
-            store_view_code = login_result.get("store_view_code")
-            if token:
-                self.set_auth_token(token)
-            if store_view_code:
-                self.set_store_code(store_view_code)
-        return login_result
+        # Mã cửa hàng trả về được lưu vào ngữ cảnh request dùng chung bởi AuthAPI
+        return await self._auth_api.login_with_mcard(hash_value, store, cust_no, phone, cust_no_mm, cust_name)
     
     async def create_customer_from_mcard(self, email, firstname, lastname="", phone="", customer_no="", mcard_no=""):
         return await self._auth_api.create_customer_from_mcard(email, firstname, lastname, phone, customer_no, mcard_no)
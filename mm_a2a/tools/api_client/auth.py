@@ -6,9 +6,13 @@ API module cho các thao tác liên quan đến xác thực và tài khoản
 """
 
 import logging
-from typing import Dict, Any
+from typing import Any, Awaitable, Callable, Dict, Optional
 
 from .base import APIClientBase
+from .customer_profile import get_customer_profiles
+from .idempotency import get_mutation_ledger, make_idempotency_key
+from .token_manager import cache_token_lifetime, get_cached_token_lifetime
+from mm_a2a.tracing import record_cache
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +21,44 @@ class AuthAPI(APIClientBase):
     API Client cho các thao tác liên quan đến xác thực và tài khoản.
     """
     
+    async def _token_lifetime(self) -> Optional[float]:
+        """Thời gian sống token của cửa hàng hiện tại (giây), cache theo cửa hàng."""
+        lifetime = get_cached_token_lifetime(self.base_url, self._store_code)
+        if lifetime is None:
+            result = await self.get_token_lifetime()
+            if result.get("success", False):
+                lifetime = float(result["lifetime_hours"]) * 3600
+                cache_token_lifetime(self.base_url, self._store_code, lifetime)
+        return lifetime
+    
+    async def _issue_token(self, token: str, relogin: Optional[Callable[[], Awaitable[bool]]] = None):
+        """Lưu token mới cấp vào token manager dùng chung, kèm thời gian sống và cách đăng nhập lại."""
+        self._tokens.set(token, relogin=relogin)
+        lifetime = await self._token_lifetime()
+        if lifetime:
+            self._tokens.set_lifetime(lifetime)
+    
+    async def _load_profile(self) -> Optional[Dict[str, Any]]:
+        """Nạp hồ sơ khách hàng vừa đăng nhập vào cache hồ sơ (lỗi không làm hỏng lần đăng nhập)."""
+        result = await self.fetch_customer_info()
+        if not result.get("success", False):
+            logger.warning(f"Không nạp được hồ sơ khách hàng sau khi đăng nhập: {result.get('message')}")
+            return None
+        customer = result["data"]["customer"]
+        self._tokens.customer_key = get_customer_profiles().store(customer, self.base_url, self._store_code, self._tokens)
+        return customer
+    
+    async def _relogin_with(self, graphql_query: str, variables: Dict[str, Any], path: str, field: str) -> bool:
+        """Đăng nhập lại (làm mới token) bằng mutation của lần đăng nhập trước, không qua ledger."""
+        result = await self.execute_graphql(graphql_query, variables)
+        if not result.get("success", False):
+            return False
+        token = ((result.get("data") or {}).get(path) or {}).get(field)
+        if not token:
+            return False
+        await self._issue_token(token)
+        return True
+    
     async def login(self, email: str, password: str) -> Dict[str, Any]:
         """
         Đăng nhập vào hệ thống.
@@ -44,6 +86,7 @@ class AuthAPI(APIClientBase):
             "password": password
         }
         
+        # Không qua ledger mutation: đăng nhập lại sau khi token bị từ chối phải nhận token mới
         result = await self.execute_graphql(graphql_query, variables)
         
         if result.get("success", False):
@@ -51,13 +94,17 @@ class AuthAPI(APIClientBase):
             token = data.get("generateCustomerToken", {}).get("token")
             
             if token:
-                # Lưu token xác thực
-                self.set_auth_token(token)
+                # Lưu token xác thực, kèm cách đăng nhập lại khi token sắp hết hạn
+                await self._issue_token(
+                    token,
+                    lambda: self._relogin_with(graphql_query, variables, "generateCustomerToken", "token")
+                )
                 
                 return {
                     "success": True,
                     "message": "Đăng nhập thành công",
-                    "token": token
+                    "token": token,
+                    "customer": await self._load_profile()
                 }
             else:
                 return {
@@ -111,6 +158,7 @@ class AuthAPI(APIClientBase):
             }
         }
         
+        # Cấp token không phải mutation giỏ hàng: luôn gọi API (xem `login`)
         result = await self.execute_graphql(graphql_query, variables)
         
         if result.get("success", False):
@@ -120,15 +168,19 @@ class AuthAPI(APIClientBase):
             store_view_code = login_info.get("store_view_code")
             
             if token:
-                # Lưu token xác thực và mã cửa hàng
-                self.set_auth_token(token)
+                # Lưu mã cửa hàng và token xác thực (thời gian sống theo cửa hàng này)
                 self.set_store_code(store_view_code)
+                await self._issue_token(
+                    token,
+                    lambda: self._relogin_with(graphql_query, variables, "generateLoginMcardInfo", "customer_token")
+                )
                 
                 return {
                     "success": True,
                     "message": "Đăng nhập thành công",
                     "token": token,
-                    "store_view_code": store_view_code
+                    "store_view_code": store_view_code,
+                    "customer": await self._load_profile()
                 }
             elif login_info is not None:
                 # Trường hợp token là null nhưng có store_view_code - chưa có tài khoản
@@ -205,7 +257,11 @@ class AuthAPI(APIClientBase):
             }
         }
         
-        result = await self.execute_graphql(graphql_query, variables)
+        # Tạo tài khoản không idempotent: lần thử lại với cùng thông tin nhận kết quả đã ghi nhận
+        result = await get_mutation_ledger().run(
+            make_idempotency_key("create_customer_from_mcard", self.base_url, email, customer_no, mcard_no),
+            lambda: self.execute_graphql(graphql_query, variables)
+        )
         
         if result.get("success", False):
             data = result.get("data", {})
@@ -214,8 +270,8 @@ class AuthAPI(APIClientBase):
             customer = create_result.get("customer", {})
             
             if token:
-                # Lưu token xác thực
-                self.set_auth_token(token)
+                # Lưu token xác thực (không đăng nhập lại được bằng mutation tạo tài khoản)
+                await self._issue_token(token)
                 
                 return {
                     "success": True,
@@ -271,7 +327,34 @@ class AuthAPI(APIClientBase):
     
     async def get_customer_info(self) -> Dict[str, Any]:
         """
-        Lấy thông tin khách hàng hiện tại.
+        Lấy thông tin khách hàng hiện tại, ưu tiên cache hồ sơ nạp khi đăng nhập.
+        
+        Returns:
+            Dict[str, Any]: Thông tin khách hàng (`from_cache: True` nếu lấy từ cache).
+        """
+        if self._auth_token:
+            customer = get_customer_profiles().get(self._tokens.customer_key)
+            record_cache("customer_profile", customer is not None)
+            if customer is not None:
+                return {
+                    "success": True,
+                    "data": {
+                        "customer": customer
+                    },
+                    "message": "Lấy thông tin khách hàng thành công",
+                    "from_cache": True
+                }
+        
+        result = await self.fetch_customer_info()
+        if result.get("success", False) and self._auth_token:
+            self._tokens.customer_key = get_customer_profiles().store(
+                result["data"]["customer"], self.base_url, self._store_code, self._tokens
+            )
+        return result
+    
+    async def fetch_customer_info(self) -> Dict[str, Any]:
+        """
+        Lấy thông tin khách hàng hiện tại từ API (không qua cache).
         
         Returns:
             Dict[str, Any]: Thông tin khách hàng.
@@ -331,33 +414,26 @@ class AuthAPI(APIClientBase):
         """
         Kiểm tra trạng thái xác thực của người dùng.
         
+        Trạng thái được kiểm tra tại chỗ theo thời hạn của token (không gọi API); token
+        sắp hết hạn được làm mới trước khi trả lời. Token bị thu hồi phía server được
+        phát hiện ở request kế tiếp bị từ chối.
+        
         Returns:
             Dict[str, Any]: Kết quả kiểm tra.
         """
-        # Thử lấy thông tin khách hàng để kiểm tra token còn hiệu lực không
-        result = await self.get_customer_info()
+        if self._tokens.needs_refresh():
+            await self._tokens.ensure_fresh()
         
-        if result.get("success", False):
+        if self._tokens.is_authenticated():
             return {
                 "success": True,
                 "is_authenticated": True,
-                "message": "Người dùng đã đăng nhập"
+                "message": "Người dùng đã đăng nhập",
+                "expires_in": self._tokens.remaining()
             }
         
-        # Nếu có lỗi, kiểm tra loại lỗi
-        error_code = result.get("code", "")
-        if error_code in ["AUTHENTICATION_ERROR", "TOKEN_EXPIRED"]:
-            self.clear_auth_token()  # Xóa token nếu đã hết hạn
-            return {
-                "success": True,
-                "is_authenticated": False,
-                "message": "Người dùng chưa đăng nhập hoặc phiên đã hết hạn"
-            }
-        
-        # Lỗi khác
         return {
-            "success": False,
+            "success": True,
             "is_authenticated": False,
-            "message": result.get("message", "Lỗi kiểm tra trạng thái xác thực"),
-            "code": error_code
-        } 
\ No newline at end of file
+            "message": "Người dùng chưa đăng nhập hoặc phiên đã hết hạn"
+        }
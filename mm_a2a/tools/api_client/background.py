@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Event loop chạy nền dùng chung cho các tác vụ không chặn lượt chat
+(prefetch, làm mới cache...).
+
+ADK Runner chạy mỗi lượt chat trong một thread với event loop riêng và đóng loop
+đó khi lượt chat kết thúc, nên các tác vụ cần sống lâu hơn một lượt chat được
+chạy trên loop nền này.
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Coroutine, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoop:
+    """Event loop chạy trong một daemon thread riêng."""
+
+    def __init__(self, name: str = "mm-a2a-background"):
+        self._name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """Event loop nền, khởi động thread nếu chưa chạy."""
+        self._ensure_started()
+        return self._loop
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_forever()
+        finally:
+            self._loop.close()
+
+    def submit(self, coro: Coroutine[Any, Any, Any]) -> concurrent.futures.Future:
+        """
+        Đưa một coroutine vào chạy trên loop nền.
+
+        Args:
+            coro: Coroutine cần chạy.
+
+        Returns:
+            concurrent.futures.Future: Future có thể chờ hoặc hủy từ bất kỳ thread nào.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def stop(self):
+        """Dừng loop nền (dùng khi tắt ứng dụng hoặc trong kiểm thử); tác vụ còn dở bị hủy."""
+        with self._lock:
+            if self._loop is not None and self._thread is not None and self._thread.is_alive():
+                try:
+                    asyncio.run_coroutine_threadsafe(_cancel_pending(), self._loop).result(timeout=5)
+                except concurrent.futures.TimeoutError:
+                    logger.warning(f"Hết thời gian chờ hủy tác vụ của loop nền {self._name}")
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(timeout=5)
+            self._thread = None
+            self._loop = None
+
+
+async def _cancel_pending():
+    """Hủy và chờ các tác vụ còn dở của loop, để coroutine được đóng trước khi loop dừng."""
+    tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+_background_loop = BackgroundLoop()
+
+
+def get_background_loop() -> BackgroundLoop:
+    """Trả về loop nền dùng chung của tiến trình."""
+    return _background_loop
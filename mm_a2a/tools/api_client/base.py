@@ -5,27 +5,93 @@
 Lớp cơ sở cho API Client
 """
 
+import functools
 import logging
+import re
+import threading
+import time
+import weakref
 import aiohttp
 import asyncio
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, Optional, Tuple, Union
 from urllib.parse import urljoin
 
-from tenacity import retry, stop_after_attempt, wait_exponential
+from opentelemetry.trace import SpanKind, Status, StatusCode
+from tenacity import RetryCallState, retry, stop_after_attempt, wait_exponential
 from config import Config
+from mm_a2a.metrics import GRAPHQL_ERRORS, GRAPHQL_LATENCY, GRAPHQL_RETRIES
+from mm_a2a.timing import record_graphql
+from mm_a2a.tracing import payload_size, set_attributes, tracer
+from .request_context import RequestContext, current_context
+from .token_manager import AUTH_ERROR_CODES, AuthTokenManager
 
 logger = logging.getLogger(__name__)
 
+_MUTATION_PATTERN = re.compile(r"^\s*mutation\b")
+_OPERATION_PATTERN = re.compile(r"^\s*(query|mutation|subscription)\b\s*([A-Za-z_]\w*)?")
+_ROOT_FIELD_PATTERN = re.compile(r"\{\s*(?:[A-Za-z_]\w*\s*:\s*)?([A-Za-z_]\w*)")
+
+
+def is_mutation(query: str) -> bool:
+    """Kiểm tra truy vấn GraphQL có phải mutation hay không."""
+    return bool(_MUTATION_PATTERN.match(query or ""))
+
+
+@functools.lru_cache(maxsize=256)
+def graphql_operation(query: str) -> Tuple[str, str]:
+    """
+    Tên và loại operation của truy vấn GraphQL (dùng đặt tên span).
+    
+    Operation không đặt tên được gọi theo field gốc đầu tiên (ví dụ `{ storeConfig {...} }`
+    -> `storeConfig`).
+    
+    Returns:
+        Tuple[str, str]: (tên operation, loại: query/mutation/subscription).
+    """
+    match = _OPERATION_PATTERN.match(query or "")
+    operation_type = match.group(1) if match else "query"
+    name = match.group(2) if match else None
+    if not name:
+        field = _ROOT_FIELD_PATTERN.search(query or "")
+        name = field.group(1) if field else "anonymous"
+    return name, operation_type
+
+
+def _retry_reads_only(retry_state: RetryCallState) -> bool:
+    """
+    Điều kiện thử lại của `execute_graphql`: chỉ thử lại truy vấn đọc.
+    
+    Mutation gặp lỗi có thể đã được server áp dụng; gửi lại mù quáng sẽ áp dụng hai lần
+    (ví dụ nhân đôi số lượng trong giỏ hàng), nên việc thử lại mutation do nơi gọi
+    quyết định sau khi đối chiếu trạng thái.
+    """
+    if not retry_state.outcome.failed:
+        return False
+    query = retry_state.args[1] if len(retry_state.args) > 1 else retry_state.kwargs.get("query", "")
+    return not is_mutation(query)
+
+
+def _count_retry(retry_state: RetryCallState):
+    """Đếm lần thử lại của `execute_graphql` theo operation."""
+    query = retry_state.args[1] if len(retry_state.args) > 1 else retry_state.kwargs.get("query", "")
+    GRAPHQL_RETRIES.inc(operation=graphql_operation(query)[0])
+
 class APIClientBase:
     """
     Lớp cơ sở cho các API Client, cung cấp các phương thức chung.
+    
+    Mã cửa hàng, token và cart ID được đọc từ ngữ cảnh request đang gắn
+    (`request_context.use_context`), nếu không có thì từ ngữ cảnh mặc định của client,
+    nên một client có thể được dùng chung cho nhiều phiên/cửa hàng. Session HTTP được
+    tạo riêng cho từng event loop.
     """
     
     def __init__(
         self,
         base_url: str,
         timeout: Optional[Union[int, aiohttp.ClientTimeout]] = None,
-        loop: Optional[asyncio.AbstractEventLoop] = None
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        context: Optional[RequestContext] = None
     ):
         """
         Khởi tạo API client cơ sở.
@@ -34,6 +100,8 @@ class APIClientBase:
             base_url: URL cơ sở của API.
             timeout: Timeout cho requests, có thể là số giây hoặc ClientTimeout object.
             loop: Event loop tùy chọn, mặc định sẽ lấy loop hiện tại.
+            context: Ngữ cảnh mặc định khi không có ngữ cảnh request nào được gắn
+                (dùng chung giữa các module của một client; mặc định tạo mới).
         """
         self.base_url = base_url.rstrip("/")
         
@@ -44,11 +112,55 @@ class APIClientBase:
         else:
             self.timeout = aiohttp.ClientTimeout(total=30)  # Default 30s
             
-        self._session = None
-        self._loop = loop or asyncio.get_event_loop()
-        self._auth_token = None
-        self._store_code = Config.STORE_CODE
-        self._cart_id = None  # Thêm _cart_id vào lớp cơ sở để tránh vòng lặp import
+        # event loop -> session HTTP của loop đó
+        self._sessions: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.ClientSession]" = weakref.WeakKeyDictionary()
+        self._sessions_lock = threading.Lock()
+        self._loop = loop
+        self._default_context = context or RequestContext()
+    
+    @property
+    def _context(self) -> RequestContext:
+        """Ngữ cảnh request của lần gọi hiện tại."""
+        return current_context() or self._default_context
+    
+    @property
+    def _store_code(self) -> str:
+        return self._context.store_code
+    
+    @_store_code.setter
+    def _store_code(self, store_code: str):
+        self._context.store_code = store_code
+    
+    @property
+    def _tokens(self) -> AuthTokenManager:
+        return self._context.tokens
+    
+    @property
+    def _cart_id(self) -> Optional[str]:
+        return self._context.cart_id
+    
+    @_cart_id.setter
+    def _cart_id(self, cart_id: Optional[str]):
+        self._context.cart_id = cart_id
+    
+    @property
+    def _session(self) -> Optional[aiohttp.ClientSession]:
+        """Session HTTP của event loop đang chạy (None nếu chưa có)."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        with self._sessions_lock:
+            return self._sessions.get(loop)
+    
+    @_session.setter
+    def _session(self, session: Optional[aiohttp.ClientSession]):
+        loop = asyncio.get_running_loop()
+        with self._sessions_lock:
+            if session is None:
+                self._sessions.pop(loop, None)
+            else:
+                self._sessions[loop] = session
     
     async def create_session(self) -> aiohttp.ClientSession:
         """
@@ -58,17 +170,17 @@ class APIClientBase:
             aiohttp.ClientSession: Session mới được tạo.
         """
         try:
-            # Kiểm tra và lấy event loop hiện tại
+            # Kiểm tra và lấy event loop hiện tại (biến cục bộ: client có thể được dùng từ nhiều thread)
             try:
-                self._loop = asyncio.get_running_loop()
+                loop = asyncio.get_running_loop()
             except RuntimeError:
                 # Nếu không có loop đang chạy, tạo loop mới
-                self._loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(self._loop)
+                loop = asyncio.new_event_loop()
+                asyncio.set_event_loop(loop)
                 
             session = aiohttp.ClientSession(
                 timeout=self.timeout,
-                loop=self._loop
+                loop=loop
             )
             return session
         except Exception as e:
@@ -133,18 +245,28 @@ class APIClientBase:
         
         return headers
     
-    def set_auth_token(self, token: str):
+    @property
+    def _auth_token(self) -> Optional[str]:
+        """Token xác thực còn hạn (None nếu chưa đăng nhập hoặc đã hết hạn)."""
+        return self._tokens.token
+    
+    def set_auth_token(self, token: str, lifetime: Optional[float] = None):
         """
         Đặt token xác thực.
         
         Args:
             token: Token xác thực.
+            lifetime: Thời gian sống của token (giây), mặc định `AUTH_TOKEN_LIFETIME`.
         """
-        self._auth_token = token
+        self._tokens.set(token, lifetime)
     
     def clear_auth_token(self):
         """Xóa token xác thực."""
-        self._auth_token = None
+        self._tokens.clear()
+    
+    def is_authenticated(self) -> bool:
+        """Kiểm tra tại chỗ người dùng đã đăng nhập (có token còn hạn) hay chưa."""
+        return self._tokens.is_authenticated()
     
     def set_store_code(self, store_code: str):
         """
@@ -156,6 +278,8 @@ class APIClientBase:
         self._store_code = store_code
     
     @retry(
+        retry=_retry_reads_only,
+        before_sleep=_count_retry,
         stop=stop_after_attempt(Config.MAX_RETRY_ATTEMPTS),
         wait=wait_exponential(multiplier=1, min=Config.RETRY_DELAY, max=10)
     )
@@ -183,6 +307,36 @@ class APIClientBase:
         Raises:
             Exception: Nếu có lỗi xảy ra.
         """
+        name, operation_type = graphql_operation(query)
+        with tracer.start_as_current_span(f"graphql {name}", kind=SpanKind.CLIENT, attributes={
+            "graphql.operation.name": name,
+            "graphql.operation.type": operation_type,
+            "mm.store_code": self._store_code
+        }) as span:
+            started = time.perf_counter()
+            result = await self._send_graphql(query, variables, headers, timeout, method)
+            success = result.get("success", False)
+            GRAPHQL_LATENCY.observe(time.perf_counter() - started, operation=name, outcome="ok" if success else "error")
+            record_graphql(name, started, success, result.get("code"))
+            set_attributes({"mm.success": success, "mm.error_code": result.get("code")})
+            if not success:
+                GRAPHQL_ERRORS.inc(operation=name, code=str(result.get("code")))
+                span.set_status(Status(StatusCode.ERROR, str(result.get("code"))))
+            return result
+    
+    async def _send_graphql(
+        self,
+        query: str,
+        variables: Optional[Dict[str, Any]],
+        headers: Optional[Dict[str, str]],
+        timeout: Optional[int],
+        method: str
+    ) -> Dict[str, Any]:
+        """Gửi một truy vấn GraphQL (phần việc của `execute_graphql` trong span của nó)."""
+        # Đăng nhập lại trước khi token hết hạn (bỏ qua khi chính request này là lần làm mới)
+        if self._tokens.needs_refresh():
+            await self._tokens.ensure_fresh()
+        
         _headers = self._get_headers()
         if headers:
             _headers.update(headers)
@@ -205,6 +359,8 @@ class APIClientBase:
             if variables:
                 payload["variables"] = variables
             
+            set_attributes({"http.request.body.size": payload_size(payload)})
+            
             # Thực hiện request
             api_url = urljoin(self.base_url, "graphql")
             
@@ -215,7 +371,7 @@ class APIClientBase:
                     headers=_headers, 
                     timeout=_timeout
                 ) as response:
-                    return await self._process_response(response)
+                    result = await self._process_response(response)
             elif method.upper() == "GET":
                 async with self._session.get(
                     api_url, 
@@ -223,9 +379,16 @@ class APIClientBase:
                     headers=_headers, 
                     timeout=_timeout
                 ) as response:
-                    return await self._process_response(response)
+                    result = await self._process_response(response)
             else:
                 raise ValueError(f"Phương thức HTTP không được hỗ trợ: {method}")
+            
+            # Token bị server từ chối (thu hồi, hết hạn sớm): không gửi lại token này
+            if not result.get("success", False) and result.get("code") in AUTH_ERROR_CODES:
+                sent_token = _headers.get("Authorization", "")[len("Bearer "):]
+                if sent_token:
+                    self._tokens.reject(sent_token)
+            return result
                 
         except aiohttp.ClientError as e:
             logger.error(f"Lỗi HTTP khi thực hiện truy vấn GraphQL: {str(e)}")
@@ -261,6 +424,10 @@ class APIClientBase:
         """
         try:
             status = response.status
+            set_attributes({
+                "http.response.status_code": status,
+                "http.response.body.size": getattr(response, "content_length", None)
+            })
             response_json = await response.json()
             
             # Kiểm tra lỗi HTTP
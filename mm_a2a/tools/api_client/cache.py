@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cache trong bộ nhớ có TTL và giới hạn kích thước (LRU) cho API Client.
+
+Mỗi lượt chat của ADK Runner chạy trong một thread/event loop riêng, nên cache
+được bảo vệ bằng `threading.Lock` thay vì các primitive của asyncio.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Cache LRU có thời gian sống cho từng mục.
+
+    Args:
+        max_entries: Số mục tối đa, mục ít được dùng nhất bị loại khi vượt quá.
+        ttl: Thời gian sống mặc định (giây).
+        on_evict: Callback `(key, value)` được gọi khi một mục bị loại do hết
+            hạn hoặc do vượt kích thước (không gọi khi xóa chủ động).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl: float = 300.0,
+        on_evict: Optional[Callable[[Hashable, Any], None]] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Lấy giá trị còn hạn theo khóa.
+
+        Args:
+            key: Khóa cache.
+            default: Giá trị trả về khi không có hoặc đã hết hạn.
+
+        Returns:
+            Any: Giá trị trong cache hoặc `default`.
+        """
+        expired = None
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                self.evictions += 1
+                expired = value
+            else:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+        self._notify_evict(key, expired)
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """
+        Lưu giá trị vào cache.
+
+        Args:
+            key: Khóa cache.
+            value: Giá trị cần lưu.
+            ttl: Thời gian sống riêng cho mục này (giây), mặc định dùng `self.ttl`.
+        """
+        evicted = []
+        with self._lock:
+            self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                evicted.append(self._data.popitem(last=False))
+                self.evictions += 1
+        for evicted_key, (_, evicted_value) in evicted:
+            self._notify_evict(evicted_key, evicted_value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Xóa chủ động một mục và trả về giá trị của nó (không gọi `on_evict`)."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def contains(self, key: Hashable) -> bool:
+        """Kiểm tra khóa còn hạn mà không tính vào thống kê hit/miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def clear(self):
+        """Xóa toàn bộ cache."""
+        with self._lock:
+            self._data.clear()
+
+    def purge_expired(self) -> int:
+        """
+        Loại bỏ các mục đã hết hạn.
+
+        Returns:
+            int: Số mục đã bị loại.
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = [(key, value) for key, (expires_at, value) in self._data.items() if expires_at <= now]
+            for key, _ in expired:
+                del self._data[key]
+            self.evictions += len(expired)
+        for key, value in expired:
+            self._notify_evict(key, value)
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê sử dụng cache.
+
+        Returns:
+            Dict[str, Any]: Số mục, hit, miss, tỷ lệ hit và số mục bị loại.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions
+        }
+
+    def _notify_evict(self, key: Hashable, value: Any):
+        if self.on_evict is not None:
+            try:
+                self.on_evict(key, value)
+            except Exception:
+                pass
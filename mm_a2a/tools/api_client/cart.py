@@ -7,18 +7,337 @@ API module cho các thao tác liên quan đến giỏ hàng
 
 import logging
 import asyncio
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple, Union
 
 from .base import APIClientBase
+from .cart_pool import get_guest_cart_pool
+from .cart_queue import QueueContext, get_cart_mutation_queue
+from .cart_state import get_cart_state_cache
+from .idempotency import get_mutation_ledger, is_ambiguous_failure
 from config import Config
+from mm_a2a.tracing import record_cache
 
 logger = logging.getLogger(__name__)
 
+# Mutation thêm sản phẩm vào giỏ hàng (nhận danh sách cartItems)
+ADD_PRODUCTS_TO_CART_MUTATION = """
+mutation AddProductsToCart($cartId: String!, $items: [CartItemInput!]!) {
+    addProductsToCart(
+        cartId: $cartId,
+        use_art_no: true,
+        cartItems: $items
+    ) {
+        cart {
+            id
+            email
+            is_guest
+            itemsV2 {
+                items {
+                    id
+                    product {
+                        name
+                        sku
+                        small_image {
+                            url
+                        }
+                    }
+                    quantity
+                    prices {
+                        price {
+                            value
+                            currency
+                        }
+                        row_total {
+                            value
+                            currency
+                        }
+                    }
+                }
+                total_quantity
+            }
+            prices {
+                grand_total {
+                    value
+                    currency
+                }
+            }
+        }
+        user_errors {
+            code
+            message
+        }
+    }
+}
+"""
+
+# Mutation cập nhật số lượng nhiều dòng giỏ hàng (số lượng 0 sẽ xóa dòng)
+UPDATE_CART_ITEMS_MUTATION = """
+mutation UpdateCartItems($cartId: String!, $items: [CartItemUpdateInput!]!) {
+  updateCartItems(
+    input: {
+      cart_id: $cartId,
+      cart_items: $items
+    }
+  ) {
+    cart {
+      itemsV2 {
+        items {
+          id
+          product {
+            name
+            sku
+          }
+          quantity
+          prices {
+            price {
+              value
+              currency
+            }
+            row_total {
+              value
+              currency
+            }
+          }
+        }
+        total_quantity
+      }
+      prices {
+        grand_total {
+          value
+          currency
+        }
+      }
+    }
+  }
+}
+"""
+
+
+# Truy vấn tóm tắt giỏ hàng: chỉ dòng sản phẩm, số lượng, thành tiền và tổng tiền
+# (bỏ các resolver tốn kém như phương thức thanh toán/vận chuyển)
+CART_SUMMARY_QUERY = """
+query GetCartSummary($cartId: String!) {
+    cart(cart_id: $cartId) {
+        id
+        email
+        is_guest
+        itemsV2 {
+            items {
+                id
+                product {
+                    name
+                    sku
+                    small_image {
+                        url
+                    }
+                }
+                quantity
+                prices {
+                    price {
+                        value
+                        currency
+                    }
+                    row_total {
+                        value
+                        currency
+                    }
+                }
+            }
+            total_quantity
+        }
+        prices {
+            grand_total {
+                value
+                currency
+            }
+        }
+    }
+}
+"""
+
+# Truy vấn đầy đủ cho bước thanh toán: thêm thuế, giảm giá, phương thức thanh toán và vận chuyển
+CART_CHECKOUT_QUERY = """
+query GetCartInfo($cartId: String!) {
+    cart(cart_id: $cartId) {
+        id
+        email
+        is_guest
+        itemsV2 {
+            items {
+                id
+                product {
+                    id
+                    name
+                    sku
+                    small_image {
+                        url
+                    }
+                    price {
+                        regularPrice {
+                            amount {
+                                value
+                                currency
+                            }
+                        }
+                    }
+                }
+                quantity
+                prices {
+                    price {
+                        value
+                        currency
+                    }
+                    row_total {
+                        value
+                        currency
+                    }
+                    total_item_discount {
+                        value
+                        currency
+                    }
+                }
+            }
+            total_quantity
+        }
+        prices {
+            subtotal_excluding_tax {
+                value
+                currency
+            }
+            subtotal_including_tax {
+                value
+                currency
+            }
+            applied_taxes {
+                amount {
+                    value
+                    currency
+                }
+                label
+            }
+            discounts {
+                amount {
+                    value
+                    currency
+                }
+                label
+            }
+            grand_total {
+                value
+                currency
+            }
+        }
+        available_payment_methods {
+            code
+            title
+        }
+        shipping_addresses {
+            available_shipping_methods {
+                carrier_code
+                carrier_title
+                method_code
+                method_title
+                price_incl_tax {
+                    value
+                    currency
+                }
+            }
+        }
+    }
+}
+"""
+
+CART_QUERY_MODES = {
+    "summary": CART_SUMMARY_QUERY,
+    "checkout": CART_CHECKOUT_QUERY
+}
+
+
+def _merge_cart_items(items: List[Union[Tuple[str, int], Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Chuẩn hóa danh sách sản phẩm thành `CartItemInput`, gộp số lượng của các SKU trùng nhau."""
+    quantities: Dict[str, float] = {}
+    for item in items or []:
+        if isinstance(item, dict):
+            sku = item.get("sku") or item.get("product_id")
+            quantity = item.get("quantity", 1)
+        else:
+            sku, quantity = item[0], item[1] if len(item) > 1 else 1
+        if not sku:
+            continue
+        sku = str(sku)
+        quantities[sku] = quantities.get(sku, 0) + (quantity or 1)
+    return [{"sku": sku, "quantity": quantity} for sku, quantity in quantities.items()]
+
+
+def _map_user_errors(
+    cart_items: List[Dict[str, Any]],
+    user_errors: List[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Gán `user_errors` của addProductsToCart cho từng sản phẩm.
+    
+    Magento không trả về chỉ số của item lỗi, nên lỗi được gán theo SKU xuất hiện
+    trong thông báo lỗi (một sản phẩm có thể có nhiều lỗi). Lỗi không chứa SKU nào
+    được gán cho sản phẩm khi chỉ gửi một sản phẩm; với nhiều sản phẩm, lỗi đó được
+    trả về riêng và các sản phẩm không có lỗi riêng được đánh dấu chưa xác nhận
+    (`ADD_TO_CART_UNCONFIRMED`) thay vì thành công.
+    
+    Args:
+        cart_items: Các `CartItemInput` đã gửi.
+        user_errors: Danh sách lỗi từ Magento.
+        
+    Returns:
+        Tuple: (kết quả theo từng sản phẩm, các lỗi không gán được cho sản phẩm nào).
+    """
+    item_errors: Dict[str, List[Dict[str, Any]]] = {}
+    unmatched: List[Dict[str, Any]] = []
+    # Ưu tiên SKU dài hơn để "123" không khớp nhầm trong "1234"
+    skus = sorted((item["sku"] for item in cart_items), key=len, reverse=True)
+    for error in user_errors:
+        message = error.get("message", "")
+        sku = next((sku for sku in skus if sku in message), None)
+        if sku is None:
+            unmatched.append(error)
+        else:
+            item_errors.setdefault(sku, []).append(error)
+    
+    if unmatched and len(cart_items) == 1:
+        item_errors.setdefault(cart_items[0]["sku"], []).extend(unmatched)
+        unmatched = []
+    
+    results = []
+    for item in cart_items:
+        errors = item_errors.get(item["sku"])
+        result = {"sku": item["sku"], "quantity": item["quantity"], "success": not errors and not unmatched}
+        if errors:
+            result["message"] = "; ".join(error.get("message", "Unknown error") for error in errors)
+            result["code"] = errors[0].get("code", "UNKNOWN_ERROR")
+        elif unmatched:
+            # Không biết lỗi thuộc sản phẩm nào: không báo thành công khi chưa xác nhận được
+            result["message"] = unmatched[0].get("message", "Unknown error")
+            result["code"] = "ADD_TO_CART_UNCONFIRMED"
+        results.append(result)
+    return results, unmatched
+
+
+def _unconfirmed_add(cart: Dict[str, Any]) -> Dict[str, Any]:
+    """Kết quả khi không xác định được mutation thêm sản phẩm đã được áp dụng hay chưa."""
+    return {
+        "success": False,
+        "message": "Không xác định được sản phẩm đã được thêm vào giỏ hàng hay chưa, vui lòng kiểm tra lại giỏ hàng",
+        "code": "ADD_TO_CART_UNCONFIRMED",
+        "data": {"cart": cart}
+    }
+
+
 class CartAPI(APIClientBase):
     """
     API Client cho các thao tác liên quan đến giỏ hàng.
     """
     
+    # Gửi thao tác ghi qua hàng đợi theo giỏ hàng (client của chính hàng đợi đặt False)
+    mutation_queue_enabled = Config.CART_QUEUE_ENABLED
+    
     async def create_cart(self, is_guest: bool = False) -> Dict[str, Any]:
         """
         Tạo giỏ hàng mới.
@@ -97,74 +416,168 @@ class CartAPI(APIClientBase):
                     "code": "CART_ERROR"
                 }
     
+    async def take_guest_cart(self) -> Dict[str, Any]:
+        """
+        Lấy giỏ hàng khách vãng lai từ pool tạo sẵn, tạo trực tiếp nếu pool rỗng.
+        
+        Khách đã đăng nhập không dùng pool (giữ cách tạo giỏ hàng trực tiếp).
+        
+        Returns:
+            Dict[str, Any]: Kết quả như `create_cart`, thêm `from_pool` cho biết nguồn cart ID.
+        """
+        if not self._auth_token:
+            cart_id = get_guest_cart_pool().acquire(self.base_url, self._store_code)
+            if cart_id:
+                self._cart_id = cart_id
+                return {
+                    "success": True,
+                    "cart_id": cart_id,
+                    "from_pool": True,
+                    "message": "Tạo giỏ hàng thành công"
+                }
+        return await self.create_cart(is_guest=True)
+    
+    def _queue_context(self) -> QueueContext:
+        """Ngữ cảnh gửi thao tác qua hàng đợi ghi giỏ hàng."""
+        return QueueContext(self.base_url, self._store_code, self._auth_token)
+    
+    async def _reconcile_add(
+        self,
+        cart_id: str,
+        added_quantity: float,
+        baseline: Optional[float]
+    ) -> Tuple[Optional[bool], Dict[str, Any]]:
+        """
+        Đọc lại giỏ hàng sau lỗi không rõ kết quả (timeout, lỗi mạng) để biết mutation thêm
+        sản phẩm đã được áp dụng hay chưa, thay vì gửi lại và có thể nhân đôi số lượng.
+        
+        Tổng số lượng được so với mốc trước khi gửi (lấy từ cache trạng thái giỏ hàng);
+        không có mốc thì chỉ kết luận "chưa áp dụng" khi giỏ hàng còn trống.
+        
+        Args:
+            cart_id: ID giỏ hàng.
+            added_quantity: Tổng số lượng đã gửi trong mutation.
+            baseline: Tổng số lượng trước khi gửi (None nếu không biết).
+            
+        Returns:
+            Tuple: (True nếu đã áp dụng, False nếu chắc chắn chưa, None nếu không xác định;
+            giỏ hàng đọc được).
+        """
+        state_cache = get_cart_state_cache()
+        read_version = state_cache.version(cart_id)
+        read = await self.execute_graphql(CART_SUMMARY_QUERY, {"cartId": cart_id})
+        cart = ((read.get("data") or {}).get("cart") or {}) if read.get("success", False) else {}
+        if not cart:
+            return None, {}
+        state_cache.store_read(cart_id, cart, read_version, complete=False)
+        
+        total = (cart.get("itemsV2") or {}).get("total_quantity") or 0
+        if baseline is None:
+            applied = False if total == 0 else None
+        elif total >= baseline + added_quantity:
+            applied = True
+        elif total == baseline:
+            applied = False
+        else:
+            applied = None
+        logger.warning(f"Đối chiếu giỏ hàng {cart_id} sau lỗi không rõ kết quả: đã áp dụng = {applied}")
+        if applied:
+            get_mutation_ledger().record_reconciled()
+        return applied, cart
+    
     async def add_to_cart(
         self,
         cart_id: Optional[str],
         product_id: str,
         quantity: int = 1,
-        retry_count: int = 3
+        retry_count: int = 3,
+        idempotency_key: Optional[str] = None
     ) -> Dict[str, Any]:
         """
-        Thêm sản phẩm vào giỏ hàng với xử lý lỗi nâng cao.
+        Thêm sản phẩm vào giỏ hàng.
+        
+        Khi bật hàng đợi ghi, thao tác được gộp với các thao tác khác trên cùng giỏ
+        hàng và gửi theo lô; nếu không tìm thấy sản phẩm theo art_no thì thử lại
+        bằng đường gửi trực tiếp (tìm theo SKU).
         
         Args:
             cart_id: ID của giỏ hàng (tùy chọn).
             product_id: Article Number (art_no) của sản phẩm.
             quantity: Số lượng sản phẩm.
             retry_count: Số lần thử lại tối đa khi gặp lỗi.
+            idempotency_key: Khóa idempotency; lần gọi lại với cùng khóa nhận kết quả đã
+                ghi nhận thay vì thêm sản phẩm thêm lần nữa.
             
         Returns:
             Dict[str, Any]: Kết quả thêm sản phẩm.
         """
-        graphql_query = """
-        mutation AddProductsToCart($cartId: String!, $items: [CartItemInput!]!) {
-            addProductsToCart(
-                cartId: $cartId,
-                use_art_no: true,
-                cartItems: $items
-            ) {
-                cart {
-                    id
-                    email
-                    is_guest
-                    itemsV2 {
-                        items {
-                            id
-                            product {
-                                name
-                                sku
-                                small_image {
-                                    url
-                                }
-                            }
-                            quantity
-                            prices {
-                                price {
-                                    value
-                                    currency
-                                }
-                                row_total {
-                                    value
-                                    currency
-                                }
-                            }
-                        }
-                        total_quantity
-                    }
-                    prices {
-                        grand_total {
-                            value
-                            currency
-                        }
-                    }
-                }
-                user_errors {
-                    code
-                    message
+        return await get_mutation_ledger().run(
+            idempotency_key,
+            lambda: self._add_to_cart(cart_id, product_id, quantity, retry_count)
+        )
+    
+    async def _add_to_cart(
+        self,
+        cart_id: Optional[str],
+        product_id: str,
+        quantity: int,
+        retry_count: int
+    ) -> Dict[str, Any]:
+        """Thêm sản phẩm vào giỏ hàng qua hàng đợi ghi hoặc gửi trực tiếp."""
+        if not self.mutation_queue_enabled:
+            return await self._add_to_cart_direct(cart_id, product_id, quantity, retry_count)
+        
+        target_cart_id = cart_id or self._cart_id
+        if not target_cart_id:
+            create_result = await self.take_guest_cart()
+            if not create_result.get("success", False):
+                return create_result
+            target_cart_id = create_result.get("cart_id")
+            self._cart_id = target_cart_id
+        
+        baseline = get_cart_state_cache().known_total_quantity(target_cart_id)
+        result = await get_cart_mutation_queue().add(
+            self._queue_context(), target_cart_id, product_id, quantity
+        )
+        if result.get("code") == "CART_QUEUE_ERROR":
+            # Lô có thể đã được gửi: đối chiếu trước khi gửi lại trực tiếp
+            applied, cart = await self._reconcile_add(target_cart_id, quantity, baseline)
+            if applied:
+                return {
+                    "success": True,
+                    "message": "Thêm sản phẩm vào giỏ hàng thành công",
+                    "data": {"cart": cart},
+                    "reconciled": True
                 }
-            }
-        }
+            if applied is None:
+                get_cart_state_cache().invalidate(target_cart_id)
+                return _unconfirmed_add(cart)
+        if result.get("code") in ("PRODUCT_NOT_FOUND", "CART_QUEUE_ERROR"):
+            return await self._add_to_cart_direct(target_cart_id, product_id, quantity, retry_count)
+        if result.get("success", False):
+            self._cart_id = result.get("data", {}).get("cart", {}).get("id") or target_cart_id
+        return result
+    
+    async def _add_to_cart_direct(
+        self,
+        cart_id: Optional[str],
+        product_id: str,
+        quantity: int = 1,
+        retry_count: int = 3
+    ) -> Dict[str, Any]:
         """
+        Thêm sản phẩm vào giỏ hàng bằng một mutation riêng, với xử lý lỗi nâng cao.
+        
+        Args:
+            cart_id: ID của giỏ hàng (tùy chọn).
+            product_id: Article Number (art_no) của sản phẩm.
+            quantity: Số lượng sản phẩm.
+            retry_count: Số lần thử lại tối đa khi gặp lỗi.
+            
+        Returns:
+            Dict[str, Any]: Kết quả thêm sản phẩm.
+        """
+        graphql_query = ADD_PRODUCTS_TO_CART_MUTATION
         
         async def _try_add_to_cart(cart_id: str) -> Dict[str, Any]:
             """Helper function để thử thêm sản phẩm vào giỏ hàng."""
@@ -200,14 +613,16 @@ class CartAPI(APIClientBase):
             
             # Sử dụng cart_id từ tham số hoặc từ session
             target_cart_id = cart_id or self._cart_id
+            from_pool = False
             
-            # Nếu không có giỏ hàng, tạo mới
+            # Nếu không có giỏ hàng, lấy từ pool hoặc tạo mới
             if not target_cart_id:
                 try:
-                    create_result = await self.create_cart(is_guest=True)
+                    create_result = await self.take_guest_cart()
                     if not create_result.get("success", False):
                         return create_result
                     target_cart_id = create_result.get("cart_id")
+                    from_pool = create_result.get("from_pool", False)
                     self._cart_id = target_cart_id
                 except Exception as cart_error:
                     if "event loop" in str(cart_error).lower():
@@ -230,6 +645,9 @@ class CartAPI(APIClientBase):
                         # Các lỗi khác
                         raise
             
+            # Mốc tổng số lượng để đối chiếu khi không rõ mutation đã được áp dụng hay chưa
+            baseline = get_cart_state_cache().known_total_quantity(target_cart_id)
+            
             # Thử thêm sản phẩm với số lần thử lại
             for attempt in range(retry_count):
                 try:
@@ -249,6 +667,24 @@ class CartAPI(APIClientBase):
                     else:
                         raise
                 
+                if is_ambiguous_failure(result):
+                    # Lần gửi có thể đã được áp dụng: đọc lại giỏ hàng trước khi gửi lại
+                    applied, read_cart = await self._reconcile_add(target_cart_id, quantity, baseline)
+                    if applied:
+                        self._cart_id = read_cart.get("id") or target_cart_id
+                        return {
+                            "success": True,
+                            "message": "Thêm sản phẩm vào giỏ hàng thành công",
+                            "data": {
+                                "cart": read_cart
+                            },
+                            "reconciled": True
+                        }
+                    if applied is None:
+                        get_cart_state_cache().invalidate(target_cart_id)
+                        return _unconfirmed_add(read_cart)
+                    baseline = (read_cart.get("itemsV2") or {}).get("total_quantity")
+                
                 if result.get("success", False):
                     data = result.get("data", {})
                     add_result = data.get("addProductsToCart", {})
@@ -258,6 +694,7 @@ class CartAPI(APIClientBase):
                         cart = add_result.get("cart", {})
                         # Cập nhật cart_id trong session
                         self._cart_id = cart.get("id")
+                        get_cart_state_cache().apply_mutation(cart.get("id") or target_cart_id, cart)
                         
                         return {
                             "success": True,
@@ -273,11 +710,15 @@ class CartAPI(APIClientBase):
                         
                         # Xử lý các trường hợp lỗi cụ thể
                         if error_code == "CART_NOT_FOUND" and attempt < retry_count - 1:
-                            # Tạo giỏ hàng mới và thử lại
-                            create_result = await self.create_cart(is_guest=True)
+                            if from_pool:
+                                get_guest_cart_pool().reject(target_cart_id)
+                            # Lấy giỏ hàng khác và thử lại
+                            create_result = await self.take_guest_cart()
                             if create_result.get("success", False):
                                 target_cart_id = create_result.get("cart_id")
+                                from_pool = create_result.get("from_pool", False)
                                 self._cart_id = target_cart_id
+                                baseline = get_cart_state_cache().known_total_quantity(target_cart_id)
                                 continue
                         
                         elif error_code == "PRODUCT_NOT_FOUND" and attempt < retry_count - 1:
@@ -297,6 +738,8 @@ class CartAPI(APIClientBase):
                 if attempt < retry_count - 1:
                     await asyncio.sleep(1 * (attempt + 1))  # Tăng thời gian chờ mỗi lần thử
             
+            # Không biết các lần thử có được áp dụng hay không
+            get_cart_state_cache().invalidate(target_cart_id)
             return {
                 "success": False,
                 "message": "Không thể thêm sản phẩm vào giỏ hàng sau nhiều lần thử",
@@ -305,6 +748,7 @@ class CartAPI(APIClientBase):
             
         except Exception as e:
             logger.error(f"Lỗi khi thêm sản phẩm vào giỏ hàng: {str(e)}")
+            get_cart_state_cache().invalidate(cart_id or self._cart_id)
             
             # Xử lý đặc biệt cho lỗi event loop
             if "event loop" in str(e).lower():
@@ -321,7 +765,7 @@ class CartAPI(APIClientBase):
                     # Thử lại một lần nữa sau khi khôi phục
                     if retry_count > 0:
                         logger.info("Thử lại thêm sản phẩm vào giỏ hàng sau khi khôi phục event loop...")
-                        return await self.add_to_cart(cart_id, product_id, quantity, retry_count - 1)
+                        return await self._add_to_cart_direct(cart_id, product_id, quantity, retry_count - 1)
                 except Exception as recovery_error:
                     logger.error(f"Không thể khôi phục sau lỗi event loop: {str(recovery_error)}")
             
@@ -331,121 +775,201 @@ class CartAPI(APIClientBase):
                 "code": "ADD_TO_CART_ERROR"
             }
             
-    async def get_cart_info(self, cart_id: Optional[str] = None) -> Dict[str, Any]:
+    async def add_items_to_cart(
+        self,
+        cart_id: Optional[str],
+        items: List[Union[Tuple[str, int], Dict[str, Any]]],
+        idempotency_key: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
-        Lấy thông tin chi tiết về giỏ hàng.
+        Thêm nhiều sản phẩm vào giỏ hàng trong một mutation duy nhất.
+        
+        Khi không rõ mutation đã được áp dụng hay chưa (timeout, lỗi mạng), giỏ hàng được
+        đọc lại để đối chiếu; lô chỉ được gửi lại khi chắc chắn chưa được áp dụng.
         
         Args:
-            cart_id: ID của giỏ hàng (tùy chọn, mặc định sử dụng cart_id hiện tại).
+            cart_id: ID của giỏ hàng (tùy chọn, mặc định dùng giỏ hàng hiện tại hoặc lấy từ pool).
+            items: Danh sách `(sku, quantity)` hoặc dict `{"sku"/"product_id", "quantity"}`;
+                sku là Article Number (art_no) như `add_to_cart`.
+            idempotency_key: Khóa idempotency; lần gọi lại với cùng khóa nhận kết quả đã
+                ghi nhận thay vì thêm lô sản phẩm thêm lần nữa.
             
         Returns:
-            Dict[str, Any]: Thông tin giỏ hàng.
+            Dict[str, Any]: Kết quả gồm giỏ hàng và trạng thái của từng sản phẩm
+            (`data.items`); `success` là True nếu ít nhất một sản phẩm được thêm.
         """
-        graphql_query = """
-        query GetCartInfo($cartId: String!) {
-            cart(cart_id: $cartId) {
-                id
-                email
-                is_guest
-                itemsV2 {
-                    items {
-                        id
-                        product {
-                            id
-                            name
-                            sku
-                            small_image {
-                                url
-                            }
-                            price {
-                                regularPrice {
-                                    amount {
-                                        value
-                                        currency
-                                    }
-                                }
-                            }
-                        }
-                        quantity
-                        prices {
-                            price {
-                                value
-                                currency
-                            }
-                            row_total {
-                                value
-                                currency
-                            }
-                            total_item_discount {
-                                value
-                                currency
+        return await get_mutation_ledger().run(
+            idempotency_key,
+            lambda: self._add_items_to_cart(cart_id, items)
+        )
+    
+    async def _add_items_to_cart(
+        self,
+        cart_id: Optional[str],
+        items: List[Union[Tuple[str, int], Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Gửi một mutation thêm nhiều sản phẩm, đối chiếu giỏ hàng khi không rõ kết quả."""
+        cart_items = _merge_cart_items(items)
+        if not cart_items:
+            return {
+                "success": False,
+                "message": "Không có sản phẩm hợp lệ để thêm vào giỏ hàng",
+                "code": "NO_ITEMS"
+            }
+        
+        try:
+            await self.ensure_session()
+            
+            target_cart_id = cart_id or self._cart_id
+            from_pool = False
+            if not target_cart_id:
+                create_result = await self.take_guest_cart()
+                if not create_result.get("success", False):
+                    return create_result
+                target_cart_id = create_result.get("cart_id")
+                from_pool = create_result.get("from_pool", False)
+                self._cart_id = target_cart_id
+            
+            for attempt in range(2):
+                baseline = get_cart_state_cache().known_total_quantity(target_cart_id)
+                result = await self.execute_graphql(
+                    ADD_PRODUCTS_TO_CART_MUTATION,
+                    {"cartId": target_cart_id, "items": cart_items}
+                )
+                if not result.get("success", False):
+                    if is_ambiguous_failure(result):
+                        # Đọc lại giỏ hàng trước khi gửi lại để không thêm trùng
+                        added_quantity = sum(item["quantity"] for item in cart_items)
+                        applied, read_cart = await self._reconcile_add(target_cart_id, added_quantity, baseline)
+                        if applied:
+                            self._cart_id = read_cart.get("id") or target_cart_id
+                            return {
+                                "success": True,
+                                "message": f"Đã thêm {len(cart_items)}/{len(cart_items)} sản phẩm vào giỏ hàng",
+                                "data": {
+                                    "cart": read_cart,
+                                    "items": [dict(item, success=True) for item in cart_items],
+                                    "errors": []
+                                },
+                                "reconciled": True
                             }
-                        }
-                    }
-                    total_quantity
-                }
-                prices {
-                    subtotal_excluding_tax {
-                        value
-                        currency
-                    }
-                    subtotal_including_tax {
-                        value
-                        currency
-                    }
-                    applied_taxes {
-                        amount {
-                            value
-                            currency
-                        }
-                        label
-                    }
-                    discounts {
-                        amount {
-                            value
-                            currency
-                        }
-                        label
-                    }
-                    grand_total {
-                        value
-                        currency
-                    }
-                }
-                available_payment_methods {
-                    code
-                    title
-                }
-                shipping_addresses {
-                    available_shipping_methods {
-                        carrier_code
-                        carrier_title
-                        method_code
-                        method_title
-                        price_incl_tax {
-                            value
-                            currency
-                        }
-                    }
+                        if applied is False and attempt == 0:
+                            continue
+                        get_cart_state_cache().invalidate(target_cart_id)
+                        return _unconfirmed_add(read_cart) if applied is None else result
+                    # Lỗi xác định (GraphQL từ chối): mutation không được áp dụng
+                    get_cart_state_cache().invalidate(target_cart_id)
+                    return result
+                
+                add_result = result.get("data", {}).get("addProductsToCart", {}) or {}
+                user_errors = add_result.get("user_errors") or []
+                
+                # Giỏ hàng hết hạn: lấy giỏ hàng khác và gửi lại cả lô một lần
+                if attempt == 0 and any(error.get("code") == "CART_NOT_FOUND" for error in user_errors):
+                    if from_pool:
+                        get_guest_cart_pool().reject(target_cart_id)
+                    create_result = await self.take_guest_cart()
+                    if not create_result.get("success", False):
+                        return create_result
+                    target_cart_id = create_result.get("cart_id")
+                    from_pool = create_result.get("from_pool", False)
+                    self._cart_id = target_cart_id
+                    continue
+                break
+            
+            cart = add_result.get("cart") or {}
+            if cart.get("id"):
+                self._cart_id = cart.get("id")
+            get_cart_state_cache().apply_mutation(cart.get("id") or target_cart_id, cart)
+            
+            item_results, unmatched_errors = _map_user_errors(cart_items, user_errors)
+            added = sum(1 for item in item_results if item["success"])
+            
+            if added == 0:
+                first_error = (user_errors or [{}])[0]
+                return {
+                    "success": False,
+                    "message": first_error.get("message", "Không thể thêm sản phẩm vào giỏ hàng"),
+                    "code": first_error.get("code", "ADD_TO_CART_ERROR"),
+                    "data": {"cart": cart, "items": item_results, "errors": unmatched_errors}
                 }
+            
+            response = {
+                "success": True,
+                "message": f"Đã thêm {added}/{len(item_results)} sản phẩm vào giỏ hàng",
+                "data": {"cart": cart, "items": item_results, "errors": unmatched_errors}
             }
-        }
+            if added < len(item_results) or unmatched_errors:
+                response["code"] = "PARTIAL_ADD_TO_CART"
+            return response
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi thêm nhiều sản phẩm vào giỏ hàng: {str(e)}")
+            get_cart_state_cache().invalidate(cart_id or self._cart_id)
+            return {
+                "success": False,
+                "message": f"Error adding products to cart: {str(e)}",
+                "code": "ADD_TO_CART_ERROR"
+            }
+    
+    async def get_cart_info(self, cart_id: Optional[str] = None, mode: str = "checkout") -> Dict[str, Any]:
+        """
+        Lấy thông tin chi tiết về giỏ hàng.
+        
+        Giỏ hàng được phục vụ từ cache trạng thái khi còn hạn và chưa bị đánh dấu cũ.
+        Chế độ "summary" dùng được cả bản cập nhật từ kết quả mutation; chế độ "checkout"
+        chỉ dùng bản lấy từ lần đọc đầy đủ (bản từ mutation thiếu thuế, giảm giá và
+        phương thức thanh toán).
+        
+        Args:
+            cart_id: ID của giỏ hàng (tùy chọn, mặc định sử dụng cart_id hiện tại).
+            mode: "summary" (dòng sản phẩm, số lượng, thành tiền, tổng tiền) để hiển thị giỏ hàng,
+                hoặc "checkout" (thêm thuế, giảm giá, phương thức thanh toán và vận chuyển).
+            
+        Returns:
+            Dict[str, Any]: Thông tin giỏ hàng (`from_cache` cho biết không cần gọi mạng).
         """
+        graphql_query = CART_QUERY_MODES.get(mode)
+        if graphql_query is None:
+            return {
+                "success": False,
+                "message": f"Chế độ truy vấn giỏ hàng không hợp lệ: {mode}",
+                "code": "INVALID_CART_QUERY_MODE"
+            }
         
         try:
             target_cart_id = cart_id or self._cart_id
+            if target_cart_id and self.mutation_queue_enabled:
+                # Read-your-writes: chờ các thao tác ghi đang chờ của giỏ hàng hoàn tất
+                await get_cart_mutation_queue().wait_idle(target_cart_id)
             if not target_cart_id:
-                # Tạo giỏ hàng mới nếu chưa có
-                create_result = await self.create_cart(is_guest=True)
+                # Lấy giỏ hàng từ pool hoặc tạo mới nếu chưa có
+                create_result = await self.take_guest_cart()
                 if not create_result.get("success", False):
                     return create_result
                 target_cart_id = create_result.get("cart_id")
                 self._cart_id = target_cart_id
             
+            state_cache = get_cart_state_cache()
+            # Chế độ thanh toán chỉ dùng bản lấy từ lần đọc đầy đủ
+            cached_cart = state_cache.get(target_cart_id, require_complete=(mode == "checkout"))
+            record_cache("cart_state", cached_cart is not None)
+            if cached_cart is not None:
+                self._cart_id = cached_cart.get("id") or target_cart_id
+                return {
+                    "success": True,
+                    "data": {
+                        "cart": cached_cart
+                    },
+                    "from_cache": True,
+                    "message": "Lấy thông tin giỏ hàng thành công"
+                }
+            
             variables = {
                 "cartId": target_cart_id
             }
             
+            read_version = state_cache.version(target_cart_id)
             result = await self.execute_graphql(graphql_query, variables)
             
             if result.get("success", False):
@@ -454,6 +978,7 @@ class CartAPI(APIClientBase):
                 
                 if not cart:
                     # Giỏ hàng không tồn tại hoặc đã hết hạn
+                    state_cache.discard(target_cart_id)
                     self._cart_id = None  # Reset cart_id
                     return {
                         "success": False,
@@ -463,6 +988,7 @@ class CartAPI(APIClientBase):
                 
                 # Cập nhật cart_id trong session
                 self._cart_id = cart.get("id")
+                state_cache.store_read(target_cart_id, cart, read_version, complete=(mode == "checkout"))
                 
                 return {
                     "success": True,
@@ -491,6 +1017,8 @@ class CartAPI(APIClientBase):
         """
         Cập nhật số lượng sản phẩm trong giỏ hàng.
         
+        Khi bật hàng đợi ghi, thao tác được gộp với các thao tác khác trên cùng giỏ hàng.
+        
         Args:
             cart_id: ID của giỏ hàng.
             cart_item_id: ID của item trong giỏ hàng.
@@ -499,47 +1027,40 @@ class CartAPI(APIClientBase):
         Returns:
             Dict[str, Any]: Kết quả cập nhật.
         """
-        graphql_query = """
-        mutation UpdateCartItems($cartId: String!, $items: [CartItemUpdateInput!]!) {
-          updateCartItems(
-            input: {
-              cart_id: $cartId,
-              cart_items: $items
-            }
-          ) {
-            cart {
-              itemsV2 {
-                items {
-                  id
-                  product {
-                    name
-                    sku
-                  }
-                  quantity
-                  prices {
-                    price {
-                      value
-                      currency
-                    }
-                    row_total {
-                      value
-                      currency
-                    }
-                  }
-                }
-                total_quantity
-              }
-              prices {
-                grand_total {
-                  value
-                  currency
-                }
-              }
+        target_cart_id = cart_id or self._cart_id
+        if not target_cart_id:
+            return {
+                "success": False,
+                "message": "Không có giỏ hàng hiện tại",
+                "code": "NO_CART"
             }
-          }
-        }
+        
+        if self.mutation_queue_enabled:
+            state_cache = get_cart_state_cache()
+            state_cache.apply_optimistic(target_cart_id, cart_item_id, quantity)
+            result = await get_cart_mutation_queue().update(
+                self._queue_context(), target_cart_id, cart_item_id, quantity
+            )
+            if not result.get("success", False):
+                state_cache.invalidate(target_cart_id)
+            return result
+        return await self.update_cart_items(target_cart_id, [(cart_item_id, quantity)])
+    
+    async def update_cart_items(
+        self,
+        cart_id: Optional[str],
+        items: List[Tuple[str, int]]
+    ) -> Dict[str, Any]:
         """
+        Cập nhật số lượng nhiều dòng giỏ hàng trong một mutation (số lượng 0 sẽ xóa dòng).
         
+        Args:
+            cart_id: ID của giỏ hàng.
+            items: Danh sách `(cart_item_id, quantity)`.
+            
+        Returns:
+            Dict[str, Any]: Kết quả cập nhật.
+        """
         try:
             target_cart_id = cart_id or self._cart_id
             if not target_cart_id:
@@ -556,15 +1077,17 @@ class CartAPI(APIClientBase):
                         "cart_item_id": cart_item_id,
                         "quantity": quantity
                     }
+                    for cart_item_id, quantity in items
                 ]
             }
             
-            result = await self.execute_graphql(graphql_query, variables)
+            result = await self.execute_graphql(UPDATE_CART_ITEMS_MUTATION, variables)
             
             if result.get("success", False):
                 data = result.get("data", {})
                 update_result = data.get("updateCartItems", {})
                 cart = update_result.get("cart", {})
+                get_cart_state_cache().apply_mutation(target_cart_id, cart)
                 
                 return {
                     "success": True,
@@ -574,10 +1097,12 @@ class CartAPI(APIClientBase):
                     }
                 }
             
+            get_cart_state_cache().invalidate(target_cart_id)
             return result
             
         except Exception as e:
             logger.error(f"Lỗi khi cập nhật giỏ hàng: {str(e)}")
+            get_cart_state_cache().invalidate(cart_id or self._cart_id)
             return {
                 "success": False,
                 "message": f"Error updating cart: {str(e)}",
@@ -592,6 +1117,9 @@ class CartAPI(APIClientBase):
         """
         Xóa sản phẩm khỏi giỏ hàng.
         
+        Khi bật hàng đợi ghi, thao tác được gộp vào mutation `updateCartItems` (số lượng 0)
+        cùng các thao tác khác trên giỏ hàng.
+        
         Args:
             cart_id: ID của giỏ hàng.
             cart_item_id: ID của item trong giỏ hàng.
@@ -638,6 +1166,16 @@ class CartAPI(APIClientBase):
                     "message": "Không có giỏ hàng hiện tại",
                     "code": "NO_CART"
                 }
+            
+            state_cache = get_cart_state_cache()
+            if self.mutation_queue_enabled:
+                state_cache.apply_optimistic(target_cart_id, cart_item_id, 0)
+                result = await get_cart_mutation_queue().remove(
+                    self._queue_context(), target_cart_id, cart_item_id
+                )
+                if not result.get("success", False):
+                    state_cache.invalidate(target_cart_id)
+                return result
                 
             variables = {
                 "cartId": target_cart_id,
@@ -650,6 +1188,7 @@ class CartAPI(APIClientBase):
                 data = result.get("data", {})
                 remove_result = data.get("removeItemFromCart", {})
                 cart = remove_result.get("cart", {})
+                state_cache.apply_mutation(target_cart_id, cart)
                 
                 return {
                     "success": True,
@@ -659,6 +1198,7 @@ class CartAPI(APIClientBase):
                     }
                 }
             
+            state_cache.invalidate(target_cart_id)
             return result
             
         except Exception as e:
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Pool giỏ hàng khách vãng lai được tạo sẵn.
+
+Lần thêm vào giỏ đầu tiên của một phiên không phải chờ `createGuestCart` nữa:
+cart ID được lấy ngay từ pool, còn pool được bổ sung trên loop nền tới kích
+thước cấu hình. Pool tách riêng theo (base_url, store_code) và loại bỏ các ID
+đã quá tuổi hoặc bị backend báo hết hạn.
+"""
+
+import collections
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from .background import BackgroundLoop, get_background_loop
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PoolKey = Tuple[str, str]
+
+
+class GuestCartPool:
+    """
+    Pool cart ID khách vãng lai theo cửa hàng.
+
+    Args:
+        creator: Hàm `(base_url, store_code)` trả về coroutine tạo một giỏ hàng khách,
+            kết quả là cart ID hoặc None nếu thất bại.
+        target_size: Số giỏ hàng giữ sẵn cho mỗi cửa hàng.
+        max_age: Tuổi tối đa (giây) của cart ID trong pool.
+        enabled: Bật/tắt pool.
+        background: Loop nền để bổ sung pool (mặc định dùng loop chung).
+    """
+
+    def __init__(
+        self,
+        creator: Callable[[str, str], Awaitable[Optional[str]]],
+        target_size: int = 3,
+        max_age: float = 6 * 3600,
+        enabled: bool = True,
+        background: Optional[BackgroundLoop] = None
+    ):
+        self._creator = creator
+        self.target_size = target_size
+        self.max_age = max_age
+        self.enabled = enabled
+        self._background = background
+        self._lock = threading.Lock()
+        # (base_url, store_code) -> hàng đợi (cart_id, thời điểm tạo)
+        self._pools: Dict[PoolKey, Deque[Tuple[str, float]]] = {}
+        self._refilling: set = set()
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+        self.create_failed = 0
+        self.expired = 0
+        self.rejected = 0
+
+    def acquire(self, base_url: str, store_code: str) -> Optional[str]:
+        """
+        Lấy một cart ID còn hạn từ pool và kích hoạt bổ sung nền.
+
+        Args:
+            base_url: URL API của giỏ hàng.
+            store_code: Mã cửa hàng.
+
+        Returns:
+            Optional[str]: Cart ID, hoặc None nếu pool rỗng (khi đó cần tạo giỏ hàng trực tiếp).
+        """
+        if not self.enabled:
+            return None
+        key = (base_url, store_code)
+        cart_id = None
+        with self._lock:
+            pool = self._pools.setdefault(key, collections.deque())
+            oldest_allowed = time.monotonic() - self.max_age
+            while pool:
+                candidate, created_at = pool.popleft()
+                if created_at >= oldest_allowed:
+                    cart_id = candidate
+                    break
+                self.expired += 1
+            if cart_id is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        self.refill(base_url, store_code)
+        return cart_id
+
+    def reject(self, cart_id: str):
+        """Ghi nhận một cart ID từ pool đã bị backend báo hết hạn/không tồn tại."""
+        with self._lock:
+            self.rejected += 1
+        logger.warning(f"Cart ID {cart_id} lấy từ pool đã hết hạn trên backend")
+
+    def refill(self, base_url: str, store_code: str) -> bool:
+        """
+        Bổ sung pool của cửa hàng trên loop nền (mỗi cửa hàng chỉ một tác vụ bổ sung).
+
+        Args:
+            base_url: URL API của giỏ hàng.
+            store_code: Mã cửa hàng.
+
+        Returns:
+            bool: True nếu đã lên lịch bổ sung.
+        """
+        if not self.enabled:
+            return False
+        key = (base_url, store_code)
+        with self._lock:
+            if key in self._refilling or len(self._pools.get(key, ())) >= self.target_size:
+                return False
+            self._refilling.add(key)
+        background = self._background or get_background_loop()
+        future = background.submit(self._refill(key))
+        future.add_done_callback(lambda _: self._finish_refill(key))
+        return True
+
+    async def _refill(self, key: PoolKey):
+        base_url, store_code = key
+        while True:
+            with self._lock:
+                if len(self._pools.setdefault(key, collections.deque())) >= self.target_size:
+                    return
+            try:
+                cart_id = await self._creator(base_url, store_code)
+            except Exception as e:
+                logger.error(f"Lỗi khi tạo giỏ hàng cho pool ({store_code}): {str(e)}")
+                cart_id = None
+            with self._lock:
+                if not cart_id:
+                    # Dừng bổ sung, lần acquire tiếp theo sẽ thử lại
+                    self.create_failed += 1
+                    return
+                self._pools[key].append((cart_id, time.monotonic()))
+                self.created += 1
+
+    def _finish_refill(self, key: PoolKey):
+        with self._lock:
+            self._refilling.discard(key)
+
+    def size(self, base_url: str, store_code: str) -> int:
+        """Số cart ID đang có trong pool của cửa hàng."""
+        with self._lock:
+            return len(self._pools.get((base_url, store_code), ()))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê pool giỏ hàng.
+
+        Returns:
+            Dict[str, Any]: Kích thước pool theo cửa hàng, số lần lấy được từ pool/phải tạo trực tiếp,
+            số giỏ đã tạo, tạo thất bại, hết hạn trong pool và bị backend từ chối.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "target_size": self.target_size,
+                "pools": {store_code: len(pool) for (_, store_code), pool in self._pools.items()},
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "created": self.created,
+                "create_failed": self.create_failed,
+                "expired": self.expired,
+                "rejected": self.rejected
+            }
+
+
+# Client tạo giỏ hàng cho pool, chỉ được truy cập từ loop nền
+_pool_clients: Dict[PoolKey, Any] = {}
+
+
+async def _create_guest_cart(base_url: str, store_code: str) -> Optional[str]:
+    """Tạo một giỏ hàng khách trên loop nền bằng client riêng của loop đó."""
+    from .cart import CartAPI
+
+    client = _pool_clients.get((base_url, store_code))
+    if client is None:
+        client = CartAPI(base_url, Config.API_TIMEOUT)
+        client.set_store_code(store_code)
+        _pool_clients[(base_url, store_code)] = client
+    result = await client.create_cart(is_guest=True)
+    return result.get("cart_id") if result.get("success", False) else None
+
+
+_guest_cart_pool = GuestCartPool(
+    _create_guest_cart,
+    target_size=Config.CART_POOL_SIZE,
+    max_age=Config.CART_POOL_MAX_AGE,
+    enabled=Config.CART_POOL_ENABLED
+)
+
+
+def get_guest_cart_pool() -> GuestCartPool:
+    """Trả về pool giỏ hàng khách dùng chung của tiến trình."""
+    return _guest_cart_pool
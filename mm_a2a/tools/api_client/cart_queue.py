@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Hàng đợi ghi theo từng giỏ hàng, gộp các thao tác sửa giỏ hàng.
+
+Mọi thao tác ghi vào cùng một giỏ hàng được tuần tự hóa trên loop nền. Các thao
+tác đến trong cùng một cửa sổ ngắn được gộp lại:
+- thêm cùng một SKU: cộng dồn số lượng
+- cập nhật/xóa cùng một dòng giỏ hàng: thao tác sau cùng thắng
+Thứ tự đến được giữ nguyên: các thao tác liên tiếp cùng loại (thêm mới hoặc
+cập nhật/xóa) tạo thành một nhóm và mỗi nhóm được gửi thành một mutation
+(`addProductsToCart` hoặc `updateCartItems`) theo đúng thứ tự; thao tác chỉ được
+gộp vào nhóm cuối cùng nên không vượt qua thao tác khác loại đến trước nó.
+`wait_idle` cho phép đọc giỏ hàng sau khi mọi thao tác ghi trước đó đã hoàn tất
+(read-your-writes).
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict, namedtuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .background import BackgroundLoop, get_background_loop
+from .request_context import RequestContext, use_context
+from .token_manager import AuthTokenManager
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Ngữ cảnh của client gửi thao tác (để gửi mutation với đúng cửa hàng và token)
+QueueContext = namedtuple("QueueContext", ["base_url", "store_code", "auth_token"])
+
+
+class _PendingOp:
+    """Một thao tác (đã gộp) đang chờ gửi."""
+
+    __slots__ = ("kind", "target", "quantity", "waiters")
+
+    def __init__(self, kind: str, target: str, quantity: float):
+        self.kind = kind  # add, update, remove
+        self.target = target  # SKU với add, cart_item_id với update/remove
+        self.quantity = quantity
+        self.waiters: List[asyncio.Future] = []
+
+
+class _CartState:
+    """Trạng thái hàng đợi của một giỏ hàng (chỉ truy cập trên loop nền)."""
+
+    __slots__ = ("pending", "context", "flush_handle", "flushing", "idle")
+
+    def __init__(self):
+        # Các nhóm thao tác liên tiếp cùng loại ("add" hoặc "item") theo thứ tự đến
+        self.pending: List[Tuple[str, "OrderedDict[str, _PendingOp]"]] = []
+        self.context: Optional[QueueContext] = None
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.flushing = False
+        self.idle = asyncio.Event()
+        self.idle.set()
+
+
+class CartMutationQueue:
+    """
+    Hàng đợi ghi theo giỏ hàng.
+
+    Args:
+        executor_factory: Hàm nhận `QueueContext`, trả về client có `update_cart_items`
+            và `add_items_to_cart` (gọi thẳng API, không qua hàng đợi).
+        window: Cửa sổ gộp (giây) tính từ thao tác đầu tiên của một lô.
+        background: Loop nền chạy hàng đợi (mặc định dùng loop chung).
+    """
+
+    def __init__(
+        self,
+        executor_factory: Callable[[QueueContext], Any],
+        window: float = 0.05,
+        background: Optional[BackgroundLoop] = None
+    ):
+        self._executor_factory = executor_factory
+        self.window = window
+        self._background = background
+        self._carts: Dict[str, _CartState] = {}
+        self.submitted = 0
+        self.coalesced = 0
+        self.mutations = 0
+        self.flushes = 0
+
+    # ---- API cho client (gọi từ bất kỳ event loop nào) ----
+
+    async def add(self, context: QueueContext, cart_id: str, sku: str, quantity: float = 1) -> Dict[str, Any]:
+        """Thêm sản phẩm (theo art_no/SKU) vào giỏ hàng qua hàng đợi."""
+        return await self._call(self._enqueue(context, cart_id, "add", sku, quantity))
+
+    async def update(self, context: QueueContext, cart_id: str, cart_item_id: str, quantity: float) -> Dict[str, Any]:
+        """Cập nhật số lượng một dòng giỏ hàng qua hàng đợi."""
+        return await self._call(self._enqueue(context, cart_id, "update", str(cart_item_id), quantity))
+
+    async def remove(self, context: QueueContext, cart_id: str, cart_item_id: str) -> Dict[str, Any]:
+        """Xóa một dòng giỏ hàng qua hàng đợi (gửi dưới dạng cập nhật số lượng 0)."""
+        return await self._call(self._enqueue(context, cart_id, "remove", str(cart_item_id), 0))
+
+    async def wait_idle(self, cart_id: str):
+        """Gửi ngay các thao tác đang chờ của giỏ hàng và chờ tới khi hoàn tất."""
+        await self._call(self._wait_idle(cart_id))
+
+    async def _call(self, coro):
+        background = self._background or get_background_loop()
+        future = background.submit(coro)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is background.loop:
+            raise RuntimeError("Không được gọi hàng đợi giỏ hàng từ chính loop nền")
+        return await asyncio.wrap_future(future)
+
+    # ---- Chạy trên loop nền ----
+
+    def _state(self, cart_id: str) -> _CartState:
+        state = self._carts.get(cart_id)
+        if state is None:
+            state = self._carts[cart_id] = _CartState()
+        return state
+
+    async def _enqueue(self, context: QueueContext, cart_id: str, kind: str, target: str, quantity: float):
+        loop = asyncio.get_running_loop()
+        state = self._state(cart_id)
+        state.context = context
+        self.submitted += 1
+
+        group = "add" if kind == "add" else "item"
+        if state.pending and state.pending[-1][0] == group:
+            ops = state.pending[-1][1]
+        else:
+            ops = OrderedDict()
+            state.pending.append((group, ops))
+        op = ops.get(target)
+        if op is None:
+            op = ops[target] = _PendingOp(kind, target, quantity)
+        else:
+            self.coalesced += 1
+            if kind == "add":
+                op.quantity += quantity
+            else:
+                op.kind, op.quantity = kind, quantity
+        waiter = loop.create_future()
+        op.waiters.append(waiter)
+
+        state.idle.clear()
+        if not state.flushing and state.flush_handle is None:
+            state.flush_handle = loop.call_later(self.window, self._start_flush, cart_id)
+        return await waiter
+
+    def _start_flush(self, cart_id: str):
+        state = self._carts.get(cart_id)
+        if state is None:
+            return
+        state.flush_handle = None
+        if not state.flushing and state.pending:
+            state.flushing = True
+            asyncio.get_running_loop().create_task(self._flush(cart_id))
+
+    async def _wait_idle(self, cart_id: str):
+        state = self._carts.get(cart_id)
+        if state is None:
+            return
+        if state.flush_handle is not None:
+            state.flush_handle.cancel()
+            self._start_flush(cart_id)
+        await state.idle.wait()
+
+    async def _flush(self, cart_id: str):
+        state = self._carts[cart_id]
+        try:
+            while state.pending:
+                groups = state.pending
+                state.pending = []
+                self.flushes += 1
+                await self._send(cart_id, state.context, groups)
+        finally:
+            state.flushing = False
+            if not state.pending and state.flush_handle is None:
+                state.idle.set()
+                # Giải phóng trạng thái khi giỏ hàng không còn thao tác nào
+                self._carts.pop(cart_id, None)
+
+    async def _send(self, cart_id: str, context: QueueContext, groups: List[Tuple[str, "OrderedDict[str, _PendingOp]"]]):
+        executor = self._executor_factory(context)
+        # Client gửi được dùng chung; cửa hàng và token của lô được gắn cho từng lần gọi
+        with use_context(_request_context(context)):
+            # Gửi từng nhóm theo thứ tự đến để thêm rồi sửa cùng một sản phẩm cho đúng kết quả
+            for group, pending in groups:
+                ops = list(pending.values())
+                items = [(op.target, op.quantity) for op in ops]
+                if group == "add":
+                    result = await self._execute(executor.add_items_to_cart, cart_id, items)
+                    for op in ops:
+                        self._resolve(op, _add_result(op, result))
+                else:
+                    result = await self._execute(executor.update_cart_items, cart_id, items)
+                    for op in ops:
+                        self._resolve(op, _item_result(op, result))
+
+    async def _execute(self, method, cart_id: str, items: list) -> Dict[str, Any]:
+        self.mutations += 1
+        try:
+            return await method(cart_id, items)
+        except Exception as e:
+            logger.error(f"Lỗi khi gửi lô thao tác giỏ hàng {cart_id}: {str(e)}")
+            return {
+                "success": False,
+                "message": f"Error flushing cart mutations: {str(e)}",
+                "code": "CART_QUEUE_ERROR"
+            }
+
+    def _resolve(self, op: _PendingOp, result: Dict[str, Any]):
+        for waiter in op.waiters:
+            if not waiter.done():
+                waiter.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê hàng đợi giỏ hàng.
+
+        Returns:
+            Dict[str, Any]: Số thao tác nhận vào, số thao tác được gộp, số lô và số mutation đã gửi.
+        """
+        return {
+            "enabled": Config.CART_QUEUE_ENABLED,
+            "window_ms": round(self.window * 1000),
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "flushes": self.flushes,
+            "mutations": self.mutations,
+            "active_carts": len(self._carts)
+        }
+
+
+def _add_result(op: _PendingOp, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Tách kết quả của một SKU từ kết quả `add_items_to_cart` của cả lô."""
+    data = result.get("data") or {}
+    item = next((item for item in data.get("items") or [] if item.get("sku") == op.target), None)
+    if item is None:
+        return result
+    if not item["success"]:
+        return {
+            "success": False,
+            "message": item.get("message", "Unknown error"),
+            "code": item.get("code", "UNKNOWN_ERROR")
+        }
+    return {
+        "success": True,
+        "message": "Thêm sản phẩm vào giỏ hàng thành công",
+        "data": {"cart": data.get("cart", {})}
+    }
+
+
+def _item_result(op: _PendingOp, result: Dict[str, Any]) -> Dict[str, Any]:
+    """Kết quả của một thao tác cập nhật/xóa từ kết quả `update_cart_items` của cả lô."""
+    if not result.get("success", False):
+        return result
+    message = "Xóa sản phẩm khỏi giỏ hàng thành công" if op.kind == "remove" else "Cập nhật giỏ hàng thành công"
+    return {
+        "success": True,
+        "message": message,
+        "data": {"cart": (result.get("data") or {}).get("cart", {})}
+    }
+
+
+def _request_context(context: QueueContext) -> RequestContext:
+    """Ngữ cảnh request (cửa hàng, token) để gửi một lô thao tác."""
+    tokens = AuthTokenManager()
+    if context.auth_token:
+        tokens.set(context.auth_token)
+    return RequestContext(context.store_code, tokens)
+
+
+# Client gửi mutation cho hàng đợi theo base URL, chỉ được truy cập từ loop nền. Cửa hàng và
+# token được truyền theo từng lần gọi (`_request_context`), nên số client (và session HTTP)
+# không tăng theo số khách hàng
+_queue_clients: Dict[str, Any] = {}
+
+
+def _queue_executor(context: QueueContext):
+    """Client CartAPI gọi thẳng API (không qua hàng đợi) cho base URL của ngữ cảnh."""
+    from .cart import CartAPI
+
+    client = _queue_clients.get(context.base_url)
+    if client is None:
+        client = CartAPI(context.base_url, Config.API_TIMEOUT)
+        client.mutation_queue_enabled = False
+        _queue_clients[context.base_url] = client
+    return client
+
+
+_cart_mutation_queue = CartMutationQueue(_queue_executor, window=Config.CART_QUEUE_WINDOW)
+
+
+def get_cart_mutation_queue() -> CartMutationQueue:
+    """Trả về hàng đợi ghi giỏ hàng dùng chung của tiến trình."""
+    return _cart_mutation_queue
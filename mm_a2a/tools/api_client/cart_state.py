@@ -0,0 +1,315 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cache trạng thái giỏ hàng có phiên bản.
+
+Mỗi giỏ hàng giữ bản sao cục bộ, được cập nhật từ:
+- kết quả đọc đầy đủ (`get_cart_info`)
+- phần `cart` trả về trong kết quả mutation (`addProductsToCart`, `updateCartItems`, ...)
+- cập nhật lạc quan (optimistic) khi người dùng sửa số lượng một dòng
+
+Lần đọc giỏ hàng được phục vụ tại chỗ cho tới khi hết TTL hoặc có sự kiện làm
+dữ liệu cũ (mutation thất bại, giỏ hàng không tồn tại, ...); lần đọc đầy đủ chỉ
+dùng bản lấy từ lần đọc đầy đủ. Bản có cập nhật lạc quan chưa được server xác
+nhận không bao giờ được phục vụ, mà được đối chiếu lại ở lần đọc tiếp theo.
+Mỗi thay đổi tăng số phiên bản của giỏ hàng; kết quả đọc bắt đầu trước một thay
+đổi mới hơn sẽ bị bỏ qua để không ghi đè dữ liệu mới bằng dữ liệu cũ.
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .models import Cart
+from config import Config
+
+# Trường chỉ có trong lần đọc đầy đủ, phụ thuộc vào nội dung giỏ hàng nên không giữ qua mutation
+CHECKOUT_ONLY_FIELDS = ("available_payment_methods", "shipping_addresses")
+
+
+class _CartEntry:
+    """Trạng thái cục bộ của một giỏ hàng."""
+
+    __slots__ = ("version", "cart", "complete", "optimistic", "stale", "expires_at")
+
+    def __init__(self):
+        self.version = 0
+        self.cart: Dict[str, Any] = {}
+        self.complete = False  # True nếu lấy từ lần đọc đầy đủ (có thuế, giảm giá, phương thức thanh toán)
+        self.optimistic = False  # Có cập nhật lạc quan chưa được server xác nhận
+        self.stale = False
+        self.expires_at = 0.0
+
+
+class CartStateCache:
+    """
+    Cache trạng thái giỏ hàng theo cart ID (an toàn đa luồng).
+
+    Args:
+        ttl: Thời gian phục vụ giỏ hàng tại chỗ kể từ lần cập nhật cuối (giây).
+        max_entries: Số giỏ hàng tối đa giữ trong cache (LRU).
+        enabled: Bật/tắt cache.
+    """
+
+    def __init__(self, ttl: float = 120.0, max_entries: int = 1024, enabled: bool = True):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._entries: "OrderedDict[str, _CartEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reads_stored = 0
+        self.reads_discarded = 0
+        self.mutation_updates = 0
+        self.optimistic_updates = 0
+        self.reconciled = 0
+        self.invalidations: Dict[str, int] = {}
+
+    def get(self, cart_id: str, require_complete: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Lấy giỏ hàng để phục vụ tại chỗ.
+
+        Args:
+            cart_id: ID giỏ hàng.
+            require_complete: Chỉ trả về bản lấy từ lần đọc đầy đủ (bản cập nhật từ mutation
+                chỉ có dòng sản phẩm và tổng tiền).
+
+        Returns:
+            Optional[Dict[str, Any]]: Bản sao giỏ hàng, hoặc None nếu cần đọc lại từ server
+            (chưa có, hết hạn, đã cũ hoặc đang chờ đối chiếu cập nhật lạc quan).
+        """
+        if not self.enabled or not cart_id:
+            return None
+        with self._lock:
+            entry = self._entries.get(cart_id)
+            if (
+                entry is None
+                or entry.stale
+                or entry.optimistic
+                or entry.expires_at <= time.monotonic()
+                or (require_complete and not entry.complete)
+            ):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(cart_id)
+            self.hits += 1
+            return copy.deepcopy(entry.cart)
+
+    def known_total_quantity(self, cart_id: Optional[str]) -> Optional[float]:
+        """
+        Tổng số lượng đã biết của giỏ hàng (không tính vào thống kê hit/miss).
+
+        Dùng làm mốc để đối chiếu khi không rõ một mutation đã được áp dụng hay chưa.
+
+        Returns:
+            Optional[float]: Tổng số lượng, hoặc None nếu không có bản còn tin cậy.
+        """
+        if not self.enabled or not cart_id:
+            return None
+        with self._lock:
+            entry = self._entries.get(cart_id)
+            if entry is None or entry.stale or entry.optimistic or entry.expires_at <= time.monotonic():
+                return None
+            return (entry.cart.get("itemsV2") or {}).get("total_quantity")
+
+    def version(self, cart_id: str) -> int:
+        """Phiên bản hiện tại của giỏ hàng (0 nếu chưa có), dùng khi bắt đầu một lần đọc."""
+        with self._lock:
+            entry = self._entries.get(cart_id)
+            return entry.version if entry is not None else 0
+
+    def store_read(self, cart_id: str, cart: Dict[str, Any], read_version: int, complete: bool = True) -> bool:
+        """
+        Lưu kết quả đọc giỏ hàng từ server.
+
+        Args:
+            cart_id: ID giỏ hàng.
+            cart: Giỏ hàng server trả về.
+            read_version: Phiên bản lấy bằng `version()` trước khi gửi truy vấn.
+            complete: True nếu là truy vấn đầy đủ; truy vấn tóm tắt được gộp vào bản trước
+                như kết quả mutation.
+
+        Returns:
+            bool: False nếu giỏ hàng đã thay đổi trong lúc đọc (kết quả bị bỏ qua).
+        """
+        if not self.enabled or not cart_id:
+            return False
+        with self._lock:
+            entry = self._entries.get(cart_id)
+            current = entry.version if entry is not None else 0
+            if current != read_version:
+                self.reads_discarded += 1
+                return False
+            entry = self._entry(cart_id)
+            if entry.optimistic:
+                self.reconciled += 1
+            if complete:
+                self._replace(entry, copy.deepcopy(cart), complete=True)
+            else:
+                self._replace(entry, self._merge(entry, cart, cart_id), complete=False)
+            self.reads_stored += 1
+            return True
+
+    def apply_mutation(self, cart_id: str, cart: Dict[str, Any]):
+        """
+        Cập nhật giỏ hàng từ phần `cart` trong kết quả mutation.
+
+        Dòng sản phẩm và giá được thay bằng dữ liệu từ server (các khoản giá chi tiết như
+        thuế, giảm giá không có trong kết quả mutation nên bị bỏ, thay vì giữ số liệu cũ).
+        Phương thức thanh toán và vận chuyển phụ thuộc vào nội dung giỏ hàng nên cũng bị
+        bỏ; bản kết quả chỉ phục vụ các lần đọc không cần dữ liệu thanh toán.
+
+        Args:
+            cart_id: ID giỏ hàng.
+            cart: Phần `cart` của kết quả mutation.
+        """
+        if not self.enabled or not cart_id or not cart:
+            return
+        with self._lock:
+            entry = self._entry(cart_id)
+            if entry.optimistic:
+                self.reconciled += 1
+            self._replace(entry, self._merge(entry, cart, cart_id), complete=False)
+            self.mutation_updates += 1
+
+    def apply_optimistic(self, cart_id: str, cart_item_id: str, quantity: float) -> bool:
+        """
+        Cập nhật lạc quan số lượng một dòng giỏ hàng trước khi server xác nhận.
+
+        Thành tiền của dòng, tổng số lượng và tổng tiền được tính lại từ đơn giá đã biết.
+        Bản này không được phục vụ cho tới khi được đối chiếu (bởi kết quả mutation hoặc
+        lần đọc tiếp theo).
+
+        Args:
+            cart_id: ID giỏ hàng.
+            cart_item_id: ID dòng giỏ hàng.
+            quantity: Số lượng mới (0 là xóa dòng).
+
+        Returns:
+            bool: True nếu giỏ hàng có trong cache và đã được cập nhật.
+        """
+        if not self.enabled or not cart_id:
+            return False
+        with self._lock:
+            entry = self._entries.get(cart_id)
+            if entry is None:
+                return False
+            cart = copy.deepcopy(entry.cart)
+            decoded = Cart.from_graphql(cart)
+            line = decoded.find_line(cart_item_id)
+            if line is None:
+                return False
+
+            if quantity <= 0:
+                cart["itemsV2"]["items"].remove(line.raw)
+                new_row_total = 0.0
+            else:
+                line.raw["quantity"] = quantity
+                new_row_total = line.price * quantity if line.price else line.row_total
+                row_total = (line.raw.get("prices") or {}).get("row_total")
+                if isinstance(row_total, dict):
+                    row_total["value"] = new_row_total
+            cart["itemsV2"]["total_quantity"] = decoded.total_quantity - line.quantity + max(quantity, 0)
+
+            grand_total = (cart.get("prices") or {}).get("grand_total")
+            if isinstance(grand_total, dict):
+                grand_total["value"] = decoded.grand_total - line.row_total + new_row_total
+
+            entry.cart = cart
+            entry.version += 1
+            entry.optimistic = True
+            self.optimistic_updates += 1
+            return True
+
+    def invalidate(self, cart_id: Optional[str], reason: str = "mutation_failed"):
+        """
+        Đánh dấu giỏ hàng đã cũ, lần đọc tiếp theo sẽ lấy từ server.
+
+        Args:
+            cart_id: ID giỏ hàng.
+            reason: Lý do (dùng cho thống kê).
+        """
+        if not cart_id:
+            return
+        with self._lock:
+            entry = self._entries.get(cart_id)
+            if entry is None:
+                return
+            entry.stale = True
+            entry.version += 1
+            self.invalidations[reason] = self.invalidations.get(reason, 0) + 1
+
+    def discard(self, cart_id: Optional[str]):
+        """Xóa giỏ hàng khỏi cache (giỏ hàng không còn tồn tại)."""
+        with self._lock:
+            self._entries.pop(cart_id, None)
+
+    def clear(self):
+        """Xóa toàn bộ cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def _entry(self, cart_id: str) -> _CartEntry:
+        entry = self._entries.get(cart_id)
+        if entry is None:
+            entry = self._entries[cart_id] = _CartEntry()
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._entries.move_to_end(cart_id)
+        return entry
+
+    @staticmethod
+    def _merge(entry: _CartEntry, cart: Dict[str, Any], cart_id: str) -> Dict[str, Any]:
+        merged = {key: value for key, value in entry.cart.items() if key not in CHECKOUT_ONLY_FIELDS}
+        merged.update(copy.deepcopy(cart))
+        merged.setdefault("id", cart_id)
+        return merged
+
+    def _replace(self, entry: _CartEntry, cart: Dict[str, Any], complete: bool):
+        entry.cart = cart
+        entry.version += 1
+        entry.complete = complete
+        entry.optimistic = False
+        entry.stale = False
+        entry.expires_at = time.monotonic() + self.ttl
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê cache trạng thái giỏ hàng.
+
+        Returns:
+            Dict[str, Any]: Số giỏ hàng, hit/miss khi đọc, số lần cập nhật từ mutation, cập nhật
+            lạc quan, số lần đối chiếu, số kết quả đọc bị bỏ do cũ và số lần vô hiệu hóa theo lý do.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "ttl": self.ttl,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "reads_stored": self.reads_stored,
+                "reads_discarded": self.reads_discarded,
+                "mutation_updates": self.mutation_updates,
+                "optimistic_updates": self.optimistic_updates,
+                "reconciled": self.reconciled,
+                "invalidations": dict(self.invalidations)
+            }
+
+
+_cart_state_cache = CartStateCache(
+    ttl=Config.CART_STATE_TTL,
+    max_entries=Config.CART_STATE_MAX_ENTRIES,
+    enabled=Config.CART_STATE_ENABLED
+)
+
+
+def get_cart_state_cache() -> CartStateCache:
+    """Trả về cache trạng thái giỏ hàng dùng chung của tiến trình."""
+    return _cart_state_cache
@@ -0,0 +1,756 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Snapshot catalog sản phẩm cục bộ với chỉ mục ngược cho tìm kiếm tiếng Việt.
+
+Snapshot được lưu thành file dạng cột (sku, name, fingerprint, item) và được
+đọc qua `mmap`, nên chỉ các item thực sự trả về mới được giải mã JSON. Chỉ mục
+ngược dùng token đã bỏ dấu ("sua" khớp "sữa"), hỗ trợ khớp tiền tố và xếp hạng
+BM25. Khi làm mới, chỉ các sản phẩm thay đổi (khác fingerprint) mới được đánh
+chỉ mục lại.
+
+Chỉ snapshot bao phủ toàn bộ catalog (lần làm mới đầy đủ gần nhất, `complete_at`
+trong metadata, còn trong `max_age`) mới trả lời tìm kiếm thay cho API: số kết quả
+và danh sách sản phẩm của snapshot chỉ chứa một phần catalog (dựng bằng cách duyệt
+theo từ khóa) không phải là của cửa hàng.
+
+Bố cục file:
+    MAGIC | các khối cột | footer JSON | độ dài footer (uint32) | MAGIC
+Mỗi khối cột gồm mảng offset uint32 (count + 1 phần tử) và phần dữ liệu UTF-8.
+"""
+
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .query_normalizer import get_query_normalizer
+from .text_utils import tokenize
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"MMCAT01\n"
+COLUMNS = ("sku", "name", "fingerprint", "item")
+
+# Tham số BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+# Trọng số cho term khớp theo tiền tố và số term tối đa mở rộng cho mỗi tiền tố
+PREFIX_WEIGHT = 0.8
+MAX_PREFIX_TERMS = 50
+# Số truy vấn đã xếp hạng được giữ lại
+RANKED_CACHE_SIZE = 256
+
+
+def _file_signature(path: str) -> Optional[Tuple[int, int, int]]:
+    """Chữ ký (mtime, kích thước, inode) của file, None nếu file không tồn tại."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+def item_fingerprint(item: Dict[str, Any]) -> str:
+    """Fingerprint nội dung của một item, dùng để phát hiện thay đổi khi làm mới."""
+    payload = json.dumps(item, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+
+class CatalogSnapshot:
+    """
+    Bản đọc (read-only) của file snapshot qua `mmap`.
+
+    Args:
+        path: Đường dẫn file snapshot.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+        view = self._mmap
+        if view[:len(MAGIC)] != MAGIC or view[-len(MAGIC):] != MAGIC:
+            self.close()
+            raise ValueError(f"File snapshot không hợp lệ: {path}")
+        footer_end = len(view) - len(MAGIC) - 4
+        (footer_len,) = struct.unpack_from("<I", view, footer_end)
+        self.meta: Dict[str, Any] = json.loads(view[footer_end - footer_len:footer_end].decode("utf-8"))
+        self.count: int = self.meta["count"]
+        self.deleted: Set[int] = set(self.meta.get("deleted", []))
+        # column -> (vị trí mảng offset, vị trí dữ liệu)
+        self._columns: Dict[str, Tuple[int, int]] = {
+            name: tuple(position) for name, position in self.meta["columns"].items()
+        }
+
+    def value(self, column: str, doc_id: int) -> bytes:
+        """
+        Đọc giá trị thô của một ô.
+
+        Args:
+            column: Tên cột.
+            doc_id: Chỉ số dòng.
+
+        Returns:
+            bytes: Dữ liệu UTF-8 của ô.
+        """
+        offsets_pos, data_pos = self._columns[column]
+        start, end = struct.unpack_from("<II", self._mmap, offsets_pos + doc_id * 4)
+        return self._mmap[data_pos + start:data_pos + end]
+
+    def text(self, column: str, doc_id: int) -> str:
+        """Đọc giá trị của một ô dưới dạng chuỗi."""
+        return self.value(column, doc_id).decode("utf-8")
+
+    def item(self, doc_id: int) -> Dict[str, Any]:
+        """Giải mã item GraphQL của một dòng."""
+        return json.loads(self.value("item", doc_id))
+
+    def close(self):
+        """Đóng mmap và file."""
+        try:
+            self._mmap.close()
+        finally:
+            self._file.close()
+
+    @staticmethod
+    def write(path: str, rows: Dict[str, List[bytes]], meta: Dict[str, Any]):
+        """
+        Ghi snapshot mới (ghi ra file tạm rồi thay thế nguyên tử).
+
+        Args:
+            path: Đường dẫn file snapshot.
+            rows: Dữ liệu theo cột, mỗi cột là danh sách bytes cùng độ dài.
+            meta: Metadata lưu trong footer (count, deleted, thời điểm làm mới...).
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        columns: Dict[str, List[int]] = {}
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            for name in COLUMNS:
+                values = rows[name]
+                offsets = [0]
+                for data in values:
+                    offsets.append(offsets[-1] + len(data))
+                offsets_pos = f.tell()
+                f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+                columns[name] = [offsets_pos, f.tell()]
+                f.writelines(values)
+            footer = json.dumps(dict(meta, columns=columns), ensure_ascii=False).encode("utf-8")
+            f.write(footer)
+            f.write(struct.pack("<I", len(footer)))
+            f.write(MAGIC)
+        os.replace(tmp_path, path)
+
+
+class LocalCatalog:
+    """
+    Catalog sản phẩm cục bộ của một cửa hàng.
+
+    Args:
+        path: Đường dẫn file snapshot.
+        store_code: Mã cửa hàng của snapshot.
+        max_age: Tuổi tối đa của snapshot (giây); quá hạn thì tìm kiếm chuyển sang API.
+        compact_ratio: Tỷ lệ dòng đã xóa mà khi vượt quá sẽ nén lại toàn bộ file.
+        reload_interval: Khoảng thời gian tối thiểu (giây) giữa hai lần kiểm tra file
+            snapshot có bị thay (ví dụ bởi CLI làm mới) hay chưa.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        store_code: str = Config.STORE_CODE,
+        max_age: float = Config.CATALOG_MAX_AGE,
+        compact_ratio: float = Config.CATALOG_COMPACT_RATIO,
+        reload_interval: float = Config.CATALOG_RELOAD_INTERVAL
+    ):
+        self.path = path
+        self.store_code = store_code
+        self.max_age = max_age
+        self.compact_ratio = compact_ratio
+        self.reload_interval = reload_interval
+        self._lock = threading.RLock()
+        self._snapshot: Optional[CatalogSnapshot] = None
+        # Chữ ký file của snapshot đang dùng và thời điểm kiểm tra gần nhất
+        self._signature: Optional[Tuple[int, int, int]] = None
+        self._checked_at: Optional[float] = None
+        self._reset_index()
+        self.local_hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.partial = 0
+        self.reloads = 0
+
+    def _reset_index(self):
+        # term -> {doc_id: tần suất}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_len: Dict[int, int] = {}
+        self._total_len = 0
+        self._sku_to_doc: Dict[str, int] = {}
+        self._vocab: Optional[List[str]] = None
+        self._invalidate_scores()
+
+    def _invalidate_scores(self):
+        # Điểm BM25 phụ thuộc độ dài trung bình nên bị hủy mỗi khi chỉ mục thay đổi
+        self._impacts: Dict[str, Dict[int, float]] = {}
+        self._ranked: "OrderedDict[Tuple[str, ...], List[int]]" = OrderedDict()
+
+    # ---- Nạp và đánh chỉ mục ----
+
+    def load(self) -> bool:
+        """
+        Nạp snapshot từ file và dựng chỉ mục.
+
+        Returns:
+            bool: True nếu nạp thành công.
+        """
+        signature = _file_signature(self.path)
+        if signature is None:
+            return False
+        try:
+            snapshot = CatalogSnapshot(self.path)
+        except Exception as e:
+            logger.error(f"Lỗi khi nạp snapshot catalog {self.path}: {str(e)}")
+            return False
+        with self._lock:
+            self._swap_snapshot(snapshot)
+            self._signature = signature
+            self._reset_index()
+            for doc_id in range(snapshot.count):
+                if doc_id not in snapshot.deleted:
+                    self._index_doc(doc_id, snapshot.text("sku", doc_id), snapshot.text("name", doc_id))
+        logger.info(f"Đã nạp catalog cục bộ {self.store_code}: {len(self._doc_len)} sản phẩm")
+        return True
+
+    def reload_if_changed(self, force: bool = False) -> bool:
+        """
+        Nạp lại snapshot nếu file đã bị thay từ bên ngoài (hoặc chưa từng nạp được).
+
+        Việc kiểm tra (một lần `stat`) được giới hạn tối đa mỗi `reload_interval` giây.
+        Nếu file bị xóa, snapshot đang dùng được giữ nguyên.
+
+        Args:
+            force: Bỏ qua giới hạn tần suất kiểm tra.
+
+        Returns:
+            bool: True nếu đã nạp (lại) snapshot.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not force and self._checked_at is not None and now - self._checked_at < self.reload_interval:
+                return False
+            self._checked_at = now
+            signature = _file_signature(self.path)
+            if signature is None or signature == self._signature:
+                return False
+            was_loaded = self._snapshot is not None
+            if not self.load():
+                return False
+            if was_loaded:
+                self.reloads += 1
+            return True
+
+    @property
+    def loaded(self) -> bool:
+        """Đã có snapshot được nạp hay chưa."""
+        return self._snapshot is not None
+
+    def _swap_snapshot(self, snapshot: Optional[CatalogSnapshot]):
+        old, self._snapshot = self._snapshot, snapshot
+        if old is not None:
+            old.close()
+
+    def _doc_terms(self, sku: str, name: str) -> List[str]:
+        return tokenize(name) + tokenize(sku)
+
+    def _index_doc(self, doc_id: int, sku: str, name: str):
+        terms = self._doc_terms(sku, name)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._vocab = None
+            postings[doc_id] = postings.get(doc_id, 0) + 1
+        self._doc_len[doc_id] = len(terms)
+        self._total_len += len(terms)
+        self._sku_to_doc[sku] = doc_id
+        if self._impacts or self._ranked:
+            self._invalidate_scores()
+
+    def _unindex_doc(self, doc_id: int, sku: str, name: str):
+        for term in set(self._doc_terms(sku, name)):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[term]
+                self._vocab = None
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+        if self._sku_to_doc.get(sku) == doc_id:
+            del self._sku_to_doc[sku]
+        if self._impacts or self._ranked:
+            self._invalidate_scores()
+
+    # ---- Tìm kiếm ----
+
+    @property
+    def size(self) -> int:
+        """Số sản phẩm còn hiệu lực trong catalog."""
+        return len(self._doc_len)
+
+    def is_fresh(self) -> bool:
+        """Kiểm tra snapshot còn trong thời hạn `max_age`."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return False
+        return time.time() - snapshot.meta.get("refreshed_at", 0) <= self.max_age
+
+    def covers_catalog(self) -> bool:
+        """
+        Kiểm tra snapshot có bao phủ toàn bộ catalog của cửa hàng không.
+
+        Returns:
+            bool: True nếu lần làm mới đầy đủ (`update(..., complete=True)`) gần nhất
+            còn trong thời hạn `max_age`.
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return False
+        complete_at = snapshot.meta.get("complete_at")
+        return complete_at is not None and time.time() - complete_at <= self.max_age
+
+    def _expand(self, token: str, prefix: bool) -> List[Tuple[str, float]]:
+        """Trả về các term khớp với token (chính xác và/hoặc theo tiền tố) kèm trọng số."""
+        terms = [(token, 1.0)] if token in self._postings else []
+        if prefix or not terms:
+            if self._vocab is None:
+                self._vocab = sorted(self._postings)
+            start = bisect.bisect_left(self._vocab, token)
+            for term in self._vocab[start:start + MAX_PREFIX_TERMS + 1]:
+                if not term.startswith(token):
+                    break
+                if term != token:
+                    terms.append((term, PREFIX_WEIGHT))
+        return terms
+
+    def _term_impacts(self, term: str) -> Dict[int, float]:
+        """Điểm BM25 của term cho từng tài liệu (tính một lần, hủy khi chỉ mục thay đổi)."""
+        impacts = self._impacts.get(term)
+        if impacts is None:
+            postings = self._postings[term]
+            doc_count = len(self._doc_len)
+            avg_len = self._total_len / doc_count
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            doc_len = self._doc_len
+            impacts = {
+                doc_id: idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_len[doc_id] / avg_len))
+                for doc_id, tf in postings.items()
+            }
+            self._impacts[term] = impacts
+        return impacts
+
+    def _token_scores(self, token: str, prefix: bool) -> Dict[int, float]:
+        """Điểm của một token truy vấn: lấy điểm cao nhất trong các term khớp."""
+        terms = self._expand(token, prefix)
+        if len(terms) == 1 and terms[0][1] == 1.0:
+            return self._term_impacts(token)
+        scores: Dict[int, float] = {}
+        for term, weight in terms:
+            for doc_id, impact in self._term_impacts(term).items():
+                score = weight * impact
+                if score > scores.get(doc_id, 0.0):
+                    scores[doc_id] = score
+        return scores
+
+    def _rank(self, tokens: Tuple[str, ...]) -> List[int]:
+        """Xếp hạng tài liệu khớp mọi token (kết quả được cache tới khi chỉ mục thay đổi)."""
+        ranked = self._ranked.get(tokens)
+        if ranked is not None:
+            self._ranked.move_to_end(tokens)
+            return ranked
+        groups = [
+            self._token_scores(token, prefix=position == len(tokens) - 1)
+            for position, token in enumerate(tokens)
+        ]
+        # Giao từ nhóm nhỏ nhất để chỉ chấm điểm các ứng viên cần thiết
+        groups.sort(key=len)
+        scores = groups[0]
+        for group in groups[1:]:
+            scores = {doc_id: score + group[doc_id] for doc_id, score in scores.items() if doc_id in group}
+            if not scores:
+                break
+        ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+        self._ranked[tokens] = ranked
+        if len(self._ranked) > RANKED_CACHE_SIZE:
+            self._ranked.popitem(last=False)
+        return ranked
+
+    def search(self, query: str, page_size: int = 10, current_page: int = 1) -> Optional[Dict[str, Any]]:
+        """
+        Tìm kiếm trong catalog cục bộ.
+
+        Mọi token của truy vấn phải khớp (token cuối được khớp theo tiền tố). Chỉ
+        snapshot bao phủ toàn bộ catalog (`covers_catalog`) mới trả lời, nên
+        `total_count` là tổng số kết quả của cửa hàng.
+
+        Args:
+            query: Từ khóa tìm kiếm.
+            page_size: Số lượng sản phẩm trên mỗi trang.
+            current_page: Trang hiện tại.
+
+        Returns:
+            Optional[Dict[str, Any]]: Kết quả cùng cấu trúc với API, hoặc None nếu
+            snapshot quá hạn/chỉ chứa một phần catalog/không có kết quả (cần chuyển sang API).
+        """
+        tokens = tuple(dict.fromkeys(tokenize(query)))
+        with self._lock:
+            if self._snapshot is None or not tokens or not self._doc_len:
+                self.misses += 1
+                return None
+            if not self.is_fresh():
+                self.stale += 1
+                return None
+            if not self.covers_catalog():
+                self.partial += 1
+                return None
+
+            ranked = self._rank(tokens)
+            if not ranked:
+                self.misses += 1
+                return None
+
+            offset = (max(current_page, 1) - 1) * page_size
+            items = [self._snapshot.item(doc_id) for doc_id in ranked[offset:offset + page_size]]
+            self.local_hits += 1
+
+        return {
+            "success": True,
+            "data": {"products": {"items": items, "total_count": len(ranked)}},
+            "message": "Success",
+            "source": "local_catalog"
+        }
+
+    # ---- Cập nhật snapshot ----
+
+    def update(self, items: Iterable[Dict[str, Any]], complete: bool = False) -> Dict[str, int]:
+        """
+        Làm mới snapshot theo kiểu tăng dần.
+
+        Sản phẩm không đổi fingerprint được giữ nguyên (không đánh chỉ mục lại);
+        sản phẩm thay đổi được đánh dấu xóa và ghi thêm vào cuối. Khi tỷ lệ dòng
+        đã xóa vượt `compact_ratio`, file được nén lại.
+
+        Args:
+            items: Các item sản phẩm GraphQL mới nhất.
+            complete: True nếu `items` là toàn bộ catalog (sản phẩm không có mặt sẽ bị xóa,
+                và snapshot được ghi nhận là bao phủ toàn bộ catalog tại thời điểm này).
+
+        Returns:
+            Dict[str, int]: Số sản phẩm thêm mới, cập nhật, xóa và không đổi.
+        """
+        items = [item for item in items if isinstance(item, dict) and item.get("sku")]
+        summary = {"added": 0, "updated": 0, "removed": 0, "unchanged": 0}
+        with self._lock:
+            snapshot = self._snapshot
+            old_count = snapshot.count if snapshot is not None else 0
+            deleted = set(snapshot.deleted) if snapshot is not None else set()
+            removed_docs: List[int] = []
+            appended: Dict[str, Tuple[Dict[str, Any], str]] = {}
+
+            for item in items:
+                sku = item["sku"]
+                fingerprint = item_fingerprint(item)
+                doc_id = self._sku_to_doc.get(sku)
+                if doc_id is not None and snapshot.text("fingerprint", doc_id) == fingerprint:
+                    summary["unchanged"] += 1
+                    continue
+                if doc_id is not None:
+                    removed_docs.append(doc_id)
+                    summary["updated"] += 1
+                elif sku not in appended:
+                    summary["added"] += 1
+                appended[sku] = (item, fingerprint)
+
+            if complete:
+                seen = {item["sku"] for item in items}
+                for sku, doc_id in list(self._sku_to_doc.items()):
+                    if sku not in seen:
+                        removed_docs.append(doc_id)
+                        summary["removed"] += 1
+
+            for doc_id in removed_docs:
+                self._unindex_doc(doc_id, snapshot.text("sku", doc_id), snapshot.text("name", doc_id))
+                deleted.add(doc_id)
+
+            total_rows = old_count + len(appended)
+            if total_rows and len(deleted) / total_rows > self.compact_ratio:
+                self._compact(snapshot, old_count, deleted, appended, complete)
+            else:
+                self._write(snapshot, old_count, deleted, appended, complete)
+                for offset, (sku, (item, _)) in enumerate(appended.items()):
+                    self._index_doc(old_count + offset, sku, item.get("name") or "")
+
+        logger.info(f"Đã làm mới catalog cục bộ {self.store_code}: {summary}")
+        return summary
+
+    def _rows(
+        self,
+        snapshot: Optional[CatalogSnapshot],
+        doc_ids: Iterable[int],
+        appended: Dict[str, Tuple[Dict[str, Any], str]]
+    ) -> Dict[str, List[bytes]]:
+        """Gom dữ liệu theo cột: các dòng cũ được sao chép nguyên bytes, không giải mã lại."""
+        rows: Dict[str, List[bytes]] = {name: [] for name in COLUMNS}
+        for doc_id in doc_ids:
+            for name in COLUMNS:
+                rows[name].append(snapshot.value(name, doc_id))
+        for sku, (item, fingerprint) in appended.items():
+            rows["sku"].append(sku.encode("utf-8"))
+            rows["name"].append((item.get("name") or "").encode("utf-8"))
+            rows["fingerprint"].append(fingerprint.encode("utf-8"))
+            rows["item"].append(json.dumps(item, ensure_ascii=False).encode("utf-8"))
+        return rows
+
+    def _meta(self, count: int, deleted: Set[int], complete: bool) -> Dict[str, Any]:
+        previous = self._snapshot.meta if self._snapshot is not None else {}
+        now = time.time()
+        return {
+            "version": 1,
+            "store_code": self.store_code,
+            "count": count,
+            "deleted": sorted(deleted),
+            "built_at": previous.get("built_at") or now,
+            "refreshed_at": now,
+            # Thời điểm làm mới đầy đủ gần nhất; làm mới một phần không thay đổi độ bao phủ
+            "complete_at": now if complete else previous.get("complete_at")
+        }
+
+    def _write(
+        self,
+        snapshot: Optional[CatalogSnapshot],
+        old_count: int,
+        deleted: Set[int],
+        appended: Dict[str, Tuple[Dict[str, Any], str]],
+        complete: bool
+    ):
+        rows = self._rows(snapshot, range(old_count), appended)
+        meta = self._meta(old_count + len(appended), deleted, complete)
+        # Đóng mmap cũ trước khi thay file (bắt buộc trên Windows)
+        self._swap_snapshot(None)
+        CatalogSnapshot.write(self.path, rows, meta)
+        self._snapshot = CatalogSnapshot(self.path)
+        self._signature = _file_signature(self.path)
+
+    def _compact(
+        self,
+        snapshot: Optional[CatalogSnapshot],
+        old_count: int,
+        deleted: Set[int],
+        appended: Dict[str, Tuple[Dict[str, Any], str]],
+        complete: bool
+    ):
+        live = [doc_id for doc_id in range(old_count) if doc_id not in deleted]
+        rows = self._rows(snapshot, live, appended)
+        meta = self._meta(len(rows["sku"]), set(), complete)
+        self._swap_snapshot(None)
+        CatalogSnapshot.write(self.path, rows, meta)
+        snapshot = CatalogSnapshot(self.path)
+        self._snapshot = snapshot
+        self._signature = _file_signature(self.path)
+        # Số thứ tự dòng thay đổi sau khi nén nên phải dựng lại chỉ mục
+        self._reset_index()
+        for doc_id in range(snapshot.count):
+            self._index_doc(doc_id, snapshot.text("sku", doc_id), snapshot.text("name", doc_id))
+
+    def names(self) -> List[str]:
+        """Tên của các sản phẩm còn hiệu lực (dùng để học từ vựng tìm kiếm)."""
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None:
+                return []
+            return [snapshot.text("name", doc_id) for doc_id in self._doc_len]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê catalog cục bộ.
+
+        Returns:
+            Dict[str, Any]: Số sản phẩm, số term, tuổi snapshot, snapshot có bao phủ toàn bộ
+            catalog không và số lần trả lời cục bộ/chuyển sang API.
+        """
+        snapshot = self._snapshot
+        refreshed_at = snapshot.meta.get("refreshed_at") if snapshot is not None else None
+        return {
+            "store_code": self.store_code,
+            "products": self.size,
+            "terms": len(self._postings),
+            "age_seconds": round(time.time() - refreshed_at, 1) if refreshed_at else None,
+            "fresh": self.is_fresh(),
+            "complete": self.covers_catalog(),
+            "local_hits": self.local_hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "partial": self.partial,
+            "reloads": self.reloads
+        }
+
+    def close(self):
+        """Giải phóng snapshot."""
+        with self._lock:
+            self._swap_snapshot(None)
+            self._reset_index()
+
+
+# Catalog theo store_code (kể cả cửa hàng chưa có snapshot, để thử nạp lại sau)
+_catalogs: Dict[str, LocalCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def catalog_path(store_code: str) -> str:
+    """Đường dẫn file snapshot của một cửa hàng."""
+    return os.path.join(Config.CATALOG_DIR, f"catalog_{store_code}.bin")
+
+
+def get_local_catalog(store_code: str) -> Optional[LocalCatalog]:
+    """
+    Lấy catalog cục bộ của cửa hàng.
+
+    Snapshot được nạp ở lần gọi đầu tiên và được nạp lại khi file bị thay (ví dụ
+    sau khi CLI làm mới snapshot); cửa hàng chưa có snapshot được thử lại sau mỗi
+    `CATALOG_RELOAD_INTERVAL` giây thay vì bị ghi nhớ là không có.
+
+    Args:
+        store_code: Mã cửa hàng.
+
+    Returns:
+        Optional[LocalCatalog]: Catalog đã nạp, hoặc None nếu tính năng bị tắt hay chưa có snapshot.
+    """
+    if not Config.CATALOG_ENABLED:
+        return None
+    catalog = _catalogs.get(store_code)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(store_code)
+            if catalog is None:
+                catalog = _catalogs[store_code] = LocalCatalog(catalog_path(store_code), store_code)
+    if catalog.reload_if_changed():
+        # Tên sản phẩm trong catalog là nguồn từ vựng cho bước chuẩn hóa truy vấn
+        get_query_normalizer().learn(catalog.names())
+    return catalog if catalog.loaded else None
+
+
+def get_catalog_stats() -> Dict[str, Any]:
+    """Thống kê các catalog cục bộ đã nạp."""
+    return {
+        "enabled": Config.CATALOG_ENABLED,
+        "stores": {code: catalog.stats() for code, catalog in list(_catalogs.items()) if catalog.loaded}
+    }
+
+
+async def collect_search_items(api, queries: Iterable[str], page_size: int = 100, max_pages: int = 20) -> List[Dict[str, Any]]:
+    """
+    Thu thập item sản phẩm bằng cách duyệt các trang của `search_products`.
+
+    Gọi thẳng API (`_fetch_search`), không qua cache hay chính catalog cục bộ.
+
+    Args:
+        api: ProductAPI đã đặt store_code.
+        queries: Các từ khóa dùng để duyệt catalog.
+        page_size: Số sản phẩm mỗi trang.
+        max_pages: Số trang tối đa cho mỗi từ khóa.
+
+    Returns:
+        List[Dict[str, Any]]: Các item (không trùng SKU).
+    """
+    items: Dict[str, Dict[str, Any]] = {}
+    for query in queries:
+        for page in range(1, max_pages + 1):
+            result = await api._fetch_search(query, page_size, page)
+            if not result.get("success", False):
+                logger.warning(f"Không tải được trang {page} cho '{query}': {result.get('message')}")
+                break
+            products = result.get("data", {}).get("products", {}) or {}
+            for item in products.get("items") or []:
+                if isinstance(item, dict) and item.get("sku"):
+                    items[item["sku"]] = item
+            if page * page_size >= (products.get("total_count") or 0):
+                break
+    return list(items.values())
+
+
+def read_export(path: str) -> List[Dict[str, Any]]:
+    """
+    Đọc file export catalog (mảng JSON hoặc JSON Lines).
+
+    Args:
+        path: Đường dẫn file export.
+
+    Returns:
+        List[Dict[str, Any]]: Các item sản phẩm.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        return json.loads(content)
+    return [json.loads(line) for line in content.splitlines() if line.strip()]
+
+
+async def _refresh_from_api(store_code: str, queries: List[str], page_size: int, max_pages: int) -> List[Dict[str, Any]]:
+    from .product import ProductAPI
+
+    api = ProductAPI(Config.API_BASE_URL, Config.API_TIMEOUT)
+    api.set_store_code(store_code)
+    try:
+        return await collect_search_items(api, queries, page_size, max_pages)
+    finally:
+        await api.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dựng/làm mới snapshot catalog sản phẩm cục bộ")
+    parser.add_argument("--store", default=Config.STORE_CODE, help="Mã cửa hàng")
+    parser.add_argument("--export", help="File export catalog (JSON/JSONL), coi là toàn bộ catalog")
+    parser.add_argument(
+        "--query", action="append", default=[],
+        help="Từ khóa để duyệt catalog qua search_products (chỉ một phần catalog: không dùng để trả lời tìm kiếm)"
+    )
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--max-pages", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=Config.LOG_FORMAT)
+    catalog = LocalCatalog(catalog_path(args.store), args.store)
+    catalog.load()
+    if args.export:
+        summary = catalog.update(read_export(args.export), complete=True)
+    elif args.query:
+        items = asyncio.run(_refresh_from_api(args.store, args.query, args.page_size, args.max_pages))
+        summary = catalog.update(items)
+    else:
+        parser.error("Cần --export hoặc ít nhất một --query")
+    print(json.dumps({"summary": summary, "stats": catalog.stats()}, ensure_ascii=False, indent=2))
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Cache hồ sơ khách hàng đã đăng nhập.
+
+Hồ sơ (`customer` của `get_customer_info`) được nạp một lần khi đăng nhập (`login`,
+`login_with_mcard`) và giữ theo cửa hàng và khách hàng (email). Lần đọc sau khi quá
+`CUSTOMER_PROFILE_TTL` vẫn trả về bản đang có và kích hoạt làm mới trên loop nền bằng
+token hiện tại của khách hàng; bản quá `CUSTOMER_PROFILE_MAX_AGE` bị bỏ. Phiên chat
+được gắn với khách hàng khi đăng nhập, để backend gộp hồ sơ tài khoản với hồ sơ do
+frontend gửi (`merge_profiles`) khi chuẩn bị context cho mô hình.
+"""
+
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .background import BackgroundLoop, get_background_loop
+from .cache import TTLCache
+from .token_manager import AuthTokenManager
+from config import Config
+from mm_a2a.shared_state import SharedMapping, get_shared_store
+
+logger = logging.getLogger(__name__)
+
+
+ProfileKey = Tuple[str, str]
+
+
+def customer_profile_key(store_code: Optional[str], email: Optional[str]) -> Optional[ProfileKey]:
+    """Khóa cache của khách hàng (cửa hàng, email chuẩn hóa), hoặc None."""
+    email = (email or "").strip().lower()
+    return (store_code or Config.STORE_CODE, email) if email else None
+
+
+def profile_fields(customer: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Chuyển hồ sơ tài khoản sang các trường của user_profile frontend.
+
+    Args:
+        customer: Phần `customer` của `get_customer_info`.
+
+    Returns:
+        Dict[str, Any]: Các trường `name`, `email`, `phone`, `address` có giá trị.
+    """
+    if not customer:
+        return {}
+    addresses = customer.get("addresses") or []
+    address = next((item for item in addresses if item.get("default_shipping")), addresses[0] if addresses else {})
+    street = address.get("street") or []
+    region = (address.get("region") or {}).get("region")
+    fields = {
+        "name": " ".join(part for part in (customer.get("lastname"), customer.get("firstname")) if part),
+        "email": customer.get("email"),
+        "phone": address.get("telephone"),
+        "address": ", ".join(part for part in [*street, address.get("city"), region] if part)
+    }
+    return {key: value for key, value in fields.items() if value}
+
+
+def merge_profiles(frontend: Optional[Dict[str, Any]], customer: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Gộp hồ sơ tài khoản vào user_profile của frontend.
+
+    Trường tài khoản điền vào chỗ frontend không gửi; giá trị frontend gửi (thường mới
+    hơn, ví dụ địa chỉ nhận hàng vừa nhập) được giữ nguyên.
+
+    Args:
+        frontend: user_profile do frontend gửi.
+        customer: Phần `customer` của `get_customer_info` (từ cache).
+
+    Returns:
+        Dict[str, Any]: Hồ sơ đã gộp.
+    """
+    merged = profile_fields(customer)
+    for key, value in (frontend or {}).items():
+        if value not in (None, "", [], {}):
+            merged[key] = value
+    return merged
+
+
+class _ProfileEntry:
+    """Hồ sơ của một khách hàng cùng ngữ cảnh để làm mới."""
+
+    __slots__ = ("customer", "fetched_at", "base_url", "store_code", "tokens")
+
+    def __init__(self, customer, base_url, store_code, tokens):
+        self.customer = customer
+        self.fetched_at = time.monotonic()
+        self.base_url = base_url
+        self.store_code = store_code
+        self.tokens = tokens
+
+
+class CustomerProfileCache:
+    """
+    Cache hồ sơ khách hàng theo (cửa hàng, email), làm mới nền theo TTL (an toàn đa luồng).
+
+    Args:
+        fetcher: Hàm `(base_url, store_code, token)` trả về coroutine lấy phần `customer`,
+            kết quả là dict hoặc None nếu thất bại.
+        ttl: Tuổi (giây) mà sau đó lần đọc kích hoạt làm mới nền.
+        max_age: Tuổi tối đa (giây) của hồ sơ được phục vụ.
+        max_entries: Số khách hàng tối đa (LRU).
+        enabled: Bật/tắt cache.
+        background: Loop nền để làm mới (mặc định dùng loop chung).
+        shared: Kho dùng chung giữa các worker (None khi chạy một worker): lưu hồ sơ theo
+            phiên để worker khác phục vụ được phiên đã đăng nhập (không làm mới nền).
+    """
+
+    def __init__(
+        self,
+        fetcher: Callable[[str, str, str], Awaitable[Optional[Dict[str, Any]]]],
+        ttl: float = 600.0,
+        max_age: float = 24 * 3600,
+        max_entries: int = 1024,
+        enabled: bool = True,
+        background: Optional[BackgroundLoop] = None,
+        shared: Optional[MutableMapping] = None
+    ):
+        self._fetcher = fetcher
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._background = background
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[ProfileKey, _ProfileEntry]" = OrderedDict()
+        # session_id -> khóa khách hàng, sống lâu như hồ sơ
+        self._sessions = TTLCache(max_entries=max_entries * 4, ttl=max_age)
+        self._shared = shared
+        self._refreshing: set = set()
+        self.shared_hits = 0
+        self.hits = 0
+        self.misses = 0
+        self.loaded = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def store(
+        self,
+        customer: Dict[str, Any],
+        base_url: str,
+        store_code: str,
+        tokens: AuthTokenManager
+    ) -> Optional[ProfileKey]:
+        """
+        Lưu hồ sơ vừa lấy từ API (khi đăng nhập hoặc khi cache chưa có).
+
+        Args:
+            customer: Phần `customer` của `get_customer_info`.
+            base_url: URL API.
+            store_code: Mã cửa hàng.
+            tokens: Token manager của khách hàng (dùng token hiện tại khi làm mới).
+
+        Returns:
+            Optional[ProfileKey]: Khóa khách hàng, hoặc None nếu không lưu.
+        """
+        key = customer_profile_key(store_code, (customer or {}).get("email"))
+        if not self.enabled or key is None:
+            return None
+        with self._lock:
+            self._entries[key] = _ProfileEntry(copy.deepcopy(customer), base_url, store_code, tokens)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.loaded += 1
+        return key
+
+    def get(self, key: Optional[ProfileKey]) -> Optional[Dict[str, Any]]:
+        """
+        Lấy hồ sơ khách hàng, kích hoạt làm mới nền nếu đã quá TTL.
+
+        Args:
+            key: Khóa khách hàng (`customer_profile_key`).
+
+        Returns:
+            Optional[Dict[str, Any]]: Bản sao phần `customer`, hoặc None nếu chưa có/quá cũ.
+        """
+        if not self.enabled or not key:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            age = time.monotonic() - entry.fetched_at if entry is not None else None
+            if entry is None or age > self.max_age:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            customer = copy.deepcopy(entry.customer)
+        if age > self.ttl:
+            self.refresh(key)
+        return customer
+
+    def bind_session(self, session_id: Optional[str], store_code: Optional[str], email: Optional[str]):
+        """Gắn phiên chat với khách hàng vừa đăng nhập tại cửa hàng."""
+        key = customer_profile_key(store_code, email)
+        if self.enabled and session_id and key:
+            self._sessions.set(session_id, key)
+            if self._shared is not None:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    customer = copy.deepcopy(entry.customer) if entry is not None else None
+                if customer is not None:
+                    self._shared[session_id] = {"customer": customer, "stored_at": time.time()}
+
+    def for_session(self, session_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Hồ sơ tài khoản của khách hàng đã đăng nhập trong phiên chat, hoặc None."""
+        if not self.enabled or not session_id:
+            return None
+        customer = self.get(self._sessions.get(session_id))
+        if customer is None and self._shared is not None:
+            # Phiên đã đăng nhập ở worker khác
+            snapshot = self._shared.get(session_id)
+            if snapshot and time.time() - snapshot["stored_at"] <= self.max_age:
+                with self._lock:
+                    self.shared_hits += 1
+                customer = snapshot["customer"]
+        return customer
+
+    def refresh(self, key: ProfileKey) -> bool:
+        """
+        Làm mới hồ sơ trên loop nền (mỗi khách hàng chỉ một tác vụ làm mới).
+
+        Returns:
+            bool: True nếu đã lên lịch làm mới.
+        """
+        with self._lock:
+            if key in self._refreshing or key not in self._entries:
+                return False
+            self._refreshing.add(key)
+        background = self._background or get_background_loop()
+        future = background.submit(self._refresh(key))
+        future.add_done_callback(lambda _: self._finish_refresh(key))
+        return True
+
+    async def _refresh(self, key: ProfileKey):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            base_url, store_code, tokens = entry.base_url, entry.store_code, entry.tokens
+        token = tokens.token
+        customer = None
+        if token:
+            try:
+                customer = await self._fetcher(base_url, store_code, token)
+            except Exception as e:
+                logger.error(f"Lỗi khi làm mới hồ sơ khách hàng: {str(e)}")
+        with self._lock:
+            if customer is None or customer_profile_key(store_code, customer.get("email")) != key:
+                # Giữ bản đang có tới khi quá max_age (token hết hạn thì không làm mới được)
+                self.refresh_failures += 1
+                return
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.customer = customer
+                entry.fetched_at = time.monotonic()
+                self.refreshes += 1
+
+    def _finish_refresh(self, key: ProfileKey):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def clear(self):
+        """Xóa toàn bộ cache."""
+        with self._lock:
+            self._entries.clear()
+        self._sessions.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê cache hồ sơ khách hàng.
+
+        Returns:
+            Dict[str, Any]: Số hồ sơ, số phiên đã gắn, hit/miss (và số lần dùng bản của worker
+            khác), số lần nạp khi đăng nhập và số lần làm mới nền thành công/thất bại.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "ttl": self.ttl,
+                "entries": len(self._entries),
+                "sessions": len(self._sessions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "shared_hits": self.shared_hits,
+                "loaded": self.loaded,
+                "refreshes": self.refreshes,
+                "refresh_failures": self.refresh_failures
+            }
+
+
+async def _fetch_customer(base_url: str, store_code: str, token: str) -> Optional[Dict[str, Any]]:
+    """Lấy hồ sơ khách hàng trên loop nền bằng client riêng, không dùng cache."""
+    from .auth import AuthAPI
+
+    # Ngữ cảnh riêng: làm mới nền không được đăng nhập lại thay cho client của lượt chat
+    client = AuthAPI(base_url, Config.API_TIMEOUT)
+    client.set_store_code(store_code)
+    client.set_auth_token(token)
+    try:
+        result = await client.fetch_customer_info()
+    finally:
+        await client.close()
+    return (result.get("data") or {}).get("customer") if result.get("success", False) else None
+
+
+_shared_store = get_shared_store()
+_customer_profiles = CustomerProfileCache(
+    _fetch_customer,
+    ttl=Config.CUSTOMER_PROFILE_TTL,
+    max_age=Config.CUSTOMER_PROFILE_MAX_AGE,
+    max_entries=Config.CUSTOMER_PROFILE_MAX_ENTRIES,
+    enabled=Config.CUSTOMER_PROFILE_ENABLED,
+    shared=SharedMapping(_shared_store, "customer_sessions") if _shared_store is not None else None
+)
+
+
+def get_customer_profiles() -> CustomerProfileCache:
+    """Trả về cache hồ sơ khách hàng dùng chung của tiến trình."""
+    return _customer_profiles
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Khóa idempotency và sổ ghi nhận (ledger) cho các mutation.
+
+Magento không hỗ trợ khóa idempotency phía server, nên việc chống gửi trùng được
+làm ở phía client:
+- mỗi thao tác ghi mang một khóa do client tạo (`make_idempotency_key`), ổn định
+  giữa các lần thử lại của cùng một thao tác (ví dụ cùng lượt chat, cùng tham số)
+- `MutationLedger.run` gửi mutation một lần cho mỗi khóa: lần gọi trùng khóa khi
+  mutation đang chạy sẽ chờ kết quả của lần đầu, sau khi thành công sẽ nhận lại kết
+  quả đã ghi nhận thay vì gửi lại
+Kết quả thất bại không được ghi nhận để thao tác có thể được thử lại; trường hợp
+không rõ mutation đã được áp dụng hay chưa (timeout, lỗi mạng) được đối chiếu bằng
+cách đọc lại giỏ hàng trước khi gửi lại (xem `CartAPI._reconcile_add`).
+"""
+
+import asyncio
+import concurrent.futures
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Mã lỗi cho biết không rõ mutation đã được server áp dụng hay chưa
+AMBIGUOUS_ERROR_CODES = frozenset({"TIMEOUT", "HTTP_ERROR", "UNKNOWN_ERROR", "RESPONSE_ERROR", "CART_QUEUE_ERROR"})
+
+
+def make_idempotency_key(*parts: Any) -> str:
+    """
+    Tạo khóa idempotency ổn định từ các thành phần của thao tác.
+
+    Args:
+        parts: Các thành phần xác định thao tác (loại thao tác, phạm vi, tham số).
+
+    Returns:
+        str: Khóa dạng hex.
+    """
+    raw = "\x1f".join("" if part is None else str(part) for part in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def is_ambiguous_failure(result: Dict[str, Any]) -> bool:
+    """Kết quả thất bại mà mutation có thể đã được áp dụng (timeout, lỗi mạng, HTTP 5xx)."""
+    if result.get("success", False):
+        return False
+    status = result.get("status")
+    return result.get("code") in AMBIGUOUS_ERROR_CODES or (isinstance(status, int) and status >= 500)
+
+
+class MutationLedger:
+    """
+    Sổ ghi nhận mutation theo khóa idempotency (an toàn đa luồng).
+
+    Args:
+        ttl: Thời gian giữ kết quả thành công của một khóa (giây).
+        max_entries: Số khóa tối đa được giữ (LRU).
+        enabled: Bật/tắt chống gửi trùng.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 4096, enabled: bool = True):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        # khóa -> (hết hạn, future kết quả); hết hạn None khi mutation đang chạy
+        self._entries: "OrderedDict[str, Tuple[Optional[float], concurrent.futures.Future]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.deduplicated = 0
+        self.joined = 0
+        self.reconciled = 0
+
+    def _claim(self, key: str) -> Tuple[bool, Optional[concurrent.futures.Future]]:
+        """Trả về (là lần gửi đầu, future của lần gửi đầu nếu khóa đã có)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, future = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    return False, future
+                del self._entries[key]
+            future = concurrent.futures.Future()
+            self._entries[key] = (None, future)
+            self.sent += 1
+            while len(self._entries) > self.max_entries:
+                oldest_key, (oldest_expires, _) = next(iter(self._entries.items()))
+                if oldest_expires is None:
+                    break  # Không loại mutation đang chạy
+                del self._entries[oldest_key]
+            return True, future
+
+    def _finish(self, key: str, future: concurrent.futures.Future, result: Optional[Dict[str, Any]]):
+        with self._lock:
+            if result is not None and result.get("success", False):
+                self._entries[key] = (time.monotonic() + self.ttl, future)
+            elif self._entries.get(key, (None, None))[1] is future:
+                # Thất bại: cho phép thử lại với cùng khóa
+                del self._entries[key]
+        if not future.done():
+            future.set_result(result)
+
+    async def run(self, key: Optional[str], send: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Gửi mutation tối đa một lần cho mỗi khóa.
+
+        Args:
+            key: Khóa idempotency (None thì gửi bình thường).
+            send: Hàm gửi mutation, trả về kết quả dạng dict.
+
+        Returns:
+            Dict[str, Any]: Kết quả của mutation; kết quả dùng lại từ lần gửi trước có
+            `deduplicated: True`.
+        """
+        if not self.enabled or not key:
+            return await send()
+
+        owner, future = self._claim(key)
+        if not owner:
+            in_flight = not future.done()
+            recorded = await asyncio.wrap_future(future) if in_flight else future.result()
+            if recorded is None or not recorded.get("success", False):
+                # Lần gửi đầu thất bại: gửi lại như thao tác mới
+                return await self.run(key, send)
+            with self._lock:
+                if in_flight:
+                    self.joined += 1
+                else:
+                    self.deduplicated += 1
+            logger.debug("Bỏ qua mutation trùng khóa %.12s", key)
+            return dict(recorded, deduplicated=True)
+
+        result = None
+        try:
+            result = await send()
+            return result
+        finally:
+            self._finish(key, future, result)
+
+    def record_reconciled(self):
+        """Ghi nhận một lần tránh gửi lại nhờ đọc lại trạng thái sau lỗi không rõ kết quả."""
+        with self._lock:
+            self.reconciled += 1
+
+    def clear(self):
+        """Xóa toàn bộ ledger."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê ledger mutation.
+
+        Returns:
+            Dict[str, Any]: Số khóa đang giữ, số mutation đã gửi, số lần dùng lại kết quả đã ghi
+            nhận, số lần chờ mutation trùng đang chạy và số lần tránh gửi lại nhờ đối chiếu.
+        """
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "sent": self.sent,
+                "deduplicated": self.deduplicated,
+                "joined": self.joined,
+                "reconciled": self.reconciled
+            }
+
+
+_mutation_ledger = MutationLedger(
+    ttl=Config.IDEMPOTENCY_TTL,
+    max_entries=Config.IDEMPOTENCY_MAX_ENTRIES,
+    enabled=Config.IDEMPOTENCY_ENABLED
+)
+
+
+def get_mutation_ledger() -> MutationLedger:
+    """Trả về ledger mutation dùng chung của tiến trình."""
+    return _mutation_ledger
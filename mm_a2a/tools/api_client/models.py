@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Các model gọn nhẹ (dùng __slots__) cho sản phẩm và giỏ hàng.
+
+Dữ liệu GraphQL được giải mã một lần thành các đối tượng có trường tính sẵn
+(final_price, discount_percent, unit...), thay vì duyệt lại các chuỗi dict lồng
+nhau ở mỗi lớp xử lý. Chỉ chuyển ngược về dict tại ranh giới API (kết quả trả
+về cho agent/frontend) thông qua `to_dict()`.
+"""
+
+from typing import Dict, Any, List, Optional, Iterable
+
+
+def _value(node: Optional[Dict[str, Any]], *path: str) -> Any:
+    """Lấy giá trị theo đường dẫn khóa, trả về None nếu thiếu bất kỳ nút nào."""
+    for key in path:
+        if not isinstance(node, dict):
+            return None
+        node = node.get(key)
+    return node
+
+
+def _number(value: Any) -> float:
+    """Chuyển giá trị về số thực, mặc định 0 khi không hợp lệ."""
+    if value is None:
+        return 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class PriceInfo:
+    """Thông tin giá đã được chuẩn hóa của một sản phẩm."""
+
+    __slots__ = ("regular_price", "final_price", "currency", "amount_off", "discount_percent")
+
+    def __init__(
+        self,
+        regular_price: float = 0.0,
+        final_price: float = 0.0,
+        currency: str = "VND",
+        amount_off: float = 0.0,
+        discount_percent: float = 0.0
+    ):
+        self.regular_price = regular_price
+        self.final_price = final_price
+        self.currency = currency
+        self.amount_off = amount_off
+        self.discount_percent = discount_percent
+
+    @classmethod
+    def from_graphql(cls, item: Dict[str, Any]) -> "PriceInfo":
+        """
+        Giải mã giá từ các khối `price` và `price_range` của GraphQL.
+
+        Args:
+            item: Item sản phẩm từ GraphQL.
+
+        Returns:
+            PriceInfo: Giá đã chuẩn hóa.
+        """
+        regular_amount = _value(item, "price", "regularPrice", "amount") or {}
+        maximum_price = _value(item, "price_range", "maximum_price") or {}
+        final_amount = maximum_price.get("final_price") or {}
+        discount = maximum_price.get("discount") or {}
+
+        regular_price = _number(regular_amount.get("value"))
+        final_price = _number(final_amount.get("value")) if final_amount else regular_price
+        amount_off = _number(discount.get("amount_off"))
+        percent_off = _number(discount.get("percent_off"))
+
+        # Tính phần trăm giảm giá nếu API không trả về sẵn
+        if not percent_off and regular_price > 0 and final_price < regular_price:
+            percent_off = round((regular_price - final_price) * 100 / regular_price, 2)
+        if not amount_off and final_price < regular_price:
+            amount_off = regular_price - final_price
+
+        currency = final_amount.get("currency") or regular_amount.get("currency") or "VND"
+        return cls(regular_price, final_price, currency, amount_off, percent_off)
+
+
+class Product:
+    """
+    Sản phẩm đã được giải mã từ GraphQL.
+
+    Giữ tham chiếu tới item gốc (`raw`) để chuyển về dict tại ranh giới API mà
+    không phải sao chép hay dựng lại cấu trúc lồng nhau.
+    """
+
+    __slots__ = ("id", "sku", "name", "url_key", "unit", "image_url", "price", "raw")
+
+    def __init__(
+        self,
+        id: Any,
+        sku: str,
+        name: str,
+        price: PriceInfo,
+        url_key: str = "",
+        unit: str = "",
+        image_url: str = "",
+        raw: Optional[Dict[str, Any]] = None
+    ):
+        self.id = id
+        self.sku = sku
+        self.name = name
+        self.price = price
+        self.url_key = url_key
+        self.unit = unit
+        self.image_url = image_url
+        self.raw = raw
+
+    @property
+    def final_price(self) -> float:
+        return self.price.final_price
+
+    @property
+    def regular_price(self) -> float:
+        return self.price.regular_price
+
+    @property
+    def discount_percent(self) -> float:
+        return self.price.discount_percent
+
+    @classmethod
+    def from_graphql(cls, item: Dict[str, Any]) -> "Product":
+        """
+        Giải mã một item sản phẩm GraphQL.
+
+        Args:
+            item: Item sản phẩm từ `products.items`.
+
+        Returns:
+            Product: Sản phẩm đã giải mã.
+        """
+        # Truyền tham số theo vị trí: hàm này nằm trên đường nóng khi gộp/sắp xếp trang kết quả
+        small_image = item.get("small_image")
+        return cls(
+            item.get("id"),
+            item.get("sku") or "",
+            item.get("name") or "",
+            PriceInfo.from_graphql(item),
+            item.get("url_key") or "",
+            item.get("unit_ecom") or "",
+            (small_image.get("url") if isinstance(small_image, dict) else None) or "",
+            item
+        )
+
+    @classmethod
+    def decode_many(cls, items: Optional[Iterable[Dict[str, Any]]]) -> List["Product"]:
+        """Giải mã danh sách item sản phẩm, bỏ qua các phần tử không hợp lệ."""
+        return [cls.from_graphql(item) for item in items or () if isinstance(item, dict)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Trả về dict tại ranh giới API (item GraphQL gốc nếu có)."""
+        if self.raw is not None:
+            return self.raw
+        return {
+            "id": self.id,
+            "sku": self.sku,
+            "name": self.name,
+            "url_key": self.url_key,
+            "unit_ecom": self.unit,
+            "small_image": {"url": self.image_url},
+            "price": {
+                "regularPrice": {
+                    "amount": {"currency": self.price.currency, "value": self.price.regular_price}
+                }
+            },
+            "price_range": {
+                "maximum_price": {
+                    "final_price": {"currency": self.price.currency, "value": self.price.final_price},
+                    "discount": {
+                        "amount_off": self.price.amount_off,
+                        "percent_off": self.price.discount_percent
+                    }
+                }
+            }
+        }
+
+    def to_summary(self) -> Dict[str, Any]:
+        """Dict phẳng, gọn cho prompt và frontend."""
+        return {
+            "product_id": self.id,
+            "sku": self.sku,
+            "name": self.name,
+            "price": self.price.final_price,
+            "original_price": self.price.regular_price,
+            "discount_percentage": self.price.discount_percent,
+            "currency": self.price.currency,
+            "unit": self.unit,
+            "image_url": self.image_url
+        }
+
+
+class CartItem:
+    """Một dòng sản phẩm trong giỏ hàng."""
+
+    __slots__ = ("id", "sku", "name", "quantity", "price", "row_total", "currency", "raw")
+
+    def __init__(
+        self,
+        id: Any,
+        sku: str,
+        name: str,
+        quantity: float,
+        price: float,
+        row_total: float,
+        currency: str = "VND",
+        raw: Optional[Dict[str, Any]] = None
+    ):
+        self.id = id
+        self.sku = sku
+        self.name = name
+        self.quantity = quantity
+        self.price = price
+        self.row_total = row_total
+        self.currency = currency
+        self.raw = raw
+
+    @classmethod
+    def from_dict(cls, item: Dict[str, Any]) -> "CartItem":
+        """
+        Giải mã một dòng giỏ hàng.
+
+        Chấp nhận cả cấu trúc GraphQL (`product`, `prices`) lẫn cấu trúc phẳng
+        từ frontend (`name`, `quantity`, `price`).
+
+        Args:
+            item: Dòng giỏ hàng.
+
+        Returns:
+            CartItem: Dòng giỏ hàng đã giải mã.
+        """
+        quantity = _number(item.get("quantity", 1))
+        product = item.get("product")
+        prices = item.get("prices")
+
+        if isinstance(product, dict) or isinstance(prices, dict):
+            product = product or {}
+            unit_price = _value(prices, "price") or {}
+            row_total = _value(prices, "row_total") or {}
+            price = _number(unit_price.get("value"))
+            return cls(
+                id=item.get("id"),
+                sku=product.get("sku") or "",
+                name=product.get("name") or "",
+                quantity=quantity,
+                price=price,
+                row_total=_number(row_total.get("value")) if row_total else price * quantity,
+                currency=unit_price.get("currency") or row_total.get("currency") or "VND",
+                raw=item
+            )
+
+        price = _number(item.get("price"))
+        return cls(
+            id=item.get("id"),
+            sku=item.get("sku") or "",
+            name=item.get("name") or "",
+            quantity=quantity,
+            price=price,
+            row_total=price * quantity,
+            raw=item
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Trả về dict tại ranh giới API."""
+        if self.raw is not None:
+            return self.raw
+        return {
+            "id": self.id,
+            "sku": self.sku,
+            "name": self.name,
+            "quantity": self.quantity,
+            "price": self.price,
+            "row_total": self.row_total
+        }
+
+
+class Cart:
+    """Giỏ hàng đã được giải mã từ GraphQL."""
+
+    __slots__ = ("id", "items", "total_quantity", "grand_total", "currency", "is_guest", "raw")
+
+    def __init__(
+        self,
+        id: Optional[str],
+        items: List[CartItem],
+        total_quantity: float = 0.0,
+        grand_total: float = 0.0,
+        currency: str = "VND",
+        is_guest: Optional[bool] = None,
+        raw: Optional[Dict[str, Any]] = None
+    ):
+        self.id = id
+        self.items = items
+        self.total_quantity = total_quantity
+        self.grand_total = grand_total
+        self.currency = currency
+        self.is_guest = is_guest
+        self.raw = raw
+
+    @classmethod
+    def from_graphql(cls, cart: Dict[str, Any]) -> "Cart":
+        """
+        Giải mã giỏ hàng từ kết quả `cart` của GraphQL.
+
+        Args:
+            cart: Dict giỏ hàng.
+
+        Returns:
+            Cart: Giỏ hàng đã giải mã.
+        """
+        items_block = cart.get("itemsV2") or {}
+        items = [CartItem.from_dict(item) for item in items_block.get("items") or () if isinstance(item, dict)]
+        grand_total = _value(cart, "prices", "grand_total") or {}
+        total_quantity = items_block.get("total_quantity")
+        return cls(
+            id=cart.get("id"),
+            items=items,
+            total_quantity=_number(total_quantity) if total_quantity is not None else sum(i.quantity for i in items),
+            grand_total=_number(grand_total.get("value")) if grand_total else sum(i.row_total for i in items),
+            currency=grand_total.get("currency") or "VND",
+            is_guest=cart.get("is_guest"),
+            raw=cart
+        )
+
+    def find_line(self, cart_item_id: Any) -> Optional[CartItem]:
+        """Tìm dòng giỏ hàng theo ID dòng (`cart_item_id`)."""
+        cart_item_id = str(cart_item_id)
+        for item in self.items:
+            if str(item.id) == cart_item_id:
+                return item
+        return None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Trả về dict tại ranh giới API."""
+        if self.raw is not None:
+            return self.raw
+        return {
+            "id": self.id,
+            "is_guest": self.is_guest,
+            "itemsV2": {
+                "items": [item.to_dict() for item in self.items],
+                "total_quantity": self.total_quantity
+            },
+            "prices": {
+                "grand_total": {"value": self.grand_total, "currency": self.currency}
+            }
+        }
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Prefetch nền cho trang kết quả tiếp theo.
+
+Sau khi phục vụ trang N, trang N+1 được tải trước trên loop nền và lưu vào
+cache tìm kiếm. Số lượng prefetch đồng thời bị giới hạn bởi một ngân sách
+chung, và các prefetch của một phiên bị hủy khi phiên đó chuyển sang truy vấn
+khác.
+"""
+
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from .background import BackgroundLoop, get_background_loop
+from .cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+
+class SearchPrefetcher:
+    """
+    Điều phối các prefetch nền và thống kê hiệu quả của chúng.
+
+    Args:
+        cache: Cache tìm kiếm nhận kết quả prefetch.
+        max_inflight: Ngân sách prefetch đồng thời cho toàn tiến trình.
+        enabled: Bật/tắt prefetch.
+        background: Loop nền để chạy prefetch (mặc định dùng loop chung).
+    """
+
+    def __init__(
+        self,
+        cache: TTLCache,
+        max_inflight: int = 4,
+        enabled: bool = True,
+        background: Optional[BackgroundLoop] = None
+    ):
+        self.cache = cache
+        self.max_inflight = max_inflight
+        self.enabled = enabled
+        self._background = background
+        self._lock = threading.Lock()
+        # key -> (scope, group, future)
+        self._inflight: Dict[Hashable, Tuple[Any, Any, concurrent.futures.Future]] = {}
+        # Các khóa do prefetch ghi vào cache và chưa được đọc
+        self._unread: set = set()
+        self.scheduled = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.skipped = 0
+        self.hits = 0
+        self.expired_unread = 0
+        # Nhận thông báo khi mục prefetch bị loại khỏi cache mà chưa được đọc
+        cache.on_evict = self._on_evict
+
+    def schedule(
+        self,
+        scope: Any,
+        group: Any,
+        key: Hashable,
+        fetch: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> bool:
+        """
+        Lên lịch prefetch cho một khóa cache.
+
+        Args:
+            scope: Phạm vi sở hữu prefetch (thường là session_id).
+            group: Nhóm trong phạm vi (thường là truy vấn), dùng để hủy khi phiên chuyển truy vấn.
+            key: Khóa cache sẽ nhận kết quả.
+            fetch: Hàm không tham số trả về coroutine tải dữ liệu.
+
+        Returns:
+            bool: True nếu prefetch đã được lên lịch.
+        """
+        if not self.enabled or self.cache.contains(key):
+            return False
+        with self._lock:
+            if key in self._inflight:
+                return False
+            if len(self._inflight) >= self.max_inflight:
+                self.skipped += 1
+                return False
+            background = self._background or get_background_loop()
+            future = background.submit(self._run(key, fetch))
+            self._inflight[key] = (scope, group, future)
+            self.scheduled += 1
+        future.add_done_callback(lambda _: self._finish(key))
+        return True
+
+    def cancel_scope(self, scope: Any, keep_group: Any = None) -> int:
+        """
+        Hủy các prefetch đang chạy của một phạm vi, trừ nhóm `keep_group`.
+
+        Args:
+            scope: Phạm vi cần hủy.
+            keep_group: Nhóm được giữ lại (truy vấn hiện tại của phiên).
+
+        Returns:
+            int: Số prefetch đã hủy.
+        """
+        if scope is None:
+            return 0
+        with self._lock:
+            targets = [
+                future for owner, group, future in self._inflight.values()
+                if owner == scope and group != keep_group
+            ]
+        count = sum(1 for future in targets if future.cancel())
+        if count:
+            with self._lock:
+                self.cancelled += count
+        return count
+
+    def record_hit(self, key: Hashable):
+        """Ghi nhận một lần đọc cache; tính là hit prefetch nếu mục do prefetch ghi."""
+        with self._lock:
+            if key in self._unread:
+                self._unread.discard(key)
+                self.hits += 1
+
+    async def _run(self, key: Hashable, fetch: Callable[[], Awaitable[Dict[str, Any]]]):
+        try:
+            result = await fetch()
+        except Exception as e:
+            logger.debug(f"Prefetch thất bại cho {key}: {str(e)}")
+            with self._lock:
+                self.failed += 1
+            return
+        if result.get("success", False):
+            with self._lock:
+                self._unread.add(key)
+                self.completed += 1
+            self.cache.set(key, result)
+        else:
+            with self._lock:
+                self.failed += 1
+
+    def _finish(self, key: Hashable):
+        with self._lock:
+            self._inflight.pop(key, None)
+
+    def _on_evict(self, key: Hashable, value: Any):
+        with self._lock:
+            if key in self._unread:
+                self._unread.discard(key)
+                self.expired_unread += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê prefetch.
+
+        Returns:
+            Dict[str, Any]: Số prefetch đã lên lịch/hoàn thành, tỷ lệ hit và số lần tải lãng phí
+            (bị hủy, thất bại hoặc hết hạn mà chưa được đọc).
+        """
+        with self._lock:
+            wasted = self.cancelled + self.failed + self.expired_unread
+            return {
+                "enabled": self.enabled,
+                "inflight": len(self._inflight),
+                "scheduled": self.scheduled,
+                "completed": self.completed,
+                "hits": self.hits,
+                "hit_rate": round(self.hits / self.completed, 4) if self.completed else 0.0,
+                "wasted": wasted,
+                "cancelled": self.cancelled,
+                "failed": self.failed,
+                "expired_unread": self.expired_unread,
+                "skipped_budget": self.skipped,
+                "pending_unread": len(self._unread)
+            }
@@ -5,23 +5,334 @@
 API module cho các thao tác liên quan đến sản phẩm
 """
 
+import copy
+import heapq
 import logging
 import asyncio
-from typing import Dict, Any, Optional, List
+import unicodedata
+from operator import attrgetter
+from typing import Dict, Any, Optional, List, Iterable, Tuple
 
 from .base import APIClientBase
+from .cache import TTLCache
+from .catalog import get_catalog_stats, get_local_catalog
+from .models import Product
+from .prefetch import SearchPrefetcher
+from .query_normalizer import NormalizedQuery, get_query_normalizer, normalize_query
+from config import Config
+from mm_a2a.tracing import record_cache
 
 logger = logging.getLogger(__name__)
 
+# Cache kết quả tìm kiếm dùng chung cho mọi client trong tiến trình
+_search_cache = TTLCache(
+    max_entries=Config.SEARCH_CACHE_MAX_ENTRIES,
+    ttl=Config.SEARCH_CACHE_TTL
+)
+_prefetcher = SearchPrefetcher(
+    _search_cache,
+    max_inflight=Config.PREFETCH_MAX_INFLIGHT,
+    enabled=Config.PREFETCH_ENABLED
+)
+# Cache facet/aggregation của suggest_products (ít thay đổi nên TTL dài hơn kết quả sản phẩm)
+_aggregation_cache = TTLCache(
+    max_entries=Config.AGGREGATION_CACHE_MAX_ENTRIES,
+    ttl=Config.AGGREGATION_CACHE_TTL
+)
+# Client dùng cho prefetch, chỉ được truy cập từ loop nền
+_background_clients: Dict[Tuple[str, str], "ProductAPI"] = {}
+
+
+def search_cache_key(store_code: str, query: str, page_size: int, current_page: int) -> Tuple:
+    """Tạo khóa cache cho một trang kết quả tìm kiếm."""
+    return ("search", store_code, " ".join(query.lower().split()), page_size, current_page)
+
+
+def aggregation_cache_key(store_code: str, query: str) -> Tuple:
+    """
+    Tạo khóa cache aggregation theo cửa hàng và truy vấn.
+
+    Truy vấn chỉ được chuẩn hóa chữ thường, khoảng trắng và dạng Unicode (NFC); dấu được
+    giữ lại vì bỏ dấu làm các truy vấn khác nghĩa trùng khóa ("thịt bò" và "thịt bơ").
+    """
+    return ("aggregations", store_code, " ".join(unicodedata.normalize("NFC", query).lower().split()))
+
+
+def build_search_suggestions(aggregations: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Dựng danh sách gợi ý điều chỉnh tìm kiếm từ khối aggregations.
+
+    Args:
+        aggregations: Khối `products.aggregations` của GraphQL.
+
+    Returns:
+        List[Dict[str, Any]]: Các nhóm bộ lọc có sản phẩm.
+    """
+    return [
+        {
+            "type": agg["attribute_code"],
+            "label": agg["label"],
+            "options": agg["options"]
+        }
+        for agg in aggregations or []
+        if agg["count"] > 0
+    ]
+
+
+def get_search_cache_stats() -> Dict[str, Any]:
+    """
+    Thống kê cache tìm kiếm và prefetch.
+
+    Returns:
+        Dict[str, Any]: Thống kê của cache tìm kiếm, cache aggregation, prefetch, catalog cục bộ
+        và chuẩn hóa truy vấn.
+    """
+    return {
+        "search_cache": _search_cache.stats(),
+        "aggregation_cache": _aggregation_cache.stats(),
+        "prefetch": _prefetcher.stats(),
+        "catalog": get_catalog_stats(),
+        "query_normalizer": get_query_normalizer().stats()
+    }
+
+
+async def _fetch_in_background(base_url: str, store_code: str, query: str, page_size: int, current_page: int):
+    """Tải một trang kết quả trên loop nền bằng client riêng của loop đó."""
+    client = _background_clients.get((base_url, store_code))
+    if client is None:
+        client = ProductAPI(base_url, Config.API_TIMEOUT)
+        client.set_store_code(store_code)
+        _background_clients[(base_url, store_code)] = client
+    return await client._fetch_search(query, page_size, current_page)
+
+
+def _needs_fallback(normalized: NormalizedQuery, result: Dict[str, Any]) -> bool:
+    """Truy vấn viết lại thành công nhưng không có sản phẩm: cần tìm lại bằng truy vấn gốc."""
+    if not normalized.changed or not result.get("success", False):
+        return False
+    return not (result.get("data", {}).get("products", {}) or {}).get("items")
+
+
+def _record_search_outcome(
+    normalized: NormalizedQuery,
+    result: Dict[str, Any],
+    scope: Optional[str] = None,
+    store_code: Optional[str] = None
+):
+    """Ghi nhận kết quả cho thống kê chuẩn hóa truy vấn và học từ vựng từ tên sản phẩm trả về."""
+    if not result.get("success", False):
+        return
+    items = (result.get("data", {}).get("products", {}) or {}).get("items") or []
+    normalizer = get_query_normalizer()
+    normalizer.record_result(normalized, len(items), scope, store_code)
+    if items and result.get("source") != "local_catalog":
+        normalizer.learn(item.get("name") or "" for item in items if isinstance(item, dict))
+
+
+def _first_occurrences(
+    pages: List[List[Product]],
+    allowed_ids: Optional[set] = None,
+    limit: Optional[int] = None
+) -> List[Product]:
+    """Lấy lần xuất hiện đầu tiên của mỗi id theo thứ tự trang, dừng khi đủ `limit` sản phẩm."""
+    seen = set()
+    result = []
+    for items in pages:
+        for item in items:
+            item_id = item.id
+            if item_id in seen or (allowed_ids is not None and item_id not in allowed_ids):
+                continue
+            seen.add(item_id)
+            result.append(item)
+            if limit is not None and len(result) >= limit:
+                return result
+    return result
+
+
+def merge_product_pages(
+    pages: Iterable[List[Product]],
+    sort: Optional[Dict[str, str]] = None,
+    combine_mode: str = "union",
+    page_size: int = 10,
+    current_page: int = 1
+) -> Tuple[List[Product], int]:
+    """
+    Gộp các trang kết quả của nhiều từ khóa và trả về đúng một trang.
+
+    Thuật toán (N: tổng số item, U: số sản phẩm không trùng,
+    k = current_page * page_size):
+
+    1. Một lượt duyệt duy nhất qua N item để thu id và loại trùng: O(N) thời
+       gian, O(U) bộ nhớ. Tổng số sản phẩm được tính từ lượt duyệt này.
+    2. "intersection": giao các tập id, rồi lấy item từ trang đầu tiên (mọi id
+       chung đều xuất hiện ở đó nên đây cũng là lần xuất hiện đầu tiên), không
+       duyệt lại các trang còn lại: O(N).
+    3. Không sắp xếp: duyệt theo thứ tự xuất hiện và dừng ngay khi đủ k item,
+       O(k) phần lớn trường hợp.
+       Sắp xếp theo giá: chọn top-k bằng heap có kích thước k, khóa là
+       `Product.regular_price` đã giải mã sẵn: O(U log k) thay vì O(U log U)
+       khi sắp xếp toàn bộ.
+
+    Thứ tự các item bằng giá được giữ ổn định như khi sắp xếp toàn bộ danh sách.
+
+    Args:
+        pages: Danh sách sản phẩm đã giải mã của từng từ khóa (theo thứ tự từ khóa).
+        sort: Tiêu chí sắp xếp, hỗ trợ {"price": "ASC"|"DESC"}.
+        combine_mode: "union" hoặc "intersection".
+        page_size: Số sản phẩm trên mỗi trang.
+        current_page: Trang cần lấy.
+
+    Returns:
+        Tuple[List[Product], int]: Các sản phẩm của trang và tổng số sản phẩm không trùng.
+    """
+    pages = list(pages)
+    start_idx = max(current_page - 1, 0) * page_size
+    end_idx = start_idx + page_size
+    direction = (sort or {}).get("price")
+
+    if combine_mode == "intersection":
+        if not pages:
+            return [], 0
+        common_ids = set.intersection(*[{item.id for item in items} for items in pages])
+        candidates = _first_occurrences(pages[:1], common_ids)
+        total_count = len(candidates)
+    elif direction in ("ASC", "DESC"):
+        candidates = _first_occurrences(pages)
+        total_count = len(candidates)
+    else:
+        # Không sắp xếp: tổng số lấy từ tập id, chỉ dựng đủ k item đầu tiên rồi dừng
+        total_count = len({item.id for items in pages for item in items})
+        candidates = _first_occurrences(pages, limit=end_idx) if start_idx < total_count else []
+
+    if start_idx >= total_count:
+        return [], total_count
+
+    if direction == "ASC":
+        top_items = heapq.nsmallest(end_idx, candidates, key=attrgetter("regular_price"))
+    elif direction == "DESC":
+        top_items = heapq.nlargest(end_idx, candidates, key=attrgetter("regular_price"))
+    else:
+        top_items = candidates
+
+    return top_items[start_idx:end_idx], total_count
+
+
+# Khối aggregations của truy vấn suggest_products (thường là phần lớn nhất của response)
+AGGREGATIONS_FIELDS = """aggregations {
+                    attribute_code
+                    count
+                    label
+                    options {
+                        label
+                        value
+                        count
+                    }
+                }"""
+
+
 class ProductAPI(APIClientBase):
     """
     API Client cho các thao tác liên quan đến sản phẩm.
     """
 
-    async def search_products(self, query: str, page_size: int = 10, current_page: int = 1) -> Dict[str, Any]:
+    async def search_products(
+        self,
+        query: str,
+        page_size: int = 10,
+        current_page: int = 1,
+        scope: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Tìm kiếm sản phẩm.
         
+        Truy vấn được chuẩn hóa trước (viết tắt, lỗi chính tả, dấu) để lần gọi
+        đầu tiên có kết quả thường xuyên hơn. Nếu có snapshot catalog cục bộ còn
+        hạn thì trả lời ngay từ chỉ mục cục bộ.
+        Ngược lại kết quả được lấy từ cache nếu có; sau khi phục vụ trang N, trang
+        N+1 được prefetch nền nếu `total_count` cho biết còn trang tiếp theo.
+        
+        Args:
+            query: Từ khóa tìm kiếm.
+            page_size: Số lượng sản phẩm trên mỗi trang.
+            current_page: Trang hiện tại.
+            scope: Phạm vi của prefetch (thường là session_id); các prefetch cũ
+                của phạm vi này bị hủy khi truy vấn thay đổi.
+            
+        Returns:
+            Dict[str, Any]: Kết quả tìm kiếm.
+        """
+        normalized = normalize_query(query)
+        result = await self._search_text(normalized.text, page_size, current_page, scope)
+        if _needs_fallback(normalized, result):
+            # Truy vấn viết lại không có kết quả: quay lại truy vấn gốc của người dùng
+            get_query_normalizer().record_fallback()
+            normalized = normalized.as_original()
+            result = await self._search_text(normalized.text, page_size, current_page, scope)
+        _record_search_outcome(normalized, result, scope, self._store_code)
+        
+        return result
+    
+    async def _search_text(
+        self,
+        query: str,
+        page_size: int,
+        current_page: int,
+        scope: Optional[str]
+    ) -> Dict[str, Any]:
+        """Tìm kiếm một truy vấn đã chuẩn hóa qua catalog cục bộ, cache hoặc API."""
+        # Phiên đã chuyển sang truy vấn khác: hủy các prefetch cũ của phiên
+        _prefetcher.cancel_scope(scope, keep_group=query)
+        
+        # Trả lời từ catalog cục bộ; None nghĩa là không có kết quả hoặc snapshot quá hạn
+        catalog = get_local_catalog(self._store_code)
+        if catalog is not None:
+            local_result = catalog.search(query, page_size, current_page)
+            record_cache("local_catalog", local_result is not None)
+            if local_result is not None:
+                return local_result
+        
+        cache_key = search_cache_key(self._store_code, query, page_size, current_page)
+        result = _search_cache.get(cache_key)
+        record_cache("product_search", result is not None)
+        if result is not None:
+            _prefetcher.record_hit(cache_key)
+        else:
+            result = await self._fetch_search(query, page_size, current_page)
+            if result.get("success", False):
+                _search_cache.set(cache_key, result)
+        
+        if result.get("success", False):
+            self._prefetch_next_page(scope, query, page_size, current_page, result)
+        
+        return result
+    
+    def _prefetch_next_page(
+        self,
+        scope: Optional[str],
+        query: str,
+        page_size: int,
+        current_page: int,
+        result: Dict[str, Any]
+    ):
+        """Lên lịch prefetch trang tiếp theo nếu còn kết quả."""
+        products = result.get("data", {}).get("products", {}) or {}
+        total_count = products.get("total_count") or 0
+        if current_page * page_size >= total_count:
+            return
+        
+        next_page = current_page + 1
+        base_url, store_code = self.base_url, self._store_code
+        _prefetcher.schedule(
+            scope,
+            query,
+            search_cache_key(store_code, query, page_size, next_page),
+            lambda: _fetch_in_background(base_url, store_code, query, page_size, next_page)
+        )
+    
+    async def _fetch_search(self, query: str, page_size: int, current_page: int) -> Dict[str, Any]:
+        """
+        Gửi truy vấn tìm kiếm sản phẩm tới API (không qua cache).
+        
         Args:
             query: Từ khóa tìm kiếm.
             page_size: Số lượng sản phẩm trên mỗi trang.
@@ -210,6 +521,9 @@ class ProductAPI(APIClientBase):
     ) -> Dict[str, Any]:
         """
         Đề xuất sản phẩm dựa trên query gốc với các bộ lọc và sắp xếp.
+        Query được chuẩn hóa (viết tắt, lỗi chính tả, dấu) trước khi gửi. Facet
+        (aggregations) được cache theo cửa hàng và truy vấn với TTL dài; khi cache
+        còn hạn, khối aggregations không được yêu cầu lại.
         
         Args:
             base_query: Query tìm kiếm cơ bản.
@@ -283,22 +597,54 @@ class ProductAPI(APIClientBase):
                     current_page
                     total_pages
                 }
-                aggregations {
-                    attribute_code
-                    count
-                    label
-                    options {
-                        label
-                        value
-                        count
-                    }
-                }
+                __AGGREGATIONS__
             }
         }
         """
         
+        normalized = normalize_query(base_query)
+        
+        try:
+            result = await self._execute_suggest(graphql_query, normalized.text, filters, sort, page_size, current_page)
+            if _needs_fallback(normalized, result):
+                # Truy vấn viết lại không có kết quả: quay lại truy vấn gốc của người dùng
+                get_query_normalizer().record_fallback()
+                normalized = normalized.as_original()
+                result = await self._execute_suggest(
+                    graphql_query, normalized.text, filters, sort, page_size, current_page
+                )
+            _record_search_outcome(normalized, result, store_code=self._store_code)
+            return result
+            
+        except Exception as e:
+            logger.error(f"Lỗi khi đề xuất sản phẩm: {str(e)}")
+            return {
+                "success": False,
+                "message": f"Error suggesting products: {str(e)}",
+                "code": "SUGGESTION_ERROR"
+            }
+    
+    async def _execute_suggest(
+        self,
+        graphql_query: str,
+        search: str,
+        filters: Optional[Dict[str, Any]],
+        sort: Optional[Dict[str, str]],
+        page_size: int,
+        current_page: int
+    ) -> Dict[str, Any]:
+        """Gửi truy vấn đề xuất sản phẩm, dùng facet trong cache nếu có."""
+        # Facet của truy vấn đã có trong cache thì không yêu cầu lại khối aggregations.
+        # Cache chỉ chứa facet của truy vấn không lọc, nên truy vấn có bộ lọc luôn yêu cầu facet
+        cache_key = aggregation_cache_key(self._store_code, search)
+        cached_facets = None if filters else _aggregation_cache.get(cache_key)
+        graphql_query = graphql_query.replace(
+            "__AGGREGATIONS__",
+            "" if cached_facets is not None else AGGREGATIONS_FIELDS
+        )
+        
         variables = {
-            "search": base_query,
+            "search": search,
             "pageSize": page_size,
             "currentPage": current_page
         }
@@ -309,42 +655,32 @@ class ProductAPI(APIClientBase):
         if sort:
             variables["sort"] = sort
         
-        try:
-            result = await self.execute_graphql(graphql_query, variables)
-            
-            if result.get("success", False):
-                data = result.get("data", {})
-                products = data.get("products", {})
-                
-                # Thêm các gợi ý điều chỉnh tìm kiếm
-                search_suggestions = []
-                aggregations = products.get("aggregations", [])
-                
-                for agg in aggregations:
-                    if agg["count"] > 0:
-                        search_suggestions.append({
-                            "type": agg["attribute_code"],
-                            "label": agg["label"],
-                            "options": agg["options"]
-                        })
-                
-                return {
-                    "success": True,
-                    "data": {
-                        "products": products,
-                        "suggestions": search_suggestions
-                    }
-                }
-            
+        result = await self.execute_graphql(graphql_query, variables)
+        if not result.get("success", False):
             return result
-            
-        except Exception as e:
-            logger.error(f"Lỗi khi đề xuất sản phẩm: {str(e)}")
-            return {
-                "success": False,
-                "message": f"Error suggesting products: {str(e)}",
-                "code": "SUGGESTION_ERROR"
+        
+        data = result.get("data", {})
+        products = data.get("products", {})
+        
+        # Thêm các gợi ý điều chỉnh tìm kiếm
+        if cached_facets is not None:
+            # Trả về bản sao để người gọi sửa kết quả không làm hỏng cache
+            aggregations, search_suggestions = copy.deepcopy(cached_facets)
+            products["aggregations"] = aggregations
+        else:
+            aggregations = products.get("aggregations", [])
+            search_suggestions = build_search_suggestions(aggregations)
+            # Chỉ lưu facet của truy vấn không lọc: chúng mô tả toàn bộ tập kết quả
+            if not filters:
+                _aggregation_cache.set(cache_key, copy.deepcopy((aggregations, search_suggestions)))
+        
+        return {
+            "success": True,
+            "data": {
+                "products": products,
+                "suggestions": search_suggestions
             }
+        }
             
     async def search_multiple_products(
         self,
@@ -369,10 +705,6 @@ class ProductAPI(APIClientBase):
         Returns:
             Dict[str, Any]: Kết quả tìm kiếm gộp lại.
         """
-        results = []
-        total_count = 0
-        seen_ids = set()
-        
         try:
             # Tìm kiếm song song cho tất cả từ khóa
             search_tasks = []
@@ -391,63 +723,26 @@ class ProductAPI(APIClientBase):
             # Chờ tất cả tìm kiếm hoàn thành
             search_results = await asyncio.gather(*search_tasks)
             
-            # Xử lý kết quả theo combine_mode
-            if combine_mode == "intersection":
-                # Chỉ giữ lại sản phẩm xuất hiện trong TẤT CẢ từ khóa
-                product_sets = []
-                for result in search_results:
-                    if result.get("success", False):
-                        products = result.get("data", {}).get("products", {})
-                        items = products.get("items", [])
-                        product_ids = {item["id"] for item in items}
-                        product_sets.append(product_ids)
-                
-                if product_sets:
-                    common_ids = set.intersection(*product_sets)
-                    # Lấy thông tin sản phẩm từ ID chung
-                    for result in search_results:
-                        if result.get("success", False):
-                            products = result.get("data", {}).get("products", {})
-                            items = products.get("items", [])
-                            for item in items:
-                                if item["id"] in common_ids and item["id"] not in seen_ids:
-                                    results.append(item)
-                                    seen_ids.add(item["id"])
-                                    total_count += 1
-            else:  # union mode
-                # Gộp tất cả sản phẩm, loại bỏ trùng lặp
-                for result in search_results:
-                    if result.get("success", False):
-                        products = result.get("data", {}).get("products", {})
-                        items = products.get("items", [])
-                        for item in items:
-                            if item["id"] not in seen_ids:
-                                results.append(item)
-                                seen_ids.add(item["id"])
-                                total_count += 1
-            
-            # Sắp xếp kết quả cuối cùng nếu cần
-            if sort:
-                results.sort(
-                    key=lambda x: (
-                        x.get("price", {}).get("regularPrice", {}).get("amount", {}).get("value", 0)
-                        if sort.get("price") == "ASC"
-                        else -x.get("price", {}).get("regularPrice", {}).get("amount", {}).get("value", 0)
-                        if sort.get("price") == "DESC"
-                        else 0
-                    )
-                )
-            
-            # Phân trang kết quả
-            start_idx = (current_page - 1) * page_size
-            end_idx = start_idx + page_size
-            paged_results = results[start_idx:end_idx]
+            # Giải mã mỗi trang kết quả một lần thành Product, rồi gộp theo combine_mode
+            # và chỉ lấy đúng trang được yêu cầu
+            pages = [
+                Product.decode_many(result.get("data", {}).get("products", {}).get("items", []))
+                for result in search_results
+                if result.get("success", False)
+            ]
+            paged_results, total_count = merge_product_pages(
+                pages,
+                sort=sort,
+                combine_mode=combine_mode,
+                page_size=page_size,
+                current_page=current_page
+            )
             
             return {
                 "success": True,
                 "data": {
                     "products": {
-                        "items": paged_results,
+                        "items": [product.to_dict() for product in paged_results],
                         "total_count": total_count,
                         "page_info": {
                             "page_size": page_size,
@@ -0,0 +1,505 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Chuẩn hóa truy vấn tìm kiếm trước khi gọi API.
+
+Các bước: tách từ, thay từ viết tắt/đồng nghĩa, sửa lỗi chính tả bằng tra cứu
+khoảng cách chỉnh sửa kiểu SymSpell trên từ vựng sản phẩm đã biết, và khôi phục
+dấu cho từ gõ không dấu. Dấu được khôi phục theo cặp từ liền kề (ví dụ "ca chua"
+chỉ thành "cà chua" khi cặp từ này có trong tên sản phẩm), hoặc theo từng từ khi
+dạng bỏ dấu chỉ có một cách viết; nếu còn từ mơ hồ thì giữ nguyên dấu của cả truy vấn.
+Từ vựng được học dần từ tên sản phẩm trong kết quả tìm kiếm và catalog cục bộ.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .cache import TTLCache
+from .text_utils import fold_diacritics
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+# Từ viết tắt và cách viết không dấu thường gặp (khóa đã bỏ dấu, tối đa 3 từ). Chỉ áp dụng
+# cho cụm từ người dùng gõ không dấu; không thêm đồng nghĩa đổi nghĩa (vd. "mì tôm" -> "mì gói")
+DEFAULT_SYNONYMS: Dict[str, str] = {
+    "ko": "không",
+    "dt": "điện thoại",
+    "nc": "nước",
+    "sp": "sản phẩm",
+    "tp": "thực phẩm",
+    "cafe": "cà phê",
+    "caphe": "cà phê",
+    "ca phe": "cà phê",
+    "bot giat": "bột giặt",
+    "nuoc rua chen": "nước rửa chén",
+    "nuoc rua bat": "nước rửa chén",
+    "nuoc xa vai": "nước xả vải",
+    "nuoc mam": "nước mắm",
+    "sua tuoi": "sữa tươi",
+    "sua chua": "sữa chua",
+    "dau an": "dầu ăn",
+}
+
+# Tỷ lệ tối thiểu của cách viết có dấu phổ biến nhất của một cặp từ để khôi phục dấu
+RESTORE_DOMINANCE = 0.8
+# Khoảng thời gian (giây) để coi một lần tìm kiếm là thử lại sau kết quả rỗng
+RETRY_WINDOW = 60
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Khoảng cách Damerau-Levenshtein (optimal string alignment) có ngưỡng.
+
+    Args:
+        a: Chuỗi thứ nhất.
+        b: Chuỗi thứ hai.
+        max_distance: Ngưỡng; trả về `max_distance + 1` khi vượt quá.
+
+    Returns:
+        int: Khoảng cách chỉnh sửa.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SymSpellIndex:
+    """
+    Chỉ mục xóa ký tự (symmetric delete) để tra cứu từ gần đúng.
+
+    Args:
+        max_distance: Khoảng cách chỉnh sửa tối đa được hỗ trợ.
+    """
+
+    def __init__(self, max_distance: int = 2):
+        self.max_distance = max_distance
+        self._deletes: Dict[str, Set[str]] = {}
+        self.counts: Counter = Counter()
+
+    def _variants(self, word: str, distance: int) -> Set[str]:
+        variants = {word}
+        frontier = {word}
+        for _ in range(distance):
+            frontier = {term[:i] + term[i + 1:] for term in frontier for i in range(len(term)) if len(term) > 1}
+            variants |= frontier
+        return variants
+
+    def add(self, word: str, count: int = 1):
+        """Thêm từ (đã bỏ dấu) vào chỉ mục."""
+        if word not in self.counts:
+            for variant in self._variants(word, self.max_distance):
+                self._deletes.setdefault(variant, set()).add(word)
+        self.counts[word] += count
+
+    def __contains__(self, word: str) -> bool:
+        return word in self.counts
+
+    def __len__(self) -> int:
+        return len(self.counts)
+
+    def lookup(self, word: str, max_distance: int) -> Optional[Tuple[str, int]]:
+        """
+        Tìm từ gần nhất trong chỉ mục.
+
+        Args:
+            word: Từ cần tra (đã bỏ dấu).
+            max_distance: Khoảng cách tối đa chấp nhận.
+
+        Returns:
+            Optional[Tuple[str, int]]: (từ gợi ý, khoảng cách), ưu tiên khoảng cách nhỏ rồi tần suất cao.
+        """
+        max_distance = min(max_distance, self.max_distance)
+        candidates: Set[str] = set()
+        for variant in self._variants(word, max_distance):
+            candidates |= self._deletes.get(variant, set())
+        best: Optional[Tuple[str, int]] = None
+        for candidate in candidates:
+            distance = edit_distance(word, candidate, max_distance)
+            if distance > max_distance:
+                continue
+            if best is None or (distance, -self.counts[candidate]) < (best[1], -self.counts[best[0]]):
+                best = (candidate, distance)
+        return best
+
+
+class NormalizedQuery:
+    """Kết quả chuẩn hóa một truy vấn."""
+
+    __slots__ = ("original", "text", "corrections", "original_unknown")
+
+    def __init__(
+        self,
+        original: str,
+        text: str,
+        corrections: List[Tuple[str, str, str]],
+        original_unknown: bool = False
+    ):
+        self.original = original
+        self.text = text
+        # (loại, từ gốc, từ thay thế) với loại: synonym, typo, diacritics
+        self.corrections = corrections
+        # Truy vấn gốc có từ không nằm trong từ vựng (đã được sửa bằng typo/synonym)
+        self.original_unknown = original_unknown
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.corrections)
+
+    def as_original(self) -> "NormalizedQuery":
+        """Truy vấn gốc không chuẩn hóa (dùng khi truy vấn viết lại không có kết quả)."""
+        return NormalizedQuery(self.original, self.original, [])
+
+
+class QueryNormalizer:
+    """
+    Chuẩn hóa truy vấn và thống kê số lần tìm kiếm lại được tránh.
+
+    Args:
+        synonyms: Từ điển viết tắt/đồng nghĩa (khóa đã bỏ dấu, chỉ khớp cụm từ gõ không dấu).
+        max_distance: Khoảng cách chỉnh sửa tối đa khi sửa lỗi chính tả.
+        max_terms: Số từ vựng tối đa được học.
+        min_vocabulary: Số từ vựng tối thiểu trước khi bật sửa lỗi chính tả.
+    """
+
+    def __init__(
+        self,
+        synonyms: Optional[Dict[str, str]] = None,
+        max_distance: int = 2,
+        max_terms: int = 50000,
+        min_vocabulary: int = 100
+    ):
+        self.synonyms = {
+            " ".join(fold_diacritics(key).split()): value
+            for key, value in (DEFAULT_SYNONYMS if synonyms is None else synonyms).items()
+        }
+        self._max_phrase = max((len(key.split()) for key in self.synonyms), default=1)
+        self.max_terms = max_terms
+        self.min_vocabulary = min_vocabulary
+        self._index = SymSpellIndex(max_distance)
+        # từ đã bỏ dấu -> tần suất các cách viết có dấu
+        self._surfaces: Dict[str, Counter] = {}
+        # cặp từ đã bỏ dấu -> tần suất các cách viết có dấu của cặp từ
+        self._bigrams: Dict[Tuple[str, str], Counter] = {}
+        self._lock = threading.Lock()
+        self._recent_empty = TTLCache(max_entries=2048, ttl=RETRY_WINDOW)
+        # truy vấn gốc (đã bỏ dấu) đã biết là không có kết quả
+        self._empty_originals = TTLCache(max_entries=4096, ttl=3600)
+        self.stats_counters: Counter = Counter()
+
+    # ---- Từ vựng ----
+
+    def learn(self, texts: Iterable[str]):
+        """
+        Học từ vựng từ tên sản phẩm.
+
+        Args:
+            texts: Các chuỗi (thường là tên sản phẩm).
+        """
+        with self._lock:
+            for text in texts:
+                previous: Optional[Tuple[str, str]] = None
+                for word in _WORD_PATTERN.findall((text or "").lower()):
+                    if len(word) < 2 or any(ch.isdigit() for ch in word):
+                        previous = None
+                        continue
+                    folded = fold_diacritics(word)
+                    if folded not in self._index and len(self._index) >= self.max_terms:
+                        previous = None
+                        continue
+                    self._index.add(folded)
+                    self._surfaces.setdefault(folded, Counter())[word] += 1
+                    if previous is not None:
+                        pair = (previous[0], folded)
+                        if pair in self._bigrams or len(self._bigrams) < self.max_terms * 4:
+                            self._bigrams.setdefault(pair, Counter())[(previous[1], word)] += 1
+                    previous = (folded, word)
+
+    def load_vocabulary(self, path: str) -> int:
+        """
+        Nạp từ vựng từ file (mỗi dòng một từ hoặc cụm từ).
+
+        Args:
+            path: Đường dẫn file.
+
+        Returns:
+            int: Số dòng đã nạp.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            lines = [line.strip() for line in f if line.strip()]
+        self.learn(lines)
+        return len(lines)
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._index)
+
+    # ---- Chuẩn hóa ----
+
+    def _max_distance_for(self, word: str) -> int:
+        if len(word) <= 3:
+            return 0
+        if len(word) <= 6:
+            return 1
+        return 2
+
+    def _normalize_word(self, word: str, corrections: List[Tuple[str, str, str]]) -> Tuple[str, bool]:
+        """
+        Sửa lỗi chính tả một từ.
+
+        Returns:
+            Tuple[str, bool]: (từ, có thể khôi phục dấu). Từ sửa lỗi chính tả được trả về ở
+            dạng bỏ dấu để bước khôi phục dấu chọn cách viết theo ngữ cảnh.
+        """
+        folded = fold_diacritics(word)
+        if any(ch.isdigit() for ch in word):
+            return word, False
+        if folded not in self._index:
+            if len(self._index) < self.min_vocabulary:
+                return word, False
+            max_distance = self._max_distance_for(folded)
+            match = self._index.lookup(folded, max_distance) if max_distance else None
+            if match is None:
+                return word, False
+            corrections.append(("typo", word, match[0]))
+            return match[0], True
+        # Người dùng đã gõ có dấu: giữ nguyên
+        return word, word == folded
+
+    def _dominant_pair(self, left: str, right: str) -> Optional[Tuple[str, str]]:
+        pairs = self._bigrams.get((fold_diacritics(left), fold_diacritics(right)))
+        if not pairs:
+            return None
+        pair, count = pairs.most_common(1)[0]
+        if count / sum(pairs.values()) < RESTORE_DOMINANCE:
+            return None
+        return pair
+
+    def _restore_diacritics(self, entries: List[List[Any]], corrections: List[Tuple[str, str, str]]):
+        """
+        Khôi phục dấu cho các từ gõ không dấu.
+
+        Mỗi từ lấy cách viết từ cặp từ liền kề chiếm ưu thế trong từ vựng (cách viết của
+        từ bên cạnh phải khớp với từ người dùng đã gõ có dấu), hoặc từ cách viết duy nhất
+        của dạng bỏ dấu. Nếu còn một từ mơ hồ, không khôi phục dấu cho từ nào để không
+        đoán sai nghĩa của cả truy vấn ("ca" có thể là "cá", "cà" hay "ca").
+
+        Args:
+            entries: Danh sách [từ, có thể khôi phục dấu], được sửa tại chỗ.
+            corrections: Danh sách thay đổi, thêm các lần khôi phục dấu.
+        """
+        proposals: Dict[int, str] = {}
+        for i, (word, restorable) in enumerate(entries):
+            if not restorable:
+                continue
+            surface: Optional[str] = None
+            for j in (i - 1, i + 1):
+                if not 0 <= j < len(entries):
+                    continue
+                neighbour, neighbour_restorable = entries[j]
+                # Thay thế đồng nghĩa có thể gồm nhiều từ: lấy từ sát với từ đang xét
+                neighbour = neighbour.split()[-1] if j < i else neighbour.split()[0]
+                pair = self._dominant_pair(neighbour, word) if j < i else self._dominant_pair(word, neighbour)
+                if pair is None:
+                    continue
+                neighbour_surface, candidate = (pair[0], pair[1]) if j < i else (pair[1], pair[0])
+                if neighbour_restorable or neighbour_surface == neighbour:
+                    surface = candidate
+                    break
+            if surface is None:
+                surfaces = self._surfaces.get(word)
+                if not surfaces or len(surfaces) != 1:
+                    return
+                surface = next(iter(surfaces))
+            proposals[i] = surface
+
+        for i, surface in proposals.items():
+            if surface != entries[i][0]:
+                corrections.append(("diacritics", entries[i][0], surface))
+                entries[i][0] = surface
+
+    def normalize(self, query: str) -> NormalizedQuery:
+        """
+        Chuẩn hóa một truy vấn.
+
+        Args:
+            query: Truy vấn gốc.
+
+        Returns:
+            NormalizedQuery: Truy vấn sau chuẩn hóa; giữ nguyên chuỗi gốc nếu không có thay đổi.
+        """
+        words = _WORD_PATTERN.findall((query or "").lower())
+        folded_words = [fold_diacritics(word) for word in words]
+        corrections: List[Tuple[str, str, str]] = []
+        entries: List[List[Any]] = []
+        original_unknown = False
+        with self._lock:
+            i = 0
+            while i < len(words):
+                # Khớp cụm từ dài nhất trong từ điển viết tắt/đồng nghĩa. Khóa đã bỏ dấu nên chỉ
+                # khớp cụm từ gõ không dấu: "sửa chữa" không được thành "sữa chua"
+                for size in range(min(self._max_phrase, len(words) - i), 0, -1):
+                    if words[i:i + size] != folded_words[i:i + size]:
+                        continue
+                    phrase = " ".join(folded_words[i:i + size])
+                    replacement = self.synonyms.get(phrase)
+                    if replacement is not None:
+                        original = " ".join(words[i:i + size])
+                        if replacement != original:
+                            corrections.append(("synonym", original, replacement))
+                            if any(folded not in self._index for folded in folded_words[i:i + size]):
+                                original_unknown = True
+                        entries.append([replacement, False])
+                        i += size
+                        break
+                else:
+                    entries.append(list(self._normalize_word(words[i], corrections)))
+                    i += 1
+            if any(kind == "typo" for kind, _, _ in corrections):
+                original_unknown = True
+            self._restore_diacritics(entries, corrections)
+
+            self.stats_counters["queries"] += 1
+            if corrections:
+                self.stats_counters["rewritten"] += 1
+                for kind, _, _ in corrections:
+                    self.stats_counters[kind] += 1
+
+        if not corrections:
+            return NormalizedQuery(query, query, corrections)
+        text = " ".join(word for word, _ in entries)
+        logger.debug("Chuẩn hóa truy vấn '%s' -> '%s'", query, text)
+        return NormalizedQuery(query, text, corrections, original_unknown)
+
+    # ---- Thống kê ----
+
+    def record_result(
+        self,
+        normalized: NormalizedQuery,
+        result_count: int,
+        scope: Optional[str] = None,
+        store_code: Optional[str] = None
+    ):
+        """
+        Ghi nhận kết quả của truy vấn đã chuẩn hóa.
+
+        Truy vấn được viết lại và có kết quả chỉ được tính là một lần tìm kiếm lại
+        đã tránh được khi truy vấn gốc có từ ngoài từ vựng hoặc đã biết là không có
+        kết quả. Với `scope` (session_id), lần tìm kiếm tiếp theo trong
+        `RETRY_WINDOW` giây sau một kết quả rỗng được tính là một lần tìm lại.
+
+        Args:
+            normalized: Truy vấn đã chuẩn hóa.
+            result_count: Số sản phẩm trả về.
+            scope: Phạm vi (thường là session_id).
+            store_code: Mã cửa hàng (truy vấn không có kết quả được ghi nhận theo cửa hàng,
+                vì danh mục sản phẩm khác nhau giữa các cửa hàng).
+        """
+        original_key = (store_code, " ".join(fold_diacritics(normalized.original or "").lower().split()))
+        with self._lock:
+            if scope is not None and self._recent_empty.pop(scope) is not None:
+                self.stats_counters["retries_after_empty"] += 1
+            if result_count > 0:
+                if normalized.changed and (
+                    normalized.original_unknown or self._empty_originals.get(original_key) is not None
+                ):
+                    self.stats_counters["retries_avoided"] += 1
+            else:
+                self.stats_counters["empty_results"] += 1
+                if not normalized.changed:
+                    self._empty_originals.set(original_key, True)
+                if scope is not None:
+                    self._recent_empty.set(scope, time.monotonic())
+
+    def record_fallback(self):
+        """Ghi nhận một lần truy vấn viết lại không có kết quả và phải tìm lại bằng truy vấn gốc."""
+        with self._lock:
+            self.stats_counters["rewrite_fallbacks"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê chuẩn hóa truy vấn.
+
+        Returns:
+            Dict[str, Any]: Số truy vấn, số truy vấn được viết lại theo từng loại,
+            số lần tìm lại đã tránh (truy vấn gốc rỗng hoặc ngoài từ vựng, truy vấn viết
+            lại có kết quả), số lần quay lại truy vấn gốc, số kết quả rỗng và số lần
+            tìm lại thực tế sau kết quả rỗng.
+        """
+        with self._lock:
+            counters = dict(self.stats_counters)
+        queries = counters.get("queries", 0)
+        rewritten = counters.get("rewritten", 0)
+        return {
+            "enabled": Config.QUERY_NORMALIZATION_ENABLED,
+            "vocabulary_size": self.vocabulary_size,
+            "queries": queries,
+            "rewritten": rewritten,
+            "rewrite_rate": round(rewritten / queries, 4) if queries else 0.0,
+            "synonym": counters.get("synonym", 0),
+            "typo": counters.get("typo", 0),
+            "diacritics": counters.get("diacritics", 0),
+            "retries_avoided": counters.get("retries_avoided", 0),
+            "rewrite_fallbacks": counters.get("rewrite_fallbacks", 0),
+            "empty_results": counters.get("empty_results", 0),
+            "retries_after_empty": counters.get("retries_after_empty", 0)
+        }
+
+
+_query_normalizer: Optional[QueryNormalizer] = None
+_normalizer_lock = threading.Lock()
+
+
+def get_query_normalizer() -> QueryNormalizer:
+    """Trả về bộ chuẩn hóa truy vấn dùng chung, nạp từ vựng từ `QUERY_VOCAB_FILE` nếu có."""
+    global _query_normalizer
+    if _query_normalizer is None:
+        with _normalizer_lock:
+            if _query_normalizer is None:
+                normalizer = QueryNormalizer(max_distance=Config.QUERY_MAX_EDIT_DISTANCE)
+                if Config.QUERY_VOCAB_FILE and os.path.exists(Config.QUERY_VOCAB_FILE):
+                    try:
+                        count = normalizer.load_vocabulary(Config.QUERY_VOCAB_FILE)
+                        logger.info(f"Đã nạp {count} dòng từ vựng tìm kiếm từ {Config.QUERY_VOCAB_FILE}")
+                    except Exception as e:
+                        logger.error(f"Lỗi khi nạp từ vựng tìm kiếm: {str(e)}")
+                _query_normalizer = normalizer
+    return _query_normalizer
+
+
+def normalize_query(query: str) -> NormalizedQuery:
+    """
+    Chuẩn hóa truy vấn bằng bộ chuẩn hóa dùng chung (giữ nguyên nếu tính năng bị tắt).
+
+    Args:
+        query: Truy vấn gốc.
+
+    Returns:
+        NormalizedQuery: Truy vấn đã chuẩn hóa.
+    """
+    if not Config.QUERY_NORMALIZATION_ENABLED:
+        return NormalizedQuery(query, query, [])
+    return get_query_normalizer().normalize(query)
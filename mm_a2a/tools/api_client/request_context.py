@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Ngữ cảnh request theo phiên chat (mã cửa hàng, token xác thực, cart ID).
+
+Client API được dùng chung cho mọi phiên, nên trạng thái riêng của khách hàng không
+được giữ trên client mà trong một `RequestContext` gắn với lần gọi hiện tại qua
+`use_context` (dựa trên `contextvars`, nên các lượt chat chạy đồng thời trên các
+thread/event loop khác nhau không thấy ngữ cảnh của nhau). Khi không có ngữ cảnh
+nào được gắn, client dùng ngữ cảnh mặc định của chính nó (script, kiểm thử, tác vụ nền).
+
+`SessionContexts` giữ ngữ cảnh của từng phiên chat để cửa hàng (sau
+`login_with_mcard`), token và giỏ hàng của phiên được dùng lại ở các lượt sau. Khi chạy
+nhiều worker, ngữ cảnh còn được lưu vào trạng thái dùng chung cuối mỗi lượt (`save`) và
+nạp lại đầu lượt sau (`sync`) nếu worker khác đã thay đổi nó.
+"""
+
+import contextlib
+import contextvars
+import uuid
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, Optional
+
+from .cache import TTLCache
+from .token_manager import AuthTokenManager
+from config import Config
+from mm_a2a.shared_state import SharedMapping, get_shared_store, seal, unseal
+
+
+# Khóa state của phiên ADK chứa session_id (backend ghi khi tạo phiên, tool đọc qua `tool_context.state`)
+SESSION_ID_KEY = "mm_session_id"
+
+
+class RequestContext:
+    """
+    Trạng thái của một khách hàng/phiên dùng cho các lần gọi API.
+
+    Args:
+        store_code: Mã cửa hàng (header `Store`).
+        tokens: Token manager của khách hàng (mặc định tạo mới, chưa đăng nhập).
+        cart_id: Cart ID hiện tại của phiên.
+    """
+
+    __slots__ = ("store_code", "tokens", "cart_id", "version")
+
+    def __init__(
+        self,
+        store_code: Optional[str] = None,
+        tokens: Optional[AuthTokenManager] = None,
+        cart_id: Optional[str] = None
+    ):
+        self.store_code = store_code or Config.STORE_CODE
+        self.tokens = tokens or AuthTokenManager()
+        self.cart_id = cart_id
+        self.version: Optional[str] = None  # Phiên bản đã lưu chung gần nhất (xem `SessionContexts.save`)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Trạng thái dạng JSON để lưu chung giữa các worker (token được mã hóa)."""
+        tokens = self.tokens.snapshot()
+        tokens["token"] = seal(tokens["token"])
+        return {
+            "version": self.version,
+            "store_code": self.store_code,
+            "cart_id": self.cart_id,
+            "tokens": tokens
+        }
+
+    def restore(self, snapshot: Dict[str, Any]):
+        """Khôi phục trạng thái từ `snapshot`; token không giải mã được coi như chưa đăng nhập."""
+        self.version = snapshot.get("version")
+        self.store_code = snapshot.get("store_code") or Config.STORE_CODE
+        self.cart_id = snapshot.get("cart_id")
+        tokens = dict(snapshot.get("tokens") or {})
+        tokens["token"] = unseal(tokens.get("token"))
+        self.tokens.restore(tokens)
+
+
+_current_context: "contextvars.ContextVar[Optional[RequestContext]]" = contextvars.ContextVar(
+    "mm_a2a_request_context", default=None
+)
+
+
+def current_context() -> Optional[RequestContext]:
+    """Ngữ cảnh request đang được gắn, hoặc None."""
+    return _current_context.get()
+
+
+@contextlib.contextmanager
+def use_context(context: Optional[RequestContext]) -> Iterator[Optional[RequestContext]]:
+    """
+    Gắn ngữ cảnh request cho các lần gọi API trong khối `with`.
+
+    Args:
+        context: Ngữ cảnh cần gắn (None thì giữ nguyên ngữ cảnh hiện tại).
+    """
+    if context is None:
+        yield current_context()
+        return
+    token = _current_context.set(context)
+    try:
+        yield context
+    finally:
+        _current_context.reset(token)
+
+
+class SessionContexts:
+    """
+    Ngữ cảnh request theo session_id, hết hạn khi phiên không hoạt động.
+
+    Args:
+        ttl: Thời gian giữ ngữ cảnh kể từ lần dùng cuối (giây).
+        max_entries: Số phiên tối đa (LRU).
+        shared: Kho dùng chung giữa các worker (None khi chạy một worker).
+    """
+
+    def __init__(self, ttl: float = 24 * 3600, max_entries: int = 10000, shared: Optional[MutableMapping] = None):
+        self._contexts = TTLCache(max_entries=max_entries, ttl=ttl)
+        self._shared = shared
+        self.restored = 0
+
+    def get(self, session_id: Optional[str]) -> Optional[RequestContext]:
+        """Ngữ cảnh của phiên (tạo mới nếu chưa có), hoặc None nếu không có session_id."""
+        if not session_id:
+            return None
+        context = self._contexts.get(session_id)
+        if context is None:
+            context = RequestContext()
+        # Gia hạn theo lần dùng cuối
+        self._contexts.set(session_id, context)
+        return context
+
+    def sync(self, session_id: Optional[str]) -> Optional[RequestContext]:
+        """
+        Ngữ cảnh của phiên ở đầu một lượt chat, nạp lại bản đã lưu chung nếu bản đó mới hơn
+        (phiên vừa được xử lý ở worker khác).
+
+        Args:
+            session_id: ID phiên chat.
+
+        Returns:
+            Optional[RequestContext]: Ngữ cảnh của phiên, hoặc None nếu không có session_id.
+        """
+        context = self.get(session_id)
+        if context is None or self._shared is None:
+            return context
+        snapshot = self._shared.get(session_id)
+        if snapshot and snapshot.get("version") != context.version:
+            context.restore(snapshot)
+            self.restored += 1
+        return context
+
+    def save(self, session_id: Optional[str]):
+        """Lưu ngữ cảnh của phiên vào kho dùng chung ở cuối lượt chat (no-op khi chạy một worker)."""
+        if self._shared is None or not session_id:
+            return
+        context = self._contexts.get(session_id)
+        if context is None:
+            return
+        context.version = uuid.uuid4().hex
+        self._shared[session_id] = context.snapshot()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê ngữ cảnh phiên.
+
+        Returns:
+            Dict[str, Any]: Số phiên đang giữ, số lần dùng lại/tạo mới ngữ cảnh.
+        """
+        stats = self._contexts.stats()
+        return {
+            "sessions": stats["entries"],
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "restored": self.restored
+        }
+
+
+_shared_store = get_shared_store()
+_session_contexts = SessionContexts(
+    ttl=Config.SESSION_CONTEXT_TTL,
+    max_entries=Config.SESSION_CONTEXT_MAX_ENTRIES,
+    shared=SharedMapping(_shared_store, "session_contexts") if _shared_store is not None else None
+)
+
+
+def get_session_contexts() -> SessionContexts:
+    """Trả về sổ ngữ cảnh phiên dùng chung của tiến trình."""
+    return _session_contexts
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho việc thêm nhiều sản phẩm vào giỏ hàng
+"""
+
+import asyncio
+
+from mm_a2a.tools.api_client.cart import CartAPI
+from mm_a2a.tools.api_client.cart_state import get_cart_state_cache
+
+
+class FakeCartAPI(CartAPI):
+    """CartAPI trả về kết quả dựng sẵn thay vì gọi mạng."""
+
+    def __init__(self, responses):
+        super().__init__("https://example.com/graphql", 5)
+        self.responses = list(responses)
+        self.calls = []
+        self.queries = []
+
+    async def ensure_session(self):
+        return None
+
+    async def execute_graphql(self, query, variables=None, **kwargs):
+        self.calls.append(variables)
+        self.queries.append(query)
+        return self.responses.pop(0)
+
+
+def _response(cart_id, user_errors=()):
+    return {
+        "success": True,
+        "data": {"addProductsToCart": {"cart": {"id": cart_id}, "user_errors": list(user_errors)}}
+    }
+
+
+def test_add_items_sends_one_mutation_and_maps_errors():
+    async def run():
+        api = FakeCartAPI([_response("cart1", [
+            {"code": "PRODUCT_NOT_FOUND", "message": 'Could not find a product with SKU "1234"'},
+        ])])
+        result = await api.add_items_to_cart("cart1", [("123", 1), ("1234", 2), {"sku": "123", "quantity": 2}])
+        return api, result
+
+    api, result = asyncio.run(run())
+    assert len(api.calls) == 1
+    assert api.calls[0]["items"] == [{"sku": "123", "quantity": 3}, {"sku": "1234", "quantity": 2}]
+    assert result["success"]
+    assert result["code"] == "PARTIAL_ADD_TO_CART"
+    statuses = {item["sku"]: item["success"] for item in result["data"]["items"]}
+    assert statuses == {"123": True, "1234": False}
+
+
+def test_add_items_maps_several_errors_to_one_sku():
+    async def run():
+        api = FakeCartAPI([_response("cart1", [
+            {"code": "INSUFFICIENT_STOCK", "message": 'The requested qty of "1234" is not available'},
+            {"code": "NOT_SALABLE", "message": 'Product "1234" is not salable'},
+        ])])
+        api.mutation_queue_enabled = False
+        return await api.add_items_to_cart("cart1", [("123", 1), ("1234", 2)])
+
+    result = asyncio.run(run())
+    assert result["data"]["errors"] == []
+    items = {item["sku"]: item for item in result["data"]["items"]}
+    assert items["123"]["success"]
+    assert not items["1234"]["success"] and items["1234"]["code"] == "INSUFFICIENT_STOCK"
+    assert "not available" in items["1234"]["message"] and "not salable" in items["1234"]["message"]
+
+
+def test_add_items_never_reports_success_with_unmatched_errors():
+    error = {"code": "INSUFFICIENT_STOCK", "message": "The requested qty is not available"}
+
+    async def run():
+        single = FakeCartAPI([_response("cart1", [error])])
+        single.mutation_queue_enabled = False
+        single_result = await single.add_items_to_cart("cart1", [("123", 1)])
+        multiple = FakeCartAPI([_response("cart1", [error])])
+        multiple.mutation_queue_enabled = False
+        multiple_result = await multiple.add_items_to_cart("cart1", [("123", 1), ("456", 1)])
+        return single_result, multiple_result
+
+    single_result, multiple_result = asyncio.run(run())
+    assert not single_result["success"]
+    assert single_result["data"]["items"][0]["code"] == "INSUFFICIENT_STOCK"
+    assert single_result["data"]["errors"] == []
+    assert not multiple_result["success"]
+    assert {item["code"] for item in multiple_result["data"]["items"]} == {"ADD_TO_CART_UNCONFIRMED"}
+    assert multiple_result["data"]["errors"] == [error]
+
+
+def test_add_items_retries_once_on_expired_cart():
+    async def run():
+        api = FakeCartAPI([
+            _response(None, [{"code": "CART_NOT_FOUND", "message": "Could not find a cart"}]),
+            {"success": True, "data": {"createGuestCart": {"cart": {"id": "cart2"}}}},
+            _response("cart2"),
+        ])
+        api.set_auth_token("token")
+        result = await api.add_items_to_cart("expired", [("123", 1)])
+        return api, result
+
+    api, result = asyncio.run(run())
+    assert result["success"]
+    assert result["data"]["cart"]["id"] == "cart2"
+    assert api.calls[-1]["cartId"] == "cart2"
+
+
+def test_mutation_cart_is_cached_but_not_served_to_full_reads():
+    async def run():
+        cart = {"id": "cart-summary", "itemsV2": {"items": [{"id": "1", "quantity": 2}], "total_quantity": 2}}
+        full_cart = dict(cart, prices={"grand_total": {"value": 20000, "currency": "VND"}})
+        api = FakeCartAPI([
+            {"success": True, "data": {"addProductsToCart": {"cart": cart, "user_errors": []}}},
+            {"success": True, "data": {"cart": full_cart}},
+        ])
+        api.mutation_queue_enabled = False
+        await api.add_items_to_cart("cart-summary", [("123", 2)])
+        cached = get_cart_state_cache().get("cart-summary")
+        info = await api.get_cart_info("cart-summary")
+        return api, cached, info
+
+    api, cached, info = asyncio.run(run())
+    # Kết quả mutation được giữ tại chỗ nhưng thiếu thuế/giảm giá nên lần đọc đầy đủ vẫn gọi server
+    assert cached["itemsV2"]["total_quantity"] == 2
+    assert len(api.calls) == 2
+    assert not info.get("from_cache")
+    assert info["data"]["cart"]["prices"]["grand_total"]["value"] == 20000
+
+
+def test_cart_summary_after_add_needs_no_network_call():
+    async def run():
+        cart = {"id": "cart-summary-mode", "itemsV2": {"items": [{"id": "1", "quantity": 2}], "total_quantity": 2}}
+        api = FakeCartAPI([{"success": True, "data": {"addProductsToCart": {"cart": cart, "user_errors": []}}}])
+        api.mutation_queue_enabled = False
+        await api.add_items_to_cart("cart-summary-mode", [("123", 2)])
+        calls_after_add = len(api.calls)
+        info = await api.get_cart_info("cart-summary-mode", mode="summary")
+        return api, calls_after_add, info
+
+    api, calls_after_add, info = asyncio.run(run())
+    assert len(api.calls) == calls_after_add == 1
+    assert info["from_cache"]
+    assert info["data"]["cart"]["itemsV2"]["total_quantity"] == 2
+
+
+def test_summary_mode_skips_checkout_resolvers():
+    async def run():
+        cart = {"id": "cart-modes", "itemsV2": {"items": [], "total_quantity": 0}}
+        api = FakeCartAPI([{"success": True, "data": {"cart": cart}}, {"success": True, "data": {"cart": cart}}])
+        api.mutation_queue_enabled = False
+        summary = await api.get_cart_info("cart-modes", mode="summary")
+        # Bản tóm tắt đã có trong cache nhưng chưa đủ cho bước thanh toán
+        checkout = await api.get_cart_info("cart-modes", mode="checkout")
+        return api, summary, checkout
+
+    api, summary, checkout = asyncio.run(run())
+    assert summary["success"] and checkout["success"]
+    assert len(api.queries) == 2
+    assert "available_payment_methods" not in api.queries[0]
+    assert "available_payment_methods" in api.queries[1]
+
+
+def test_timeout_is_reconciled_before_resending():
+    timeout = {"success": False, "message": "Timeout when executing GraphQL query", "code": "TIMEOUT"}
+    applied_cart = {"id": "cart-timeout", "itemsV2": {"items": [{"id": "1", "quantity": 2}], "total_quantity": 2}}
+    empty_cart = {"id": "cart-retry", "itemsV2": {"items": [], "total_quantity": 0}}
+
+    async def run():
+        # Lần gửi đầu đã được áp dụng dù bị timeout (giỏ hàng trống trước đó): không gửi lại
+        state_cache = get_cart_state_cache()
+        state_cache.store_read(
+            "cart-timeout", dict(empty_cart, id="cart-timeout"), state_cache.version("cart-timeout")
+        )
+        applied = FakeCartAPI([timeout, {"success": True, "data": {"cart": applied_cart}}])
+        applied.mutation_queue_enabled = False
+        applied_result = await applied.add_items_to_cart("cart-timeout", [("123", 2)])
+        # Giỏ hàng vẫn trống sau timeout: gửi lại đúng một lần
+        resent = FakeCartAPI([
+            timeout,
+            {"success": True, "data": {"cart": empty_cart}},
+            _response("cart-retry"),
+        ])
+        resent.mutation_queue_enabled = False
+        resent_result = await resent.add_items_to_cart("cart-retry", [("123", 2)])
+        return applied, applied_result, resent, resent_result
+
+    applied, applied_result, resent, resent_result = asyncio.run(run())
+    assert applied_result["success"] and applied_result["reconciled"]
+    assert [bool(call.get("items")) for call in applied.calls] == [True, False]
+    assert resent_result["success"]
+    assert [bool(call.get("items")) for call in resent.calls] == [True, False, True]
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho pool giỏ hàng khách vãng lai
+"""
+
+import itertools
+import time
+
+from mm_a2a.tools.api_client.background import BackgroundLoop
+from mm_a2a.tools.api_client.cart_pool import GuestCartPool
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_pool_refills_per_store_and_hands_out_ids():
+    background = BackgroundLoop(name="test-cart-pool")
+    counter = itertools.count(1)
+
+    async def create(base_url, store_code):
+        return f"{store_code}-{next(counter)}"
+
+    pool = GuestCartPool(create, target_size=2, background=background)
+    try:
+        # Pool rỗng: phải tạo trực tiếp, đồng thời pool được bổ sung nền
+        assert pool.acquire("https://api", "store_a") is None
+        _wait_for(lambda: pool.size("https://api", "store_a") == 2)
+        cart_id = pool.acquire("https://api", "store_a")
+        assert cart_id.startswith("store_a-")
+        assert pool.acquire("https://api", "store_b") is None
+        _wait_for(lambda: pool.size("https://api", "store_b") == 2 and pool.size("https://api", "store_a") == 2)
+
+        stats = pool.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 2
+        assert stats["pools"] == {"store_a": 2, "store_b": 2}
+    finally:
+        background.stop()
+
+
+def test_expired_ids_are_discarded():
+    background = BackgroundLoop(name="test-cart-pool-expiry")
+
+    async def create(base_url, store_code):
+        return "cart"
+
+    pool = GuestCartPool(create, target_size=1, max_age=-1, background=background)
+    try:
+        pool.refill("https://api", "store")
+        _wait_for(lambda: pool.size("https://api", "store") == 1)
+        assert pool.acquire("https://api", "store") is None
+        assert pool.stats()["expired"] == 1
+        _wait_for(lambda: pool.size("https://api", "store") == 1)
+    finally:
+        background.stop()
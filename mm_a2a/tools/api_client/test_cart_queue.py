@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho hàng đợi ghi giỏ hàng
+"""
+
+import asyncio
+
+from mm_a2a.tools.api_client.background import BackgroundLoop
+from mm_a2a.tools.api_client.cart_queue import CartMutationQueue, QueueContext, _queue_executor
+from mm_a2a.tools.api_client.request_context import current_context
+
+CONTEXT = QueueContext("https://example.com/graphql", "store", None)
+
+
+def _sent_with():
+    """Cửa hàng và token của ngữ cảnh request đang gắn khi gửi lô."""
+    context = current_context()
+    return context.store_code, context.tokens.token
+
+
+class FakeExecutor:
+    """Ghi lại các lô mutation nhận được."""
+
+    def __init__(self):
+        self.calls = []
+        self.contexts = []
+
+    async def update_cart_items(self, cart_id, items):
+        self.calls.append(("update", cart_id, items))
+        self.contexts.append(_sent_with())
+        await asyncio.sleep(0.01)
+        return {"success": True, "data": {"cart": {"id": cart_id, "version": len(self.calls)}}}
+
+    async def add_items_to_cart(self, cart_id, items):
+        self.calls.append(("add", cart_id, items))
+        self.contexts.append(_sent_with())
+        await asyncio.sleep(0.01)
+        return {
+            "success": True,
+            "data": {
+                "cart": {"id": cart_id},
+                "items": [
+                    {"sku": sku, "quantity": quantity, "success": sku != "bad",
+                     **({"code": "PRODUCT_NOT_FOUND", "message": "not found"} if sku == "bad" else {})}
+                    for sku, quantity in items
+                ]
+            }
+        }
+
+
+def test_burst_is_coalesced_into_batched_mutations():
+    background = BackgroundLoop(name="test-cart-queue")
+    executor = FakeExecutor()
+    queue = CartMutationQueue(lambda context: executor, window=0.05, background=background)
+
+    async def run():
+        results = await asyncio.gather(
+            queue.add(CONTEXT, "c1", "milk", 1),
+            queue.add(CONTEXT, "c1", "milk", 2),
+            queue.add(CONTEXT, "c1", "bad", 1),
+            queue.update(CONTEXT, "c1", "10", 3),
+            queue.update(CONTEXT, "c1", "10", 5),
+            queue.remove(CONTEXT, "c1", "11"),
+        )
+        await queue.wait_idle("c1")
+        return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        background.stop()
+
+    assert executor.calls == [
+        ("add", "c1", [("milk", 3), ("bad", 1)]),
+        ("update", "c1", [("10", 5), ("11", 0)]),
+    ]
+    assert [result["success"] for result in results] == [True, True, False, True, True, True]
+    assert results[2]["code"] == "PRODUCT_NOT_FOUND"
+    stats = queue.stats()
+    assert stats["submitted"] == 6 and stats["coalesced"] == 2 and stats["mutations"] == 2
+
+
+def test_interleaved_kinds_keep_arrival_order():
+    background = BackgroundLoop(name="test-cart-queue-order")
+    executor = FakeExecutor()
+    queue = CartMutationQueue(lambda context: executor, window=0.05, background=background)
+
+    async def run():
+        # Thêm 1 rồi đặt số lượng dòng đó thành 3: phải ra 3, không phải 4
+        await asyncio.gather(
+            queue.add(CONTEXT, "c3", "milk", 1),
+            queue.update(CONTEXT, "c3", "10", 3),
+            queue.add(CONTEXT, "c3", "milk", 1),
+        )
+        await queue.wait_idle("c3")
+
+    try:
+        asyncio.run(run())
+    finally:
+        background.stop()
+
+    assert executor.calls == [
+        ("add", "c3", [("milk", 1)]),
+        ("update", "c3", [("10", 3)]),
+        ("add", "c3", [("milk", 1)]),
+    ]
+    assert queue.stats()["coalesced"] == 0
+
+
+def test_wait_idle_flushes_pending_writes_immediately():
+    background = BackgroundLoop(name="test-cart-queue-idle")
+    executor = FakeExecutor()
+    queue = CartMutationQueue(lambda context: executor, window=10, background=background)
+
+    async def run():
+        pending = asyncio.ensure_future(queue.add(CONTEXT, "c2", "milk", 1))
+        await asyncio.sleep(0.05)
+        await queue.wait_idle("c2")
+        assert executor.calls == [("add", "c2", [("milk", 1)])]
+        return await pending
+
+    try:
+        assert asyncio.run(run())["success"]
+    finally:
+        background.stop()
+
+
+def test_one_client_sends_for_every_customer():
+    background = BackgroundLoop(name="test-cart-queue-context")
+    executor = FakeExecutor()
+    queue = CartMutationQueue(lambda context: executor, window=0.01, background=background)
+    alice = QueueContext("https://example.com/graphql", "store-a", "token-a")
+    bob = QueueContext("https://example.com/graphql", "store-b", "token-b")
+
+    async def run():
+        await asyncio.gather(queue.add(alice, "ca", "milk", 1), queue.add(bob, "cb", "milk", 1))
+        await queue.update(alice, "ca", "10", 2)
+
+    try:
+        asyncio.run(run())
+    finally:
+        background.stop()
+
+    assert sorted(executor.contexts) == [("store-a", "token-a"), ("store-a", "token-a"), ("store-b", "token-b")]
+    assert _queue_executor(alice) is _queue_executor(bob)
+    assert _queue_executor(alice)._context.tokens.token is None
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho cache trạng thái giỏ hàng
+"""
+
+from mm_a2a.tools.api_client.cart_state import CartStateCache
+
+
+def _cart(quantity=2):
+    return {
+        "id": "c1",
+        "itemsV2": {
+            "items": [
+                {
+                    "id": "10",
+                    "quantity": quantity,
+                    "prices": {
+                        "price": {"value": 10000, "currency": "VND"},
+                        "row_total": {"value": 10000 * quantity, "currency": "VND"}
+                    }
+                },
+                {
+                    "id": "11",
+                    "quantity": 1,
+                    "prices": {
+                        "price": {"value": 5000, "currency": "VND"},
+                        "row_total": {"value": 5000, "currency": "VND"}
+                    }
+                }
+            ],
+            "total_quantity": quantity + 1
+        },
+        "prices": {"grand_total": {"value": 10000 * quantity + 5000, "currency": "VND"}},
+        "available_payment_methods": [{"code": "cod", "title": "COD"}]
+    }
+
+
+def test_mutation_response_is_served_locally_and_merged():
+    cache = CartStateCache(ttl=60)
+    assert cache.get("c1") is None
+
+    version = cache.version("c1")
+    assert cache.store_read("c1", _cart(), version)
+    assert cache.get("c1", require_complete=True)["itemsV2"]["total_quantity"] == 3
+
+    mutation_cart = {k: v for k, v in _cart(quantity=3).items() if k != "available_payment_methods"}
+    cache.apply_mutation("c1", mutation_cart)
+    cart = cache.get("c1")
+    assert cart["itemsV2"]["total_quantity"] == 4
+    # Phương thức thanh toán phụ thuộc nội dung giỏ hàng: không giữ lại từ bản trước
+    assert "available_payment_methods" not in cart
+    # Bản cập nhật từ mutation không đủ cho màn hình thanh toán
+    assert cache.get("c1", require_complete=True) is None
+
+
+def test_optimistic_update_is_reconciled_on_next_read():
+    cache = CartStateCache(ttl=60)
+    cache.store_read("c1", _cart(), cache.version("c1"))
+
+    assert cache.apply_optimistic("c1", "11", 0)
+    # Chưa được server xác nhận: lần đọc tiếp theo phải lấy từ server
+    assert cache.get("c1") is None
+    assert cache.stats()["optimistic_updates"] == 1
+
+    version = cache.version("c1")
+    server_cart = _cart()
+    server_cart["itemsV2"]["items"].pop()
+    assert cache.store_read("c1", server_cart, version)
+    assert len(cache.get("c1")["itemsV2"]["items"]) == 1
+    assert cache.stats()["reconciled"] == 1
+
+
+def test_read_started_before_a_mutation_is_discarded():
+    cache = CartStateCache(ttl=60)
+    version = cache.version("c1")
+    cache.apply_mutation("c1", _cart(quantity=5))
+    assert not cache.store_read("c1", _cart(quantity=2), version)
+    assert cache.get("c1")["itemsV2"]["items"][0]["quantity"] == 5
+
+    cache.invalidate("c1")
+    assert cache.get("c1") is None
+    assert cache.stats()["invalidations"] == {"mutation_failed": 1}
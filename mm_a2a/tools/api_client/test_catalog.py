@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho catalog sản phẩm cục bộ
+"""
+
+import os
+
+from mm_a2a.tools.api_client.catalog import LocalCatalog
+from mm_a2a.tools.api_client.text_utils import fold_diacritics, tokenize
+
+
+def _item(sku, name, price=10000):
+    return {
+        "id": sku,
+        "sku": sku,
+        "name": name,
+        "price": {"regularPrice": {"amount": {"currency": "VND", "value": price}}}
+    }
+
+
+def _catalog(tmp_path, items):
+    catalog = LocalCatalog(os.path.join(tmp_path, "catalog.bin"), "test_store", max_age=3600)
+    catalog.update(items, complete=True)
+    return catalog
+
+
+def test_fold_diacritics():
+    assert fold_diacritics("Sữa Tươi Đà Lạt") == "sua tuoi da lat"
+    assert tokenize("Bánh quy, 200g") == ["banh", "quy", "200g"]
+
+
+def test_search_folds_diacritics_and_matches_prefix(tmp_path):
+    catalog = _catalog(tmp_path, [
+        _item("1", "Sữa tươi Vinamilk 1L"),
+        _item("2", "Sữa chua uống"),
+        _item("3", "Bia Tiger lon"),
+    ])
+    result = catalog.search("sua tuoi")
+    assert result["success"]
+    assert [item["sku"] for item in result["data"]["products"]["items"]] == ["1"]
+
+    result = catalog.search("sữa ch")
+    assert [item["sku"] for item in result["data"]["products"]["items"]] == ["2"]
+    assert catalog.search("sua", page_size=1)["data"]["products"]["total_count"] == 2
+    assert catalog.search("nuoc mam") is None
+    catalog.close()
+
+
+def test_incremental_refresh_and_reload(tmp_path):
+    catalog = _catalog(tmp_path, [_item("1", "Sữa tươi"), _item("2", "Bia Tiger"), _item("3", "Gạo ST25")])
+    summary = catalog.update([_item("1", "Sữa tươi"), _item("2", "Bia Heineken")])
+    assert summary == {"added": 0, "updated": 1, "removed": 0, "unchanged": 1}
+    assert catalog.search("tiger") is None
+    assert catalog.search("heineken")["data"]["products"]["items"][0]["sku"] == "2"
+    catalog.close()
+
+    reloaded = LocalCatalog(os.path.join(tmp_path, "catalog.bin"), "test_store", max_age=3600)
+    assert reloaded.load()
+    assert reloaded.size == 3
+    assert reloaded.search("gao")["data"]["products"]["items"][0]["name"] == "Gạo ST25"
+    reloaded.close()
+
+
+def test_stale_snapshot_falls_back(tmp_path):
+    catalog = _catalog(tmp_path, [_item("1", "Sữa tươi")])
+    catalog.max_age = -1
+    assert catalog.search("sua") is None
+    assert catalog.stats()["stale"] == 1
+    catalog.close()
+
+
+def test_partial_snapshot_is_not_served(tmp_path):
+    # Snapshot chỉ dựng từ một phần catalog: số kết quả không phải của cửa hàng
+    catalog = LocalCatalog(os.path.join(tmp_path, "catalog.bin"), "test_store", max_age=3600)
+    catalog.update([_item("1", "Sữa tươi")])
+    assert catalog.search("sua") is None
+    assert catalog.stats()["partial"] == 1 and not catalog.stats()["complete"]
+
+    # Làm mới đầy đủ rồi bổ sung một phần: vẫn bao phủ toàn bộ catalog
+    catalog.update([_item("1", "Sữa tươi")], complete=True)
+    catalog.update([_item("2", "Sữa chua")])
+    assert catalog.search("sua")["data"]["products"]["total_count"] == 2
+
+    # Lần làm mới đầy đủ đã quá hạn dù vừa làm mới một phần
+    catalog._snapshot.meta["complete_at"] -= 7200
+    assert catalog.search("sua") is None
+    assert catalog.stats()["partial"] == 2
+    catalog.close()
+
+
+def test_running_catalog_picks_up_replaced_snapshot(tmp_path, monkeypatch):
+    from config import Config
+    from mm_a2a.tools.api_client import catalog as catalog_module
+
+    monkeypatch.setattr(Config, "CATALOG_ENABLED", True)
+    monkeypatch.setattr(Config, "CATALOG_DIR", str(tmp_path))
+    monkeypatch.setattr(catalog_module, "_catalogs", {})
+    store = "reload_store"
+
+    # Chưa có snapshot: không ghi nhớ kết quả âm mãi mãi
+    assert catalog_module.get_local_catalog(store) is None
+    writer = LocalCatalog(catalog_module.catalog_path(store), store, max_age=3600)
+    writer.update([_item("1", "Sữa tươi")], complete=True)
+    catalog_module._catalogs[store].reload_interval = 0
+    served = catalog_module.get_local_catalog(store)
+    assert served is not None and served.search("sua") is not None
+
+    # CLI làm mới snapshot (thay file): catalog đang chạy nạp lại
+    writer.update([_item("1", "Sữa tươi"), _item("2", "Bia lon")], complete=True)
+    assert catalog_module.get_local_catalog(store).search("bia") is not None
+    assert served.stats()["reloads"] == 1
+    served.close()
+    writer.close()
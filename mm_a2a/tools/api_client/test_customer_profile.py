@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho cache hồ sơ khách hàng (nạp khi đăng nhập, làm mới nền, gộp với hồ sơ frontend)
+"""
+
+import asyncio
+import time
+
+from mm_a2a.tools.api_client.auth import AuthAPI
+from mm_a2a.tools.api_client.background import BackgroundLoop
+from mm_a2a.tools.api_client.customer_profile import CustomerProfileCache, get_customer_profiles, merge_profiles
+from mm_a2a.tools.api_client.token_manager import AuthTokenManager
+
+CUSTOMER = {
+    "firstname": "An",
+    "lastname": "Nguyễn",
+    "email": "An.Nguyen@example.com",
+    "addresses": [
+        {"street": ["12 Lê Lợi"], "city": "Hồ Chí Minh", "telephone": "0901234567", "default_shipping": True}
+    ]
+}
+
+
+class FakeAuthAPI(AuthAPI):
+    """AuthAPI trả về kết quả dựng sẵn thay vì gọi mạng."""
+
+    def __init__(self):
+        super().__init__("https://profile.example.com", 5)
+        self.queries = []
+
+    async def execute_graphql(self, query, variables=None, **kwargs):
+        self.queries.append(query)
+        if "generateCustomerToken" in query:
+            return {"success": True, "data": {"generateCustomerToken": {"token": "token-profile"}}}
+        if "storeConfig" in query:
+            return {"success": True, "data": {"storeConfig": {"customer_access_token_lifetime": 1}}}
+        return {"success": True, "data": {"customer": CUSTOMER}}
+
+
+def test_profile_is_loaded_at_login_and_merged_with_frontend():
+    async def run():
+        api = FakeAuthAPI()
+        login = await api.login("an.nguyen@example.com", "secret")
+        sent = len(api.queries)
+        info = await api.get_customer_info()
+        return api, login, sent, info
+
+    api, login, sent, info = asyncio.run(run())
+    assert login["customer"]["email"] == CUSTOMER["email"]
+    assert info["from_cache"] and info["data"]["customer"]["firstname"] == "An"
+    assert len(api.queries) == sent
+
+    profiles = get_customer_profiles()
+    profiles.bind_session("session-profile", "b2c_10010_vi", login["customer"]["email"])
+    assert profiles.for_session("session-other-store") is None
+    profiles.bind_session("session-other-store", "b2c_10020_vi", login["customer"]["email"])
+    assert profiles.for_session("session-other-store") is None
+    merged = merge_profiles({"phone": "0987654321", "cart_items": []}, profiles.for_session("session-profile"))
+    assert merged["name"] == "Nguyễn An"
+    assert merged["phone"] == "0987654321"
+    assert merged["address"] == "12 Lê Lợi, Hồ Chí Minh"
+    assert merged["email"] == CUSTOMER["email"]
+
+
+def test_stale_profile_is_served_and_refreshed_in_background():
+    fetched = []
+
+    async def fetcher(base_url, store_code, token):
+        fetched.append(token)
+        return dict(CUSTOMER, firstname="Bình")
+
+    background = BackgroundLoop("test-customer-profile")
+    cache = CustomerProfileCache(fetcher, ttl=0, background=background)
+    tokens = AuthTokenManager()
+    tokens.set("token-refresh")
+    try:
+        key = cache.store(CUSTOMER, "https://profile.example.com", "b2c_10010_vi", tokens)
+        assert cache.get(key)["firstname"] == "An"
+        deadline = time.monotonic() + 2
+        while cache.stats()["refreshes"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert fetched == ["token-refresh"]
+        cache.ttl = 3600
+        assert cache.get(key)["firstname"] == "Bình"
+    finally:
+        background.stop()
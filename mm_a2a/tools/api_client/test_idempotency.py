@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho ledger mutation theo khóa idempotency
+"""
+
+import asyncio
+
+from mm_a2a.tools.api_client.base import is_mutation
+from mm_a2a.tools.api_client.idempotency import MutationLedger, is_ambiguous_failure, make_idempotency_key
+
+
+def test_same_key_is_sent_once_and_failures_are_not_recorded():
+    ledger = MutationLedger(ttl=60)
+    sent = []
+
+    async def send(result):
+        sent.append(result)
+        await asyncio.sleep(0.01)
+        return result
+
+    async def run():
+        key = make_idempotency_key("turn-1", "add_to_cart", "cart1", "123", 2)
+        concurrent = await asyncio.gather(
+            ledger.run(key, lambda: send({"success": True, "n": 1})),
+            ledger.run(key, lambda: send({"success": True, "n": 2})),
+        )
+        later = await ledger.run(key, lambda: send({"success": True, "n": 3}))
+        failing = make_idempotency_key("turn-1", "add_to_cart", "cart1", "456", 1)
+        first_failure = await ledger.run(failing, lambda: send({"success": False, "code": "TIMEOUT"}))
+        retried = await ledger.run(failing, lambda: send({"success": True, "n": 4}))
+        return concurrent, later, first_failure, retried
+
+    concurrent, later, first_failure, retried = asyncio.run(run())
+    assert [result["n"] for result in concurrent] == [1, 1]
+    assert later["n"] == 1 and later["deduplicated"]
+    assert not first_failure["success"]
+    assert retried["n"] == 4
+    assert len(sent) == 3
+    stats = ledger.stats()
+    assert stats["joined"] == 1 and stats["deduplicated"] == 1 and stats["sent"] == 3
+
+
+def test_ambiguous_failures_and_mutation_detection():
+    assert is_ambiguous_failure({"success": False, "code": "TIMEOUT"})
+    assert is_ambiguous_failure({"success": False, "code": "HTTP_502", "status": 502})
+    assert not is_ambiguous_failure({"success": False, "code": "graphql-input"})
+    assert is_mutation("\n  mutation AddProductsToCart { x }")
+    assert not is_mutation("query { mutation_log }")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho các model sản phẩm và giỏ hàng
+"""
+
+from mm_a2a.tools.api_client.models import Product, CartItem, Cart
+
+
+def _graphql_item(item_id, regular, final=None, percent_off=None):
+    """Tạo item sản phẩm theo cấu trúc GraphQL."""
+    maximum_price = {"final_price": {"currency": "VND", "value": final if final is not None else regular}}
+    if percent_off is not None:
+        maximum_price["discount"] = {"amount_off": regular - final, "percent_off": percent_off}
+    return {
+        "id": item_id,
+        "sku": f"SKU{item_id}",
+        "name": f"Sản phẩm {item_id}",
+        "price": {"regularPrice": {"amount": {"currency": "VND", "value": regular}}},
+        "price_range": {"maximum_price": maximum_price},
+        "small_image": {"url": f"https://example.com/{item_id}.jpg"},
+        "unit_ecom": "Hộp"
+    }
+
+
+def test_product_precomputed_fields():
+    product = Product.from_graphql(_graphql_item(1, 100000, 80000))
+    assert product.final_price == 80000
+    assert product.regular_price == 100000
+    assert product.discount_percent == 20
+    assert product.unit == "Hộp"
+    assert product.image_url == "https://example.com/1.jpg"
+
+
+def test_product_uses_api_discount_and_keeps_raw():
+    item = _graphql_item(2, 50000, 45000, percent_off=10)
+    product = Product.from_graphql(item)
+    assert product.discount_percent == 10
+    assert product.to_dict() is item
+
+
+def test_product_missing_price_blocks():
+    product = Product.from_graphql({"id": 3, "sku": "SKU3", "name": "Không giá"})
+    assert product.final_price == 0
+    assert product.discount_percent == 0
+
+
+def test_cart_item_accepts_graphql_and_flat_shapes():
+    graphql_item = CartItem.from_dict({
+        "id": "10",
+        "product": {"sku": "SKU1", "name": "Sữa"},
+        "quantity": 2,
+        "prices": {"price": {"value": 30000, "currency": "VND"}, "row_total": {"value": 60000, "currency": "VND"}}
+    })
+    flat_item = CartItem.from_dict({"name": "Sữa", "quantity": 3, "price": 30000})
+    assert graphql_item.sku == "SKU1" and graphql_item.row_total == 60000
+    assert flat_item.row_total == 90000
+
+
+def test_cart_from_graphql():
+    cart = Cart.from_graphql({
+        "id": "cart-1",
+        "itemsV2": {
+            "items": [{"id": "1", "product": {"sku": "SKU1", "name": "Sữa"}, "quantity": 1,
+                       "prices": {"price": {"value": 10000}, "row_total": {"value": 10000}}}],
+            "total_quantity": 1
+        },
+        "prices": {"grand_total": {"value": 10000, "currency": "VND"}}
+    })
+    assert cart.grand_total == 10000
+    assert cart.find_line(1).quantity == 1
+    assert cart.find_line("2") is None
+
+
+def test_product_summary_is_flat():
+    summary = Product.from_graphql(_graphql_item(4, 100000, 80000)).to_summary()
+    assert summary["price"] == 80000 and summary["original_price"] == 100000
+    assert summary["discount_percentage"] == 20
+    assert summary["image_url"] == "https://example.com/4.jpg"
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho cache tìm kiếm và prefetch nền
+"""
+
+import asyncio
+import time
+
+from mm_a2a.tools.api_client.background import BackgroundLoop
+from mm_a2a.tools.api_client.cache import TTLCache
+from mm_a2a.tools.api_client.prefetch import SearchPrefetcher
+
+
+def _wait_idle(prefetcher, timeout=2.0):
+    """Chờ tới khi không còn prefetch nào đang chạy."""
+    deadline = time.monotonic() + timeout
+    while prefetcher.stats()["inflight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_ttl_cache_expiry_and_lru():
+    evicted = []
+    cache = TTLCache(max_entries=2, ttl=60, on_evict=lambda key, value: evicted.append(key))
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert evicted == ["b"]
+    cache.set("d", 4, ttl=0)
+    assert cache.get("d") is None
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+
+
+def test_prefetch_hit_and_waste_accounting():
+    background = BackgroundLoop(name="test-prefetch")
+    cache = TTLCache(max_entries=10, ttl=60)
+    prefetcher = SearchPrefetcher(cache, max_inflight=1, background=background)
+
+    async def fetch_ok():
+        return {"success": True, "data": {"page": 2}}
+
+    async def fetch_slow():
+        await asyncio.sleep(5)
+        return {"success": True}
+
+    try:
+        assert prefetcher.schedule("s1", "sữa", "k2", fetch_ok)
+        _wait_idle(prefetcher)
+        assert cache.get("k2") == {"success": True, "data": {"page": 2}}
+        prefetcher.record_hit("k2")
+
+        assert prefetcher.schedule("s1", "sữa", "k3", fetch_slow)
+        # Vượt ngân sách: prefetch thứ hai bị bỏ qua
+        assert not prefetcher.schedule("s2", "bia", "x2", fetch_ok)
+        # Phiên chuyển sang truy vấn khác: prefetch cũ bị hủy
+        assert prefetcher.cancel_scope("s1", keep_group="bánh") == 1
+        _wait_idle(prefetcher)
+
+        stats = prefetcher.stats()
+        assert stats["hits"] == 1
+        assert stats["hit_rate"] == 1.0
+        assert stats["cancelled"] == 1
+        assert stats["wasted"] == 1
+        assert stats["skipped_budget"] == 1
+    finally:
+        background.stop()
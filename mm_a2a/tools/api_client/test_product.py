@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho việc gộp kết quả của search_multiple_products và cache aggregation
+"""
+
+import asyncio
+import random
+
+from mm_a2a.tools.api_client.models import Product
+from mm_a2a.tools.api_client.product import ProductAPI, aggregation_cache_key, merge_product_pages
+
+
+def make_pages(keywords: int, items: int, catalog_size: int, seed: int = 42):
+    """Tạo dữ liệu giả lập: mỗi từ khóa trả về `items` sản phẩm, có trùng lặp giữa các từ khóa."""
+    rng = random.Random(seed)
+    prices = {i: rng.randint(5, 500) * 1000 for i in range(catalog_size)}
+    pages = []
+    for _ in range(keywords):
+        ids = rng.sample(range(catalog_size), items)
+        pages.append([
+            {
+                "id": i,
+                "sku": f"SKU{i}",
+                "name": f"Sản phẩm {i}",
+                "price": {"regularPrice": {"amount": {"currency": "VND", "value": prices[i]}}},
+                "price_range": {"maximum_price": {"final_price": {"currency": "VND", "value": prices[i]}}},
+            }
+            for i in ids
+        ])
+    return pages
+
+
+def legacy_merge(pages, sort, combine_mode, page_size, current_page):
+    """Cách gộp trước đây: duyệt kết quả hai lần, sắp xếp toàn bộ rồi cắt trang."""
+    results, seen_ids, total_count = [], set(), 0
+    if combine_mode == "intersection":
+        product_sets = [{item["id"] for item in items} for items in pages]
+        common_ids = set.intersection(*product_sets) if product_sets else set()
+        for items in pages:
+            for item in items:
+                if item["id"] in common_ids and item["id"] not in seen_ids:
+                    results.append(item)
+                    seen_ids.add(item["id"])
+                    total_count += 1
+    else:
+        for items in pages:
+            for item in items:
+                if item["id"] not in seen_ids:
+                    results.append(item)
+                    seen_ids.add(item["id"])
+                    total_count += 1
+    if sort:
+        results.sort(
+            key=lambda x: (
+                x.get("price", {}).get("regularPrice", {}).get("amount", {}).get("value", 0)
+                if sort.get("price") == "ASC"
+                else -x.get("price", {}).get("regularPrice", {}).get("amount", {}).get("value", 0)
+                if sort.get("price") == "DESC"
+                else 0
+            )
+        )
+    start_idx = (current_page - 1) * page_size
+    return results[start_idx:start_idx + page_size], total_count
+
+
+def _ids(items):
+    return [item.id if isinstance(item, Product) else item["id"] for item in items]
+
+
+def _decode(pages):
+    return [Product.decode_many(items) for items in pages]
+
+
+def test_merge_matches_full_sort_for_all_modes():
+    pages = make_pages(keywords=8, items=30, catalog_size=120)
+    for sort in (None, {"price": "ASC"}, {"price": "DESC"}):
+        for mode in ("union", "intersection"):
+            for current_page in (1, 2, 5):
+                expected_items, expected_total = legacy_merge(pages, sort, mode, 7, current_page)
+                items, total = merge_product_pages(_decode(pages), sort, mode, 7, current_page)
+                assert total == expected_total
+                assert _ids(items) == _ids(expected_items)
+
+
+def test_merge_intersection_keeps_only_common_ids():
+    pages = [
+        [{"id": 1}, {"id": 2}, {"id": 3}],
+        [{"id": 3}, {"id": 2}],
+        [{"id": 2}, {"id": 3}, {"id": 4}],
+    ]
+    items, total = merge_product_pages(_decode(pages), combine_mode="intersection")
+    assert total == 2
+    assert _ids(items) == [2, 3]
+
+
+def test_merge_page_out_of_range_and_empty_input():
+    pages = [[{"id": 1}, {"id": 2}]]
+    assert merge_product_pages(_decode(pages), page_size=10, current_page=3) == ([], 2)
+    assert merge_product_pages([], combine_mode="intersection") == ([], 0)
+
+
+def test_suggest_products_skips_aggregations_when_cached():
+    aggregations = [{"attribute_code": "brand", "count": 2, "label": "Thương hiệu", "options": []}]
+    queries = []
+
+    class FakeProductAPI(ProductAPI):
+        async def execute_graphql(self, query, variables=None, **kwargs):
+            queries.append(query)
+            products = {"items": [{"id": 1, "name": "Sữa tươi"}], "total_count": 1}
+            if "aggregations {" in query:
+                products["aggregations"] = aggregations
+            return {"success": True, "data": {"products": products}}
+
+    async def run():
+        api = FakeProductAPI("https://example.com/graphql", 5)
+        api.set_store_code("test_aggregation_store")
+        first = await api.suggest_products("sữa tươi")
+        second = await api.suggest_products("Sữa  Tươi", sort={"price": "ASC"})
+        second["data"]["products"]["aggregations"].clear()
+        third = await api.suggest_products("sữa tươi")
+        filtered = await api.suggest_products("sữa tươi", filters={"brand": {"eq": "vinamilk"}})
+        return first, second, third, filtered
+
+    first, second, third, filtered = asyncio.run(run())
+    assert "aggregations {" in queries[0]
+    assert "aggregations {" not in queries[1]
+    assert second["data"]["suggestions"] == first["data"]["suggestions"]
+    # Kết quả trả về là bản sao: sửa nó không làm hỏng cache
+    assert third["data"]["products"]["aggregations"] == aggregations
+    # Truy vấn có bộ lọc luôn yêu cầu facet của chính nó
+    assert "aggregations {" in queries[3]
+    assert filtered["data"]["products"]["aggregations"] == aggregations
+
+
+def test_aggregation_cache_key_keeps_diacritics():
+    assert aggregation_cache_key("s", "Thịt  Bò") == aggregation_cache_key("s", "thịt bò")
+    assert aggregation_cache_key("s", "thịt bò") != aggregation_cache_key("s", "thịt bơ")
+
+
+def test_suggest_products_falls_back_to_original_query():
+    searches = []
+
+    class FakeProductAPI(ProductAPI):
+        async def execute_graphql(self, query, variables=None, **kwargs):
+            searches.append(variables["search"])
+            items = [{"id": 7, "name": "Sữa ko đường"}] if variables["search"] == "sua ko duong" else []
+            return {"success": True, "data": {"products": {"items": items, "total_count": len(items)}}}
+
+    async def run():
+        api = FakeProductAPI("https://example.com/graphql", 5)
+        api.set_store_code("test_fallback_store")
+        return await api.suggest_products("sua ko duong")
+
+    result = asyncio.run(run())
+    assert len(searches) == 2
+    assert searches[0] != "sua ko duong"
+    assert searches[1] == "sua ko duong"
+    assert [item["id"] for item in result["data"]["products"]["items"]] == [7]
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho bước chuẩn hóa truy vấn tìm kiếm
+"""
+
+from mm_a2a.tools.api_client.query_normalizer import QueryNormalizer, edit_distance
+
+PRODUCT_NAMES = [
+    "Sữa tươi tiệt trùng Vinamilk 1L",
+    "Sữa chua uống Probi",
+    "Nước mắm Nam Ngư 500ml",
+    "Bột giặt Omo Matic 3kg",
+    "Dầu gội Clear bạc hà",
+    "Bánh quy bơ Danisa",
+]
+
+
+def _normalizer():
+    normalizer = QueryNormalizer(min_vocabulary=10)
+    normalizer.learn(PRODUCT_NAMES)
+    return normalizer
+
+
+def test_edit_distance_handles_transposition():
+    assert edit_distance("vinamilk", "vinamilk", 2) == 0
+    assert edit_distance("vinamlik", "vinamilk", 2) == 1
+    assert edit_distance("abc", "xyzabc", 2) == 3
+
+
+def test_synonyms_and_abbreviations():
+    normalized = _normalizer().normalize("nuoc mam ko mặn")
+    assert normalized.text == "nước mắm không mặn"
+    assert [kind for kind, _, _ in normalized.corrections] == ["synonym", "synonym"]
+
+
+def test_accented_input_is_not_rewritten_by_synonyms():
+    normalizer = _normalizer()
+    for query in ("sửa chữa", "mì tôm", "bánh mì tôm", "Sữa chua uống"):
+        normalized = normalizer.normalize(query)
+        assert normalized.text == query
+        assert not normalized.changed
+    # Gõ không dấu vẫn được khôi phục theo từ điển
+    assert normalizer.normalize("sua chua").text == "sữa chua"
+
+
+def test_typo_correction_and_diacritics_restore():
+    normalizer = _normalizer()
+    normalized = normalizer.normalize("vinamlik tiet trung")
+    assert normalized.text == "vinamilk tiệt trùng"
+    kinds = {kind for kind, _, _ in normalized.corrections}
+    assert kinds == {"typo", "diacritics"}
+    # Từ số và từ ngắn được giữ nguyên
+    assert normalizer.normalize("omo 3kg").text == "omo 3kg"
+
+
+def test_unchanged_query_is_returned_as_is():
+    normalized = _normalizer().normalize("Bánh quy")
+    assert not normalized.changed
+    assert normalized.text == "Bánh quy"
+
+
+def test_diacritics_restored_only_with_context_or_unambiguous():
+    normalizer = _normalizer()
+    normalizer.learn(["Cá hồi Na Uy", "Cà rốt Đà Lạt", "Thịt bò Úc", "Bơ sáp Đắk Lắk"])
+    # "ca" có thể là "cá" hoặc "cà", không có cặp "ca chua" trong từ vựng: giữ nguyên
+    assert normalizer.normalize("ca chua").text == "ca chua"
+    # "bo" mơ hồ (bò/bơ) nhưng cặp "bò úc" xác định cả hai từ
+    assert normalizer.normalize("thit bo uc").text == "thịt bò úc"
+    normalizer.learn(["Cà chua bi Đà Lạt"])
+    assert normalizer.normalize("ca chua").text == "cà chua"
+
+
+def test_retry_accounting():
+    normalizer = _normalizer()
+    # Truy vấn gốc gồm các từ đã biết: viết lại có kết quả không được tính là tránh tìm lại
+    normalizer.record_result(normalizer.normalize("bot giat"), 5, scope="s1")
+    # Truy vấn gốc có lỗi chính tả (ngoài từ vựng)
+    normalizer.record_result(normalizer.normalize("vinamlik"), 2, scope="s2")
+    empty = normalizer.normalize("xyz")
+    normalizer.record_result(empty, 0, scope="s1")
+    normalizer.record_result(normalizer.normalize("bánh quy"), 3, scope="s1")
+    stats = normalizer.stats()
+    assert stats["retries_avoided"] == 1
+    assert stats["empty_results"] == 1
+    assert stats["retries_after_empty"] == 1
+
+
+def test_retry_avoided_when_original_known_empty():
+    normalizer = _normalizer()
+    original = normalizer.normalize("tiet trung")
+    normalizer.record_result(original.as_original(), 0)
+    normalizer.record_result(original, 4)
+    assert normalizer.stats()["retries_avoided"] == 1
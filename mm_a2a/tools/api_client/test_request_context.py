@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho ngữ cảnh request theo phiên (một client dùng chung cho nhiều cửa hàng)
+"""
+
+import asyncio
+import threading
+
+from mm_a2a.tools.api_client.api_client import EcommerceAPIClient
+from mm_a2a.tools.api_client.request_context import RequestContext, SessionContexts, use_context
+
+
+def test_concurrent_sessions_share_one_client_without_cross_talk(fake_session):
+    client = EcommerceAPIClient("https://context.example.com", 5)
+    contexts = SessionContexts()
+    sent = {}
+    sessions = {}
+    barrier = threading.Barrier(2)
+
+    def run_session(session_id, store_code, token):
+        async def turn():
+            context = contexts.get(session_id)
+            with use_context(context):
+                # Tương đương login_with_mcard trả về store_view_code và token
+                client.set_store_code(store_code)
+                client.set_auth_token(token)
+                client._product_api._session = fake_session(body={"data": {"storeConfig": {"store_code": "ok"}}})
+                sessions[session_id] = client._product_api._session
+                await asyncio.sleep(0)
+                barrier.wait(timeout=5)
+                for _ in range(3):
+                    await client._product_api.execute_graphql("query { storeConfig { store_code } }")
+                    await asyncio.sleep(0)
+        asyncio.run(turn())
+        sent[session_id] = [(headers.get("Store"), headers.get("Authorization"))
+                            for _, headers in sessions[session_id].requests]
+
+    threads = [
+        threading.Thread(target=run_session, args=("s1", "b2c_10010_vi", "token-1")),
+        threading.Thread(target=run_session, args=("s2", "b2c_10020_vi", "token-2")),
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(sent["s1"]) == {("b2c_10010_vi", "Bearer token-1")}
+    assert set(sent["s2"]) == {("b2c_10020_vi", "Bearer token-2")}
+    assert sessions["s1"] is not sessions["s2"]
+    # Ngữ cảnh phiên được giữ cho lượt sau, client không bị thay đổi
+    assert contexts.get("s2").store_code == "b2c_10020_vi"
+    assert client._store_code == RequestContext().store_code
+    assert client._auth_token is None
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Kiểm thử cho vòng đời token xác thực (kiểm tra tại chỗ, làm mới trước hạn, token bị từ chối)
+"""
+
+import asyncio
+
+from mm_a2a.tools.api_client.api_client import EcommerceAPIClient
+from mm_a2a.tools.api_client.auth import AuthAPI
+
+
+class FakeMagento:
+    """Trả lời truy vấn theo nội dung cho `fake_session` (cấp token, cấu hình cửa hàng, thông tin khách hàng)."""
+
+    def __init__(self, customer_error=None):
+        self.issued = 0
+        self.customer_error = customer_error
+
+    def __call__(self, query, headers):
+        if "generateCustomerToken" in query:
+            self.issued += 1
+            return {"data": {"generateCustomerToken": {"token": f"token-{self.issued}"}}}
+        if "storeConfig" in query:
+            return {"data": {"storeConfig": {"customer_access_token_lifetime": 1}}}
+        if self.customer_error:
+            return {"errors": [{"message": "The current customer isn't authorized.",
+                                "extensions": {"category": self.customer_error}}]}
+        return {"data": {"customer": {"email": "a@example.com"}}}
+
+
+def _auth_api(base_url, session):
+    """AuthAPI dùng session giả (gọi bên trong event loop: session được gắn theo loop)."""
+    api = AuthAPI(base_url, 5)
+    api._session = session
+    return api
+
+
+def test_auth_status_is_answered_locally(fake_session):
+    async def run():
+        session = fake_session(FakeMagento())
+        api = _auth_api("https://token-local.example.com", session)
+        login = await api.login("local@example.com", "secret")
+        sent = len(session.requests)
+        status = await api.check_auth_status()
+        return login, status, sent, session
+
+    login, status, sent, session = asyncio.run(run())
+    assert login["success"] and login["token"] == "token-1"
+    assert len(session.requests) == 3
+    assert "generateCustomerToken" in session.requests[0][0] and "storeConfig" in session.requests[1][0]
+    assert status["is_authenticated"]
+    assert 3500 < status["expires_in"] <= 3600
+    assert len(session.requests) == sent
+
+
+def test_token_is_renewed_before_expiry_and_shared_across_modules(fake_session):
+    magento = FakeMagento()
+
+    async def run():
+        session = fake_session(magento)
+        client = EcommerceAPIClient("https://token-refresh.example.com", 5)
+        for module in (client, client._product_api, client._cart_api, client._auth_api):
+            module._session = session
+        await client.login("refresh@example.com", "secret")
+        # Còn 60 giây, ít hơn AUTH_REFRESH_MARGIN: request kế tiếp đăng nhập lại trước
+        client._tokens.set_lifetime(client._tokens.remaining() - 3600 + 60)
+        await client._auth_api.fetch_customer_info()
+        return client, session
+
+    client, session = asyncio.run(run())
+    assert magento.issued == 2
+    assert session.requests[-1][1]["Authorization"] == "Bearer token-2"
+    assert client._cart_api._auth_token == "token-2"
+    assert client._tokens.remaining() > 3500
+    assert client._tokens.stats()["refreshes"] == 1
+
+
+def test_rejected_token_is_dropped(fake_session):
+    magento = FakeMagento()
+
+    async def run():
+        session = fake_session(magento)
+        api = _auth_api("https://token-rejected.example.com", session)
+        await api.login("rejected@example.com", "secret")
+        magento.customer_error = "graphql-authorization"
+        info = await api.fetch_customer_info()
+        status = await api.check_auth_status()
+        return info, status, api
+
+    info, status, api = asyncio.run(run())
+    assert not info["success"]
+    assert not status["is_authenticated"]
+    assert api._auth_token is None
+    assert api._tokens.stats()["rejected"] == 1
+
+
+def test_login_after_rejection_issues_new_token(fake_session):
+    async def run():
+        session = fake_session(FakeMagento())
+        api = _auth_api("https://token-relogin.example.com", session)
+        first = await api.login("relogin@example.com", "secret")
+        api._tokens.reject(first["token"])
+        second = await api.login("relogin@example.com", "secret")
+        return first, second, api
+
+    first, second, api = asyncio.run(run())
+    assert (first["token"], second["token"]) == ("token-1", "token-2")
+    assert not second.get("deduplicated")
+    assert api._auth_token == "token-2"
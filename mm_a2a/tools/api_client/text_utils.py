@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tiện ích xử lý văn bản tiếng Việt cho tìm kiếm sản phẩm.
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import List
+
+_TOKEN_PATTERN = re.compile(r"[0-9a-z]+")
+
+
+@lru_cache(maxsize=4096)
+def fold_diacritics(text: str) -> str:
+    """
+    Bỏ dấu tiếng Việt và chuyển về chữ thường ("Sữa tươi" -> "sua tuoi").
+
+    Args:
+        text: Chuỗi cần chuẩn hóa.
+
+    Returns:
+        str: Chuỗi không dấu, chữ thường.
+    """
+    text = text.lower().replace("đ", "d")
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tách chuỗi thành các token đã bỏ dấu.
+
+    Args:
+        text: Chuỗi cần tách.
+
+    Returns:
+        List[str]: Danh sách token (chữ và số).
+    """
+    if not text:
+        return []
+    return _TOKEN_PATTERN.findall(fold_diacritics(text))
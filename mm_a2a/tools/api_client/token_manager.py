@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Quản lý vòng đời token xác thực khách hàng.
+
+Token được giữ trong một `AuthTokenManager` thuộc ngữ cảnh request của khách hàng
+(`request_context.py`), dùng chung giữa các module Product/Cart/Auth thay vì sao chép
+token sang từng module. Manager ghi nhận thời
+điểm cấp và thời gian sống của token (lấy từ `storeConfig.customer_access_token_lifetime`,
+cache theo cửa hàng) nên:
+- `is_authenticated` được trả lời tại chỗ, không cần gọi `customer` qua mạng
+- token được làm mới (đăng nhập lại) trước khi hết hạn `AUTH_REFRESH_MARGIN` giây,
+  ở lần gọi API đầu tiên rơi vào khoảng này
+- token bị server từ chối (lỗi phân quyền) hoặc đã hết hạn không còn được gửi đi
+
+Magento không có API làm mới token, nên làm mới là đăng nhập lại bằng thông tin của
+lần đăng nhập trước (hàm `relogin` do `AuthAPI` cung cấp).
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .cache import TTLCache
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Mã lỗi cho biết server từ chối token hiện tại
+AUTH_ERROR_CODES = frozenset({"graphql-authorization", "AUTHENTICATION_ERROR", "TOKEN_EXPIRED", "HTTP_401"})
+
+# Thời gian sống token theo (base_url, mã cửa hàng), dùng chung cho cả tiến trình
+_token_lifetimes = TTLCache(max_entries=64, ttl=Config.AUTH_LIFETIME_CACHE_TTL)
+
+
+def get_cached_token_lifetime(base_url: str, store_code: str) -> Optional[float]:
+    """Thời gian sống token (giây) đã biết của cửa hàng, hoặc None."""
+    return _token_lifetimes.get((base_url, store_code))
+
+
+def cache_token_lifetime(base_url: str, store_code: str, lifetime: float):
+    """Ghi nhận thời gian sống token (giây) của cửa hàng."""
+    _token_lifetimes.set((base_url, store_code), lifetime)
+
+
+class AuthTokenManager:
+    """
+    Token xác thực cùng thời điểm cấp, thời hạn và cách làm mới (an toàn đa luồng).
+
+    Args:
+        refresh_margin: Làm mới token khi thời gian còn lại nhỏ hơn giá trị này (giây).
+        default_lifetime: Thời gian sống dùng khi chưa biết cấu hình của cửa hàng (giây).
+    """
+
+    def __init__(
+        self,
+        refresh_margin: float = Config.AUTH_REFRESH_MARGIN,
+        default_lifetime: float = Config.AUTH_TOKEN_LIFETIME
+    ):
+        self.refresh_margin = refresh_margin
+        self.default_lifetime = default_lifetime
+        self._token: Optional[str] = None
+        self._issued_at = 0.0
+        self._expires_at = 0.0
+        self._relogin: Optional[Callable[[], Awaitable[bool]]] = None
+        self._refreshing = False
+        self.customer_key: Optional[Tuple[str, str]] = None  # Khóa hồ sơ khách hàng của token (xem customer_profile.py)
+        self._lock = threading.Lock()
+        self.local_checks = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.rejected = 0
+
+    @property
+    def token(self) -> Optional[str]:
+        """Token còn hạn, hoặc None."""
+        with self._lock:
+            if self._token and self._expires_at > time.monotonic():
+                return self._token
+            return None
+
+    def set(
+        self,
+        token: Optional[str],
+        lifetime: Optional[float] = None,
+        relogin: Optional[Callable[[], Awaitable[bool]]] = None
+    ):
+        """
+        Lưu token mới cấp.
+
+        Args:
+            token: Token xác thực.
+            lifetime: Thời gian sống (giây), mặc định `default_lifetime`.
+            relogin: Hàm đăng nhập lại để làm mới token, trả về True nếu thành công
+                (None thì giữ hàm của token trước nếu có).
+        """
+        if not token:
+            self.clear()
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._token = token
+            self._issued_at = now
+            self._expires_at = now + (lifetime or self.default_lifetime)
+            if relogin is not None:
+                self._relogin = relogin if Config.AUTH_RELOGIN_ENABLED else None
+
+    def set_lifetime(self, lifetime: float):
+        """Cập nhật thời hạn của token hiện tại theo thời gian sống thực của cửa hàng (giây)."""
+        with self._lock:
+            if self._token:
+                self._expires_at = self._issued_at + lifetime
+
+    def clear(self):
+        """Xóa token, thông tin đăng nhập lại và khách hàng gắn với token."""
+        with self._lock:
+            self._token = None
+            self._expires_at = 0.0
+            self._relogin = None
+            self.customer_key = None
+
+    def reject(self, token: str):
+        """
+        Server từ chối token (bị thu hồi hoặc hết hạn sớm): không gửi token này nữa.
+
+        Args:
+            token: Token đã gửi kèm request bị từ chối (bỏ qua nếu đã được thay bằng token mới).
+        """
+        with self._lock:
+            if self._token is None or self._token != token:
+                return
+            self._token = None
+            self._expires_at = 0.0
+            self.rejected += 1
+        logger.info("Token xác thực bị server từ chối, đã xóa")
+
+    def remaining(self) -> Optional[float]:
+        """Số giây còn lại của token, hoặc None nếu không có token còn hạn."""
+        with self._lock:
+            if not self._token:
+                return None
+            remaining = self._expires_at - time.monotonic()
+            return remaining if remaining > 0 else None
+
+    def is_authenticated(self) -> bool:
+        """Kiểm tra tại chỗ: có token còn hạn hay không."""
+        with self._lock:
+            self.local_checks += 1
+            return bool(self._token) and self._expires_at > time.monotonic()
+
+    def needs_refresh(self) -> bool:
+        """Token sắp hết hạn (hoặc đã hết hạn) và có thể đăng nhập lại."""
+        with self._lock:
+            return (
+                self._relogin is not None
+                and not self._refreshing
+                and self._token is not None
+                and self._expires_at - time.monotonic() <= self.refresh_margin
+            )
+
+    async def ensure_fresh(self) -> bool:
+        """
+        Làm mới token nếu sắp hết hạn.
+
+        Chỉ một lần làm mới chạy tại một thời điểm; các request trong lúc làm mới dùng
+        token hiện tại (nếu còn hạn).
+
+        Returns:
+            bool: True nếu sau khi gọi vẫn có token còn hạn.
+        """
+        with self._lock:
+            relogin = self._relogin
+            if (
+                relogin is None
+                or self._refreshing
+                or self._token is None
+                or self._expires_at - time.monotonic() > self.refresh_margin
+            ):
+                return bool(self._token) and self._expires_at > time.monotonic()
+            self._refreshing = True
+        try:
+            refreshed = await relogin()
+        except Exception as e:
+            logger.warning(f"Lỗi khi làm mới token xác thực: {str(e)}")
+            refreshed = False
+        finally:
+            with self._lock:
+                self._refreshing = False
+        with self._lock:
+            if refreshed:
+                self.refreshes += 1
+            else:
+                self.refresh_failures += 1
+                # Không làm mới được: dùng token hiện tại tới khi hết hạn, không thử lại ở mỗi request
+                self._relogin = None
+            return bool(self._token) and self._expires_at > time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Trạng thái token để worker khác khôi phục (`restore`).
+
+        Thời điểm cấp/hết hạn được đổi sang giờ hệ thống; hàm đăng nhập lại không được lưu.
+        """
+        with self._lock:
+            offset = time.time() - time.monotonic()
+            return {
+                "token": self._token,
+                "issued_at": self._issued_at + offset if self._token else None,
+                "expires_at": self._expires_at + offset if self._token else None,
+                "customer_key": list(self.customer_key) if self.customer_key else None
+            }
+
+    def restore(self, snapshot: Dict[str, Any]):
+        """
+        Khôi phục token từ `snapshot` (do worker khác lưu).
+
+        Hàm đăng nhập lại chỉ được giữ nếu token không đổi; nếu không, token được dùng tới khi
+        hết hạn rồi khách hàng đăng nhập lại.
+        """
+        offset = time.time() - time.monotonic()
+        token = snapshot.get("token")
+        customer_key = snapshot.get("customer_key")
+        with self._lock:
+            if token != self._token:
+                self._relogin = None
+            self._token = token
+            self._issued_at = snapshot["issued_at"] - offset if token else 0.0
+            self._expires_at = snapshot["expires_at"] - offset if token else 0.0
+            self.customer_key = tuple(customer_key) if customer_key else None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê token.
+
+        Returns:
+            Dict[str, Any]: Trạng thái đăng nhập, số giây còn lại, số lần kiểm tra tại chỗ,
+            số lần làm mới thành công/thất bại và số lần token bị server từ chối.
+        """
+        remaining = self.remaining()
+        with self._lock:
+            return {
+                "authenticated": remaining is not None,
+                "expires_in": round(remaining, 1) if remaining is not None else None,
+                "local_checks": self.local_checks,
+                "refreshes": self.refreshes,
+                "refresh_failures": self.refresh_failures,
+                "rejected": self.rejected
+            }
@@ -6,16 +6,20 @@
 from datetime import datetime
 import json
 import os
-from typing import Dict, Any, List, Optional
-
-from google.adk.agents.callback_context import CallbackContext
-from google.adk.sessions.state import State
-from google.adk.tools import ToolContext
+from typing import TYPE_CHECKING, Dict, Any, List, Optional
 
 from mm_a2a.tools import constants
+from mm_a2a.logging_setup import capped
+from mm_a2a.shared_state import shared_mapping
 
 import logging
 
+if TYPE_CHECKING:
+    # Chỉ dùng cho chú thích kiểu: backend import module này mà không cần nạp ADK
+    from google.adk.agents.callback_context import CallbackContext
+    from google.adk.sessions.state import State
+    from google.adk.tools import ToolContext
+
 logger = logging.getLogger(__name__)
 
 # Đường dẫn mặc định đến file sample_scenario.json
@@ -24,12 +28,12 @@ SAMPLE_SCENARIO_PATH = os.path.join(
     os.getenv("MM_A2A_SCENARIO", "eval/sample_scenario.json")
 )
 
-# In-memory storage for simplicity in this prototype
-# In a production setting, this should be replaced with a proper database
-_memory_store = {}
-_session_store = {}
+# Dict của tiến trình khi chạy một worker, SQLite dùng chung khi chạy nhiều worker
+# (giá trị lấy ra là bản sao: chỉ gán lại khóa, không sửa tại chỗ)
+_memory_store = shared_mapping("memory")
+_session_store = shared_mapping("session_data")
 
-def memorize_list(key: str, value: str, tool_context: ToolContext):
+def memorize_list(key: str, value: str, tool_context: "ToolContext"):
     """
     Ghi nhớ các mảng thông tin.
 
@@ -49,7 +53,7 @@ def memorize_list(key: str, value: str, tool_context: ToolContext):
     return {"status": f'Đã lưu "{key}": "{value}"'}
 
 
-def memorize(key: str, value: str, tool_context: ToolContext):
+def memorize(key: str, value: str, tool_context: "ToolContext"):
     """
     Ghi nhớ thông tin, một cặp khóa-giá trị mỗi lần.
 
@@ -66,7 +70,7 @@ def memorize(key: str, value: str, tool_context: ToolContext):
     return {"status": f'Đã lưu "{key}": "{value}"'}
 
 
-def forget(key: str, value: str, tool_context: ToolContext):
+def forget(key: str, value: str, tool_context: "ToolContext"):
     """
     Xóa thông tin đã ghi nhớ.
 
@@ -85,7 +89,7 @@ def forget(key: str, value: str, tool_context: ToolContext):
     return {"status": f'Đã xóa "{key}": "{value}"'}
 
 
-def _set_initial_states(source: Dict[str, Any], target: State | dict[str, Any]):
+def _set_initial_states(source: Dict[str, Any], target: "State | dict[str, Any]"):
     """
     Thiết lập trạng thái phiên ban đầu dựa trên đối tượng JSON của các trạng thái.
 
@@ -107,7 +111,7 @@ def _set_initial_states(source: Dict[str, Any], target: State | dict[str, Any]):
             target[constants.SESSION_DATE] = session_data.get(constants.SESSION_DATE, "")
 
 
-def _load_precreated_session(callback_context: CallbackContext):
+def _load_precreated_session(callback_context: "CallbackContext"):
     """
     Thiết lập trạng thái ban đầu.
     Đặt điều này như một callback before_agent_call của root_agent.
@@ -285,16 +289,16 @@ async def _load_precreated_session(context=None, callback_context=None):
                 for key, value in saved_data.items():
                     ctx.session.state[key] = value
                 
-                logger.info(f"Đã tải {len(saved_data)} khóa từ phiên {session_id}")
+                logger.debug("Đã tải %d khóa từ phiên %s", len(saved_data), session_id)
                 
                 # Đặc biệt kiểm tra cart_id
                 if 'cart_id' in saved_data:
-                    logger.info(f"Khôi phục giỏ hàng {saved_data['cart_id']}")
+                    logger.debug("Khôi phục giỏ hàng %s", saved_data['cart_id'])
                     
                     # Lưu cart_id vào memory store để các agent khác có thể truy cập
                     # Không dùng await với session object
                     _memory_store['cart_id'] = saved_data['cart_id']
-                    logger.debug(f"Đã lưu giá trị cart_id trực tiếp vào memory store")
+                    logger.debug("Đã lưu giá trị cart_id trực tiếp vào memory store")
     except Exception as e:
         logger.error(f"Lỗi khi tải phiên đã tạo sẵn: {str(e)}")
         logger.exception(e)
@@ -329,14 +333,14 @@ async def _save_session_data(context=None, callback_context=None):
                                 "content": content,
                                 "timestamp": datetime.now().isoformat()
                             })
-                            logger.info(f"Đã lưu tin nhắn: {msg.role} - {content[:30]}...")
+                            logger.debug("Đã lưu tin nhắn: %s - %s", msg.role, capped(content, 30))
                         except Exception as e:
                             logger.error(f"Lỗi khi xử lý tin nhắn: {str(e)}")
                             continue
             
             # Thêm messages vào dữ liệu lưu trữ
             data_to_save['messages'] = messages
-            logger.info(f"Đã thêm {len(messages)} tin nhắn vào dữ liệu lưu trữ")
+            logger.debug("Đã thêm %d tin nhắn vào dữ liệu lưu trữ", len(messages))
             
             # Lọc bỏ các giá trị quá lớn hoặc không cần thiết
             filtered_data = {}
@@ -367,7 +371,7 @@ async def _save_session_data(context=None, callback_context=None):
             
             # Lưu dữ liệu đã lọc
             _store_session_data(session_id, filtered_data)
-            logger.info(f"Đã lưu {len(filtered_data)} khóa vào phiên {session_id}")
+            logger.debug("Đã lưu %d khóa vào phiên %s", len(filtered_data), session_id)
     except Exception as e:
         logger.error(f"Lỗi khi lưu dữ liệu phiên: {str(e)}")
         logger.exception(e)
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Tracing OpenTelemetry cho backend, agent, công cụ và GraphQL.
+
+Mỗi lượt chat tạo một cây span:
+- `HTTP <method> <route>` (`TracingMiddleware`): một span cho mỗi request HTTP, đặt tên theo
+  mẫu route (`/api/session/{session_id}`), kèm đường dẫn thô (`url.path`), mã trạng thái và
+  số byte request/response (span kết thúc khi response stream xong)
+- `chat_turn` (`run_turn_async`, `run_turn`): một lượt chạy Runner, kèm user/session, mã cửa
+  hàng và số byte tin nhắn/phản hồi
+- `invocation`, `agent_run [<agent>]`, `call_llm`, `tool_call [<công cụ>]`: do ADK tạo;
+  lượt chạy trong ngữ cảnh trace của request (kể cả trên thread khác) nên các span này nằm dưới
+  `chat_turn`. Công cụ ghi thêm mã cửa hàng và cache hit/miss (`record_cache`) lên span
+  `tool_call` đang chạy
+- `graphql <operation>` (`APIClientBase.execute_graphql`): mỗi lần gửi GraphQL, đặt tên
+  theo operation, kèm mã cửa hàng, số byte request/response và mã lỗi
+
+Exporter hoạt động offline: ghi file JSON lines (`TRACING_EXPORTER=file`, mỗi dòng một
+span) hoặc in ra console. Khi `TRACING_ENABLED` tắt, không cài TracerProvider nên mọi
+span là no-op.
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+from config import Config
+from mm_a2a.metrics import CACHE_LOOKUPS
+from mm_a2a.timing import TurnTiming, use_timing
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("mm_a2a")
+
+_provider: Optional[TracerProvider] = None
+
+
+class JsonLinesSpanExporter(SpanExporter):
+    """
+    Exporter ghi mỗi span thành một dòng JSON vào file (không cần collector).
+
+    Args:
+        path: Đường dẫn file (ghi nối tiếp).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = "".join(json.dumps(json.loads(span.to_json()), ensure_ascii=False) + "\n" for span in spans)
+        with self._lock:
+            if self._file.closed:
+                return SpanExportResult.FAILURE
+            self._file.write(lines)
+            self._file.flush()
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self):
+        with self._lock:
+            self._file.close()
+
+
+def setup_tracing(exporter: Optional[SpanExporter] = None) -> Optional[TracerProvider]:
+    """
+    Cài TracerProvider toàn cục theo cấu hình (gọi một lần khi khởi động).
+
+    Args:
+        exporter: Exporter dùng thay cho cấu hình (ví dụ trong kiểm thử).
+
+    Returns:
+        Optional[TracerProvider]: Provider đã cài, hoặc None nếu tracing bị tắt.
+    """
+    global _provider
+    if _provider is not None:
+        return _provider
+    if exporter is None:
+        if not Config.TRACING_ENABLED:
+            return None
+        if Config.TRACING_EXPORTER == "console":
+            exporter = ConsoleSpanExporter()
+        else:
+            exporter = JsonLinesSpanExporter(Config.TRACING_FILE)
+    _provider = TracerProvider(resource=Resource.create({"service.name": Config.TRACING_SERVICE_NAME}))
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    trace.set_tracer_provider(_provider)
+    logger.info(f"Đã bật tracing ({type(exporter).__name__})")
+    return _provider
+
+
+def shutdown_tracing():
+    """Xuất nốt các span đang chờ và đóng exporter."""
+    if _provider is not None:
+        _provider.shutdown()
+
+
+def set_attributes(attributes: Dict[str, Any], span: Optional[trace.Span] = None):
+    """Ghi các thuộc tính (bỏ giá trị None) lên span, mặc định span hiện tại."""
+    span = span or trace.get_current_span()
+    if span.is_recording():
+        span.set_attributes({key: value for key, value in attributes.items() if value is not None})
+
+
+def record_cache(name: str, hit: bool):
+    """Ghi cache hit/miss lên span hiện tại (thuộc tính `mm.cache.<name>`) và đếm vào `mm_cache_lookups_total`."""
+    CACHE_LOOKUPS.inc(cache=name, result="hit" if hit else "miss")
+    span = trace.get_current_span()
+    if span.is_recording():
+        span.set_attribute(f"mm.cache.{name}", "hit" if hit else "miss")
+
+
+def payload_size(payload: Any) -> Optional[int]:
+    """Số byte JSON của payload; chỉ tính khi span hiện tại đang được ghi."""
+    if not trace.get_current_span().is_recording():
+        return None
+    try:
+        return len(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+    except (TypeError, ValueError):
+        return None
+
+
+async def run_turn_async(
+    runner,
+    *,
+    user_id: str,
+    session_id: str,
+    new_message,
+    store_code: Optional[str] = None,
+    timing: Optional[TurnTiming] = None
+) -> AsyncIterator:
+    """
+    Chạy một lượt của Runner (`run_async`) trên event loop hiện tại trong span `chat_turn`.
+
+    Span và `timing` được gắn vào ngữ cảnh của lượt nên span của ADK nằm dưới `chat_turn`.
+    Người gọi dừng giữa chừng phải đóng generator trong cùng task (`contextlib.aclosing`).
+
+    Args:
+        runner: Runner ADK.
+        user_id: ID người dùng.
+        session_id: ID phiên.
+        new_message: Tin nhắn của người dùng (`types.Content`).
+        store_code: Mã cửa hàng của phiên (ghi vào span).
+        timing: Phân rã độ trễ của lượt (`include_timing`), được ghi bởi callback của agent.
+
+    Yields:
+        Event: Các event của lượt chạy.
+    """
+    message_bytes = sum(len((part.text or "").encode("utf-8")) for part in (new_message.parts or []))
+    with tracer.start_as_current_span("chat_turn", attributes={
+        "mm.user_id": user_id,
+        "mm.session_id": session_id,
+        "mm.store_code": store_code or Config.STORE_CODE,
+        "mm.message.bytes": message_bytes
+    }) as span:
+        started = time.perf_counter()
+        count = 0
+        response_bytes = 0
+        try:
+            with use_timing(timing):
+                async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=new_message):
+                    count += 1
+                    if event.content and event.content.parts:
+                        response_bytes += sum(len((part.text or "").encode("utf-8")) for part in event.content.parts)
+                    yield event
+        finally:
+            span.set_attributes({
+                "mm.events": count,
+                "mm.response.bytes": response_bytes,
+                "mm.turn.ms": round((time.perf_counter() - started) * 1000, 1)
+            })
+
+
+def run_turn(runner, **kwargs) -> Iterator:
+    """
+    Chạy một lượt của Runner trong span `chat_turn`, trả về các event như `Runner.run`.
+
+    `Runner.run` chạy agent trên thread riêng nhưng không chuyển contextvars sang thread
+    đó, nên span của ADK sẽ tách khỏi trace của request. Hàm này làm như `Runner.run`
+    (chạy `run_turn_async` trên thread riêng) nhưng trong bản sao ngữ cảnh hiện tại.
+
+    Args:
+        runner: Runner ADK.
+        **kwargs: Tham số của `run_turn_async`.
+
+    Yields:
+        Event: Các event của lượt chạy.
+    """
+    events: "queue.Queue" = queue.Queue()
+
+    async def pump():
+        async with contextlib.aclosing(run_turn_async(runner, **kwargs)) as turn:
+            async for event in turn:
+                events.put(event)
+
+    def thread_main():
+        import asyncio
+        try:
+            asyncio.run(pump())
+        except Exception as e:
+            events.put(e)
+        finally:
+            events.put(None)
+
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(thread_main,), name="runner-turn")
+    thread.start()
+    while True:
+        event = events.get()
+        if event is None:
+            break
+        if isinstance(event, Exception):
+            raise event
+        yield event
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI tạo một span cho mỗi request HTTP.
+
+    Span kết thúc khi response đã gửi xong (kể cả response stream), nên thời gian và số
+    byte của `/api/chat/stream` là của toàn bộ luồng SSE. Tên span dùng mẫu route của FastAPI
+    (đặt sau khi định tuyến, như `MetricsMiddleware`) để số tên span không tăng theo đường dẫn
+    thô; đường dẫn thô chỉ nằm trong thuộc tính `url.path`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope.get("method", "GET")
+        path = scope.get("path", "")
+        with tracer.start_as_current_span(f"HTTP {method}", kind=SpanKind.SERVER, attributes={
+            "http.request.method": method,
+            "url.path": path
+        }) as span:
+            sizes = {"request": 0, "response": 0}
+
+            async def counting_receive():
+                message = await receive()
+                if message["type"] == "http.request":
+                    sizes["request"] += len(message.get("body", b""))
+                return message
+
+            async def counting_send(message):
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    span.set_attribute("http.response.status_code", status)
+                    if status >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                elif message["type"] == "http.response.body":
+                    sizes["response"] += len(message.get("body", b""))
+                await send(message)
+
+            try:
+                await self.app(scope, counting_receive, counting_send)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    span.update_name(f"HTTP {method} {route}")
+                    span.set_attribute("http.route", route)
+                span.set_attributes({
+                    "http.request.body.size": sizes["request"],
+                    "http.response.body.size": sizes["response"]
+                })